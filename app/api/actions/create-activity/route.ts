@@ -1,6 +1,7 @@
 import { NextResponse } from 'next/server';
 import Airtable from 'airtable';
 import { z } from 'zod'; // For validation
+import { dumpPath } from '@/lib/utils/pathCodec';
 
 // Helper to convert a string to PascalCase
 const stringToPascalCase = (str: string): string => {
@@ -369,7 +370,7 @@ export async function POST(request: Request) {
             return NextResponse.json({ success: false, error: "Pathfinding did not return a valid path or timing.", details: internalPathData.error }, { status: 400 });
         }
 
-        airtablePayload.Path = JSON.stringify(internalPathData.path);
+        airtablePayload.Path = dumpPath(internalPathData.path);
         startDate = new Date(internalPathData.timing.startDate);
         endDate = new Date(internalPathData.timing.endDate);
         if (internalPathData.transporter) airtablePayload.Transporter = internalPathData.transporter;
@@ -420,7 +421,7 @@ export async function POST(request: Request) {
                 if (!internalPathData.success || !internalPathData.path || !internalPathData.timing) {
                      return NextResponse.json({ success: false, error: "Pathfinding for fetch_resource did not return a valid path or timing.", details: internalPathData.error }, { status: 400 });
                 }
-                airtablePayload.Path = JSON.stringify(internalPathData.path);
+                airtablePayload.Path = dumpPath(internalPathData.path);
                 startDate = new Date(internalPathData.timing.startDate);
                 endDate = new Date(internalPathData.timing.endDate);
                 if (internalPathData.transporter) airtablePayload.Transporter = internalPathData.transporter;
@@ -474,7 +475,7 @@ export async function POST(request: Request) {
             return NextResponse.json({ success: false, error: "Pathfinding for bid_on_land did not return a valid path or timing.", details: internalPathData.error }, { status: 400 });
         }
 
-        airtablePayload.Path = JSON.stringify(internalPathData.path);
+        airtablePayload.Path = dumpPath(internalPathData.path);
         startDate = new Date(internalPathData.timing.startDate);
         endDate = new Date(internalPathData.timing.endDate); // EndDate is arrival at targetBuildingId
         if (internalPathData.transporter) airtablePayload.Transporter = internalPathData.transporter;
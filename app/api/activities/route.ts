@@ -1,4 +1,5 @@
 import { NextResponse } from 'next/server';
+import { toJsonPath } from '@/lib/utils/pathCodec';
 
 // Helper to escape single quotes for Airtable formulas
 function escapeAirtableValue(value: string): string {
@@ -192,6 +193,9 @@ export async function GET(request: Request) {
           formattedActivity[camelKey] = fields[key];
         }
       }
+      if (formattedActivity.path !== undefined) {
+        formattedActivity.path = toJsonPath(formattedActivity.path);
+      }
       return formattedActivity;
     });
 
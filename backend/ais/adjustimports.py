@@ -16,6 +16,13 @@ from pyairtable import Api, Base, Table # Added Base
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.citizen_utils import find_citizen_by_identifier
 
+# Add the project root to sys.path for backend.engine imports
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from backend.engine.utils.definitions_cache import get_building_type_definitions, get_resource_type_definitions
+
 log = logging.getLogger(__name__) # Initialize logger
 
 # Configuration for API calls (ensure BASE_URL is defined if not already)
@@ -160,84 +167,12 @@ def get_ai_citizens(tables) -> List[Dict]:
         return []
 
 def get_building_types_from_api() -> Dict:
-    """Get information about different building types from the API."""
-    try:
-        # Get API base URL from environment variables, with a default fallback
-        api_base_url = os.getenv("API_BASE_URL", "https://serenissima.ai")
-        
-        # Construct the API URL
-        url = f"{api_base_url}/api/building-types"
-        
-        print(f"Fetching building types from API: {url}")
-        
-        # Make the API request
-        response = requests.get(url)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            response_data = response.json()
-            
-            # Check if the response has the expected structure
-            if "success" in response_data and response_data["success"] and "buildingTypes" in response_data:
-                building_types = response_data["buildingTypes"]
-                print(f"Successfully fetched {len(building_types)} building types from API")
-                
-                # Transform the data into a dictionary keyed by building type
-                building_defs = {}
-                for building in building_types:
-                    if "type" in building:
-                        building_defs[building["type"]] = building
-                
-                return building_defs
-            else:
-                print(f"Unexpected API response format: {response_data}")
-                return {}
-        else:
-            print(f"Error fetching building types from API: {response.status_code} - {response.text}")
-            return {}
-    except Exception as e:
-        print(f"Exception fetching building types from API: {str(e)}")
-        return {}
+    """Get building type definitions keyed by type (shared definitions cache)."""
+    return get_building_type_definitions(os.getenv("API_BASE_URL", "https://serenissima.ai"))
 
 def get_resource_types_from_api() -> Dict:
-    """Get information about different resource types from the API."""
-    try:
-        # Get API base URL from environment variables, with a default fallback
-        api_base_url = os.getenv("API_BASE_URL", "https://serenissima.ai")
-        
-        # Construct the API URL
-        url = f"{api_base_url}/api/resource-types"
-        
-        print(f"Fetching resource types from API: {url}")
-        
-        # Make the API request
-        response = requests.get(url)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            response_data = response.json()
-            
-            # Check if the response has the expected structure
-            if "success" in response_data and response_data["success"] and "resourceTypes" in response_data:
-                resource_types = response_data["resourceTypes"]
-                print(f"Successfully fetched {len(resource_types)} resource types from API")
-                
-                # Transform the data into a dictionary keyed by resource id
-                resource_defs = {}
-                for resource in resource_types:
-                    if "id" in resource:
-                        resource_defs[resource["id"]] = resource
-                
-                return resource_defs
-            else:
-                print(f"Unexpected API response format: {response_data}")
-                return {}
-        else:
-            print(f"Error fetching resource types from API: {response.status_code} - {response.text}")
-            return {}
-    except Exception as e:
-        print(f"Exception fetching resource types from API: {str(e)}")
-        return {}
+    """Get resource type definitions keyed by resource id (shared definitions cache)."""
+    return get_resource_type_definitions(os.getenv("API_BASE_URL", "https://serenissima.ai"))
 
 def get_citizen_buildings(tables, username: str) -> List[Dict]:
     """Get all buildings run by by a specific citizen."""
@@ -402,6 +402,11 @@ class TryCreateActivityRequest(BaseModel):
     activityType: str
     activityParameters: Optional[Dict[str, Any]] = None
 
+class BatchPathRequest(BaseModel):
+    starts: List[Dict[str, float]] # {lat, lng} points
+    ends: List[Dict[str, float]]
+    mode: str = "paths" # "paths": one path per pair (starts or ends must hold a single point); "matrix": durations/distances for every pair
+
 class TryCreateStratagemEngineRequest(BaseModel):
     citizenUsername: str
     stratagemType: str
@@ -3493,6 +3498,36 @@ async def try_create_activity_endpoint(request_data: TryCreateActivityRequest):
         return JSONResponse(status_code=500, content={"success": False, "message": f"Internal server error: {str(e)}", "activity": None, "reason": "internal_server_error"})
 
 
+@app.post("/api/paths/batch")
+async def batch_paths_endpoint(request_data: BatchPathRequest):
+    """
+    One-to-many / many-to-one paths, or a travel time matrix, computed by the in-process router
+    with one graph expansion per source instead of one transport API request per pair.
+    """
+    from backend.engine.utils.pathfinding import find_paths_from, find_paths_to, find_travel_cost_matrix
+
+    if not request_data.starts or not request_data.ends:
+        raise HTTPException(status_code=400, detail="starts and ends must not be empty.")
+
+    if request_data.mode == "matrix":
+        matrix = find_travel_cost_matrix(request_data.starts, request_data.ends)
+        if matrix is None:
+            raise HTTPException(status_code=503, detail="Navigation data unavailable.")
+        return {"success": True, "durations": matrix["durations"], "distances": matrix["distances"]}
+
+    if request_data.mode != "paths":
+        raise HTTPException(status_code=400, detail=f"Unknown mode '{request_data.mode}' (expected 'paths' or 'matrix').")
+    if len(request_data.starts) == 1:
+        paths = find_paths_from(request_data.starts[0], request_data.ends)
+    elif len(request_data.ends) == 1:
+        paths = find_paths_to(request_data.starts, request_data.ends[0])
+    else:
+        raise HTTPException(status_code=400, detail="In 'paths' mode, starts or ends must contain a single point.")
+    if paths is None:
+        raise HTTPException(status_code=503, detail="Navigation data unavailable.")
+    return {"success": True, "paths": paths}
+
+
 # The scheduler is now started via the lifespan event manager above.
 # The direct call to start_scheduler() is removed.
 
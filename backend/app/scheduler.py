@@ -23,7 +23,7 @@ SCRIPTS_RESPECTING_FORCED_HOUR = [
     "engine/emergency_food_distribution_charity_contracts.py" # Charity contract-based emergency food distribution
     # Add other scripts here if they are updated to support --hour
 ]
-import subprocess
+from backend.app.task_runner import run_task, split_task_command
 from datetime import datetime, timedelta, timezone # Added timezone for timezone.utc
 from colorama import Fore, Style # Added import for colorama
 from typing import Dict, Optional # Import Dict and Optional for type hinting
@@ -73,42 +73,18 @@ def run_scheduled_tasks(forced_hour: Optional[int] = None): # Added forced_hour
 
         # --- Define a wrapper function for threaded task execution ---
         def run_task_in_thread(script_path_relative: str, task_name: str, active_threads_dict: Dict[str, threading.Thread], scheduler_forced_hour: Optional[int]): # Added scheduler_forced_hour
-            script_full_path = os.path.join(backend_dir_path, script_path_relative)
-            command_parts = ["python", script_full_path] # Basic command
+            actual_script_relative_path, script_args = split_task_command(
+                script_path_relative, scheduler_forced_hour, tuple(SCRIPTS_RESPECTING_FORCED_HOUR)
+            )
+            script_full_path = os.path.join(backend_dir_path, actual_script_relative_path)
 
-            # Handle potential arguments in script_path_relative (e.g., "script.py --arg value")
-            actual_script_to_check = script_path_relative # Path for checking against scripts_respecting_forced_hour
-            if " " in script_path_relative:
-                parts = script_path_relative.split(" ", 1)
-                actual_script_relative_path = parts[0]
-                script_args = parts[1].split()
-                script_full_path = os.path.join(backend_dir_path, actual_script_relative_path)
-                command_parts = ["python", script_full_path] + script_args
-                actual_script_to_check = actual_script_relative_path # Update for checking
-            
-            # Propagate forced_hour if set for the scheduler AND if the script is one that should respect it
-            if scheduler_forced_hour is not None and actual_script_to_check in SCRIPTS_RESPECTING_FORCED_HOUR: # Use module-level constant
-                command_parts.extend(["--hour", str(scheduler_forced_hour)])
-
-            print(f"Scheduler (Thread {threading.get_ident()}): Starting task: {task_name} with command: {' '.join(command_parts)}")
+            print(f"Scheduler (Thread {threading.get_ident()}): Starting task: {task_name} ({actual_script_relative_path} {' '.join(script_args)})")
             try:
                 output_lines = []
-                process = subprocess.Popen(
-                    command_parts,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    bufsize=1,
-                    universal_newlines=True
-                )
-                if process.stdout:
-                    for line in iter(process.stdout.readline, ''):
-                        stripped_line = line.strip()
-                        print(f"[{task_name} - Thread {threading.get_ident()}] {stripped_line}")
-                        output_lines.append(stripped_line)
-                    process.stdout.close()
-                
-                return_code = process.wait()
+                # In-process when the script exposes run_cli(argv), otherwise as a subprocess (see task_runner.py)
+                task_result = run_task(actual_script_relative_path, script_args, task_name)
+                output_lines = task_result.output_tail
+                return_code = task_result.return_code
                 log_output_for_telegram = "\n".join(output_lines[-20:]) # Get last 20 lines for notification
 
                 if return_code == 0:
@@ -247,7 +223,8 @@ def run_scheduled_tasks(forced_hour: Optional[int] = None): # Added forced_hour
                 4: [("ais/answertomessages.py --model local", "AI message responses", 0), # 4:00 VT
                     ("the-code/translateCodeToExperience.py", "Translate code changes to citizen experiences", 3), # 4:03 VT
                     ("ais/automated_managepublicsalesandprices.py --strategy standard", "Automated AI Public Sales & Pricing (Standard)", 5), # 4:05 VT
-                    ("engine/processPassiveBuildings.py", "Process Passive Buildings (Wells/Cisterns)", 10)], # 4:10 VT
+                    ("engine/processPassiveBuildings.py", "Process Passive Buildings (Wells/Cisterns)", 10), # 4:10 VT
+                    ("engine/buildTravelMatrix.py", "Update building travel matrix", 20)], # 4:20 VT
             }
             
             # Add processEncounters.py to run every hour at minute 45
@@ -304,28 +281,13 @@ def run_scheduled_tasks(forced_hour: Optional[int] = None): # Added forced_hour
                                 try:
                                     script_full_path = os.path.join(backend_dir_path, actual_script_path)
                                     
-                                    command_to_run = ["python", script_full_path] + script_args
-                                    # Propagate forced_hour for hourly tasks if applicable
                                     if forced_hour is not None and actual_script_path in SCRIPTS_RESPECTING_FORCED_HOUR: # Use module-level constant
-                                        command_to_run.extend(["--hour", str(forced_hour)])
+                                        script_args = script_args + ["--hour", str(forced_hour)]
                                     
                                     output_lines_hourly = []
-                                    process = subprocess.Popen(
-                                        command_to_run,
-                                        stdout=subprocess.PIPE,
-                                        stderr=subprocess.STDOUT, # Redirect stderr to stdout
-                                        text=True,
-                                        bufsize=1, 
-                                        universal_newlines=True
-                                    )
-                                    if process.stdout:
-                                        for line in iter(process.stdout.readline, ''):
-                                            stripped_line_hourly = line.strip()
-                                            print(f"[{task_name}] {stripped_line_hourly}")
-                                            output_lines_hourly.append(stripped_line_hourly)
-                                        process.stdout.close()
-                                    
-                                    return_code = process.wait()
+                                    task_result = run_task(actual_script_path, script_args, task_name)
+                                    output_lines_hourly = task_result.output_tail
+                                    return_code = task_result.return_code
                                     log_output_hourly_telegram = "\n".join(output_lines_hourly[-20:])
 
                                     if return_code == 0:
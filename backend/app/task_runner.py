@@ -0,0 +1,205 @@
+"""
+Task runner for the scheduler.
+
+Scheduled scripts used to be launched with `python script.py` for every run, paying for
+interpreter start-up, heavy imports, .env loading, Airtable initialization and definition
+downloads each time. Scripts that expose a `run_cli(argv)` function are now imported once
+and called in-process, so their module-level state (Airtable sessions, definitions cache,
+transport caches) stays warm between runs. Everything else, and any script whose module
+cannot be imported, still runs as a subprocess.
+
+The output tail of an in-process run comes from a logging handler attached for the task.
+A per-task filter keeps the records of the task's thread and of the script's worker pools,
+recognized by thread name: a script whose pools log declares their `thread_name_prefix` as
+WORKER_THREAD_NAME_PREFIX. Records of the other tasks running concurrently are ignored.
+
+Set SCHEDULER_TASK_MODE=subprocess to run every task as a subprocess.
+"""
+
+import os
+import sys
+import time
+import logging
+import importlib
+import threading
+import traceback
+import subprocess
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_ROOT = os.path.dirname(BACKEND_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+IN_PROCESS_ENTRY_POINT = "run_cli"
+TASK_MODE = os.getenv("SCHEDULER_TASK_MODE", "inprocess").lower()
+OUTPUT_TAIL_LINES = 20
+
+# Scripts that must keep running in their own process even if they expose run_cli
+SUBPROCESS_ONLY_SCRIPTS = set(filter(None, os.getenv("SCHEDULER_SUBPROCESS_ONLY", "").split(",")))
+
+# Module attribute holding the thread_name_prefix of a script's worker pools
+WORKER_PREFIX_ATTRIBUTE = "WORKER_THREAD_NAME_PREFIX"
+
+_entry_points: Dict[str, Optional[Callable]] = {}
+_entry_points_lock = threading.Lock()
+_module_run_locks: Dict[str, threading.Lock] = {}
+_worker_prefixes: Dict[str, Tuple[str, ...]] = {}
+
+
+class TaskResult:
+    """Outcome of one task run, shaped after a finished subprocess."""
+
+    def __init__(self, return_code: int, output_tail: List[str], duration: float, mode: str):
+        self.return_code = return_code
+        self.output_tail = output_tail
+        self.duration = duration
+        self.mode = mode
+
+    @property
+    def success(self) -> bool:
+        return self.return_code == 0
+
+
+class _TaskThreadFilter(logging.Filter):
+    """Passes the records of one task: its own thread and the threads named with its worker prefixes."""
+
+    def __init__(self, thread_name: str, worker_prefixes: Tuple[str, ...]):
+        super().__init__()
+        self.thread_name = thread_name
+        self.worker_prefixes = worker_prefixes
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        thread_name = record.threadName or ''
+        return thread_name == self.thread_name or thread_name.startswith(self.worker_prefixes)
+
+
+class _TaskTailHandler(logging.Handler):
+    """Keeps the last log lines emitted by one task's threads (see _TaskThreadFilter)."""
+
+    def __init__(self, thread_name: str, worker_prefixes: Tuple[str, ...] = (), max_lines: int = OUTPUT_TAIL_LINES):
+        super().__init__()
+        self.lines: Deque[str] = deque(maxlen=max_lines)
+        self.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        self.addFilter(_TaskThreadFilter(thread_name, worker_prefixes))
+
+    def emit(self, record: logging.LogRecord):
+        self.lines.append(self.format(record))
+
+
+def split_task_command(script_path_relative: str, forced_hour: Optional[int] = None,
+                       scripts_respecting_forced_hour: Tuple[str, ...] = ()) -> Tuple[str, List[str]]:
+    """Splits "engine/script.py --arg value" into the script path and its arguments (plus --hour when applicable)."""
+    parts = script_path_relative.split(" ", 1)
+    script_relative = parts[0]
+    script_args = parts[1].split() if len(parts) > 1 else []
+    if forced_hour is not None and script_relative in scripts_respecting_forced_hour:
+        script_args += ["--hour", str(forced_hour)]
+    return script_relative, script_args
+
+
+def _module_name_for(script_relative: str) -> Optional[str]:
+    """engine/createActivities.py -> backend.engine.createActivities (None if not importable as a module)."""
+    if not script_relative.endswith('.py'):
+        return None
+    parts = ['backend'] + script_relative[:-3].split('/')
+    if not all(p.isidentifier() for p in parts):
+        return None
+    return '.'.join(parts)
+
+
+def _declares_entry_point(script_full_path: str) -> bool:
+    try:
+        with open(script_full_path, 'r', encoding='utf-8') as f:
+            return f"def {IN_PROCESS_ENTRY_POINT}(" in f.read()
+    except OSError:
+        return False
+
+
+def get_entry_point(script_relative: str) -> Optional[Callable]:
+    """Imports the script's module once and returns its run_cli function, or None to use a subprocess."""
+    if TASK_MODE == 'subprocess' or script_relative in SUBPROCESS_ONLY_SCRIPTS:
+        return None
+    with _entry_points_lock:
+        if script_relative in _entry_points:
+            return _entry_points[script_relative]
+        entry_point = None
+        module_name = _module_name_for(script_relative)
+        # Only import scripts that declare the entry point: importing any other script would run it
+        if module_name and _declares_entry_point(os.path.join(BACKEND_DIR, script_relative)):
+            try:
+                module = importlib.import_module(module_name)
+                entry_point = getattr(module, IN_PROCESS_ENTRY_POINT, None)
+                worker_prefix = getattr(module, WORKER_PREFIX_ATTRIBUTE, None)
+                _worker_prefixes[script_relative] = (worker_prefix,) if worker_prefix else ()
+            except BaseException as e:  # A module calling sys.exit() at import must not stop the scheduler
+                print(f"Task runner: could not import {module_name} ({e!r}); it will run as a subprocess.")
+        _entry_points[script_relative] = entry_point if callable(entry_point) else None
+        _module_run_locks.setdefault(script_relative, threading.Lock())
+        return _entry_points[script_relative]
+
+
+def _run_in_process(script_relative: str, entry_point: Callable, script_args: List[str], task_name: str) -> TaskResult:
+    start = time.time()
+    tail_handler = _TaskTailHandler(threading.current_thread().name, _worker_prefixes.get(script_relative, ()))
+    logging.getLogger().addHandler(tail_handler)
+    return_code = 0
+    try:
+        # Runs of the same script share module globals, so they never overlap
+        with _module_run_locks[script_relative]:
+            entry_point(script_args)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            return_code = e.code if isinstance(e.code, int) else 1
+            tail_handler.lines.append(f"SystemExit: {e.code}")
+    except KeyboardInterrupt:
+        raise
+    except Exception:
+        return_code = 1
+        for line in traceback.format_exc().strip().splitlines():
+            tail_handler.lines.append(line)
+        print(f"[{task_name}] {traceback.format_exc()}")
+    finally:
+        logging.getLogger().removeHandler(tail_handler)
+    return TaskResult(return_code, list(tail_handler.lines), time.time() - start, 'in-process')
+
+
+def _run_subprocess(script_full_path: str, script_args: List[str], task_name: str) -> TaskResult:
+    start = time.time()
+    output_lines: Deque[str] = deque(maxlen=OUTPUT_TAIL_LINES)
+    process = subprocess.Popen(
+        ["python", script_full_path] + script_args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+        universal_newlines=True
+    )
+    if process.stdout:
+        for line in iter(process.stdout.readline, ''):
+            stripped_line = line.strip()
+            print(f"[{task_name} - Thread {threading.get_ident()}] {stripped_line}")
+            output_lines.append(stripped_line)
+        process.stdout.close()
+    return_code = process.wait()
+    return TaskResult(return_code, list(output_lines), time.time() - start, 'subprocess')
+
+
+def run_task(script_relative: str, script_args: List[str], task_name: str) -> TaskResult:
+    """
+    Runs a scheduled script, in-process when possible. Failures (exceptions, sys.exit(n))
+    are reported through the TaskResult and never propagate to the scheduler.
+    Raises FileNotFoundError if the script does not exist.
+    """
+    script_full_path = os.path.join(BACKEND_DIR, script_relative)
+    if not os.path.isfile(script_full_path):
+        raise FileNotFoundError(script_full_path)
+
+    entry_point = get_entry_point(script_relative)
+    if entry_point is not None:
+        result = _run_in_process(script_relative, entry_point, script_args, task_name)
+    else:
+        result = _run_subprocess(script_full_path, script_args, task_name)
+    print(f"Task runner: {task_name} finished {result.mode} in {result.duration:.2f}s (return code {result.return_code}).")
+    return result
@@ -3,6 +3,8 @@ import uuid
 import logging
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional, List # Added List
+
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     _escape_airtable_value,
     VENICE_TIMEZONE,
@@ -132,7 +134,7 @@ def try_create(
         start_date_iso=travel_start_date,
         end_date_iso=travel_end_date,
         to_building_id=business_building_id,
-        path_json=json.dumps(path_data.get('path', [])),
+        path_json=dump_path(path_data.get('path', [])),
         details_json=goto_details_json_for_notes, # Structured data
         notes=goto_simple_notes, # Simple text notes (will be used if details_json is None, or combined by helper if logic changes)
         title=goto_title,
@@ -4,6 +4,7 @@ import logging
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     _escape_airtable_value,
     VENICE_TIMEZONE,
@@ -113,7 +114,7 @@ def try_create(
         "Citizen": citizen_username,
         "FromBuilding": from_building_id,
         "ToBuilding": building_id_to_bid_on,
-        "Path": json.dumps(path_to_inspection_site.get('path', [])),
+        "Path": dump_path(path_to_inspection_site.get('path', [])),
         "Details": json.dumps({
             "finalActivityType": "bid_on_building", 
             "nextStep": "inspect_building_for_purchase",
@@ -178,7 +179,7 @@ def try_create(
         "Citizen": citizen_username,
         "FromBuilding": building_id_to_bid_on, # From inspection site
         "ToBuilding": official_building_id,    # To official building
-        "Path": json.dumps(path_to_official_building.get('path', [])),
+        "Path": dump_path(path_to_official_building.get('path', [])),
         "Details": json.dumps({
             "finalActivityType": "bid_on_building",
             "nextStep": "submit_building_purchase_offer",
@@ -3,6 +3,8 @@ import uuid
 import logging
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional, List # Added List
+
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     _escape_airtable_value, 
     VENICE_TIMEZONE,
@@ -72,7 +74,7 @@ def try_create(
 
     # 4. Create goto_location activity if path is found
     if path_data and path_data.get("path"):
-        path_json = json.dumps(path_data["path"])
+        path_json = dump_path(path_data["path"])
         travel_duration_minutes = path_data.get("duration_minutes", 30) # Default 30 min
         
         goto_activity_id = str(uuid.uuid4())
@@ -9,6 +9,7 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     LogColors, get_building_record, find_path_between_buildings_or_coords,
     get_closest_building_of_type, VENICE_TIMEZONE, get_contract_record
@@ -118,7 +119,7 @@ def try_create(tables: dict, citizen_record: dict, activity_type: str, activity_
     current_end_time_utc = now_utc_dt
 
     if path_data and path_data.get("path"):
-        path_json = json.dumps(path_data["path"])
+        path_json = dump_path(path_data["path"])
         travel_duration_minutes = path_data["duration_minutes"]
         goto_activity_id = str(uuid.uuid4())
         goto_start_time_utc = now_utc_dt
@@ -3,6 +3,8 @@ import uuid
 import logging
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional
+
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     LogColors, # Import LogColors
     _escape_airtable_value, 
@@ -248,7 +250,7 @@ def try_create( # Renamed from try_create to match the dispatcher's call if it w
         "Citizen": citizen,
         "FromBuilding": None,  # Starting from current position
         "ToBuilding": business_building_id,
-        "Path": json.dumps(path_to_business.get('path', [])),
+        "Path": dump_path(path_to_business.get('path', [])),
         "Details": json.dumps({
             **common_details,
             "nextStep": "goto_office_or_meeting"
@@ -270,7 +272,7 @@ def try_create( # Renamed from try_create to match the dispatcher's call if it w
         "Citizen": citizen,
         "FromBuilding": business_building_id,  # Starting from the business
         "ToBuilding": destination_building_id,  # May be None if meeting a party
-        "Path": json.dumps(path_to_destination.get('path', [])),
+        "Path": dump_path(path_to_destination.get('path', [])),
         "Details": json.dumps({
             **common_details,
             "meetingPartyUsername": meeting_party_username,
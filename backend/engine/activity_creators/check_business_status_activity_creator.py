@@ -4,11 +4,11 @@ Creator for 'check_business_status' activities.
 import logging
 import datetime
 import time
-import json
 import uuid
 import pytz
 from typing import Dict, Optional, Any
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import get_building_record, _get_building_position_coords, get_path_between_points, _calculate_distance_meters, LogColors
 
 log = logging.getLogger(__name__)
@@ -50,7 +50,7 @@ def try_create(
                 travel_duration_seconds = path_data['timing']['durationSeconds']
                 arrival_dt = start_dt_obj + datetime.timedelta(seconds=travel_duration_seconds)
                 effective_end_date_iso = (arrival_dt + datetime.timedelta(minutes=check_duration_minutes)).isoformat()
-                path_json = json.dumps(path_data.get('path', []))
+                path_json = dump_path(path_data.get('path', []))
                 transporter = path_data.get('transporter')
             else: # No travel or path_data missing duration
                 effective_end_date_iso = (start_dt_obj + datetime.timedelta(minutes=check_duration_minutes)).isoformat()
@@ -61,7 +61,7 @@ def try_create(
             arrival_dt = datetime.datetime.fromisoformat(arrival_at_business_iso.replace("Z", "+00:00"))
             if arrival_dt.tzinfo is None: arrival_dt = pytz.UTC.localize(arrival_dt)
             effective_end_date_iso = (arrival_dt + datetime.timedelta(minutes=check_duration_minutes)).isoformat()
-            path_json = json.dumps(path_data.get('path', []))
+            path_json = dump_path(path_data.get('path', []))
             transporter = path_data.get('transporter')
         else: # Fallback to current_time_utc and default duration for check only
             effective_start_date_iso = current_time_utc.isoformat()
@@ -9,6 +9,7 @@ import uuid
 import pytz # For timezone handling
 from typing import Dict, Optional, Any
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import get_building_record, get_closest_building_to_position, get_citizen_inventory_details # Import helpers
 
 log = logging.getLogger(__name__)
@@ -69,7 +70,7 @@ def try_create_construct_building_activity(
                 "ActivityId": f"goto_constr_site_{citizen_custom_id}_{uuid.uuid4()}",
                 "Type": "goto_construction_site",
                 "ToBuilding": target_building_custom_id,
-                "Path": json.dumps(path_data.get('path', [])),
+                "Path": dump_path(path_data.get('path', [])),
                 "StartDate": travel_start_time_iso,
                 "EndDate": travel_end_time_iso,
                 "CreatedAt": current_time_utc.isoformat(),
@@ -9,6 +9,8 @@ import json
 import uuid
 from typing import Dict, Optional, Any, List
 
+from backend.engine.utils.path_codec import dump_path
+
 log = logging.getLogger(__name__)
 
 def try_create_deliver_construction_materials_activity(
@@ -69,7 +71,7 @@ def try_create_deliver_construction_materials_activity(
             effective_start_date_iso = current_time_utc.isoformat()
             effective_end_date_iso = (current_time_utc + datetime.timedelta(hours=1)).isoformat() # Default 1 hour
 
-        path_points_json = json.dumps(path_data.get('path', []))
+        path_points_json = dump_path(path_data.get('path', []))
         transport_mode = "walk" # Default, can be enhanced from path_data if available
         if isinstance(path_data.get('path'), list):
             for point in path_data['path']:
@@ -10,6 +10,8 @@ import logging
 import datetime
 import json
 from typing import Dict, Any, List, Optional
+
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     create_activity_record,
     LogColors
@@ -87,7 +89,7 @@ def try_create(
         end_date_iso=end_date_iso,     # Use endDate from path_data.timing
         from_building_id=from_building_custom_id, # Can be None
         to_building_id=to_building_custom_id,
-        path_json=json.dumps(path_data.get('path', [])),
+        path_json=dump_path(path_data.get('path', [])),
         resources_json_payload=resources_manifest_json_str, # Pass the manifest to the new parameter
         details_json=details_for_notes_json_str, # Pass the remaining details to Notes
         notes=notes, # Original notes parameter, if any, will be overridden by details_json if details_json is not None
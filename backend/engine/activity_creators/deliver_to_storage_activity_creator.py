@@ -9,6 +9,7 @@ import pytz
 import uuid
 from typing import Dict, Optional, Any, List
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import VENICE_TIMEZONE # Import VENICE_TIMEZONE
 
 log = logging.getLogger(__name__)
@@ -90,7 +91,7 @@ def try_create(
             effective_start_date_iso = current_time_utc.isoformat()
             effective_end_date_iso = (current_time_utc + datetime.timedelta(hours=1)).isoformat() # Default 1 hour
 
-        path_points_json = json.dumps(path_data.get('path', []))
+        path_points_json = dump_path(path_data.get('path', []))
         transporter = path_data.get('transporter') # Get transporter from path_data
 
         resources_json = json.dumps(resources_to_deliver)
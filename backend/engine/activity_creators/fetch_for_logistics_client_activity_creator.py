@@ -10,6 +10,7 @@ import pytz
 import uuid
 from typing import Dict, Optional, Any
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import VENICE_TIMEZONE
 
 log = logging.getLogger(__name__)
@@ -76,7 +77,7 @@ def try_create(
             estimated_duration_hours = 2
             effective_end_date_iso = (current_time_utc + datetime.timedelta(hours=estimated_duration_hours)).isoformat()
 
-        path_points_json = json.dumps(path_data.get('path', []))
+        path_points_json = dump_path(path_data.get('path', []))
         transporter = path_data.get('transporter') # Porter might use a cart, or this is for gondola sections
 
         details_payload = {
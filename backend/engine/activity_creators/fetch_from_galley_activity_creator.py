@@ -9,6 +9,8 @@ import uuid
 import pytz 
 from typing import Dict, Optional, Any
 
+from backend.engine.utils.path_codec import dump_path
+
 log = logging.getLogger(__name__)
 
 def try_create(
@@ -119,7 +121,7 @@ def try_create(
         "Type": "goto_location",
         "Citizen": citizen_username,
         "ToBuilding": galley_custom_id,
-        "Path": json.dumps(path_data_to_galley.get('path', []) if path_data_to_galley else []),
+        "Path": dump_path(path_data_to_galley.get('path', []) if path_data_to_galley else []),
         "Transporter": path_data_to_galley.get('transporter') if path_data_to_galley else None,
         "StartDate": goto_galley_start_time_iso,
         "EndDate": goto_galley_end_time_iso,
@@ -211,7 +213,7 @@ def try_create(
         "Citizen": citizen_username,
         "FromBuilding": galley_custom_id, # Starting from galley
         "ToBuilding": buyer_dest_id,
-        "Path": json.dumps(path_to_destination_data.get('path', []) if path_to_destination_data else []),
+        "Path": dump_path(path_to_destination_data.get('path', []) if path_to_destination_data else []),
         "Transporter": path_to_destination_data.get('transporter') if path_to_destination_data else None,
         "StartDate": goto_dest_start_time_iso,
         "EndDate": goto_dest_end_time_iso,
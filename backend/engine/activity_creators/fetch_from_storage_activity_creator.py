@@ -9,6 +9,7 @@ import pytz
 import uuid
 from typing import Dict, Optional, Any, List
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     VENICE_TIMEZONE,
     get_citizen_current_load,
@@ -109,7 +110,7 @@ def try_create(
             effective_start_date_iso = current_time_utc.isoformat()
             effective_end_date_iso = (current_time_utc + datetime.timedelta(hours=1)).isoformat() # Default 1 hour
 
-        path_points_json = json.dumps(path_data.get('path', []))
+        path_points_json = dump_path(path_data.get('path', []))
         transporter = path_data.get('transporter')
 
         resources_json = json.dumps(final_resources_to_fetch_list) # Use adjusted list
@@ -3,10 +3,11 @@ Creator for 'fishing' and 'emergency_fishing' activities.
 """
 import logging
 import datetime
-import json
 import uuid
 from typing import Dict, Optional, Any
 
+from backend.engine.utils.path_codec import dump_path
+
 log = logging.getLogger(__name__)
 
 FISHING_ACTIVITY_BASE_DURATION_MINUTES = 60 # Includes travel and some fishing time
@@ -52,7 +53,7 @@ def try_create_fishing_activity(
             effective_start_date_iso = current_time_utc.isoformat()
             effective_end_date_iso = (current_time_utc + datetime.timedelta(minutes=FISHING_ACTIVITY_BASE_DURATION_MINUTES)).isoformat()
         
-        path_json_str = json.dumps(path_data_to_water_point.get('path', []))
+        path_json_str = dump_path(path_data_to_water_point.get('path', []))
         activity_id_str = f"{activity_type}_{citizen_custom_id}_{uuid.uuid4()}"
         
         description = f"Going fishing at {target_water_point_id}."
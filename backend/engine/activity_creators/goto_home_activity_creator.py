@@ -4,10 +4,10 @@ Creator for 'goto_home' activities.
 import logging
 import datetime
 import time
-import json
 import pytz # For timezone handling
 from typing import Dict, Optional, Any
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import get_building_record # Import helper
 
 log = logging.getLogger(__name__)
@@ -38,7 +38,7 @@ def try_create(
             end_time_calc = start_datetime_obj_for_calc + datetime.timedelta(hours=1) # Default 1 hour travel
             end_date_iso_to_use = end_time_calc.isoformat()
         
-        path_json = json.dumps(path_data.get('path', []))
+        path_json = dump_path(path_data.get('path', []))
         
         transporter = path_data.get('transporter') # Get transporter from path_data
 
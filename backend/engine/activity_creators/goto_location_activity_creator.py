@@ -12,6 +12,7 @@ import uuid
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     VENICE_TIMEZONE,
     get_building_record,
@@ -184,7 +185,7 @@ def try_create(
         end_date_iso=end_time_utc_iso,
         from_building_id=from_building_id,
         to_building_id=target_building_id,
-        path_json=json.dumps(path_data.get('path', [])),
+        path_json=dump_path(path_data.get('path', [])),
         details_json=details_json_for_creation, # Pass structured JSON here
         notes=notes_for_activity,             # Pass plain text notes here
         transporter_username=transporter_for_activity,
@@ -12,6 +12,7 @@ import pytz
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     VENICE_TIMEZONE,
     get_path_between_points,
@@ -102,6 +103,6 @@ def try_create(
         description=activity_description,
         thought=activity_thought,
         notes=json.dumps(activity_notes),
-        path_json=json.dumps(path_data.get('path', [])),
+        path_json=dump_path(path_data.get('path', [])),
         priority_override=50  # Standard movement priority
     )
\ No newline at end of file
@@ -12,6 +12,7 @@ from typing import Dict, Optional, Any
 
 log = logging.getLogger(__name__)
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import _escape_airtable_value, VENICE_TIMEZONE # Import VENICE_TIMEZONE at the top
 
 def try_create(
@@ -186,7 +187,7 @@ def try_create(
             effective_start_date_iso = current_time_utc.isoformat()
             effective_end_date_iso = (current_time_utc + datetime.timedelta(hours=1)).isoformat() # Default 1 hour
         
-        path_json = json.dumps(path_points) # Use path_points determined above
+        path_json = dump_path(path_points) # Use path_points determined above
         
         transporter = path_data.get('transporter') 
         
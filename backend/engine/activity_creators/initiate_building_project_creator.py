@@ -3,6 +3,8 @@ import uuid
 import logging
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional
+
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     _escape_airtable_value, 
     VENICE_TIMEZONE,
@@ -211,7 +213,7 @@ def try_create(
         "Citizen": citizen,
         "FromBuilding": None,  # Starting from current position
         "ToBuilding": None,    # Going to a land plot, not a building
-        "Path": json.dumps(path_to_land.get('path', [])),
+        "Path": dump_path(path_to_land.get('path', [])),
         "Notes": combined_notes_goto_land, # Combined notes with DetailsJSON
         "Status": "created",
         "Title": f"Traveling to inspect land {land_id}",
@@ -263,7 +265,7 @@ def try_create(
         "Citizen": citizen,
         "FromBuilding": None,  # Coming from a land plot, not a building
         "ToBuilding": target_office_building_id,
-        "Path": json.dumps(path_to_office.get('path', [])),
+        "Path": dump_path(path_to_office.get('path', [])),
         "Notes": combined_notes_goto_office, # Combined notes with DetailsJSON
         "Status": "created",
         "Title": f"Traveling to office to submit building project",
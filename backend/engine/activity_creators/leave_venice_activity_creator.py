@@ -9,6 +9,7 @@ import uuid
 import pytz 
 from typing import Dict, Optional, Any
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import get_building_record, get_citizen_inventory_details # Import helper
 
 log = logging.getLogger(__name__)
@@ -49,7 +50,7 @@ def try_create(
             effective_start_date_iso = current_time_utc.isoformat()
             effective_end_date_iso = (current_time_utc + datetime.timedelta(hours=1)).isoformat() # Default 1 hour
         
-        path_json_str = json.dumps(path_data_to_exit.get('path', []))
+        path_json_str = dump_path(path_data_to_exit.get('path', []))
         transporter = path_data_to_exit.get('transporter')
         
         activity_id_str = f"leave_venice_{citizen_custom_id}_{uuid.uuid4()}"
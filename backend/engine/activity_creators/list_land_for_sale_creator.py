@@ -12,6 +12,7 @@ if PROJECT_ROOT not in sys.path:
 
 from typing import Dict, Any, Optional # Added import
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     LogColors,
     get_building_record,
@@ -135,7 +136,7 @@ def try_create(tables: dict, citizen_record: dict, activity_type: str, activity_
         path_json = None
         travel_duration_minutes = 0
     else:
-        path_json = json.dumps(path_data["path"])
+        path_json = dump_path(path_data["path"])
         travel_duration_minutes = path_data["duration_minutes"]
         
         goto_activity_id = str(uuid.uuid4())
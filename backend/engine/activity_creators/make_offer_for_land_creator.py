@@ -10,6 +10,7 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     LogColors,
     get_building_record,
@@ -114,7 +115,7 @@ def try_create(tables: dict, citizen_record: dict, activity_type: str, activity_
     current_end_time_utc = now_utc_dt
 
     if path_data and path_data.get("path"):
-        path_json = json.dumps(path_data["path"])
+        path_json = dump_path(path_data["path"])
         travel_duration_minutes = path_data.get("duration_minutes")
         if travel_duration_minutes is None:
             log.warning(f"{LogColors.WARNING}Key 'duration_minutes' not found in path_data for land offer by {citizen_username}. Defaulting to 30 minutes.{LogColors.ENDC}")
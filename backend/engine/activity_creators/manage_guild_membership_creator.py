@@ -3,6 +3,8 @@ import uuid
 import logging
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional
+
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     _escape_airtable_value, 
     VENICE_TIMEZONE,
@@ -145,7 +147,7 @@ def try_create(
         "Citizen": sender,
         "FromBuilding": None,  # Starting from current position
         "ToBuilding": destination_building_id,
-        "Path": json.dumps(path_data.get('path', [])),
+        "Path": dump_path(path_data.get('path', [])),
         "Details": json.dumps({
             "guildId": guild_id,
             "guildName": guild_name,
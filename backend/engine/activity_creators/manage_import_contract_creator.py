@@ -3,6 +3,8 @@ import uuid
 import logging
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional, List, Union # Added Union
+
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     _escape_airtable_value, 
     VENICE_TIMEZONE,
@@ -214,7 +216,7 @@ def try_create(
         "Citizen": citizen,
         "FromBuilding": None,  # Starting from current position
         "ToBuilding": target_office_building_id,
-        "Path": json.dumps(path_to_office.get('path', [])),
+        "Path": dump_path(path_to_office.get('path', [])),
         "Notes": json.dumps({ # Changed Details to Notes
             "resourceType": resource_type,
             "targetAmount": target_amount,
@@ -283,13 +285,3 @@ def _calculate_distance(pos1, pos2): # This seems unused now, consider removing
     lat_diff = (pos1['lat'] - pos2['lat']) * 111000  # ~111km per degree of latitude
     lng_diff = (pos1['lng'] - pos2['lng']) * 111000 * 0.85  # Approximate at mid-latitudes
     return (lat_diff**2 + lng_diff**2)**0.5  # Euclidean distance in meters
-
-def _calculate_distance(pos1, pos2):
-    """Calculate simple Euclidean distance between two positions."""
-    if not (pos1 and pos2 and 'lat' in pos1 and 'lng' in pos1 and 'lat' in pos2 and 'lng' in pos2):
-        return float('inf')
-    
-    # Simple approximation for small distances
-    lat_diff = (pos1['lat'] - pos2['lat']) * 111000  # ~111km per degree of latitude
-    lng_diff = (pos1['lng'] - pos2['lng']) * 111000 * 0.85  # Approximate at mid-latitudes
-    return (lat_diff**2 + lng_diff**2)**0.5  # Euclidean distance in meters
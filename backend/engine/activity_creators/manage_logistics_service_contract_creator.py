@@ -4,6 +4,8 @@ import logging
 import os # Added import
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional, List, Union # Added List, Union
+
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     _escape_airtable_value, 
     VENICE_TIMEZONE,
@@ -143,7 +145,7 @@ def try_create(
             "Citizen": citizen_username,
             "FromBuilding": None,  # Starting from current position
             "ToBuilding": client_building_id,
-            "Path": json.dumps(path_to_client.get('path', [])),
+            "Path": dump_path(path_to_client.get('path', [])),
             "Notes": json.dumps({ # Changed Details to Notes
                 "resourceType": resource_type,
                 "activityType": "manage_logistics_service_contract",
@@ -192,7 +194,7 @@ def try_create(
         "Citizen": citizen_username,
         "FromBuilding": client_building_id,
         "ToBuilding": target_guild_hall_id,
-        "Path": json.dumps(path_to_guild_hall.get('path', [])),
+        "Path": dump_path(path_to_guild_hall.get('path', [])),
         "Notes": json.dumps({ # Changed Details to Notes
             "resourceType": resource_type,
             "serviceFeePerUnit": service_fee_per_unit,
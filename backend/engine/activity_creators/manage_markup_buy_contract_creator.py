@@ -3,6 +3,7 @@ from typing import Dict, List, Any, Optional
 
 # Import LogColors from activity_helpers
 from backend.engine.utils.activity_helpers import LogColors # This line was already present in the user's provided file, but the error suggests it might not have been effective or was missing in the deployed version. Let's ensure it's correctly placed.
+from backend.engine.utils.path_codec import dump_path
 
 log = logging.getLogger(__name__)
 
@@ -132,7 +133,7 @@ def try_create(
 
     if path_data and path_data.get("path"):
         log.info(f"{LogColors.ACTIVITY}[MarkupBuyCreator] Path found for {citizen_username} to {target_market_building_id}. Path details: {json.dumps(path_data)[:200]}...{LogColors.ENDC}")
-        path_json = json.dumps(path_data["path"])
+        path_json = dump_path(path_data["path"])
         travel_duration_minutes = path_data.get("duration_minutes", 30)
         
         goto_activity_id = str(uuid.uuid4())
@@ -4,6 +4,8 @@ import logging
 import os # Added import
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional, List, Union # Added List, Union
+
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     _escape_airtable_value, 
     VENICE_TIMEZONE,
@@ -121,7 +123,7 @@ def try_create(
         "Citizen": citizen_username,
         "FromBuilding": None,  # Starting from current position
         "ToBuilding": target_office_building_id,
-        "Path": json.dumps(path_to_office.get('path', [])),
+        "Path": dump_path(path_to_office.get('path', [])),
         "Notes": json.dumps({ # Changed Details to Notes
             "resourceType": resource_type,
             "targetAmount": target_amount,
@@ -4,6 +4,8 @@ import logging
 import time # Import time for performance measurement
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional, List
+
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     _escape_airtable_value, 
     VENICE_TIMEZONE,
@@ -202,7 +204,7 @@ def try_create(
         "Citizen": citizen_username,
         "FromBuilding": None,  # Starting from current position
         "ToBuilding": seller_building_id,
-        "Path": json.dumps(path_to_seller.get('path', [])),
+        "Path": dump_path(path_to_seller.get('path', [])),
         "Notes": json.dumps({ # Changed Details to Notes
             "contractId": contract_id,
             "resourceType": resource_type,
@@ -259,7 +261,7 @@ def try_create(
         "Citizen": citizen_username,
         "FromBuilding": seller_building_id,
         "ToBuilding": target_market_record['fields'].get('BuildingId'), # Use resolved market ID
-        "Path": json.dumps(path_to_market.get('path', [])),
+        "Path": dump_path(path_to_market.get('path', [])),
         "Notes": json.dumps({ # Changed Details to Notes
             "contractId": contract_id,
             "resourceType": resource_type,
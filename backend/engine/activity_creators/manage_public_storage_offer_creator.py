@@ -4,6 +4,7 @@ import uuid
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     VENICE_TIMEZONE,
     get_building_record,
@@ -153,7 +154,7 @@ def try_create(
         start_date_iso=goto_office_start_utc.isoformat(),
         end_date_iso=goto_office_end_utc.isoformat(),
         to_building_id=target_office_building_id,
-        path_json=json.dumps(path_to_office_data.get('path', [])),
+        path_json=dump_path(path_to_office_data.get('path', [])),
         notes=json.dumps(goto_notes), # Store the chain details here
         title=f"Travel to {target_office_record['fields'].get('Name', target_office_building_id)} to manage storage offer"
     )
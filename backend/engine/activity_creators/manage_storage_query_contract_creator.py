@@ -4,6 +4,7 @@ import json
 import uuid
 from datetime import timedelta
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     LogColors, find_path_between_buildings_or_coords, 
     get_closest_building_of_type, get_building_record
@@ -88,7 +89,7 @@ def try_create(
     current_end_time_utc = now_utc_dt
 
     if path_data and path_data.get("path"):
-        path_json = json.dumps(path_data["path"])
+        path_json = dump_path(path_data["path"])
         travel_duration_minutes = path_data.get("duration_minutes", 30)
         
         goto_activity_id = str(uuid.uuid4())
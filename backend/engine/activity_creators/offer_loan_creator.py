@@ -3,6 +3,8 @@ import uuid
 import logging
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional
+
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     _escape_airtable_value, 
     VENICE_TIMEZONE,
@@ -138,7 +140,7 @@ def try_create(
         "Citizen": citizen,
         "FromBuilding": None,  # Starting from current position
         "ToBuilding": destination_building_id,
-        "Path": json.dumps(path_data.get('path', [])),
+        "Path": dump_path(path_data.get('path', [])),
         "Details": json.dumps({
             "amount": amount,
             "interestRate": interest_rate,
@@ -3,11 +3,11 @@ Creator for 'return_to_workplace' activities.
 """
 import logging
 import datetime
-import json
 import uuid
 import pytz
 from typing import Dict, Optional, Any, List
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import get_building_record, get_citizen_inventory_details
 
 log = logging.getLogger(__name__)
@@ -52,7 +52,7 @@ def try_create(
             effective_start_date_iso = current_time_utc.isoformat()
             effective_end_date_iso = (current_time_utc + datetime.timedelta(hours=1)).isoformat() # Default 1 hour
 
-        path_json_str = json.dumps(path_data.get('path', []))
+        path_json_str = dump_path(path_data.get('path', []))
         transporter = path_data.get('transporter')
         activity_id_str = f"return_wp_{citizen_custom_id}_{uuid.uuid4()}"
 
@@ -5,6 +5,8 @@ import random
 import re
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional, Tuple, List, Union
+
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     _escape_airtable_value,
     VENICE_TIMEZONE,
@@ -48,8 +50,7 @@ def choose_interlocutor_via_kinos(
         # Importer les fonctions nécessaires pour appeler KinOS
         from backend.engine.utils.conversation_helper import (
             make_kinos_channel_call,
-            get_kinos_model_for_social_class,
-            clean_thought_content
+            get_kinos_model_for_social_class
         )
         import os
         import json
@@ -542,7 +543,7 @@ def try_create(
         "Citizen": sender,
         "FromBuilding": None,  # Starting from current position
         "ToBuilding": destination_building_id if destination_type != 'receiver_location' else None,
-        "Path": json.dumps(path_data.get('path', [])),
+        "Path": dump_path(path_data.get('path', [])),
         "Notes": json.dumps({ # Changed Details to Notes
             "receiverUsername": receiver_username,
             "content": content,
@@ -4,10 +4,10 @@ Creator for 'travel_to_inn' activities.
 import logging
 import datetime
 import time
-import json
 import pytz # For timezone handling
 from typing import Dict, Optional, Any
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import get_building_record # Import helper
 
 log = logging.getLogger(__name__)
@@ -48,7 +48,7 @@ def try_create(
             effective_start_date_iso = current_time_utc.isoformat()
             effective_end_date_iso = (current_time_utc + datetime.timedelta(hours=1)).isoformat() # Default 1 hour
         
-        path_json = json.dumps(path_data.get('path', []))
+        path_json = dump_path(path_data.get('path', []))
         
         transporter = path_data.get('transporter') # Get transporter from path_data
 
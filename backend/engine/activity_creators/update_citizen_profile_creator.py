@@ -5,6 +5,8 @@ from datetime import timedelta
 from typing import Dict, List, Any, Optional
 
 # Assuming utils are in backend.engine.utils
+
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     LogColors,
     get_building_record,
@@ -90,7 +92,7 @@ def try_create(
     current_end_time_utc = now_utc_dt
 
     if path_data and path_data.get("path"):
-        path_json = json.dumps(path_data["path"])
+        path_json = dump_path(path_data["path"])
         travel_duration_minutes = path_data.get("duration_minutes", 30)
         
         goto_activity_id = str(uuid.uuid4())
@@ -25,6 +25,7 @@ from backend.engine.utils.activity_helpers import (
 )
 # Import relationship helper
 from backend.engine.utils.relationship_helpers import update_trust_score_for_activity, TRUST_SCORE_SUCCESS_SIMPLE, TRUST_SCORE_FAILURE_SIMPLE, TRUST_SCORE_SUCCESS_MEDIUM, TRUST_SCORE_FAILURE_MEDIUM
+from backend.engine.utils.ducat_service import get_ducat_service
 
 log = logging.getLogger(__name__)
 
@@ -466,11 +467,17 @@ def process(
         return False
     
     try:
-        payer_ducats = float(payer_citizen_rec['fields'].get('Ducats', 0))
-        merchant_ducats_initial = float(merchant_citizen_rec['fields'].get('Ducats', 0))
-        italia_ducats_initial = float(italia_citizen_rec['fields'].get('Ducats', 0))
+        ducat_service = get_ducat_service(tables)
 
-        if payer_ducats < total_cost_for_this_delivery:
+        # Calculate shares
+        italia_share = total_cost_for_this_delivery * 0.5
+        merchant_profit = total_cost_for_this_delivery - italia_share
+
+        # Transaction 1: Payer (RunBy) pays Merchant full amount (checked and applied atomically)
+        if not ducat_service.transfer(payer_citizen_rec, merchant_citizen_rec, total_cost_for_this_delivery,
+                                      reason=f"Import payment for contract {original_contract_custom_id}",
+                                      transaction_type="import_payment_final"):
+            payer_ducats = ducat_service.balance(payer_citizen_rec) or 0.0
             err_msg = f"Payer (RunBy: {payer_username}) has insufficient funds ({payer_ducats:.2f}) for import payment ({total_cost_for_this_delivery:.2f}) for contract {original_contract_custom_id}."
             log.error(err_msg)
             _update_activity_notes_with_failure_reason(tables, activity_id_airtable, err_msg)
@@ -478,14 +485,6 @@ def process(
             if payer_username and seller_username:
                 update_trust_score_for_activity(tables, payer_username, seller_username, TRUST_SCORE_FAILURE_MEDIUM, "payment", False, "insufficient_funds")
             return False
-
-        # Calculate shares
-        italia_share = total_cost_for_this_delivery * 0.5
-        merchant_profit = total_cost_for_this_delivery - italia_share
-
-        # Transaction 1: Payer (RunBy) pays Merchant full amount
-        tables['citizens'].update(payer_citizen_rec['id'], {'Ducats': payer_ducats - total_cost_for_this_delivery})
-        tables['citizens'].update(merchant_citizen_rec['id'], {'Ducats': merchant_ducats_initial + total_cost_for_this_delivery})
         log.info(f"{LogColors.OKGREEN}Payer (RunBy: {payer_username}) paid {total_cost_for_this_delivery:.2f} to Merchant {seller_username}.{LogColors.ENDC}")
 
         transaction_payload_buyer_to_merchant = {
@@ -508,32 +507,34 @@ def process(
         tables['transactions'].create(transaction_payload_buyer_to_merchant)
         log.info(f"{LogColors.OKGREEN}Created transaction: Payer (RunBy: {payer_username}) to Merchant {seller_username} for {total_cost_for_this_delivery:.2f} (Contract: {original_contract_custom_id}).{LogColors.ENDC}")
 
-        # Transaction 2: Merchant pays "Italia" for cost of goods
-        merchant_ducats_after_sale = merchant_ducats_initial + total_cost_for_this_delivery
-        
-        tables['citizens'].update(merchant_citizen_rec['id'], {'Ducats': merchant_ducats_after_sale - italia_share})
-        tables['citizens'].update(italia_citizen_rec['id'], {'Ducats': italia_ducats_initial + italia_share})
-        log.info(f"{LogColors.OKGREEN}Merchant {seller_username} paid {italia_share:.2f} to Italia (cost of goods).{LogColors.ENDC}")
-        
-        transaction_payload_merchant_to_italia = {
-            "Type": "import_cost_of_goods",
-            "AssetType": "contract_revenue_share",
-            "Asset": original_contract_custom_id,
-            "Seller": "Italia", 
-            "Buyer": seller_username, # Merchant is "buying" from Italia
-            "Price": italia_share,
-            "Notes": json.dumps({
-                "original_payer_runby": payer_username, # Log the actual payer (RunBy)
-                "total_sale_price_to_payer": total_cost_for_this_delivery,
-                "merchant_profit": merchant_profit,
-                "activity_guid": activity_guid,
-                "note": "Merchant's payment to Italia for cost of imported goods."
-            }),
-            "CreatedAt": now_iso, # Venice time ISO string
-            "ExecutedAt": now_iso # Venice time ISO string
-        }
-        tables['transactions'].create(transaction_payload_merchant_to_italia)
-        log.info(f"{LogColors.OKGREEN}Created transaction: Merchant {seller_username} to Italia for {italia_share:.2f} (Contract: {original_contract_custom_id}).{LogColors.ENDC}")
+        # Transaction 2: Merchant pays "Italia" for cost of goods, out of the payment just received
+        if ducat_service.transfer(merchant_citizen_rec, italia_citizen_rec, italia_share,
+                                  reason=f"Cost of goods for contract {original_contract_custom_id}",
+                                  transaction_type="import_cost_of_goods", allow_negative=True):
+            log.info(f"{LogColors.OKGREEN}Merchant {seller_username} paid {italia_share:.2f} to Italia (cost of goods).{LogColors.ENDC}")
+
+            transaction_payload_merchant_to_italia = {
+                "Type": "import_cost_of_goods",
+                "AssetType": "contract_revenue_share",
+                "Asset": original_contract_custom_id,
+                "Seller": "Italia", 
+                "Buyer": seller_username, # Merchant is "buying" from Italia
+                "Price": italia_share,
+                "Notes": json.dumps({
+                    "original_payer_runby": payer_username, # Log the actual payer (RunBy)
+                    "total_sale_price_to_payer": total_cost_for_this_delivery,
+                    "merchant_profit": merchant_profit,
+                    "activity_guid": activity_guid,
+                    "note": "Merchant's payment to Italia for cost of imported goods."
+                }),
+                "CreatedAt": now_iso, # Venice time ISO string
+                "ExecutedAt": now_iso # Venice time ISO string
+            }
+            tables['transactions'].create(transaction_payload_merchant_to_italia)
+            log.info(f"{LogColors.OKGREEN}Created transaction: Merchant {seller_username} to Italia for {italia_share:.2f} (Contract: {original_contract_custom_id}).{LogColors.ENDC}")
+        else:
+            # The payer's payment stands; the cost of goods wasn't written, so there is no transaction to record
+            log.error(f"{LogColors.FAIL}Merchant {seller_username} could not pay {italia_share:.2f} to Italia (cost of goods) for contract {original_contract_custom_id}.{LogColors.ENDC}")
 
         # Trust impact: Successful payment from Payer to Seller
         if payer_username and seller_username:
@@ -18,6 +18,7 @@ from backend.engine.utils.activity_helpers import (
     LogColors # Assuming LogColors might be useful here too
 )
 # Import relationship helper
+from backend.engine.utils.ducat_service import get_ducat_service
 from backend.engine.utils.relationship_helpers import update_trust_score_for_activity, TRUST_SCORE_SUCCESS_SIMPLE, TRUST_SCORE_FAILURE_SIMPLE, TRUST_SCORE_SUCCESS_MEDIUM, TRUST_SCORE_FAILURE_MEDIUM
 
 log = logging.getLogger(__name__)
@@ -246,8 +247,6 @@ def process_eat_at_tavern(
     # The custom ID from the activity is the one we use
     tavern_building_custom_id = tavern_building_custom_id_from_activity
 
-    current_ducats = float(citizen_record['fields'].get('Ducats', 0))
-    
     meal_cost = TAVERN_MEAL_COST
     food_resource_id_consumed = None
     original_sell_contract_id = None # Custom ID of the public_sell contract
@@ -258,7 +257,20 @@ def process_eat_at_tavern(
         original_sell_contract_id = activity_details.get("original_contract_id")
         log.info(f"Retail purchase detected: Food={food_resource_id_consumed}, Price={meal_cost}, Contract={original_sell_contract_id}")
 
-    if current_ducats < meal_cost:
+    tavern_operator = tavern_record['fields'].get('RunBy') or tavern_record['fields'].get('Owner', "UnknownTavernOperator")
+    operator_record = get_citizen_record(tables, tavern_operator)
+    if not operator_record:
+        log.warning(f"Could not find operator {tavern_operator} to credit meal cost.")
+
+    # Check funds and pay in one atomic step, so concurrent payments can't overdraw the citizen
+    ducat_service = get_ducat_service(tables)
+    transaction_type = "retail_food_purchase" if food_resource_id_consumed else "tavern_meal"
+    if operator_record:
+        paid = ducat_service.transfer(citizen_record, operator_record, meal_cost, reason=f"Meal at {tavern_building_custom_id_from_activity}", transaction_type=transaction_type)
+    else:
+        paid = ducat_service.adjust(citizen_record, -meal_cost, reason=f"Meal at {tavern_building_custom_id_from_activity}", transaction_type=transaction_type) is not None
+    if not paid:
+        current_ducats = ducat_service.balance(citizen_record)
         log.warning(f"Citizen {citizen_username} has insufficient Ducats ({current_ducats}) for meal (cost: {meal_cost}) for activity {activity_guid}.")
         # Trust: Citizen failed to pay Tavern Operator
         tavern_operator_for_trust = tavern_record['fields'].get('RunBy') or tavern_record['fields'].get('Owner')
@@ -267,16 +279,11 @@ def process_eat_at_tavern(
         return False
     
     try:
-        new_ducats = current_ducats - meal_cost
         now_venice = datetime.now(VENICE_TIMEZONE)
         now_iso = now_venice.isoformat()
         
-        tables['citizens'].update(citizen_record['id'], {'Ducats': new_ducats})
-        log.info(f"{LogColors.OKGREEN}Citizen {citizen_username} paid {meal_cost:.2f} Ducats for a meal. New balance: {new_ducats:.2f}{LogColors.ENDC}")
+        log.info(f"{LogColors.OKGREEN}Citizen {citizen_username} paid {meal_cost:.2f} Ducats for a meal.{LogColors.ENDC}")
         
-        tavern_operator = tavern_record['fields'].get('RunBy') or tavern_record['fields'].get('Owner', "UnknownTavernOperator")
-        
-        transaction_type = "retail_food_purchase" if food_resource_id_consumed else "tavern_meal"
         transaction_notes = {
             "activity_guid": activity_guid,
             "location_id": tavern_building_custom_id
@@ -299,13 +306,8 @@ def process_eat_at_tavern(
         tables['transactions'].create(transaction_payload)
         log.info(f"{LogColors.OKGREEN}Created transaction record for {citizen_username}'s {transaction_type}.{LogColors.ENDC}")
         
-        operator_record = get_citizen_record(tables, tavern_operator)
         if operator_record:
-            operator_ducats = float(operator_record['fields'].get('Ducats', 0))
-            tables['citizens'].update(operator_record['id'], {'Ducats': operator_ducats + meal_cost})
             log.info(f"{LogColors.OKGREEN}Credited operator {tavern_operator} with {meal_cost:.2f} Ducats.{LogColors.ENDC}")
-        else:
-            log.warning(f"Could not find operator {tavern_operator} to credit meal cost.")
 
         # If it was a retail purchase, decrement the public_sell contract
         if food_resource_id_consumed and original_sell_contract_id:
@@ -4,6 +4,8 @@ from datetime import datetime
 from typing import Dict, Any, Optional
 import pytz
 
+from backend.engine.activity_processors.lazy_registry import processor_signature
+
 from backend.engine.utils.activity_helpers import (
     LogColors,
     VENICE_TIMEZONE,
@@ -148,4 +150,15 @@ def process_file_grievance_activity(
         
     except Exception as e:
         log.error(f"{LogColors.FAIL}Error processing file_grievance activity: {e}{LogColors.ENDC}")
-        return False
\ No newline at end of file
+        return False
+
+
+@processor_signature(accepts_api_base_url=False)
+def process(
+    tables: Dict[str, Any],
+    activity_record: Dict[str, Any],
+    building_type_defs: Dict[str, Any],
+    resource_defs: Dict[str, Any]
+) -> bool:
+    """Entry point for the activity processor registry: processes the file_grievance activity at the current Venice time."""
+    return process_file_grievance_activity(tables, activity_record, datetime.now(VENICE_TIMEZONE))
@@ -15,6 +15,7 @@ from backend.engine.utils.activity_helpers import (
     VENICE_TIMEZONE,
     LogColors
 )
+from backend.engine.utils.path_codec import load_path
 
 log = logging.getLogger(__name__)
 
@@ -79,7 +80,7 @@ def process_fishing_activity(
     path_json_str = activity_fields.get('Path')
     if path_json_str:
         try:
-            path_points = json.loads(path_json_str)
+            path_points = load_path(path_json_str)
             if path_points and isinstance(path_points, list):
                 fishing_spot_coords = path_points[-1] # Last point in the path
                 if isinstance(fishing_spot_coords, dict) and 'lat' in fishing_spot_coords and 'lng' in fishing_spot_coords:
@@ -93,8 +94,8 @@ def process_fishing_activity(
                     log.warning(f"Last path point for activity {activity_guid} is not valid coordinates: {fishing_spot_coords}")
             else:
                 log.warning(f"Path for activity {activity_guid} is empty or not a list.")
-        except json.JSONDecodeError:
-            log.warning(f"Could not parse Path JSON for activity {activity_guid}: {path_json_str}")
+        except ValueError:
+            log.warning(f"Could not parse Path for activity {activity_guid}: {path_json_str}")
     else:
         log.warning(f"No Path found for activity {activity_guid}. Cannot update citizen position to fishing spot.")
 
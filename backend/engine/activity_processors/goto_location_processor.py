@@ -8,6 +8,7 @@ from dateutil import parser as dateutil_parser # Added for robust date parsing
 
 # Import helpers and creators
 from backend.engine.utils.activity_helpers import get_citizen_record, LogColors
+from backend.engine.utils.path_codec import load_path
 from backend.engine.activity_creators import try_create_eat_at_tavern_activity
 
 
@@ -56,13 +57,13 @@ def process(
         path = []
         if path_str and path_str.strip():
             try:
-                parsed_path_candidate = json.loads(path_str)
+                parsed_path_candidate = load_path(path_str)
                 if isinstance(parsed_path_candidate, list):
                     path = parsed_path_candidate
                 else:
                     log.warning(f"Path string for activity {fields.get('ActivityId', 'N/A')} (Citizen: {citizen}) did not parse to a list: '{path_str[:100]}...'. Using empty path.")
-            except json.JSONDecodeError:
-                log.warning(f"Could not parse Path as JSON for activity {fields.get('ActivityId', 'N/A')} (Citizen: {citizen}). Path: '{path_str[:100]}...'. Using empty path.")
+            except ValueError:
+                log.warning(f"Could not parse Path for activity {fields.get('ActivityId', 'N/A')} (Citizen: {citizen}). Path: '{path_str[:100]}...'. Using empty path.")
         
         # Parse notes (details)
         details = {}
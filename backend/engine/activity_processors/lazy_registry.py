@@ -0,0 +1,185 @@
+"""
+Lazily loaded activity-type -> processor mapping.
+
+Processor modules pull in a lot of code (activity creators, KinOS clients, helpers), and a
+single run of processActivities usually sees a handful of activity types. A
+LazyProcessorRegistry maps each activity type to a "module:function" target and imports the
+module the first time that type is looked up; importing the registry itself is cheap.
+
+    PROCESSORS = LazyProcessorRegistry({
+        'goto_home': '.goto_home_processor:process',
+        'welfare_porter': 'backend.engine.handlers.welfare_porter_handler:handle_welfare_porter',
+    })
+
+    @PROCESSORS.register('idle', 'secure_warehouse')
+    def process_placeholder_activity_fn(tables, activity_record, building_type_defs, resource_defs, api_base_url=None):
+        ...
+
+    processor = PROCESSORS.get(activity_type)   # a ProcessorSpec, or None
+    success = processor(tables, activity_record, building_type_defs, resource_defs,
+                        api_base_url, kinos_model_override=model)
+
+Values are ProcessorSpec objects. They know the processor's signature, so every activity type
+is called the same way, and they time each call per activity type (`timing_report()`).
+Processors whose signature differs from the standard
+(tables, activity_record, building_type_defs, resource_defs, api_base_url) say so with the
+`processor_signature` decorator.
+
+Relative module paths are resolved against backend.engine.activity_processors.
+"""
+
+import time
+import logging
+import importlib
+import threading
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+log = logging.getLogger(__name__)
+
+PROCESSORS_PACKAGE = 'backend.engine.activity_processors'
+PROCESSOR_SIGNATURE_ATTRIBUTE = '_processor_signature'
+
+ProcessorTarget = Union[str, Callable]
+
+
+def resolve_target(target: str) -> Callable:
+    """Imports "module:function" (module relative to the processors package when it starts with '.')."""
+    module_name, _, attribute = target.partition(':')
+    module = importlib.import_module(module_name, package=PROCESSORS_PACKAGE)
+    return getattr(module, attribute)
+
+
+def processor_signature(accepts_api_base_url: bool = True, accepts_kinos_model: bool = False):
+    """
+    Decorator for processors with a non-standard signature.
+    accepts_api_base_url: takes api_base_url as its fifth positional argument.
+    accepts_kinos_model: takes a `kinos_model_override` keyword argument.
+    """
+    def decorator(func: Callable) -> Callable:
+        setattr(func, PROCESSOR_SIGNATURE_ATTRIBUTE, {
+            'accepts_api_base_url': accepts_api_base_url,
+            'accepts_kinos_model': accepts_kinos_model,
+        })
+        return func
+    return decorator
+
+
+class ProcessorTimings:
+    """Call counters for one activity type."""
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+
+class ProcessorSpec:
+    """A processor function with its signature metadata; calling it records timings."""
+
+    def __init__(self, activity_type: str, func: Callable, registry: 'LazyProcessorRegistry'):
+        self.activity_type = activity_type
+        self.func = func
+        signature = getattr(func, PROCESSOR_SIGNATURE_ATTRIBUTE, {})
+        self.accepts_api_base_url = signature.get('accepts_api_base_url', True)
+        self.accepts_kinos_model = signature.get('accepts_kinos_model', False)
+        self._registry = registry
+
+    def __call__(self, tables, activity_record, building_type_defs, resource_defs,
+                 api_base_url: Optional[str] = None, kinos_model_override: Optional[str] = None) -> bool:
+        args: List[Any] = [tables, activity_record, building_type_defs, resource_defs]
+        if self.accepts_api_base_url:
+            args.append(api_base_url)
+        kwargs = {'kinos_model_override': kinos_model_override} if self.accepts_kinos_model else {}
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = self.func(*args, **kwargs)
+            outcome = 'success' if result else 'failure'
+            return result
+        finally:
+            self._registry._record_call(self.activity_type, time.perf_counter() - start, outcome)
+
+    def __repr__(self) -> str:
+        return f"<ProcessorSpec {self.activity_type} -> {getattr(self.func, '__module__', '?')}.{getattr(self.func, '__name__', '?')}>"
+
+
+class LazyProcessorRegistry(Mapping):
+    """Read-only mapping of activity type -> ProcessorSpec, imported on first access."""
+
+    def __init__(self, targets: Optional[Dict[str, ProcessorTarget]] = None):
+        self._targets: Dict[str, ProcessorTarget] = dict(targets or {})
+        self._resolved: Dict[str, ProcessorSpec] = {}
+        self._timings: Dict[str, ProcessorTimings] = {}
+        self._lock = threading.Lock()
+        self._timings_lock = threading.Lock()
+
+    def register(self, *activity_types: str):
+        """Decorator registering a function for the given activity types (replacing declared targets)."""
+        def decorator(func: Callable) -> Callable:
+            with self._lock:
+                for activity_type in activity_types:
+                    self._targets[activity_type] = func
+                    self._resolved.pop(activity_type, None)
+            return func
+        return decorator
+
+    def __getitem__(self, activity_type: str) -> ProcessorSpec:
+        spec = self._resolved.get(activity_type)
+        if spec is not None:
+            return spec
+        target = self._targets[activity_type]
+        with self._lock:
+            if activity_type not in self._resolved:
+                if callable(target):
+                    func = target
+                else:
+                    log.debug(f"Loading processor for activity type '{activity_type}' from {target}")
+                    func = resolve_target(target)
+                self._resolved[activity_type] = ProcessorSpec(activity_type, func, self)
+            return self._resolved[activity_type]
+
+    def __contains__(self, activity_type) -> bool:
+        # Membership must not import anything
+        return activity_type in self._targets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._targets)
+
+    def __len__(self) -> int:
+        return len(self._targets)
+
+    def loaded_types(self) -> List[str]:
+        return sorted(self._resolved)
+
+    # --- Timings ---
+
+    def _record_call(self, activity_type: str, elapsed: float, outcome: str):
+        with self._timings_lock:
+            timings = self._timings.get(activity_type)
+            if timings is None:
+                timings = self._timings[activity_type] = ProcessorTimings()
+            timings.calls += 1
+            timings.total_seconds += elapsed
+            timings.max_seconds = max(timings.max_seconds, elapsed)
+            if outcome == 'failure':
+                timings.failures += 1
+            elif outcome == 'error':
+                timings.errors += 1
+
+    def reset_timings(self):
+        with self._timings_lock:
+            self._timings.clear()
+
+    def timing_report(self) -> List[str]:
+        """One line per activity type processed since the last reset, slowest total first."""
+        with self._timings_lock:
+            items = sorted(self._timings.items(), key=lambda item: item[1].total_seconds, reverse=True)
+            return [
+                f"{activity_type}: {t.calls} calls, {t.total_seconds:.2f}s total, "
+                f"{t.total_seconds / t.calls:.3f}s avg, {t.max_seconds:.3f}s max, "
+                f"{t.failures} failed, {t.errors} errors"
+                for activity_type, t in items
+            ]
@@ -7,6 +7,8 @@ import random
 from datetime import datetime
 from typing import Dict, Any, Optional
 
+from backend.engine.activity_processors.lazy_registry import processor_signature
+
 from backend.engine.utils.activity_helpers import (
     LogColors,
     get_citizen_record,
@@ -116,6 +118,7 @@ def _call_kinos_for_prayer_async(
     except Exception as e_thread:
         log.error(f"  [Thread: {threading.get_ident()}] Unexpected error in KinOS call thread for prayer by {citizen_username_log}: {e_thread}")
 
+@processor_signature(accepts_kinos_model=True)
 def process(
     tables: Dict[str, Any],
     activity_record: Dict[str, Any],
@@ -0,0 +1,119 @@
+"""
+The activity-type -> processor registry used by processActivities.py, re-exported by the
+activity_processors package.
+
+This table is the single place that says which processor handles which activity type. Targets
+are "module:function" strings, so a processor module is only imported the first time its
+activity type is processed (see lazy_registry.py). Processors that need a different call
+signature (no api_base_url, a KinOS model override) declare it with @processor_signature in
+their own module. Functions defined elsewhere can be added with @ACTIVITY_PROCESSORS.register(...).
+"""
+
+from backend.engine.activity_processors.lazy_registry import LazyProcessorRegistry
+
+ACTIVITY_PROCESSORS = LazyProcessorRegistry({
+    # "idle" and "secure_warehouse" are registered by processActivities.process_placeholder_activity_fn
+    "deliver_resource_batch": ".deliver_resource_batch_processor:process",
+    "goto_home": ".goto_home_processor:process",
+    "goto_work": ".goto_work_processor:process",
+    "production": ".production_processor:process",
+    "fetch_resource": ".fetch_resource_processor:process",
+    "eat_from_inventory": ".eat_processor:process", # Dispatch to generic eat processor
+    "eat_at_home": ".eat_processor:process",        # Dispatch to generic eat processor
+    "eat_at_tavern": ".eat_processor:process",      # Dispatch to generic eat processor
+    # "fetch_from_galley": process_fetch_from_galley_fn, # This type is no longer directly created for processing this way
+    "pickup_from_galley": ".pickup_from_galley_processor:process", # New processor for the pickup step
+    "deliver_resource_to_buyer": ".deliver_resource_to_buyer_processor:process", # New processor for final delivery
+    "leave_venice": ".leave_venice_processor:process",
+    "deliver_construction_materials": ".deliver_construction_materials_processor:process",
+    "construct_building": ".construct_building_processor:process",
+    "goto_construction_site": ".goto_construction_site_processor:process",
+    "deliver_to_storage": ".deliver_to_storage_processor:process",
+    "fetch_from_storage": ".fetch_from_storage_processor:process",
+    "goto_building_for_storage_fetch": ".goto_building_for_storage_fetch_processor:process",
+    "fetch_for_logistics_client": ".fetch_for_logistics_client_processor:process", # Already present
+    "check_business_status": ".check_business_status_processor:process",
+    "fishing": ".fishing_processor:process_fishing_activity", # New
+    "emergency_fishing": ".fishing_processor:process_fishing_activity", # New, uses same processor
+    "inspect_building_for_purchase": ".inspect_building_for_purchase_processor:process_inspect_building_for_purchase_fn", # New
+    "submit_building_purchase_offer": ".submit_building_purchase_offer_processor:process_submit_building_purchase_offer_fn", 
+    "execute_respond_to_building_bid": ".execute_respond_to_building_bid_processor:process_execute_respond_to_building_bid_fn", 
+    "execute_withdraw_building_bid": ".execute_withdraw_building_bid_processor:process_execute_withdraw_building_bid_fn", 
+    "finalize_manage_markup_buy_contract": ".finalize_manage_markup_buy_contract_processor:process_finalize_manage_markup_buy_contract_fn", 
+    "finalize_manage_storage_query_contract": ".finalize_manage_storage_query_contract_processor:process_finalize_manage_storage_query_contract_fn",
+    "finalize_update_citizen_profile": ".finalize_update_citizen_profile_processor:process_finalize_update_citizen_profile_fn", # New
+    "manage_public_dock": ".manage_public_dock_processor:process", # New
+    "work_on_art": ".process_work_on_art:process_work_on_art_fn", # New Artisti activity
+    "read_book": ".read_book_processor:process_read_book_fn", # Use new processor for read_book
+    "goto_inn": ".goto_inn_processor:process", # New mapping for goto_inn
+    "deposit_items_at_location": ".deposit_items_at_location_processor:process", # New activity type
+    "attend_theater_performance": ".attend_theater_performance_processor:process", # New theater activity
+    "drink_at_inn": ".drink_at_inn_activity_processor:process", # New drink at inn activity
+    "use_public_bath": ".use_public_bath_processor:process", # New public bath activity
+    "rest": ".rest_processor:process", # New rest processor
+    "occupant_self_construction": ".occupant_self_construction_processor:process_occupant_self_construction_fn", # New
+    "pray": ".pray_processor:process", # Pray processor
+    "bid_on_land": ".bid_on_land_activity_processor:process_bid_on_land_fn",
+    "goto_location": ".goto_location_activity_processor:process_goto_location_fn", # New processor for multi-activity chains
+    "submit_land_bid": ".bid_on_land_activity_processor:process_bid_on_land_fn", # Second step in bid_on_land chain
+    "prepare_goods_for_sale": ".manage_public_sell_contract_processor:process_manage_public_sell_contract_fn", # First step in manage_public_sell_contract chain
+    "register_public_sell_offer": ".manage_public_sell_contract_processor:process_manage_public_sell_contract_fn", # Final step in manage_public_sell_contract chain
+    "assess_import_needs": ".manage_import_contract_processor:process_manage_import_contract_fn", # First step in manage_import_contract chain
+    "register_import_agreement": ".manage_import_contract_processor:process_manage_import_contract_fn", # Final step in manage_import_contract chain
+    "register_public_import_agreement": ".manage_public_import_contract_processor:process_manage_public_import_contract_fn", # Final step in manage_public_import_contract chain
+    "assess_logistics_needs": ".manage_logistics_service_contract_processor:process_manage_logistics_service_contract_fn", # First step in manage_logistics_service_contract chain
+    "register_logistics_service_contract": ".manage_logistics_service_contract_processor:process_manage_logistics_service_contract_fn", # Final step in manage_logistics_service_contract chain
+    "finalize_land_purchase": ".buy_available_land_processor:process_buy_available_land_fn", # Final step in buy_available_land chain
+    "inspect_land_plot": ".initiate_building_project_processor:process_initiate_building_project_fn", # Second step in initiate_building_project chain
+    "submit_building_project": ".initiate_building_project_processor:process_initiate_building_project_fn", # Final step in initiate_building_project chain
+    "file_lease_adjustment": ".adjust_land_lease_price_processor:process_adjust_land_lease_price_fn", # Final step in adjust_land_lease_price chain
+    "file_rent_adjustment": ".adjust_building_rent_price_processor:process_adjust_building_rent_price_fn", # Final step in adjust_building_rent_price chain
+    "file_building_lease_adjustment": ".adjust_building_lease_price_processor:process_file_building_lease_adjustment_fn", # Final step for adjust_building_lease_price
+    "update_wage_ledger": ".adjust_business_wages_processor:process_adjust_business_wages_fn", # Final step in adjust_business_wages chain
+    "finalize_operator_change": ".change_business_manager_processor:process_change_business_manager_fn", # Final step in change_business_manager chain
+    "submit_loan_application_form": ".request_loan_processor:process_request_loan_fn", # Final step in request_loan chain
+    "register_loan_offer_terms": ".offer_loan_processor:process_offer_loan_fn", # Final step in offer_loan chain
+    "deliver_message_interaction": ".send_message_processor:process_send_message_fn", # Final step in send_message chain
+    "reply_to_message": ".reply_to_message_processor:process_reply_to_message_fn", # Automatically created after receiving a message
+    "perform_guild_membership_action": ".manage_guild_membership_processor:process_manage_guild_membership_fn", # Final step in manage_guild_membership chain
+    "register_public_storage_offer": ".manage_public_storage_contract_processor:process_register_public_storage_offer_fn",
+
+    # Land Management Processors
+    "finalize_list_land_for_sale": ".list_land_for_sale_processor:process_list_land_for_sale_fn",
+    "finalize_make_offer_for_land": ".make_offer_for_land_processor:process_make_offer_for_land_fn",
+    "execute_accept_land_offer": ".accept_land_offer_processor:process_accept_land_offer_fn",
+    "execute_buy_listed_land": ".buy_listed_land_processor:process_buy_listed_land_fn",
+    "execute_cancel_land_listing": ".cancel_land_listing_processor:process_cancel_land_listing_fn",
+    "execute_cancel_land_offer": ".cancel_land_offer_processor:process_cancel_land_offer_fn",
+    "spread_rumor": ".spread_rumor_activity_processor:process", # Ajout du nouveau processeur
+    # process_buy_available_land_fn is already in the dict for "finalize_land_purchase"
+
+    # Types created without their "execute_"/"finalize_" prefix by older activity creators
+    "send_message": ".send_message_processor:process_send_message_fn",
+    "manage_guild_membership": ".manage_guild_membership_processor:process_manage_guild_membership_fn",
+    "respond_to_building_bid": ".execute_respond_to_building_bid_processor:process_execute_respond_to_building_bid_fn",
+    "withdraw_building_bid": ".execute_withdraw_building_bid_processor:process_execute_withdraw_building_bid_fn",
+    "manage_markup_buy_contract": ".finalize_manage_markup_buy_contract_processor:process_finalize_manage_markup_buy_contract_fn",
+    "manage_storage_query_contract": ".finalize_manage_storage_query_contract_processor:process_finalize_manage_storage_query_contract_fn",
+    "update_citizen_profile": ".finalize_update_citizen_profile_processor:process_finalize_update_citizen_profile_fn",
+
+    # Clero and Scientisti activities
+    "attend_mass": ".attend_mass_processor:process_attend_mass_fn",
+    "prepare_sermon": ".prepare_sermon_processor:process",
+    "study_literature": ".study_literature_processor:process",
+    "observe_phenomena": ".observe_phenomena_processor:process",
+    "goto_position": ".goto_position_processor:process",
+    "research_investigation": ".research_investigation_processor:process",
+    "research_scope_definition": ".research_scope_definition_processor:process",
+    "hypothesis_and_question_development": ".hypothesis_and_question_development_processor:process",
+    "knowledge_integration": ".knowledge_integration_processor:process",
+
+    # Welfare handlers
+    "welfare_porter": "backend.engine.handlers.welfare_porter_handler:handle_welfare_porter",
+    "welfare_porter_delivery": "backend.engine.handlers.welfare_porter_delivery_handler:handle_welfare_porter_delivery",
+    "collect_welfare_food": "backend.engine.handlers.collect_welfare_food_handler:handle_collect_welfare_food",
+
+    # Governance activities
+    "file_grievance": ".file_grievance_processor:process",
+    "support_grievance": ".support_grievance_processor:process",
+})
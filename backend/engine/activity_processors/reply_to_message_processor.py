@@ -7,6 +7,7 @@ from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional, List, Tuple
 from pyairtable import Table
 from backend.engine.utils.activity_helpers import _escape_airtable_value, VENICE_TIMEZONE
+from backend.engine.activity_processors.lazy_registry import processor_signature
 
 log = logging.getLogger(__name__)
 
@@ -16,6 +17,7 @@ KINOS_BLUEPRINT = os.getenv("KINOS_BLUEPRINT", "serenissima-ai")
 KINOS_MODEL = os.getenv("KINOS_MODEL", "gemini/gemini-2.5-pro-preview-03-25")
 DEFAULT_CONVERSATION_LENGTH = int(os.getenv("DEFAULT_CONVERSATION_LENGTH", "3"))
 
+@processor_signature(accepts_api_base_url=False, accepts_kinos_model=True)
 def process_reply_to_message_fn(
     tables: Dict[str, Any],
     activity_record: Dict[str, Any],
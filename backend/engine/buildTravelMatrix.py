@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Builds the building-to-building travel matrix (see backend/engine/utils/travel_matrix.py).
+
+Fetches all constructed buildings and computes travel times and distances on the in-process
+navigation network for buildings that are new or have moved since the last run; buildings that
+no longer exist are dropped. Use --full to recompute every pair.
+"""
+
+import os
+import sys
+import time
+import logging
+from typing import Dict, List, Optional
+
+from pyairtable import Api, Table
+from dotenv import load_dotenv
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+log = logging.getLogger("build_travel_matrix")
+
+# Load environment variables
+load_dotenv()
+
+# Add project root to sys.path for backend imports
+SCRIPT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from backend.engine.utils.activity_helpers import LogColors, log_header
+from backend.engine.utils.travel_matrix import update_travel_matrix, TRAVEL_MATRIX_DIR
+
+
+def initialize_airtable() -> Optional[Dict[str, Table]]:
+    api_key = os.environ.get('AIRTABLE_API_KEY')
+    base_id = os.environ.get('AIRTABLE_BASE_ID')
+
+    if not api_key or not base_id:
+        log.error("Missing Airtable credentials.")
+        return None
+
+    try:
+        api = Api(api_key)
+        return {'buildings': api.table(base_id, 'BUILDINGS')}
+    except Exception as e:
+        log.error(f"Failed to initialize Airtable: {e}")
+        return None
+
+
+def fetch_constructed_buildings(tables: Dict[str, Table]) -> List[Dict]:
+    return tables['buildings'].all(
+        formula="{IsConstructed}=TRUE()",
+        fields=['BuildingId', 'Position', 'Point']
+    )
+
+
+def build_travel_matrix(full_rebuild: bool = False) -> bool:
+    log_header("Building travel matrix", LogColors.HEADER)
+
+    tables = initialize_airtable()
+    if not tables:
+        return False
+
+    try:
+        buildings = fetch_constructed_buildings(tables)
+    except Exception as e:
+        log.error(f"{LogColors.FAIL}Failed to fetch buildings: {e}{LogColors.ENDC}")
+        return False
+    log.info(f"{LogColors.OKBLUE}Fetched {len(buildings)} constructed buildings.{LogColors.ENDC}")
+
+    start = time.time()
+    try:
+        stats = update_travel_matrix(buildings, full_rebuild=full_rebuild)
+    except RuntimeError as e:
+        log.error(f"{LogColors.FAIL}{e}{LogColors.ENDC}")
+        return False
+
+    log.info(f"{LogColors.OKGREEN}Travel matrix in {TRAVEL_MATRIX_DIR} updated in {time.time() - start:.1f}s: "
+             f"{stats['buildings']} buildings, {stats['computed']} recomputed, {stats['removed']} removed, "
+             f"capacity {stats['capacity']}.{LogColors.ENDC}")
+    return True
+
+
+def run_cli(argv: Optional[List[str]] = None):
+    """Command-line entry point; also called in-process by the scheduler's task runner."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the building-to-building travel matrix")
+    parser.add_argument("--full", action="store_true", help="Recompute every pair instead of only new or moved buildings")
+
+    args = parser.parse_args(argv)
+
+    if not build_travel_matrix(full_rebuild=args.full):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run_cli()
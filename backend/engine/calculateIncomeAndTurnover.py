@@ -1,6 +1,7 @@
 import os
 import sys
 import json
+import argparse
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv # Removed find_dotenv
 from pyairtable import Api, Table
@@ -30,6 +31,7 @@ else:
 if PROJECT_ROOT_CALC_FINANCIALS not in sys.path: # Ensure PROJECT_ROOT_CALC_FINANCIALS is defined if this script is run standalone
     sys.path.insert(0, PROJECT_ROOT_CALC_FINANCIALS)
 from backend.engine.utils.activity_helpers import LogColors, log_header
+from backend.engine.utils.income_windows import IncomeWindows, load_income_windows, save_income_windows
 
 # Airtable Configuration
 AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
@@ -45,6 +47,8 @@ api = Api(AIRTABLE_API_KEY)
 citizens_table = api.table(AIRTABLE_BASE_ID, AIRTABLE_CITIZENS_TABLE_NAME)
 transactions_table = api.table(AIRTABLE_BASE_ID, AIRTABLE_TRANSACTIONS_TABLE_NAME)
 
+FINANCIAL_FIELDS = ['DailyIncome', 'DailyNetResult', 'WeeklyIncome', 'WeeklyNetResult', 'MonthlyIncome', 'MonthlyNetResult']
+
 def parse_timestamp(timestamp_str):
     """Safely parse Airtable timestamp string to timezone-aware datetime object."""
     if not timestamp_str:
@@ -62,10 +66,39 @@ def parse_timestamp(timestamp_str):
         print(f"Warning: Could not parse timestamp: {timestamp_str}")
         return None
 
-def calculate_citizen_financials():
+def transaction_parties(tx_fields, username_to_record_id, wallet_to_record_id):
+    """
+    (income recipient record id, expense payer record id) of a transaction: the Seller receives
+    and the Buyer pays, except for 'transfer' transactions whose parties are the from_wallet and
+    to_wallet of their Notes.
+    """
+    tx_type = tx_fields.get('Type', 'unknown_type').lower()
+    if tx_type == 'transfer':
+        notes_str = tx_fields.get('Notes', '{}')
+        try:
+            notes_data = json.loads(notes_str) if isinstance(notes_str, str) else {}
+        except json.JSONDecodeError:
+            notes_data = {}
+        payer_raw = notes_data.get('from_wallet', '')
+        recipient_raw = notes_data.get('to_wallet', '')
+    else:
+        payer_raw = tx_fields.get('Buyer', '')
+        recipient_raw = tx_fields.get('Seller', '')
+    payer = payer_raw.lower() if isinstance(payer_raw, str) else ''
+    recipient = recipient_raw.lower() if isinstance(recipient_raw, str) else ''
+
+    income_recipient_id = (username_to_record_id.get(recipient) or wallet_to_record_id.get(recipient)) if recipient else None
+    expense_payer_id = (username_to_record_id.get(payer) or wallet_to_record_id.get(payer)) if payer else None
+    return income_recipient_id, expense_payer_id
+
+def calculate_citizen_financials(rebuild=False):
     """
     Calculates daily, weekly, and monthly income and turnover for all citizens
-    and updates their records in Airtable.
+    and updates the records whose figures changed in Airtable.
+
+    Only the transactions executed since the previous run are fetched; weekly and monthly
+    totals come from the day buckets saved in data/.financials/ (see utils/income_windows.py).
+    With rebuild=True the saved buckets are discarded and the last 30 days are fetched again.
     """
     log_header("Citizen Financials Calculation", LogColors.HEADER)
 
@@ -87,10 +120,8 @@ def calculate_citizen_financials():
         citizen_info[record_id] = {
             'Username': username,
             'Wallet': wallet,
-            # Initialize financial fields
-            'DailyIncome': 0.0, 'DailyExpenses': 0.0,
-            'WeeklyIncome': 0.0, 'WeeklyExpenses': 0.0,
-            'MonthlyIncome': 0.0, 'MonthlyExpenses': 0.0,
+            # Values currently in Airtable, to only write the changed ones
+            'current': {name: fields.get(name) for name in FINANCIAL_FIELDS},
         }
         if username:
             username_to_record_id[username.lower()] = record_id
@@ -99,26 +130,26 @@ def calculate_citizen_financials():
     
     print(f"{LogColors.OKGREEN}[OK] Fetched {len(citizen_info)} citizens.{LogColors.ENDC}")
 
-    # 2. Fetch all transactions
+    # 2. Load the rolling windows and fetch the transactions executed since the last run
     print(f"\n{LogColors.OKCYAN}--- Section 2: Fetching Transaction Data ---{LogColors.ENDC}")
-    print(f"{LogColors.OKBLUE}Fetching transactions from table '{AIRTABLE_TRANSACTIONS_TABLE_NAME}'...{LogColors.ENDC}")
-    all_transactions = transactions_table.all()
-    print(f"{LogColors.OKGREEN}[OK] Fetched {len(all_transactions)} transactions.{LogColors.ENDC}")
-
-    # 3. Define time windows
-    print(f"\n{LogColors.OKCYAN}--- Section 3: Defining Time Windows ---{LogColors.ENDC}")
     now = datetime.now(timezone.utc)
     last_24_hours = now - timedelta(days=1)
-    last_7_days = now - timedelta(days=7)
-    last_30_days = now - timedelta(days=30)
+    windows = IncomeWindows() if rebuild else load_income_windows()
+    fetch_start = windows.fetch_start(now)
+    windows.advance_to(now)
     print(f"{LogColors.OKBLUE}Current UTC time: {now.isoformat()}{LogColors.ENDC}")
-    print(f"{LogColors.OKBLUE}24-hour window starts: {last_24_hours.isoformat()}{LogColors.ENDC}")
-    print(f"{LogColors.OKBLUE}7-day window starts: {last_7_days.isoformat()}{LogColors.ENDC}")
-    print(f"{LogColors.OKBLUE}30-day window starts: {last_30_days.isoformat()}{LogColors.ENDC}")
+    print(f"{LogColors.OKBLUE}Fetching transactions executed after {fetch_start.isoformat()} from table '{AIRTABLE_TRANSACTIONS_TABLE_NAME}'"
+          f"{' (no saved windows, rebuilding the last 30 days)' if windows.last_run is None else ''}...{LogColors.ENDC}")
+    new_transactions = transactions_table.all(formula=f"IS_AFTER({{ExecutedAt}}, '{fetch_start.isoformat()}')")
+    print(f"{LogColors.OKGREEN}[OK] Fetched {len(new_transactions)} transactions.{LogColors.ENDC}")
 
-    # 4. Process transactions
-    print(f"\n{LogColors.OKCYAN}--- Section 4: Processing Transactions ---{LogColors.ENDC}")
+    # 3. Process transactions: the daily figures are summed from the fetched transactions (they
+    # always cover the last 24 hours), the weekly and monthly ones from the day buckets.
+    print(f"\n{LogColors.OKCYAN}--- Section 3: Processing Transactions ---{LogColors.ENDC}")
+    daily_income = {}
+    daily_expenses = {}
     processed_tx_count = 0
+    already_counted_tx_count = 0
     skipped_tx_no_date = 0
     skipped_tx_no_price = 0
     unassigned_recipient_count = 0
@@ -126,122 +157,57 @@ def calculate_citizen_financials():
     recipient_not_in_citizens_count = 0
     payer_not_in_citizens_count = 0
 
-    for tx_record in all_transactions:
+    for tx_record in new_transactions:
         tx_fields = tx_record['fields']
         executed_at_str = tx_fields.get('ExecutedAt')
-        tx_id_log = tx_record.get('id', 'N/A')
         
         if not executed_at_str:
-            # log.debug(f"Skipping transaction {tx_id_log}: missing 'ExecutedAt' date.")
             skipped_tx_no_date += 1
             continue 
 
         executed_at = parse_timestamp(executed_at_str)
         if not executed_at:
-            # log.debug(f"Skipping transaction {tx_id_log}: could not parse 'ExecutedAt' date '{executed_at_str}'.")
             skipped_tx_no_date += 1
             continue
 
         price = tx_fields.get('Price', 0.0)
         if not isinstance(price, (int, float)) or price <= 0:
-            # log.debug(f"Skipping transaction {tx_id_log}: invalid or zero price ({price}).")
             skipped_tx_no_price += 1
             continue
         
-        processed_tx_count +=1
-        tx_type = tx_fields.get('Type', 'unknown_type').lower()
-        seller_identifier_raw = tx_fields.get('Seller', '')
-        buyer_identifier_raw = tx_fields.get('Buyer', '')
-        seller_identifier = seller_identifier_raw.lower() if isinstance(seller_identifier_raw, str) else ''
-        buyer_identifier = buyer_identifier_raw.lower() if isinstance(buyer_identifier_raw, str) else ''
-        notes_str = tx_fields.get('Notes', '{}')
-        
-        # print(f"{LogColors.OKBLUE}Processing Tx ID: {tx_id_log}, Type: {tx_type}, SellerRaw: '{seller_identifier_raw}', BuyerRaw: '{buyer_identifier_raw}', Price: {price}{LogColors.ENDC}")
+        income_recipient_id, expense_payer_id = transaction_parties(tx_fields, username_to_record_id, wallet_to_record_id)
+        in_last_24_hours = executed_at >= last_24_hours
+        is_new = windows.is_new(tx_record['id'], executed_at)
+        if not is_new:
+            already_counted_tx_count += 1
+            if not in_last_24_hours:
+                continue
 
-        try:
-            notes_data = json.loads(notes_str) if isinstance(notes_str, str) else {}
-        except json.JSONDecodeError:
-            notes_data = {}
-
-        # Determine seller and buyer record IDs
-        seller_record_id = username_to_record_id.get(seller_identifier) or \
-                           wallet_to_record_id.get(seller_identifier)
-        
-        buyer_record_id = username_to_record_id.get(buyer_identifier) or \
-                          wallet_to_record_id.get(buyer_identifier)
-
-        # Income/Expenses logic
-        # Income: Citizen is Seller
-        # Expenses: Citizen is Buyer
-        
-        income_recipient_id = seller_record_id # Citizen receives money if they are the Seller
-        expense_payer_id = buyer_record_id    # Citizen spends money if they are the Buyer
-
-        # For all transaction types, Seller is the income recipient and Buyer is the expense payer.
-        # The specific elif conditions that reversed this for types like 'deposit', 'inject', 'wage_payment'
-        # are removed based on the new rule that Seller is always recipient, Buyer always payer.
-        # If 'transfer' type needs special handling for from_wallet/to_wallet, it might need to remain
-        # or be adapted if Seller/Buyer fields are now consistently set for transfers.
-        # Assuming for now that 'transfer' also follows the Seller=Income, Buyer=Expense rule,
-        # or that its Seller/Buyer fields are set appropriately to reflect this.
-        # If 'transfer' still needs to derive from_wallet/to_wallet, that specific block should be preserved.
-
-        # Let's assume 'transfer' still needs its special logic for now, as it uses notes_data.
-        if tx_type == 'transfer': # Direct transfer between citizens from Notes
-            from_wallet_raw = notes_data.get('from_wallet', '')
-            to_wallet_raw = notes_data.get('to_wallet', '')
-            from_wallet = from_wallet_raw.lower() if isinstance(from_wallet_raw, str) else ''
-            to_wallet = to_wallet_raw.lower() if isinstance(to_wallet_raw, str) else ''
-            
-            # For transfers, the 'from_wallet' is the payer (expense)
-            # and 'to_wallet' is the recipient (income).
-            # We override the default income_recipient_id and expense_payer_id here.
-            expense_payer_id = None
-            income_recipient_id = None
-            if from_wallet:
-                expense_payer_id = username_to_record_id.get(from_wallet) or \
-                                   wallet_to_record_id.get(from_wallet)
-            if to_wallet:
-                income_recipient_id = username_to_record_id.get(to_wallet) or \
-                                      wallet_to_record_id.get(to_wallet)
-        # For all other types, the initial assignment of income_recipient_id = seller_record_id
-        # and expense_payer_id = buyer_record_id holds.
-
-        # Log determined parties
-        # log_detail_msg = f"  Tx {tx_id_log}: Type='{tx_type}', Seller='{seller_identifier}', Buyer='{buyer_identifier}'"
-        # log_detail_msg += f" -> IncomeTo: {citizen_info[income_recipient_id]['Username'] if income_recipient_id and income_recipient_id in citizen_info else income_recipient_id}"
-        # log_detail_msg += f", ExpenseFrom: {citizen_info[expense_payer_id]['Username'] if expense_payer_id and expense_payer_id in citizen_info else expense_payer_id}"
-        # print(f"{LogColors.OKBLUE}{log_detail_msg}{LogColors.ENDC}")
+        if is_new:
+            processed_tx_count += 1
+            tx_type = tx_fields.get('Type', 'unknown_type').lower()
+            if not income_recipient_id and tx_type not in ['inject']:
+                unassigned_recipient_count +=1
+            if not expense_payer_id and tx_type not in ['deposit', 'loan_disbursement']:
+                unassigned_payer_count +=1
+            if income_recipient_id and income_recipient_id not in citizen_info:
+                recipient_not_in_citizens_count += 1
+            if expense_payer_id and expense_payer_id not in citizen_info:
+                payer_not_in_citizens_count += 1
 
-        if not income_recipient_id and tx_type not in ['inject']:
-            unassigned_recipient_count +=1
-        if not expense_payer_id and tx_type not in ['deposit', 'loan_disbursement']:
-            unassigned_payer_count +=1
-            
-        # Update financials based on time windows
-        time_windows = []
-        if executed_at >= last_24_hours:
-            time_windows.append("Daily")
-        if executed_at >= last_7_days:
-            time_windows.append("Weekly")
-        if executed_at >= last_30_days:
-            time_windows.append("Monthly")
-
-        for window_prefix in time_windows:
+        income_recipient_id = income_recipient_id if income_recipient_id in citizen_info else None
+        expense_payer_id = expense_payer_id if expense_payer_id in citizen_info else None
+        if is_new:
+            windows.add(income_recipient_id, expense_payer_id, executed_at, price)
+        if in_last_24_hours:
             if income_recipient_id:
-                if income_recipient_id in citizen_info:
-                    citizen_info[income_recipient_id][f'{window_prefix}Income'] += price
-                else:
-                    recipient_not_in_citizens_count +=1
-            
+                daily_income[income_recipient_id] = daily_income.get(income_recipient_id, 0.0) + price
             if expense_payer_id:
-                if expense_payer_id in citizen_info:
-                    citizen_info[expense_payer_id][f'{window_prefix}Expenses'] += price
-                else:
-                    payer_not_in_citizens_count +=1
+                daily_expenses[expense_payer_id] = daily_expenses.get(expense_payer_id, 0.0) + price
     
     print(f"{LogColors.OKGREEN}[OK] Transaction processing complete.{LogColors.ENDC}")
-    print(f"{LogColors.OKBLUE}  Processed transactions: {processed_tx_count}{LogColors.ENDC}")
+    print(f"{LogColors.OKBLUE}  Processed new transactions: {processed_tx_count}{LogColors.ENDC}")
+    print(f"{LogColors.OKBLUE}  Already counted by a previous run: {already_counted_tx_count}{LogColors.ENDC}")
     if skipped_tx_no_date > 0:
         print(f"{LogColors.WARNING}  Skipped transactions (no/invalid date): {skipped_tx_no_date}{LogColors.ENDC}")
     if skipped_tx_no_price > 0:
@@ -255,29 +221,30 @@ def calculate_citizen_financials():
     if payer_not_in_citizens_count > 0:
         print(f"{LogColors.WARNING}  Expense assignments from non-citizen entities: {payer_not_in_citizens_count}{LogColors.ENDC}")
 
-
-    # 5. Prepare records for Airtable update
-    print(f"\n{LogColors.OKCYAN}--- Section 5: Preparing Airtable Updates ---{LogColors.ENDC}")
+    # 4. Prepare records for Airtable update: only citizens whose figures changed
+    print(f"\n{LogColors.OKCYAN}--- Section 4: Preparing Airtable Updates ---{LogColors.ENDC}")
     updates = []
-    for record_id, financials in citizen_info.items():
-        daily_net_result = financials['DailyIncome'] - financials['DailyExpenses']
-        weekly_net_result = financials['WeeklyIncome'] - financials['WeeklyExpenses']
-        monthly_net_result = financials['MonthlyIncome'] - financials['MonthlyExpenses']
+    for record_id, info in citizen_info.items():
+        totals = windows.totals(record_id)
+        weekly_income, weekly_expenses = totals['Weekly']
+        monthly_income, monthly_expenses = totals['Monthly']
+        day_income = daily_income.get(record_id, 0.0)
+        day_expenses = daily_expenses.get(record_id, 0.0)
         
-        update_payload = {
-            'id': record_id,
-            'fields': {
-                'DailyIncome': round(financials['DailyIncome'], 2),
-                'DailyNetResult': round(daily_net_result, 2),
-                'WeeklyIncome': round(financials['WeeklyIncome'], 2),
-                'WeeklyNetResult': round(weekly_net_result, 2),
-                'MonthlyIncome': round(financials['MonthlyIncome'], 2),
-                'MonthlyNetResult': round(monthly_net_result, 2),
-            }
+        fields = {
+            'DailyIncome': round(day_income, 2),
+            'DailyNetResult': round(day_income - day_expenses, 2),
+            'WeeklyIncome': round(weekly_income, 2),
+            'WeeklyNetResult': round(weekly_income - weekly_expenses, 2),
+            'MonthlyIncome': round(monthly_income, 2),
+            'MonthlyNetResult': round(monthly_income - monthly_expenses, 2),
         }
-        updates.append(update_payload)
+        changed_fields = {name: value for name, value in fields.items() if info['current'].get(name) != value}
+        if changed_fields:
+            updates.append({'id': record_id, 'fields': changed_fields})
+    print(f"{LogColors.OKBLUE}{len(updates)} of {len(citizen_info)} citizens have changed figures.{LogColors.ENDC}")
 
-    # 6. Batch update Airtable
+    # 5. Batch update Airtable, then save the windows (a failed run is redone from the previous state)
     if updates:
         print(f"{LogColors.OKBLUE}Updating {len(updates)} citizen records in Airtable...{LogColors.ENDC}")
         try:
@@ -285,15 +252,20 @@ def calculate_citizen_financials():
             citizens_table.batch_update(updates)
             print(f"{LogColors.OKGREEN}[OK] Airtable update successful.{LogColors.ENDC}")
         except Exception as e:
-            print(f"{LogColors.FAIL}[FAIL] Error updating Airtable: {e}{LogColors.ENDC}")
-            # Optionally, print details of records that failed if possible
-            # For example, log 'updates' or parts of it.
+            print(f"{LogColors.FAIL}[FAIL] Error updating Airtable: {e}. Income windows not saved.{LogColors.ENDC}")
+            return
     else:
         print(f"{LogColors.OKBLUE}No updates to send to Airtable.{LogColors.ENDC}")
 
+    windows.finish_run(now, citizen_info.keys())
+    save_income_windows(windows)
+
     print(f"\n{LogColors.HEADER}==============================================================")
     print(f"=== Citizen Financial Calculation Finished ===")
     print(f"=============================================================={LogColors.ENDC}")
 
 if __name__ == "__main__":
-    calculate_citizen_financials()
+    parser = argparse.ArgumentParser(description="Calculate citizens' daily, weekly and monthly income and net results.")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the saved income windows and refetch the last 30 days.")
+    args = parser.parse_args()
+    calculate_citizen_financials(rebuild=args.rebuild)
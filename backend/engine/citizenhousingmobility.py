@@ -28,13 +28,19 @@ import random
 import json
 import datetime
 import subprocess
-import requests
-import math
 import traceback # Ajout de l'import pour traceback
 from typing import Dict, List, Optional, Any, Tuple
 from pyairtable import Api, Table
 from dotenv import load_dotenv
 
+# Add the project root to sys.path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from backend.engine.utils.definitions_cache import get_building_type_definitions
+from backend.engine.utils.geo import haversine_meters, distances_from, to_list
+
 # Importer les fonctions nécessaires depuis activity_helpers
 try:
     # Try absolute import first
@@ -96,39 +102,20 @@ BUILDING_PREFERENCES = {
 # --- Fonctions utilitaires (potentiellement copiées/adaptées de buildbuildings.py) ---
 
 def get_building_types_from_api() -> Dict:
-    """Get information about different building types from the API."""
-    try:
-        api_base_url = os.getenv("API_BASE_URL", "http://localhost:3000")
-        url = f"{api_base_url}/api/building-types"
-        log.info(f"Fetching building types from API: {url}")
-        response = requests.get(url)
-        if response.status_code == 200:
-            response_data = response.json()
-            if response_data.get("success") and "buildingTypes" in response_data:
-                building_types = response_data["buildingTypes"]
-                log.info(f"Successfully fetched {len(building_types)} building types from API")
-                transformed_types = {}
-                for building in building_types:
-                    if "type" in building and "name" in building:
-                        building_type_key = building["type"]
-                        transformed_types[building_type_key] = {
-                            "type": building_type_key,
-                            "name": building["name"],
-                            "consumeTier": building.get("consumeTier"),
-                            "buildTier": building.get("buildTier"),
-                            "tier": building.get("tier"),
-                            # Ajouter d'autres champs si nécessaire
-                        }
-                return transformed_types
-            else:
-                log.warning(f"Unexpected API response format for building types: {response_data}")
-                return {}
-        else:
-            log.error(f"Error fetching building types from API: {response.status_code} - {response.text}")
-            return {}
-    except Exception as e:
-        log.error(f"Exception fetching building types from API: {str(e)}")
-        return {}
+    """Get information about different building types (shared definitions cache, API fallback to data/)."""
+    building_types = get_building_type_definitions(os.getenv("API_BASE_URL", "http://localhost:3000"))
+    transformed_types = {}
+    for building_type_key, building in building_types.items():
+        if "name" in building:
+            transformed_types[building_type_key] = {
+                "type": building_type_key,
+                "name": building["name"],
+                "consumeTier": building.get("consumeTier"),
+                "buildTier": building.get("buildTier"),
+                "tier": building.get("tier"),
+            }
+    log.info(f"Loaded {len(transformed_types)} building types")
+    return transformed_types
 
 def get_building_tier(building_type: str, building_types_data: Dict) -> int:
     """Determine the tier of a building type, prioritizing consumeTier."""
@@ -189,19 +176,14 @@ def get_building_coords(building_record: Dict) -> Optional[Dict[str, float]]:
 
 def calculate_distance_meters(coord1: Dict[str, float], coord2: Dict[str, float]) -> float:
     """Calculate Haversine distance between two lat/lng coordinates in meters."""
-    R = 6371000  # Rayon de la Terre en mètres
-    lat1_rad = math.radians(coord1['lat'])
-    lng1_rad = math.radians(coord1['lng'])
-    lat2_rad = math.radians(coord2['lat'])
-    lng2_rad = math.radians(coord2['lng'])
-
-    d_lng = lng2_rad - lng1_rad
-    d_lat = lat2_rad - lat1_rad
+    return haversine_meters(coord1['lat'], coord1['lng'], coord2['lat'], coord2['lng'])
 
-    a = math.sin(d_lat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(d_lng / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = R * c
-    return distance
+def distances_to_workplace(buildings: List[Dict], workplace_coords: Dict[str, float]) -> List[Optional[float]]:
+    """Distance in meters from each building to the workplace (None for buildings without coordinates), in one batch."""
+    building_coords = [get_building_coords(building) for building in buildings]
+    located = [coords for coords in building_coords if coords]
+    batch = iter(to_list(distances_from(workplace_coords, located))) if located else iter(())
+    return [next(batch) if coords else None for coords in building_coords]
 
 def get_citizen_workplace_coords(citizen_username: str, tables: Dict[str, Table]) -> Optional[Dict[str, float]]:
     """Get the coordinates of a citizen's workplace."""
@@ -569,8 +551,9 @@ def get_citizen_owned_vacant_suitable_homes(
         )
 
         allowed_tiers_for_class = get_allowed_building_tiers(social_class)
+        work_distances = distances_to_workplace(candidate_owned_buildings, workplace_coords) if workplace_coords else [None] * len(candidate_owned_buildings)
         
-        for building in candidate_owned_buildings:
+        for building, distance_m in zip(candidate_owned_buildings, work_distances):
             building_actual_type = building['fields'].get('Type')
             building_instance_tier = None
             if building_actual_type:
@@ -581,14 +564,12 @@ def get_citizen_owned_vacant_suitable_homes(
 
             # Calculate effective rent (0 rent + distance to work)
             effective_rent = 0.0 # Rent is 0 for self-owned
-            building_coords = get_building_coords(building)
             distance_to_work_for_log = -1.0
 
-            if workplace_coords and building_coords:
-                distance_m = calculate_distance_meters(building_coords, workplace_coords)
+            if workplace_coords and distance_m is not None:
                 effective_rent += distance_m
                 distance_to_work_for_log = distance_m
-            elif workplace_coords and not building_coords: # Has workplace, but building has no coords
+            elif workplace_coords: # Has workplace, but building has no coords
                 effective_rent = float('inf') # Penalize if building coords are missing
                 log.warning(f"Owned building {building['id']} missing coords, cannot calculate precise effective rent.")
             
@@ -726,15 +707,13 @@ def process_housing_mobility(dry_run: bool = False):
                     available_homes_of_type = get_available_buildings(
                         tables, type_pref, social_class, all_building_type_definitions
                     )
-                    for home in available_homes_of_type:
+                    work_distances = distances_to_workplace(available_homes_of_type, workplace_coords) if workplace_coords else [None] * len(available_homes_of_type)
+                    for home, distance_to_work in zip(available_homes_of_type, work_distances):
                         home_rent_price = float(home['fields'].get('RentPrice', 0) or 0)
                         home_effective_rent = home_rent_price
-                        if workplace_coords:
-                            home_coords = get_building_coords(home)
-                            if home_coords:
-                                distance_to_work = calculate_distance_meters(home_coords, workplace_coords)
-                                home_effective_rent += distance_to_work
-                            # No else needed for missing home_coords, as effective_rent remains home_rent_price
+                        if distance_to_work is not None:
+                            home_effective_rent += distance_to_work
+                        # No else needed for missing home_coords, as effective_rent remains home_rent_price
                         home['effective_rent'] = home_effective_rent
                     potential_new_homes_mismatch.extend(available_homes_of_type)
                 
@@ -790,14 +769,12 @@ def process_housing_mobility(dry_run: bool = False):
                     available_homes_of_type = get_available_buildings(
                         tables, type_pref, social_class, all_building_type_definitions
                     )
-                    for home in available_homes_of_type:
+                    work_distances = distances_to_workplace(available_homes_of_type, workplace_coords) if workplace_coords else [None] * len(available_homes_of_type)
+                    for home, distance_to_work in zip(available_homes_of_type, work_distances):
                         home_rent_price = float(home['fields'].get('RentPrice', 0) or 0)
                         home_effective_rent = home_rent_price
-                        if workplace_coords:
-                            home_coords = get_building_coords(home)
-                            if home_coords:
-                                distance_to_work = calculate_distance_meters(home_coords, workplace_coords)
-                                home_effective_rent += distance_to_work
+                        if distance_to_work is not None:
+                            home_effective_rent += distance_to_work
                         
                         if home_effective_rent < max_new_effective_rent:
                             home['effective_rent'] = home_effective_rent
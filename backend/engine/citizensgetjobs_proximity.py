@@ -39,10 +39,12 @@ if PROJECT_ROOT_JOBS not in sys.path:
     sys.path.insert(0, PROJECT_ROOT_JOBS)
 
 from backend.engine.utils.activity_helpers import LogColors, log_header, _escape_airtable_value
-from backend.engine.utils.distance_helpers import calculate_distance, estimate_walking_time, find_nearest_locations
+from backend.engine.utils.distance_helpers import calculate_distance, estimate_walking_time, find_nearest_locations, parse_position
+from backend.engine.utils.geo import distances, to_list
 
 # Constants
 MAX_WALKING_TIME_MINUTES = 15  # Maximum acceptable commute time
+JOB_SEARCH_RADIUS_METERS = 2000  # 2km max search radius
 SKILL_MATCH_BONUS = 0.3  # 30% bonus for personality-job match
 RELIGIOUS_BUILDING_TYPES = {'parish_church', 'chapel', 'st__mark_s_basilica'}
 
@@ -138,11 +140,15 @@ def calculate_job_compatibility_score(
 def find_best_job_for_citizen(
     citizen: Dict,
     available_businesses: List[Dict],
-    all_citizens_positions: Dict[str, Dict]
+    all_citizens_positions: Dict[str, Dict],
+    nearby_businesses: Optional[List[Tuple[Dict, float]]] = None
 ) -> Optional[Tuple[Dict, float]]:
     """
     Find the best job for a citizen using proximity and compatibility scoring.
     
+    nearby_businesses, when given, is the precomputed list of (business, distance) pairs
+    within the search radius, sorted by distance (see assign_jobs_with_proximity).
+    
     Returns:
         Tuple of (best_business, score) or None if no suitable job found
     """
@@ -155,11 +161,12 @@ def find_best_job_for_citizen(
     citizen_ducats = float(citizen['fields'].get('Ducats', 0) or 0)
     
     # Find all businesses within reasonable distance
-    nearby_businesses = find_nearest_locations(
-        citizen_pos,
-        available_businesses,
-        max_distance=2000  # 2km max search radius
-    )
+    if nearby_businesses is None:
+        nearby_businesses = find_nearest_locations(
+            citizen_pos,
+            available_businesses,
+            max_distance=JOB_SEARCH_RADIUS_METERS
+        )
     
     if not nearby_businesses:
         log.info(f"No businesses found within 2km for citizen {citizen['fields'].get('Username')}")
@@ -446,6 +453,39 @@ def assign_citizen_to_business(
         return False
 
 
+def compute_citizen_business_distances(citizens: List[Dict], businesses: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """
+    Distances in meters from each citizen to each business, computed as one batch matrix.
+    Returns {citizen record id: {business id: distance}}; citizens or businesses whose
+    position cannot be parsed are left out.
+    """
+    located_citizens, citizen_coords = [], []
+    for citizen in citizens:
+        try:
+            citizen_coords.append(parse_position(citizen['fields'].get('Position')))
+            located_citizens.append(citizen)
+        except (ValueError, TypeError):
+            continue
+    located_businesses, business_coords = [], []
+    for business in businesses:
+        if not business.get('position') or not business.get('id'):
+            continue
+        try:
+            business_coords.append(parse_position(business['position']))
+            located_businesses.append(business)
+        except (ValueError, TypeError):
+            continue
+    if not located_citizens or not located_businesses:
+        return {}
+
+    matrix = distances(citizen_coords, business_coords)
+    business_ids = [business['id'] for business in located_businesses]
+    return {
+        citizen['id']: dict(zip(business_ids, to_list(row)))
+        for citizen, row in zip(located_citizens, matrix)
+    }
+
+
 def assign_jobs_with_proximity(dry_run: bool = False, noupdate: bool = False):
     """Main function for proximity-based job assignment."""
     log_header(f"Proximity-Based Job Assignment (dry_run={dry_run})", LogColors.HEADER)
@@ -481,6 +521,9 @@ def assign_jobs_with_proximity(dry_run: bool = False, noupdate: bool = False):
     # Create a copy of available businesses list to track assignments
     remaining_businesses = available_businesses.copy()
     
+    # All citizen-to-business distances in one pass instead of one haversine per pair and citizen
+    distance_matrix = compute_citizen_business_distances(unemployed_citizens, available_businesses)
+    
     # Process each unemployed citizen
     for citizen in unemployed_citizens:
         if not remaining_businesses:
@@ -489,8 +532,16 @@ def assign_jobs_with_proximity(dry_run: bool = False, noupdate: bool = False):
         
         citizen_name = f"{citizen['fields'].get('FirstName', '')} {citizen['fields'].get('LastName', '')}"
         
-        # Find best job match
-        job_match = find_best_job_for_citizen(citizen, remaining_businesses, citizen_positions)
+        # Find best job match among the remaining businesses within the search radius
+        nearby_businesses = None
+        citizen_distances = distance_matrix.get(citizen['id'])
+        if citizen_distances is not None:
+            nearby_businesses = sorted(
+                ((business, citizen_distances[business.get('id')]) for business in remaining_businesses
+                 if citizen_distances.get(business.get('id'), JOB_SEARCH_RADIUS_METERS + 1) <= JOB_SEARCH_RADIUS_METERS),
+                key=lambda pair: pair[1]
+            )
+        job_match = find_best_job_for_citizen(citizen, remaining_businesses, citizen_positions, nearby_businesses)
         
         if not job_match:
             no_match_count += 1
@@ -500,9 +551,9 @@ def assign_jobs_with_proximity(dry_run: bool = False, noupdate: bool = False):
         best_business, score = job_match
         
         # Calculate distance for statistics
-        citizen_pos = citizen['fields'].get('Position')
-        business_pos = best_business.get('position')
-        distance = calculate_distance(citizen_pos, business_pos)
+        distance = (citizen_distances or {}).get(best_business.get('id'))
+        if distance is None:
+            distance = calculate_distance(citizen['fields'].get('Position'), best_business.get('position'))
         walking_time = estimate_walking_time(distance)
         
         # Track assignment by distance
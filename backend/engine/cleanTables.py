@@ -7,6 +7,10 @@ This script removes old records from specified Airtable tables:
 - NOTIFICATIONS: records older than 2 weeks (14 days).
 - RELEVANCIES: records older than 1 week (7 days).
 - PROBLEMS: records older than 2 weeks (14 days).
+- CONTRACTS: records that ended more than 24 hours ago.
+- TRANSACTIONS: records older than TRANSACTIONS_RETENTION_DAYS (60 days), after they have been
+  appended to the columnar transaction archive (backend/engine/utils/transaction_archive.py).
+  If they can't be archived (pyarrow/pandas missing, disk error), they are kept.
 
 The script uses the 'CreatedAt' field for determining the age of records.
 """
@@ -30,6 +34,7 @@ from dotenv import load_dotenv
 # --- Configuration ---
 
 from backend.engine.utils.activity_helpers import _escape_airtable_value, LogColors, log_header # Import LogColors and log_header
+from backend.engine.utils.transaction_archive import archive_transactions, archive_available, TransactionArchiveUnavailable
 
 logging.basicConfig(
     level=logging.INFO,
@@ -51,6 +56,8 @@ PROBLEMS_TABLE_NAME = 'PROBLEMS'
 CONTRACTS_TABLE_NAME = 'CONTRACTS' # Added
 BUILDINGS_TABLE_NAME = 'BUILDINGS' # Added
 RESOURCES_TABLE_NAME = 'RESOURCES' # Added
+TRANSACTIONS_TABLE_NAME = 'TRANSACTIONS'
+TRANSACTIONS_RETENTION_DAYS = int(os.getenv("TRANSACTIONS_RETENTION_DAYS", "60"))
 
 from backend.engine.utils.activity_helpers import LogColors
 
@@ -60,6 +67,7 @@ TABLE_CONFIGS = {
     RELEVANCIES_TABLE_NAME: {"time_value_to_keep": 7, "time_unit_to_keep": "days", "field_to_check": "CreatedAt"},
     PROBLEMS_TABLE_NAME: {"time_value_to_keep": 14, "time_unit_to_keep": "days", "field_to_check": "CreatedAt"},
     CONTRACTS_TABLE_NAME: {"time_value_to_keep": 24, "time_unit_to_keep": "hours", "field_to_check": "EndAt"},
+    TRANSACTIONS_TABLE_NAME: {"time_value_to_keep": TRANSACTIONS_RETENTION_DAYS, "time_unit_to_keep": "days", "field_to_check": "CreatedAt", "archive": True},
 }
 
 # --- Helper Functions ---
@@ -117,9 +125,13 @@ def delete_old_records(
     time_value_to_keep: int,
     time_unit_to_keep: str, # "days" or "hours"
     date_field: str,
-    dry_run: bool
+    dry_run: bool,
+    archive: bool = False
 ) -> int:
-    """Deletes records from the given table older than `time_value_to_keep` `time_unit_to_keep`."""
+    """
+    Deletes records from the given table older than `time_value_to_keep` `time_unit_to_keep`.
+    With `archive`, the records are first appended to the transaction archive and kept if that fails.
+    """
     log.info(f"{LogColors.HEADER}--- Cleaning table: {table_name} (keeping last {time_value_to_keep} {time_unit_to_keep}) ---{LogColors.ENDC}")
     
     # Airtable's NOW() is UTC. Date fields are also typically UTC.
@@ -142,8 +154,18 @@ def delete_old_records(
         log.info(f"Found {count} records to delete from {table_name}.")
 
         if dry_run:
-            log.info(f"{LogColors.OKCYAN}[DRY RUN] Would delete {count} records from {table_name}.{LogColors.ENDC}")
+            if archive and not archive_available():
+                log.info(f"{LogColors.OKCYAN}[DRY RUN] Would keep {count} records in {table_name}: the transaction archive needs pyarrow and pandas.{LogColors.ENDC}")
+                return 0
+            log.info(f"{LogColors.OKCYAN}[DRY RUN] Would {'archive and ' if archive else ''}delete {count} records from {table_name}.{LogColors.ENDC}")
             return count
+
+        if archive:
+            try:
+                archive_transactions(old_records)
+            except (TransactionArchiveUnavailable, OSError) as e_archive:
+                log.warning(f"{LogColors.WARNING}Could not archive {count} records from {table_name}, keeping them: {e_archive}{LogColors.ENDC}")
+                return 0
         
         if records_to_delete_ids:
             # Airtable's batch_delete can handle up to 10 records per request.
@@ -375,7 +397,8 @@ def main(dry_run: bool):
                     config["time_value_to_keep"],
                     config["time_unit_to_keep"],
                     config["field_to_check"],
-                    dry_run
+                    dry_run,
+                    archive=config.get("archive", False)
                 )
                 total_deleted_count += deleted_in_table
         else:
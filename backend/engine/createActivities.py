@@ -36,6 +36,8 @@ import pytz
 import uuid
 import re # Added import for regular expressions
 import random # Added for selecting random building point
+import contextvars
+import concurrent.futures
 from collections import defaultdict
 from typing import Dict, List, Optional, Any
 from pyairtable import Api, Table
@@ -79,6 +81,11 @@ from backend.engine.utils.activity_helpers import (
     is_docks_open_time, # Import the new helper
     VENICE_TIMEZONE
 )
+from backend.engine.utils.world_snapshot import WorldSnapshot
+from backend.engine.utils.building_reservations import BuildingReservations, buildings_to_reserve_for
+from backend.engine.utils.adaptive_pool import AIMDController, AdaptiveWorkerPool, instrument_tables
+from backend.engine.utils.sqlite_storage import is_local_storage_enabled, initialize_local_tables
+from backend.engine.utils.path_cache import log_path_cache_stats
 # Import specific logic handlers
 from backend.engine.logic.porter_activities import process_porter_activity # Already present
 # Import galley activity processing functions
@@ -109,11 +116,30 @@ load_dotenv(os.path.join(PROJECT_ROOT, '.env'))
 # Constants
 TRANSPORT_API_URL = os.getenv("TRANSPORT_API_URL", "http://localhost:3000/api/transport")
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:3000") # Define API_BASE_URL
+WORKER_THREAD_NAME_PREFIX = "create-activities" # Worker thread names; the scheduler's task runner collects their logs by it
 # VENICE_TIMEZONE is imported from activity_helpers
 # Other constants like NIGHT_START_HOUR etc. are managed in their respective logic files or helpers.
 
+# Keys used by the engine -> Airtable table names
+AIRTABLE_TABLE_NAMES = {
+    'citizens': 'CITIZENS',
+    'buildings': 'BUILDINGS',
+    'activities': 'ACTIVITIES',
+    'contracts': 'CONTRACTS',
+    'resources': 'RESOURCES',
+    'relationships': 'RELATIONSHIPS', # Ajout de la table RELATIONSHIPS
+    'stratagems': 'STRATAGEMS', # Ajout de la table STRATAGEMS
+    'processes': 'PROCESSES'
+}
+
+# Tables (and their HTTP session) kept across runs when the scheduler runs this script in-process
+_airtable_tables_cache: Dict[Any, Dict[str, Table]] = {}
+
 def initialize_airtable():
-    """Initialize Airtable connection."""
+    """Initialize Airtable connection (or the local SQLite backend when SERENISSIMA_STORAGE_BACKEND=sqlite)."""
+    if is_local_storage_enabled():
+        return initialize_local_tables(AIRTABLE_TABLE_NAMES)
+
     api_key = os.environ.get('AIRTABLE_API_KEY')
     base_id = os.environ.get('AIRTABLE_BASE_ID')
 
@@ -124,6 +150,10 @@ def initialize_airtable():
         log.error(f"{LogColors.FAIL}Missing Airtable credentials (or empty after strip). Set AIRTABLE_API_KEY and AIRTABLE_BASE_ID environment variables.{LogColors.ENDC}")
         sys.exit(1)
     
+    cached_tables = _airtable_tables_cache.get((api_key, base_id))
+    if cached_tables is not None:
+        return cached_tables
+
     try:
         # Create a requests session that doesn't trust environment proxy settings
         # custom_session = requests.Session() # Removed custom session creation
@@ -140,28 +170,95 @@ def initialize_airtable():
         # api.session = custom_session # Removed custom session assignment
 
         # Construct Table instances using api.table()
-        return {
-            'citizens': api.table(base_id, 'CITIZENS'),
-            'buildings': api.table(base_id, 'BUILDINGS'),
-            'activities': api.table(base_id, 'ACTIVITIES'),
-            'contracts': api.table(base_id, 'CONTRACTS'),
-            'resources': api.table(base_id, 'RESOURCES'),
-            'relationships': api.table(base_id, 'RELATIONSHIPS'), # Ajout de la table RELATIONSHIPS
-            'stratagems': api.table(base_id, 'STRATAGEMS'), # Ajout de la table STRATAGEMS
-            'processes': api.table(base_id, 'PROCESSES')
-        }
+        tables = {table_key: api.table(base_id, table_name) for table_key, table_name in AIRTABLE_TABLE_NAMES.items()}
+        _airtable_tables_cache[(api_key, base_id)] = tables
+        return tables
     except Exception as e:
         log.error(f"{LogColors.FAIL}Failed to initialize Airtable: {e}{LogColors.ENDC}")
         sys.exit(1)
 
-def create_activities(target_citizen_username: Optional[str] = None):
-    """Main function to create activities for idle citizens."""
+def create_activities(target_citizen_username: Optional[str] = None, parallel: bool = False):
+    """
+    Main function to create activities for idle citizens.
+    With `parallel`, general activities are created for several citizens at once (see _run_general_phase_parallel).
+    Parallel creation is opt-in: only the buildings a citizen occupies are reserved, not the shops,
+    contracts and stock elsewhere that concurrent citizens may both claim.
+    """
+    if target_citizen_username:
+        _create_activities_for_tick(target_citizen_username, tables=initialize_airtable(), snapshot=None)
+        return
+
+    tables = initialize_airtable()
+    # Load the world once for the whole tick; lookup helpers read from it while it is active.
+    try:
+        snapshot = WorldSnapshot.load(tables)
+    except Exception as e_snapshot:
+        log.error(f"{LogColors.FAIL}Failed to load world snapshot, falling back to per-lookup queries: {e_snapshot}{LogColors.ENDC}")
+        snapshot = None
+
+    if snapshot:
+        with snapshot.activate():
+            # Writes during the tick (Ducats, stock, contracts, new activities) also update the snapshot
+            _create_activities_for_tick(None, snapshot.track_writes(tables), snapshot, parallel=parallel)
+    else:
+        _create_activities_for_tick(None, tables, None, parallel=parallel)
+
+def _run_general_phase_parallel(
+    tables: Dict[str, Table],
+    citizens_to_process_general: List[Dict],
+    resource_defs: Dict,
+    building_type_defs: Dict,
+    now_venice_dt: datetime.datetime,
+    now_utc_dt: datetime.datetime,
+    snapshot: Optional[WorldSnapshot]
+) -> List[Dict]:
+    """
+    Runs process_citizen_activity for many citizens concurrently and returns the citizens
+    that received an activity, in their original order.
+    Citizens sharing a home or workplace are serialized through per-building reservations
+    so they don't claim the same stock or contract; everyone else runs in parallel.
+    """
+    reservations = BuildingReservations()
+    worker_controller = AIMDController()
+    instrument_tables(tables, worker_controller)
+
+    def create_for_citizen(citizen_record: Dict) -> bool:
+        with reservations.reserve(buildings_to_reserve_for(citizen_record, snapshot)):
+            return bool(process_citizen_activity(
+                tables, citizen_record, resource_defs,
+                building_type_defs,
+                now_venice_dt, now_utc_dt, TRANSPORT_API_URL, API_BASE_URL
+            ))
+
+    log.info(f"{LogColors.OKBLUE}Creating general activities in parallel ({worker_controller.limit} workers initially, max {worker_controller.max_limit}).{LogColors.ENDC}")
+    results: Dict[int, bool] = {}
+    with AdaptiveWorkerPool(worker_controller, thread_name_prefix=WORKER_THREAD_NAME_PREFIX) as pool:
+        # Worker threads don't inherit context variables: give each task a copy so the
+        # active WorldSnapshot stays visible to the lookup helpers.
+        future_to_index = {
+            pool.submit(contextvars.copy_context().run, create_for_citizen, citizen_record): index
+            for index, citizen_record in enumerate(citizens_to_process_general)
+        }
+        for future in concurrent.futures.as_completed(future_to_index):
+            index = future_to_index[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                citizen_username_log = citizens_to_process_general[index]['fields'].get('Username', citizens_to_process_general[index]['id'])
+                log.error(f"{LogColors.FAIL}Error creating activity for citizen {citizen_username_log}: {e}{LogColors.ENDC}", exc_info=True)
+                results[index] = False
+
+    created_count = sum(1 for created in results.values() if created)
+    log.info(f"{LogColors.OKBLUE}Throughput: {pool.report(len(citizens_to_process_general))} {created_count} activities created, {reservations.contended} building reservations waited.{LogColors.ENDC}")
+    return [citizens_to_process_general[i] for i in sorted(results) if results[i]]
+
+def _create_activities_for_tick(target_citizen_username: Optional[str], tables: Dict[str, Table], snapshot: Optional[WorldSnapshot], parallel: bool = False):
+    """Creates activities for idle citizens using already initialized tables and an optional world snapshot."""
     if target_citizen_username:
         log.info(f"{LogColors.HEADER}Starting activity creation process for citizen '{target_citizen_username}'{LogColors.ENDC}")
     else:
         log.info(f"{LogColors.HEADER}Starting activity creation process for all idle citizens{LogColors.ENDC}")
     
-    tables = initialize_airtable()
     # VENICE_TIMEZONE is imported from activity_helpers
     now_venice_dt = datetime.datetime.now(VENICE_TIMEZONE)
     now_utc_dt = now_venice_dt.astimezone(pytz.UTC)
@@ -209,7 +306,7 @@ def create_activities(target_citizen_username: Optional[str] = None):
             log.error(f"{LogColors.FAIL}Error fetching or checking status for citizen '{target_citizen_username}': {e}{LogColors.ENDC}")
             return
     else:
-        citizens_to_process_list = get_idle_citizens(tables, now_utc_dt) # <<<< Passer now_utc_dt ici
+        citizens_to_process_list = get_idle_citizens(tables, now_utc_dt, snapshot=snapshot) # <<<< Passer now_utc_dt ici
     
     if not citizens_to_process_list:
         log.info(f"{LogColors.OKBLUE}No idle citizens to process (checked with time {now_utc_dt.isoformat()}).{LogColors.ENDC}")
@@ -243,6 +340,17 @@ def create_activities(target_citizen_username: Optional[str] = None):
             log.info(f"{LogColors.OKBLUE}Processing general activities for {len(citizens_remaining_idle)} idle citizens.{LogColors.ENDC}")
             citizens_to_process_general = list(citizens_remaining_idle) 
 
+        if parallel and len(citizens_to_process_general) > 1:
+            for citizen_record in _run_general_phase_parallel(
+                tables, citizens_to_process_general, resource_defs, building_type_defs,
+                now_venice_dt, now_utc_dt, snapshot
+            ):
+                success_count += 1
+                citizens_processed_general_activity.add(citizen_record['fields'].get('Username', citizen_record['id']))
+                if citizen_record in citizens_remaining_idle:
+                    citizens_remaining_idle.remove(citizen_record)
+            citizens_to_process_general = []
+
         for citizen_record in citizens_to_process_general: 
             activity_created_for_this_citizen = False
             citizen_username_log = citizen_record['fields'].get('Username', citizen_record['id'])
@@ -280,14 +388,17 @@ def create_activities(target_citizen_username: Optional[str] = None):
     else:
         log.info(f"{LogColors.OKBLUE}No citizens remaining idle after general activity processing for galley tasks.{LogColors.ENDC}")
 
+    log_path_cache_stats()
     total_citizens_considered = len(citizens_to_process_list)
     summary_color = LogColors.OKGREEN if success_count >= total_citizens_considered and total_citizens_considered > 0 else LogColors.WARNING if success_count > 0 else LogColors.FAIL
     log.info(f"{summary_color}Activity creation process complete. Total activities created or simulated: {success_count} for {total_citizens_considered} citizen(s) considered.{LogColors.ENDC}")
 
-if __name__ == "__main__":
+def run_cli(argv: Optional[List[str]] = None):
+    """Command-line entry point; also called in-process by the scheduler's task runner."""
     parser = argparse.ArgumentParser(description="Create activities for idle citizens.")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
     parser.add_argument("--citizen", type=str, help="Process activities for a specific citizen by username.")
+    parser.add_argument("--parallel", action="store_true", help="Create general activities for several citizens at once (citizens may race for the same shop stock or contracts).")
     parser.add_argument(
         "--hour",
         type=int,
@@ -296,9 +407,12 @@ if __name__ == "__main__":
         help="Force the script to operate as if it's this hour in Venice time (0-23). Date and minutes/seconds remain current."
     )
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
     
-    create_activities(target_citizen_username=args.citizen)
+    create_activities(target_citizen_username=args.citizen, parallel=args.parallel)
+
+if __name__ == "__main__":
+    run_cli()
@@ -44,6 +44,8 @@ from backend.engine.utils.activity_helpers import (
     LogColors, # Import LogColors
     log_header # Import log_header
 )
+from backend.engine.utils.geodata import GeoData, get_geodata
+from backend.engine.utils.path_codec import dump_path
 
 import uuid # Added for generating ResourceId
 
@@ -98,39 +100,14 @@ def is_dock_working_hours(current_venice_time: datetime) -> bool:
 
 # Removed local get_building_types and get_resource_types, will use helpers
 
-def get_polygons_data() -> Optional[Dict]:
-    """Fetches polygon data from the /api/get-polygons endpoint."""
-    try:
-        api_base_url = os.getenv("API_BASE_URL", "https://serenissima.ai")
-        url = f"{api_base_url}/api/get-polygons"
-        log.info(f"Fetching polygon data from API: {url}")
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        if data.get("success"):
-            log.info(f"Successfully fetched polygon data (version: {data.get('version')}).")
-            polygons_list = data.get("polygons")
-            if isinstance(polygons_list, list):
-                # Transform the list of polygon objects into a dictionary keyed by polygon ID (LandId)
-                polygons_dict = {
-                    poly.get('id'): poly 
-                    for poly in polygons_list 
-                    if poly and isinstance(poly, dict) and poly.get('id')
-                }
-                log.info(f"Transformed polygon list into a dictionary with {len(polygons_dict)} entries.")
-                return polygons_dict
-            else:
-                log.warning(f"Polygons data from API is not a list as expected. Received: {type(polygons_list)}")
-                return {} # Return empty dict if structure is not as expected
-        else:
-            log.error(f"API error when fetching polygons: {data.get('error', 'Unknown error')}")
-            return None
-    except requests.exceptions.RequestException as e:
-        log.error(f"Request exception fetching polygon data: {e}")
-        return None
-    except json.JSONDecodeError as e:
-        log.error(f"JSON decode error fetching polygon data: {e}")
+def get_polygons_data() -> Optional[GeoData]:
+    """Polygon data (dock canal points) from data/polygons, parsed once and cached (see utils/geodata.py)."""
+    geodata = get_geodata()
+    if geodata is None:
+        log.error("No polygon data found under data/polygons.")
         return None
+    log.info(f"Loaded geodata (version: {geodata.version}) with {len(geodata.polygon_ids)} polygons.")
+    return geodata
 
 def get_public_docks(tables: Dict[str, Table]) -> List[Dict]:
     """Fetches all buildings of type 'public_dock'."""
@@ -172,8 +149,8 @@ def select_best_dock(docks: List[Dict]) -> Optional[Dict]:
 # Removed get_building_types() and get_resource_types() local definitions.
 # They are now imported from activity_helpers as get_building_types_from_api and get_resource_types_from_api.
 
-def get_dock_canal_point_data(dock_record: Dict, polygons_data: Dict) -> Optional[Dict]:
-    """Extracts the full canalPoint object for a given dock using polygon data."""
+def get_dock_canal_point_data(dock_record: Dict, polygons_data: GeoData) -> Optional[Dict]:
+    """Canal point ({'id', 'polygonId', 'edge', 'water'}) of a dock, from the geodata."""
     if not dock_record or not polygons_data:
         return None
         
@@ -184,30 +161,17 @@ def get_dock_canal_point_data(dock_record: Dict, polygons_data: Dict) -> Optiona
         log.warning(f"Dock {dock_record.get('id')} is missing BuildingId or LandId.")
         return None
 
-    land_polygon_data = polygons_data.get(dock_land_id)
-    if not land_polygon_data:
+    if dock_land_id not in polygons_data.polygon_rows:
         log.warning(f"No polygon data found for LandId: {dock_land_id}")
         return None
-        
-    canal_points_list = land_polygon_data.get('canalPoints', [])
-    if isinstance(canal_points_list, list):
-        for point_data in canal_points_list:
-            if isinstance(point_data, dict) and point_data.get('id') == dock_building_id:
-                # Validate that the point_data contains 'edge' and 'water' with lat/lng
-                if (isinstance(point_data.get('edge'), dict) and 
-                    'lat' in point_data['edge'] and 'lng' in point_data['edge'] and
-                    isinstance(point_data.get('water'), dict) and 
-                    'lat' in point_data['water'] and 'lng' in point_data['water']):
-                    log.info(f"Found valid canalPoint data for dock {dock_building_id}: {point_data}")
-                    return point_data
-                else:
-                    log.warning(f"CanalPoint data for dock {dock_building_id} is missing or has invalid edge/water structure: {point_data}")
-                    return None # Invalid structure
-        log.warning(f"No matching canalPoint data found for dock BuildingId: {dock_building_id} on LandId: {dock_land_id}")
-        return None
+
+    # None when the canal point is on another polygon or lacks edge/water coordinates
+    point_data = polygons_data.dock_canal_point(dock_building_id, dock_land_id)
+    if point_data:
+        log.info(f"Found valid canalPoint data for dock {dock_building_id}: {point_data}")
     else:
-        log.warning(f"canalPoints for LandId {dock_land_id} is not a list as expected. Type: {type(canal_points_list)}")
-        return None
+        log.warning(f"No valid canalPoint data found for dock BuildingId: {dock_building_id} on LandId: {dock_land_id}")
+    return point_data
 
 def create_or_get_merchant_galley(
     tables: Dict[str, Table], 
@@ -416,84 +380,6 @@ def get_active_contracts(tables: Dict[str, Table], current_venice_time: datetime
         log.error(f"Error getting active import contracts: {e}")
         return []
 
-def get_building_types() -> Dict:
-    """Get building types information from the API."""
-    try:
-        # Get API base URL from environment variables, with a default fallback
-        api_base_url = os.getenv("API_BASE_URL", "https://serenissima.ai")
-        
-        # Construct the API URL
-        url = f"{api_base_url}/api/building-types"
-        
-        log.info(f"Fetching building types from API: {url}")
-        
-        # Make the API request
-        response = requests.get(url)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            data = response.json()
-            
-            if data.get("success") and "buildingTypes" in data:
-                building_types = data["buildingTypes"]
-                log.info(f"Successfully fetched {len(building_types)} building types from API")
-                
-                # Transform the data into a dictionary keyed by building type
-                building_defs = {}
-                for building in building_types:
-                    if "type" in building:
-                        building_defs[building["type"]] = building
-                
-                return building_defs
-            else:
-                log.error(f"Unexpected API response format: {data}")
-                return {}
-        else:
-            log.error(f"Error fetching building types from API: {response.status_code} - {response.text}")
-            return {}
-    except Exception as e:
-        log.error(f"Exception fetching building types from API: {str(e)}")
-        return {}
-
-def get_resource_types() -> Dict:
-    """Get resource types information from the API."""
-    try:
-        # Get API base URL from environment variables, with a default fallback
-        api_base_url = os.getenv("API_BASE_URL", "https://serenissima.ai")
-        
-        # Construct the API URL
-        url = f"{api_base_url}/api/resource-types"
-        
-        log.info(f"Fetching resource types from API: {url}")
-        
-        # Make the API request
-        response = requests.get(url)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            data = response.json()
-            
-            if data.get("success") and "resourceTypes" in data:
-                resource_types = data["resourceTypes"]
-                log.info(f"Successfully fetched {len(resource_types)} resource types from API")
-                
-                # Transform the data into a dictionary keyed by resource id
-                resource_defs = {}
-                for resource in resource_types:
-                    if "id" in resource:
-                        resource_defs[resource["id"]] = resource
-                
-                return resource_defs
-            else:
-                log.error(f"Unexpected API response format: {data}")
-                return {}
-        else:
-            log.error(f"Error fetching resource types from API: {response.status_code} - {response.text}")
-            return {}
-    except Exception as e:
-        log.error(f"Exception fetching resource types from API: {str(e)}")
-        return {}
-
 def get_building_resources(tables, building_id: str) -> List[Dict]:
     """Get all resources stored in a specific building."""
     try:
@@ -646,18 +532,18 @@ def create_delivery_activity(tables, citizen: Dict, galley_building_id: str,
         # Use the first original contract's string ID for the ContractId field for reference
         primary_original_contract_id_str = original_contract_ids[0] if original_contract_ids else None
 
-        # Prepare and potentially truncate Path JSON
+        # Prepare and potentially truncate the Path value (JSON or compact, see path_codec.py)
         path_list_for_json = path_data.get('path', [])
-        path_json_string = json.dumps(path_list_for_json)
+        path_json_string = dump_path(path_list_for_json)
         MAX_PATH_LENGTH = 90000 # Airtable long text field limit is around 100k
 
         if len(path_json_string) > MAX_PATH_LENGTH:
             log.warning(f"Path JSON string for activity to {galley_building_id} is too long ({len(path_json_string)} chars). Attempting to truncate.")
             # Truncate by removing points from the middle to preserve start and end
             temp_path_list = list(path_list_for_json) # Work on a copy
-            while len(json.dumps(temp_path_list)) > MAX_PATH_LENGTH and len(temp_path_list) > 2:
+            while len(dump_path(temp_path_list)) > MAX_PATH_LENGTH and len(temp_path_list) > 2:
                 temp_path_list.pop(len(temp_path_list) // 2)
-            path_json_string = json.dumps(temp_path_list)
+            path_json_string = dump_path(temp_path_list)
             
             if len(path_json_string) > MAX_PATH_LENGTH: # If still too long
                 log.error(f"Path for activity to {galley_building_id} still too long ({len(path_json_string)} chars) after attempting to truncate points. Storing empty path as last resort.")
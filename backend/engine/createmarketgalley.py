@@ -38,6 +38,7 @@ from backend.engine.utils.activity_helpers import (
     calculate_haversine_distance_meters,
     get_citizen_record # For checking merchant/forestiero validity
 )
+from backend.engine.utils.geodata import GeoData, get_geodata
 # Import the specific activity creator
 from backend.engine.activity_creators.deliver_resource_batch_activity_creator import try_create as try_create_deliver_resource_batch_activity
 
@@ -81,26 +82,9 @@ def initialize_airtable() -> Optional[Dict[str, Table]]:
         log.error(f"{LogColors.FAIL}Failed to initialize Airtable: {e}{LogColors.ENDC}")
         return None
 
-def get_polygons_data() -> Optional[Dict]:
-    """Fetches polygon data from the /api/get-polygons endpoint."""
-    try:
-        api_base_url = os.getenv("API_BASE_URL", "http://localhost:3000")
-        url = f"{api_base_url}/api/get-polygons"
-        log.info(f"Fetching polygon data from API: {url}")
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        data = response.json()
-        if data.get("success"):
-            polygons_list = data.get("polygons")
-            if isinstance(polygons_list, list):
-                return {poly.get('id'): poly for poly in polygons_list if poly and poly.get('id')}
-            log.warning(f"Polygons data from API is not a list. Type: {type(polygons_list)}")
-            return {}
-        log.error(f"API error fetching polygons: {data.get('error', 'Unknown error')}")
-        return None
-    except Exception as e:
-        log.error(f"Exception fetching polygon data: {e}")
-        return None
+def get_polygons_data() -> Optional[GeoData]:
+    """Polygon data (dock canal points) from data/polygons, parsed once and cached (see utils/geodata.py)."""
+    return get_geodata()
 
 def get_public_docks(tables: Dict[str, Table]) -> List[Dict]:
     """Fetches all buildings of type 'public_dock'."""
@@ -110,22 +94,13 @@ def get_public_docks(tables: Dict[str, Table]) -> List[Dict]:
         log.error(f"Error fetching public_docks: {e}")
         return []
 
-def get_dock_canal_point_data(dock_record: Dict, polygons_data: Dict) -> Optional[Dict]:
-    """Extracts the full canalPoint object for a given dock using polygon data."""
+def get_dock_canal_point_data(dock_record: Dict, polygons_data: GeoData) -> Optional[Dict]:
+    """Canal point ({'id', 'polygonId', 'edge', 'water'}) of a dock, from the geodata."""
     if not dock_record or not polygons_data: return None
     dock_building_id = dock_record['fields'].get('BuildingId')
     dock_land_id = dock_record['fields'].get('LandId')
     if not dock_building_id or not dock_land_id: return None
-    land_polygon_data = polygons_data.get(dock_land_id)
-    if not land_polygon_data: return None
-    canal_points_list = land_polygon_data.get('canalPoints', [])
-    if isinstance(canal_points_list, list):
-        for point_data in canal_points_list:
-            if isinstance(point_data, dict) and point_data.get('id') == dock_building_id:
-                if (isinstance(point_data.get('edge'), dict) and 'lat' in point_data['edge'] and
-                    isinstance(point_data.get('water'), dict) and 'lat' in point_data['water']):
-                    return point_data
-    return None
+    return polygons_data.dock_canal_point(dock_building_id, dock_land_id)
 
 def get_existing_merchant_galleys(tables: Dict[str, Table]) -> List[Dict]:
     """Fetches all existing merchant_galley buildings and their positions."""
@@ -43,6 +43,7 @@ if PROJECT_ROOT_LOAN not in sys.path:
     sys.path.insert(0, PROJECT_ROOT_LOAN)
 
 from backend.engine.utils.activity_helpers import LogColors, log_header # Import shared LogColors and log_header
+from backend.engine.utils.ledger import Ledger
 
 def initialize_airtable():
     """Initialize Airtable connection."""
@@ -80,109 +81,23 @@ def get_active_loans(tables) -> List[Dict]:
         log.error(f"Error fetching active loans: {e}")
         return []
 
-def find_citizen_by_identifier(tables, identifier: str) -> Optional[Dict]:
-    """Find a citizen by username or wallet address."""
-    log.info(f"Looking up citizen: {identifier}")
-    
-    try:
-        # First try to find by username
-        formula = f"{{Username}}='{identifier}'"
-        citizens = tables['citizens'].all(formula=formula)
-        
-        if citizens:
-            log.info(f"Found citizen by username: {identifier}")
-            return citizens[0]
-        
-        # If not found, try by wallet address
-        formula = f"{{Wallet}}='{identifier}'"
-        citizens = tables['citizens'].all(formula=formula)
-        
-        if citizens:
-            log.info(f"Found citizen by wallet address: {identifier}")
-            return citizens[0]
-        
-        # Special case for ConsiglioDeiDieci - try alternative spellings
-        if identifier == "ConsiglioDeiDieci":
-            # Try with different variations
-            for variation in ["Consiglio Dei Dieci", "Consiglio dei Dieci", "ConsiglioDeidieci"]:
-                formula = f"{{Username}}='{variation}'"
-                citizens = tables['citizens'].all(formula=formula)
-                if citizens:
-                    log.info(f"Found citizen by alternative spelling: {variation}")
-                    return citizens[0]
-        
-        log.warning(f"Citizen not found: {identifier}")
-        return None
-    except Exception as e:
-        log.error(f"Error finding citizen {identifier}: {e}")
-        return None
-
-def update_compute_balance(tables, citizen_id: str, amount: float, operation: str = "add") -> Optional[Dict]:
-    """Update a citizen's compute balance."""
-    log.info(f"Updating compute balance for citizen {citizen_id}: {operation} {amount}")
-    
-    try:
-        # Get the citizen record
-        citizen = tables['citizens'].get(citizen_id)
-        if not citizen:
-            log.warning(f"Citizen not found: {citizen_id}")
-            return None
-        
-        # Get current Ducats
-        current_price = citizen['fields'].get('Ducats', 0)
-        
-        # Calculate new amount
-        if operation == "add":
-            new_amount = current_price + amount
-        elif operation == "subtract":
-            new_amount = current_price - amount
-        else:
-            log.error(f"Invalid operation: {operation}")
-            return None
-        
-        # Update the citizen record
-        updated_citizen = tables['citizens'].update(citizen_id, {
-            'Ducats': new_amount
-        })
-        
-        log.info(f"Updated compute balance for citizen {citizen_id}: {current_price} -> {new_amount}")
-        return updated_citizen
-    except Exception as e:
-        log.error(f"Error updating compute balance for citizen {citizen_id}: {e}")
-        return None
-
-def create_transaction_record(tables, loan: Dict, payment_amount: float) -> Optional[Dict]:
-    """Create a transaction record for a loan payment."""
-    loan_id = loan['id']
-    borrower = loan['fields'].get('Borrower', '')
-    lender = loan['fields'].get('Lender', '')
-    
-    log.info(f"Creating transaction record for loan {loan_id}: {borrower} -> {lender}, amount: {payment_amount}")
-    
-    try:
-        now = datetime.datetime.now().isoformat()
-        
-        # Create the transaction record
-        transaction = tables['transactions'].create({
-            "Type": "loan_payment",
-            "Asset": "compute_token",
-            "Seller": borrower,  # Borrower is the seller (paying)
-            "Buyer": lender,     # Lender is the buyer (receiving)
-            "Price": payment_amount,
-            "CreatedAt": now,
-            "ExecutedAt": now,
-            "Notes": json.dumps({
-                "loan_id": loan_id,
-                "payment_type": "scheduled",
-                "remaining_balance": loan['fields'].get('RemainingBalance', 0) - payment_amount
-            })
+def loan_transaction_fields(loan: Dict, payment_amount: float) -> Dict[str, Any]:
+    """Fields of the TRANSACTIONS record for a loan payment."""
+    now = datetime.datetime.now().isoformat()
+    return {
+        "Type": "loan_payment",
+        "Asset": "compute_token",
+        "Seller": loan['fields'].get('Borrower', ''),  # Borrower is the seller (paying)
+        "Buyer": loan['fields'].get('Lender', ''),     # Lender is the buyer (receiving)
+        "Price": payment_amount,
+        "CreatedAt": now,
+        "ExecutedAt": now,
+        "Notes": json.dumps({
+            "loan_id": loan['id'],
+            "payment_type": "scheduled",
+            "remaining_balance": loan['fields'].get('RemainingBalance', 0) - payment_amount
         })
-        
-        log.info(f"Created transaction record: {transaction['id']}")
-        return transaction
-    except Exception as e:
-        log.error(f"Error creating transaction record for loan {loan_id}: {e}")
-        return None
+    }
 
 def create_notification(tables, citizen: str, content: str, details: Dict) -> Optional[Dict]:
     """Create a notification for a citizen."""
@@ -212,8 +127,11 @@ def create_notification(tables, citizen: str, content: str, details: Dict) -> Op
         log.error(f"Error creating notification for citizen {citizen}: {e}")
         return None
 
-def process_loan_payment(tables, loan: Dict, dry_run: bool = False) -> bool:
-    """Process a payment for a single loan."""
+def process_loan_payment(tables, ledger: Ledger, loan: Dict, loan_updates: List[Dict], dry_run: bool = False) -> bool:
+    """
+    Record the payment of a single loan in the ledger. The loan's own update is appended to
+    `loan_updates`, written with one batch after the ledger is committed.
+    """
     loan_id = loan['id']
     loan_name = loan['fields'].get('Name', loan_id)
     borrower = loan['fields'].get('Borrower', '')
@@ -240,14 +158,9 @@ def process_loan_payment(tables, loan: Dict, dry_run: bool = False) -> bool:
         log.warning(f"Payment amount for loan {loan_id} is zero or negative, skipping")
         return False
     
-    if dry_run:
-        log.info(f"[DRY RUN] Would process payment of {payment_amount} for loan {loan_id}")
-        log.info(f"[DRY RUN] Would update remaining balance from {remaining_balance} to {remaining_balance - payment_amount}")
-        return True
-    
     # Find borrower and lender records
-    borrower_record = find_citizen_by_identifier(tables, borrower)
-    lender_record = find_citizen_by_identifier(tables, lender)
+    borrower_record = ledger.citizen(borrower)
+    lender_record = ledger.citizen(lender)
     
     if not borrower_record:
         log.warning(f"Borrower {borrower} not found, skipping payment")
@@ -299,10 +212,12 @@ def process_loan_payment(tables, loan: Dict, dry_run: bool = False) -> bool:
         )
         return False
     
-    # Check if borrower has enough compute
-    borrower_compute = borrower_record['fields'].get('Ducats', 0)
+    # Check if borrower has enough compute (running balance, after this run's earlier payments)
+    borrower_compute = ledger.balance(borrower)
     if borrower_compute < payment_amount:
         log.warning(f"Borrower {borrower} has insufficient compute balance: {borrower_compute} < {payment_amount}")
+        if dry_run:
+            return False
         
         # Create notification about insufficient funds for borrower
         create_notification(
@@ -339,78 +254,78 @@ def process_loan_payment(tables, loan: Dict, dry_run: bool = False) -> bool:
         
         return False
     
-    # Process the payment
-    # 1. Deduct from borrower
-    update_compute_balance(tables, borrower_record['id'], payment_amount, "subtract")
-    
-    # 2. Add to lender
-    update_compute_balance(tables, lender_record['id'], payment_amount, "add")
-    
-    # 3. Create transaction record
-    create_transaction_record(tables, loan, payment_amount)
-    
-    # 4. Update loan record
     new_balance = remaining_balance - payment_amount
     now = datetime.datetime.now().isoformat()
     
     # Determine if this is the final payment
     is_final_payment = new_balance <= 0
     new_status = "paid" if is_final_payment else "active"
+
+    def notify_loan_paid():
+        # For borrower
+        borrower_notification_content = f"💰 Loan payment of **{int(payment_amount):,} ⚜️ Ducats** processed"
+        if is_final_payment:
+            borrower_notification_content += ". Your loan has been **fully repaid**! 🎉 Congratulations!"
+        else:
+            borrower_notification_content += f". Remaining balance: **{int(new_balance):,} ⚜️ Ducats**"
+        
+        create_notification(
+            tables,
+            borrower,
+            borrower_notification_content,
+            {
+                "loan_id": loan_id,
+                "loan_name": loan_name,
+                "payment_amount": payment_amount,
+                "remaining_balance": new_balance,
+                "is_final_payment": is_final_payment,
+                "event_type": "payment_processed",
+                "lender": lender
+            }
+        )
+        
+        # For lender
+        lender_notification_content = f"💰 Received loan payment of **{int(payment_amount):,} ⚜️ Ducats** from **{borrower}**"
+        if is_final_payment:
+            lender_notification_content += ". The loan has been **fully repaid**! 🎉"
+        else:
+            lender_notification_content += f". Remaining balance: **{int(new_balance):,} ⚜️ Ducats**"
+        
+        create_notification(
+            tables,
+            lender,
+            lender_notification_content,
+            {
+                "loan_id": loan_id,
+                "loan_name": loan_name,
+                "payment_amount": payment_amount,
+                "remaining_balance": new_balance,
+                "borrower": borrower,
+                "is_final_payment": is_final_payment,
+                "event_type": "payment_received"
+            }
+        )
+
+    # Record the payment; balances and the transaction record are written by ledger.commit(),
+    # which then sends the notifications
+    if not ledger.transfer(borrower, lender, payment_amount, transaction=loan_transaction_fields(loan, payment_amount),
+                           on_commit=notify_loan_paid):
+        log.warning(f"Could not record loan payment of {payment_amount} from {borrower} to {lender}")
+        return False
     
-    # Update loan record
-    updated_loan = tables['loans'].update(loan_id, {
+    # Queue the loan record update
+    loan_updates.append({'id': loan_id, 'fields': {
         "RemainingBalance": new_balance,
         "Status": new_status,
         "Notes": f"{loan['fields'].get('Notes', '')}\nPayment of {payment_amount} made on {now}"
-    })
-    
-    log.info(f"Updated loan {loan_id}: remaining balance {remaining_balance} -> {new_balance}, status: {new_status}")
+    }})
     
-    # 5. Create notifications
-    # For borrower
-    borrower_notification_content = f"💰 Loan payment of **{int(payment_amount):,} ⚜️ Ducats** processed"
-    if is_final_payment:
-        borrower_notification_content += ". Your loan has been **fully repaid**! 🎉 Congratulations!"
-    else:
-        borrower_notification_content += f". Remaining balance: **{int(new_balance):,} ⚜️ Ducats**"
-    
-    create_notification(
-        tables,
-        borrower,
-        borrower_notification_content,
-        {
-            "loan_id": loan_id,
-            "loan_name": loan_name,
-            "payment_amount": payment_amount,
-            "remaining_balance": new_balance,
-            "is_final_payment": is_final_payment,
-            "event_type": "payment_processed",
-            "lender": lender
-        }
-    )
-    
-    # For lender
-    lender_notification_content = f"💰 Received loan payment of **{int(payment_amount):,} ⚜️ Ducats** from **{borrower}**"
-    if is_final_payment:
-        lender_notification_content += ". The loan has been **fully repaid**! 🎉"
-    else:
-        lender_notification_content += f". Remaining balance: **{int(new_balance):,} ⚜️ Ducats**"
-    
-    create_notification(
-        tables,
-        lender,
-        lender_notification_content,
-        {
-            "loan_id": loan_id,
-            "loan_name": loan_name,
-            "payment_amount": payment_amount,
-            "remaining_balance": new_balance,
-            "borrower": borrower,
-            "is_final_payment": is_final_payment,
-            "event_type": "payment_received"
-        }
-    )
+    if dry_run:
+        log.info(f"[DRY RUN] Would process payment of {payment_amount} for loan {loan_id}")
+        log.info(f"[DRY RUN] Would update remaining balance from {remaining_balance} to {new_balance}")
+        return True
     
+    log.info(f"Loan {loan_id}: remaining balance {remaining_balance} -> {new_balance}, status: {new_status}")
     return True
 
 def create_admin_summary(tables, payment_summary) -> None:
@@ -461,6 +376,8 @@ def process_daily_loan_payments(dry_run: bool = False):
         "total_amount": 0,
         "loans_paid_off": 0
     }
+    ledger = Ledger(tables, dry_run=dry_run).load()
+    loan_updates: List[Dict] = []
     
     for loan in active_loans:
         loan_id = loan['id']
@@ -472,7 +389,7 @@ def process_daily_loan_payments(dry_run: bool = False):
             payment_amount = remaining_balance
         
         # Process the payment
-        success = process_loan_payment(tables, loan, dry_run)
+        success = process_loan_payment(tables, ledger, loan, loan_updates, dry_run)
         
         if success:
             payment_summary["successful"] += 1
@@ -484,6 +401,18 @@ def process_daily_loan_payments(dry_run: bool = False):
         else:
             payment_summary["failed"] += 1
     
+    if not ledger.commit()['ok']:
+        # The loans must not be marked as paid when the payments were not written
+        log.error(f"{LogColors.FAIL}Loan payments were not fully written; not updating {len(loan_updates)} loan records nor the admin summary.{LogColors.ENDC}")
+        return
+    if not dry_run:
+        for i in range(0, len(loan_updates), 10):
+            try:
+                tables['loans'].batch_update(loan_updates[i:i + 10])
+            except Exception as e:
+                log.error(f"Error updating loans: {e}. Updates: {json.dumps(loan_updates[i:i + 10])}")
+        log.info(f"Updated {len(loan_updates)} loan records.")
+    
     log.info(f"Daily loan payments complete. Successful: {payment_summary['successful']}, Failed: {payment_summary['failed']}")
     log.info(f"Total amount processed: {payment_summary['total_amount']}, Loans paid off: {payment_summary['loans_paid_off']}")
     
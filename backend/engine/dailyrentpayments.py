@@ -42,6 +42,7 @@ if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
 from backend.engine.utils.activity_helpers import LogColors, log_header # Import shared LogColors and log_header
+from backend.engine.utils.ledger import Ledger
 from backend.engine.utils.relationship_helpers import update_trust_score_for_activity, TRUST_SCORE_SUCCESS_MEDIUM, TRUST_SCORE_FAILURE_MEDIUM # Import relationship helper
 
 def initialize_airtable():
@@ -84,107 +85,34 @@ def get_buildings_with_occupants(tables) -> List[Dict]:
 
 # Function removed as we no longer process business rent payments
 
-def find_citizen_by_identifier(tables, username: str) -> Optional[Dict]:
-    """Find a citizen by username."""
-    log.info(f"Looking up citizen: {username}")
-    
-    try:
-        # Find by username
-        formula = f"{{Username}}='{username}'"
-        citizens = tables['citizens'].all(formula=formula)
-        
-        if citizens:
-            log.info(f"Found citizen by username: {username}")
-            return citizens[0]
-        
-        # Special case for ConsiglioDeiDieci - try alternative spellings
-        if username == "ConsiglioDeiDieci":
-            # Try with different variations
-            for variation in ["Consiglio Dei Dieci", "Consiglio dei Dieci", "ConsiglioDeidieci"]:
-                formula = f"{{Username}}='{variation}'"
-                citizens = tables['citizens'].all(formula=formula)
-                if citizens:
-                    log.info(f"Found citizen by alternative spelling: {variation}")
-                    return citizens[0]
-        
-        log.warning(f"Citizen not found: {username}")
-        return None
-    except Exception as e:
-        log.error(f"Error finding citizen {username}: {e}")
-        return None
-
-def update_ducats_balance(tables, citizen_id: str, amount: float, operation: str = "add") -> Optional[Dict]:
-    """Update a citizen's Ducats balance."""
-    log.info(f"Updating Ducats balance for citizen {citizen_id}: {operation} {amount}")
-    
-    try:
-        # Get the citizen record
-        citizen = tables['citizens'].get(citizen_id)
-        if not citizen:
-            log.warning(f"Citizen not found: {citizen_id}")
-            return None
-        
-        # Get current Ducats
-        current_price = citizen['fields'].get('Ducats', 0)
-        
-        # Calculate new amount
-        if operation == "add":
-            new_amount = current_price + amount
-        elif operation == "subtract":
-            new_amount = current_price - amount
-        else:
-            log.error(f"Invalid operation: {operation}")
-            return None
-        
-        # Update the citizen record
-        updated_citizen = tables['citizens'].update(citizen_id, {
-            'Ducats': new_amount
-        })
-        
-        log.info(f"Updated Ducats balance for citizen {citizen_id}: {current_price} -> {new_amount}")
-        return updated_citizen
-    except Exception as e:
-        log.error(f"Error updating Ducats balance for citizen {citizen_id}: {e}")
-        return None
-
-def create_transaction_record(tables, from_citizen: str, to_citizen: str, amount: float,
-                             building_id_for_asset: str, # ID personnalisé du bâtiment pour le champ Asset
-                             airtable_record_id: str,    # ID d'enregistrement Airtable du bâtiment pour les Notes
-                             payment_type: str, details: Dict = None) -> Optional[Dict]:
-    """Create a transaction record for a rent payment."""
-    log.info(f"Creating transaction record for {payment_type} payment: {from_citizen} -> {to_citizen}, amount: {amount}")
+def rent_transaction_fields(from_citizen: str, to_citizen: str, amount: float,
+                            building_id_for_asset: str, # ID personnalisé du bâtiment pour le champ Asset
+                            airtable_record_id: str,    # ID d'enregistrement Airtable du bâtiment pour les Notes
+                            payment_type: str, details: Dict = None) -> Dict[str, Any]:
+    """Fields of the TRANSACTIONS record for a rent payment."""
+    now = datetime.datetime.now().isoformat()
 
-    try:
-        now = datetime.datetime.now().isoformat()
+    # Create transaction notes with details
+    notes = {
+        "building_id": airtable_record_id, # Utiliser l'ID d'enregistrement Airtable dans les notes
+        "payment_type": payment_type,
+        "payment_date": now
+    }
 
-        # Create transaction notes with details
-        notes = {
-            "building_id": airtable_record_id, # Utiliser l'ID d'enregistrement Airtable dans les notes
-            "payment_type": payment_type,
-            "payment_date": now
-        }
+    # Add any additional details
+    if details:
+        notes.update(details)
 
-        # Add any additional details
-        if details:
-            notes.update(details)
-
-        # Create the transaction record
-        transaction = tables['transactions'].create({
-            "Type": payment_type,
-            "Asset": building_id_for_asset,  # Utiliser l'ID personnalisé du bâtiment pour le champ Asset
-            "Seller": to_citizen,     # Building owner is the seller of housing service (receiving payment)
-            "Buyer": from_citizen,  # Tenant/Business owner is the buyer of housing service (paying)
-            "Price": amount,
-            "CreatedAt": now,
-            "ExecutedAt": now,
-            "Notes": json.dumps(notes)
-        })
-        
-        log.info(f"Created transaction record: {transaction['id']}")
-        return transaction
-    except Exception as e:
-        log.error(f"Error creating transaction record: {e}")
-        return None
+    return {
+        "Type": payment_type,
+        "Asset": building_id_for_asset,  # Utiliser l'ID personnalisé du bâtiment pour le champ Asset
+        "Seller": to_citizen,     # Building owner is the seller of housing service (receiving payment)
+        "Buyer": from_citizen,  # Tenant/Business owner is the buyer of housing service (paying)
+        "Price": amount,
+        "CreatedAt": now,
+        "ExecutedAt": now,
+        "Notes": json.dumps(notes)
+    }
 
 def create_notification(tables, citizen: str, content: str, details: Dict) -> Optional[Dict]:
     """Create a notification for a citizen."""
@@ -214,8 +142,8 @@ def create_notification(tables, citizen: str, content: str, details: Dict) -> Op
         log.error(f"Error creating notification for citizen {citizen}: {e}")
         return None
 
-def process_housing_rent(tables, building: Dict, dry_run: bool = False) -> Tuple[bool, float]:
-    """Process a housing rent payment from a citizen to a building owner."""
+def process_housing_rent(tables, ledger: Ledger, building: Dict, dry_run: bool = False) -> Tuple[bool, float]:
+    """Record a housing rent payment from a citizen to a building owner in the ledger."""
     building_id = building['id']
     building_name = building['fields'].get('Name', building_id)
     building_owner = building['fields'].get('Owner', '')
@@ -243,30 +171,27 @@ def process_housing_rent(tables, building: Dict, dry_run: bool = False) -> Tuple
         log.info(f"Building owner and occupant are the same ({building_owner}), skipping payment")
         return True, 0  # Return True but 0 amount as this is not an error
     
-    if dry_run:
-        log.info(f"[DRY RUN] Would transfer {rent_price} ⚜️ Ducats from {occupant_username} to {building_owner}")
-        return True, rent_price
-    
     # Find occupant citizen record
-    occupant_record = find_citizen_by_identifier(tables, occupant_username)
+    occupant_record = ledger.citizen(occupant_username)
     if not occupant_record:
         log.warning(f"Occupant {occupant_username} not found, skipping payment")
         return False, 0
     
     citizen_name = f"{occupant_record['fields'].get('FirstName', '')} {occupant_record['fields'].get('LastName', '')}"
-    citizen_ducats = occupant_record['fields'].get('Ducats', 0)
+    citizen_ducats = ledger.balance(occupant_username)  # Running balance, after this run's earlier payments
     
     log.info(f"Citizen: {citizen_name}, Ducats: {citizen_ducats}")
     
     # Find building owner citizen record
-    building_owner_record = find_citizen_by_identifier(tables, building_owner)
-    if not building_owner_record:
+    if not ledger.citizen(building_owner):
         log.warning(f"Building owner {building_owner} not found, skipping payment")
         return False, 0
     
     # Check if citizen has enough wealth
     if citizen_ducats < rent_price:
         log.warning(f"Citizen {citizen_name} has insufficient wealth: {citizen_ducats} < {rent_price}")
+        if dry_run:
+            return False, 0
         
         # Create notification about insufficient funds
         create_notification(
@@ -290,14 +215,7 @@ def process_housing_rent(tables, building: Dict, dry_run: bool = False) -> Tuple
         
         return False, 0
     
-    # Process the payment
-    # 1. Deduct from occupant's Ducats balance
-    update_ducats_balance(tables, occupant_record['id'], rent_price, "subtract")
-    
-    # 2. Add to building owner's Ducats balance
-    update_ducats_balance(tables, building_owner_record['id'], rent_price, "add")
-    
-    # 3. Create transaction record
+    # Process the payment; balances and the transaction record are written by ledger.commit()
     building_airtable_id = building['id']
     # Utiliser le BuildingId personnalisé pour le champ Asset, avec fallback sur l'ID Airtable si manquant.
     building_custom_id = building['fields'].get('BuildingId')
@@ -305,8 +223,7 @@ def process_housing_rent(tables, building: Dict, dry_run: bool = False) -> Tuple
         log.warning(f"Le bâtiment {building_airtable_id} n'a pas de BuildingId personnalisé. Utilisation de l'ID d'enregistrement Airtable comme identifiant d'actif.")
         building_custom_id = building_airtable_id
 
-    create_transaction_record(
-        tables,
+    transaction = rent_transaction_fields(
         occupant_username,
         building_owner,
         rent_price,
@@ -319,25 +236,33 @@ def process_housing_rent(tables, building: Dict, dry_run: bool = False) -> Tuple
             "building_type": building['fields'].get('Type', 'unknown')
         }
     )
-    # 4. Create notifications
-    # For citizen (as a notification in their name) - Landlord notification will be summarized later
-    create_notification(
-        tables,
-        occupant_username,
-        f"✅ Rent Paid: You paid **{int(rent_price):,} ⚜️ Ducats** to **{building_owner}** for **{building_name}**.",
-        {
-            "building_id": building_id,
-            "building_name": building_name,
-            "rent_price": rent_price,
-            "building_owner": building_owner,
-            "event_type": "rent_payment_made"
-        }
-    )
 
-    # Trust impact: Successful rent payment
-    if occupant_username and building_owner:
+    def on_rent_paid():
+        # For citizen (as a notification in their name) - Landlord notification will be summarized later
+        create_notification(
+            tables,
+            occupant_username,
+            f"✅ Rent Paid: You paid **{int(rent_price):,} ⚜️ Ducats** to **{building_owner}** for **{building_name}**.",
+            {
+                "building_id": building_id,
+                "building_name": building_name,
+                "rent_price": rent_price,
+                "building_owner": building_owner,
+                "event_type": "rent_payment_made"
+            }
+        )
+        # Trust impact: Successful rent payment
         update_trust_score_for_activity(tables, occupant_username, building_owner, TRUST_SCORE_SUCCESS_MEDIUM, "housing_rent_payment", True)
-    
+
+    # Notifications and trust are updated by ledger.commit() once the payment is written
+    if not ledger.transfer(occupant_username, building_owner, rent_price, transaction=transaction, on_commit=on_rent_paid):
+        log.warning(f"Could not record rent payment of {rent_price} from {occupant_username} to {building_owner}")
+        return False, 0
+
+    if dry_run:
+        log.info(f"[DRY RUN] Would transfer {rent_price} ⚜️ Ducats from {occupant_username} to {building_owner}")
+        return True, rent_price, building_owner, occupant_username, citizen_name, building_name
+
     log.info(f"Successfully processed housing rent payment: {rent_price} from {citizen_name} to {building_owner}")
     # Return more details for aggregated landlord notification
     return True, rent_price, building_owner, occupant_username, citizen_name, building_name
@@ -400,11 +325,12 @@ def process_daily_rent_payments(dry_run: bool = False):
     # Process housing rent payments
     log.info("Processing housing rent payments...")
     landlord_payment_details = defaultdict(list)
+    ledger = Ledger(tables, dry_run=dry_run).load()
 
     for building in buildings:
         # success, amount = process_housing_rent(tables, building, dry_run)
         # process_housing_rent now returns: success, amount, building_owner, occupant_username, citizen_name, building_name
-        result = process_housing_rent(tables, building, dry_run)
+        result = process_housing_rent(tables, ledger, building, dry_run)
         success = result[0]
         amount = result[1]
         
@@ -428,6 +354,10 @@ def process_daily_rent_payments(dry_run: bool = False):
         else:
             rent_summary["housing"]["failed"] += 1
     
+    if not ledger.commit()['ok']:
+        log.error(f"{LogColors.FAIL}Rent payments were not fully written; skipping the landlord and admin summaries.{LogColors.ENDC}")
+        return
+
     # Get top landlords for admin summary
     top_landlords = sorted(rent_summary["by_landlord"].items(), key=lambda x: x[1], reverse=True)[:5]
     rent_summary["top_landlords"] = [{"owner": owner, "amount": amount} for owner, amount in top_landlords]
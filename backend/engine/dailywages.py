@@ -6,7 +6,8 @@ This script:
 1. Finds all citizens with jobs (Work field is not empty)
 2. For each citizen, gets their workplace (business)
 3. Transfers the Wages amount from the business owner to the citizen
-4. Creates transaction records for each payment
+4. Creates transaction records for each payment (all balances and records are written in
+   batches by the shared Ledger at the end of the run; --dry-run logs the balance diff)
 5. Sends a summary notification to the administrator
 
 Run this script daily to process wage payments from business owners to workers.
@@ -42,6 +43,7 @@ load_dotenv()
 
 # Import helper functions
 from backend.engine.utils.activity_helpers import _escape_airtable_value, LogColors, log_header # Import log_header
+from backend.engine.utils.ledger import Ledger
 from backend.engine.utils.relationship_helpers import update_trust_score_for_activity, TRUST_SCORE_SUCCESS_MEDIUM, TRUST_SCORE_FAILURE_MEDIUM
 
 def initialize_airtable():
@@ -121,139 +123,24 @@ def get_business_details_by_custom_id(tables, business_custom_id: str) -> Option
         log.error(f"Error fetching business (building) by custom ID {business_custom_id}: {e}")
         return None
 
-def find_citizen_by_identifier(tables, identifier: str) -> Optional[Dict]:
-    """Find a citizen by username or wallet address."""
-    log.info(f"Looking up citizen: {identifier}")
-    
-    # Handle known misspellings
-    if identifier == "ConsiglioDeiDieci":
-        identifier = "ConsiglioDeiDieci"
-        log.info(f"Corrected misspelled identifier from ConsiglioDeiDieci to {identifier}")
-    
-    try:
-        # First try to find by username
-        formula = f"{{Username}}='{identifier}'"
-        citizens = tables['citizens'].all(formula=formula)
-        
-        if citizens:
-            log.info(f"Found citizen by username: {identifier}")
-            return citizens[0]
-        
-        # If not found, try by wallet address
-        formula = f"{{Wallet}}='{identifier}'"
-        citizens = tables['citizens'].all(formula=formula)
-        
-        if citizens:
-            log.info(f"Found citizen by wallet address: {identifier}")
-            return citizens[0]
-        
-        # Special case for ConsiglioDeiDieci - try alternative spellings
-        if identifier == "ConsiglioDeiDieci":
-            # Try with different variations
-            for variation in ["Consiglio Dei Dieci", "Consiglio dei Dieci", "ConsiglioDeidieci"]:
-                formula = f"{{Username}}='{variation}'"
-                citizens = tables['citizens'].all(formula=formula)
-                if citizens:
-                    log.info(f"Found citizen by alternative spelling: {variation}")
-                    return citizens[0]
-        
-        log.warning(f"Citizen not found: {identifier}")
-        return None
-    except Exception as e:
-        log.error(f"Error finding citizen {identifier}: {e}")
-        return None
-
-def update_compute_balance(tables, citizen_id: str, amount: float, operation: str = "add") -> Optional[Dict]:
-    """Update a citizen's compute balance."""
-    log.info(f"Updating compute balance for citizen {citizen_id}: {operation} {amount}")
-    
-    try:
-        # Get the citizen record
-        citizen = tables['citizens'].get(citizen_id)
-        if not citizen:
-            log.warning(f"Citizen not found: {citizen_id}")
-            return None
-        
-        # Get current Ducats
-        current_price = citizen['fields'].get('Ducats', 0)
-        
-        # Calculate new amount
-        if operation == "add":
-            new_amount = current_price + amount
-        elif operation == "subtract":
-            new_amount = current_price - amount
-        else:
-            log.error(f"Invalid operation: {operation}")
-            return None
-        
-        # Update the citizen record
-        updated_citizen = tables['citizens'].update(citizen_id, {
-            'Ducats': new_amount
-        })
-        
-        log.info(f"Updated compute balance for citizen {citizen_id}: {current_price} -> {new_amount}")
-        return updated_citizen
-    except Exception as e:
-        log.error(f"Error updating compute balance for citizen {citizen_id}: {e}")
-        return None
-
-def update_citizen_wealth(tables, citizen_id: str, amount: float) -> Optional[Dict]:
-    """Update a citizen's wealth."""
-    log.info(f"Updating wealth for citizen {citizen_id}: +{amount}")
-    
-    try:
-        # Get the citizen record
-        citizen = tables['citizens'].get(citizen_id)
-        if not citizen:
-            log.warning(f"Citizen not found: {citizen_id}")
-            return None
-        
-        # Get current wealth
-        current_wealth = citizen['fields'].get('Ducats', 0)
-        
-        # Calculate new wealth
-        new_wealth = current_wealth + amount
-        
-        # Update the citizen record
-        updated_citizen = tables['citizens'].update(citizen_id, {
-            'Ducats': new_wealth
+def wage_transaction_fields(from_citizen: str, to_citizen: str, amount: float, business_id: str) -> Dict[str, Any]:
+    """Fields of the TRANSACTIONS record for a wage payment."""
+    now = datetime.datetime.now().isoformat()
+    return {
+        "Type": "wage_payment",
+        "AssetType": "building",  # Set AssetType to 'building'
+        "Asset": business_id, # Asset is the BuildingId (using renamed parameter)
+        "Seller": to_citizen,    # Worker (Username) is the seller of labor (receiving payment)
+        "Buyer": from_citizen,  # Employer (RunBy) is the buyer of labor (paying)
+        "Price": amount,
+        "CreatedAt": now,
+        "ExecutedAt": now,
+        "Notes": json.dumps({
+            "business_id": business_id, # Use renamed parameter
+            "payment_type": "wage",
+            "payment_date": now
         })
-        
-        log.info(f"Updated wealth for citizen {citizen_id}: {current_wealth} -> {new_wealth}")
-        return updated_citizen
-    except Exception as e:
-        log.error(f"Error updating wealth for citizen {citizen_id}: {e}")
-        return None
-
-def create_transaction_record(tables, from_citizen: str, to_citizen: str, amount: float, business_id: str) -> Optional[Dict]:
-    """Create a transaction record for a wage payment."""
-    log.info(f"Creating transaction record for wage payment: {from_citizen} -> {to_citizen}, amount: {amount}")
-    
-    try:
-        now = datetime.datetime.now().isoformat()
-        
-        # Create the transaction record
-        transaction = tables['transactions'].create({
-            "Type": "wage_payment",
-            "AssetType": "building",  # Set AssetType to 'building'
-            "Asset": business_id, # Asset is the BuildingId (using renamed parameter)
-            "Seller": to_citizen,    # Worker (Username) is the seller of labor (receiving payment)
-            "Buyer": from_citizen,  # Employer (RunBy) is the buyer of labor (paying)
-            "Price": amount,
-            "CreatedAt": now,
-            "ExecutedAt": now,
-            "Notes": json.dumps({
-                "business_id": business_id, # Use renamed parameter
-                "payment_type": "wage",
-                "payment_date": now
-            })
-        })
-        
-        log.info(f"Created transaction record: {transaction['id']}")
-        return transaction
-    except Exception as e:
-        log.error(f"Error creating transaction record: {e}")
-        return None
+    }
 
 def create_admin_summary(tables, wage_summary) -> None:
     """Create a summary notification for the admin."""
@@ -286,8 +173,8 @@ def create_admin_summary(tables, wage_summary) -> None:
     except Exception as e:
         log.error(f"Error creating admin summary notification: {e}")
 
-def process_wage_payment(tables, citizen: Dict, dry_run: bool = False) -> tuple[bool, float]:
-    """Process a wage payment from a business owner to a citizen."""
+def process_wage_payment(tables, ledger: Ledger, citizen: Dict, dry_run: bool = False) -> tuple[bool, float]:
+    """Record a wage payment from a business owner to a citizen in the ledger."""
     citizen_airtable_id = citizen['id']
     citizen_username = citizen['fields'].get('Username')
     citizen_name = f"{citizen['fields'].get('FirstName', '')} {citizen['fields'].get('LastName', '')}"
@@ -335,23 +222,19 @@ def process_wage_payment(tables, citizen: Dict, dry_run: bool = False) -> tuple[
         log.warning(f"Wages for business {business_name} are zero or negative, skipping payment.")
         return False, 0
     
-    if dry_run:
-        log.info(f"[DRY RUN] Would transfer {wages} ⚜️ Ducats from {employer_username} to {citizen_name}")
-        return True, wages
-    
     # Find employer citizen record
-    employer_record = find_citizen_by_identifier(tables, employer_username)
+    employer_record = ledger.citizen(employer_username)
     
     if not employer_record:
         log.warning(f"Employer {employer_username} (RunBy) not found, skipping payment for {citizen_name} at {business_name}")
         return False, 0
     
-    # Check if employer has enough funds
-    employer_balance = employer_record['fields'].get('Ducats', 0)
+    # Check if employer has enough funds (running balance, after the payments already recorded this run)
+    employer_balance = ledger.balance(employer_username)
     if employer_balance < wages:
         log.warning(f"Employer {employer_username} has insufficient funds: {employer_balance} < {wages} for {citizen_name} at {business_name}")
         # Trust impact: Employer failed to pay Employee
-        if employer_username and citizen_username:
+        if not dry_run and employer_username and citizen_username:
             update_trust_score_for_activity(tables, employer_username, citizen_username, TRUST_SCORE_FAILURE_MEDIUM, "wage_payment", False, "employer_insufficient_funds")
         return False, 0
 
@@ -362,19 +245,13 @@ def process_wage_payment(tables, citizen: Dict, dry_run: bool = False) -> tuple[
         # No Ducats transfer needed as it's the same person.
         return True, wages # Return success as the wage is "accounted for"
 
-    # Process the payment
-    # 1. Deduct from employer
-    update_compute_balance(tables, employer_record['id'], wages, "subtract")
-    
-    # 2. Update citizen's wealth
-    update_citizen_wealth(tables, citizen_airtable_id, wages)
-    
-    # 3. Create transaction record
-    create_transaction_record(tables, employer_username, citizen_username, wages, business_custom_id)
-
-    # Trust impact: Successful wage payment
-    if employer_username and citizen_username:
-        update_trust_score_for_activity(tables, employer_username, citizen_username, TRUST_SCORE_SUCCESS_MEDIUM, "wage_payment", True)
+    # Record the payment; balances and the transaction record are written by ledger.commit(),
+    # which then applies the trust impact of the successful wage payment
+    transaction = wage_transaction_fields(employer_username, citizen_username, wages, business_custom_id)
+    if not ledger.transfer(employer_username, citizen_username, wages, transaction=transaction,
+                           on_commit=lambda: update_trust_score_for_activity(tables, employer_username, citizen_username, TRUST_SCORE_SUCCESS_MEDIUM, "wage_payment", True)):
+        log.warning(f"Could not record wage payment of {wages} from {employer_username} to {citizen_name}")
+        return False, 0
     
     log.info(f"{LogColors.OKGREEN}Successfully processed wage payment: {wages} from {employer_username} to {citizen_name}{LogColors.ENDC}")
     return True, wages
@@ -401,8 +278,9 @@ def process_daily_wages(dry_run: bool = False):
         "top_earners": []
     }
     
+    ledger = Ledger(tables, dry_run=dry_run).load()
     for citizen in employed_citizens:
-        success, amount = process_wage_payment(tables, citizen, dry_run)
+        success, amount = process_wage_payment(tables, ledger, citizen, dry_run)
         
         if success:
             wage_summary["successful"] += 1
@@ -443,6 +321,9 @@ def process_daily_wages(dry_run: bool = False):
     top_earners = sorted(wage_summary["by_citizen"].items(), key=lambda x: x[1], reverse=True)[:5]
     wage_summary["top_earners"] = [{"citizen": citizen, "amount": amount} for citizen, amount in top_earners]
     
+    if not ledger.commit()['ok']:
+        log.error(f"{LogColors.FAIL}Wage payments were not fully written; skipping the admin summary.{LogColors.ENDC}")
+        return
     log.info(f"Daily wage payments complete. Successful: {wage_summary['successful']}, Failed: {wage_summary['failed']}")
     log.info(f"Total amount processed: {wage_summary['total_amount']}")
     
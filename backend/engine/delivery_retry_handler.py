@@ -43,6 +43,7 @@ PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..'))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     LogColors, 
     log_header,
@@ -54,6 +55,7 @@ from backend.engine.utils.activity_helpers import (
     _calculate_distance_meters,
     get_path_between_points
 )
+from backend.engine.utils.pathfinding import find_travel_cost_matrix, is_native_pathfinding_enabled
 
 # Constants
 MAX_RETRIES = 3
@@ -127,12 +129,18 @@ def get_retry_count(activity: Dict) -> int:
     return 0
 
 def find_available_porter(tables: Dict[str, Any], location: Optional[Dict], exclude_citizens: List[str]) -> Optional[Dict]:
-    """Find an available porter near the location."""
+    """
+    Find an available porter near the location.
+    
+    Candidates within 200 m are ranked by travel time to the location, computed for all of them
+    at once with the in-process router (straight-line distance when it is unavailable), and the
+    first idle one is returned.
+    """
     try:
         # Get all citizens
         all_citizens = tables['citizens'].all()
         
-        available_porters = []
+        candidates = []
         
         for citizen in all_citizens:
             fields = citizen['fields']
@@ -163,22 +171,34 @@ def find_available_porter(tables: Dict[str, Any], location: Optional[Dict], excl
                 # If no location provided, use a default distance
                 distance = 100  # Default distance for sorting
             
-            # Check if citizen is idle (no active activities)
-            active_formula = f"AND({{Citizen}}='{_escape_airtable_value(username)}', {{Status}}!='processed', {{Status}}!='failed')"
-            active_activities = tables['activities'].all(formula=active_formula, max_records=1)
-            
-            if active_activities:
-                continue  # Citizen is busy
-            
-            available_porters.append({
+            candidates.append({
                 'citizen': citizen,
+                'position': position,
                 'distance': distance
             })
         
-        # Sort by distance and return closest
-        if available_porters:
-            available_porters.sort(key=lambda x: x['distance'])
-            return available_porters[0]['citizen']
+        if not candidates:
+            return None
+        
+        # Rank by travel time (unreachable candidates last), falling back to distance
+        travel_costs = None
+        if location and is_native_pathfinding_enabled():
+            travel_costs = find_travel_cost_matrix([candidate['position'] for candidate in candidates], [location])
+        if travel_costs:
+            for candidate, row in zip(candidates, travel_costs['durations']):
+                candidate['duration'] = row[0]
+            candidates.sort(key=lambda x: (x['duration'] is None, x['duration'] or 0, x['distance']))
+        else:
+            candidates.sort(key=lambda x: x['distance'])
+        
+        # Return the best candidate that is idle (no active activities)
+        for candidate in candidates:
+            username = candidate['citizen']['fields'].get('Username')
+            active_formula = f"AND({{Citizen}}='{_escape_airtable_value(username)}', {{Status}}!='processed', {{Status}}!='failed')"
+            active_activities = tables['activities'].all(formula=active_formula, max_records=1)
+            
+            if not active_activities:
+                return candidate['citizen']
         
         return None
         
@@ -234,7 +254,7 @@ def create_retry_activity(tables: Dict[str, Any], original_activity: Dict, new_p
             'ToBuilding': original_fields.get('ToBuilding'),
             'Resources': original_fields.get('Resources'),
             'ContractId': original_fields.get('ContractId'),
-            'Path': json.dumps(path_data.get('path', [])),
+            'Path': dump_path(path_data.get('path', [])),
             'CreatedAt': now_utc.isoformat(),
             'StartDate': start_time.isoformat(),
             'Priority': 15,  # Higher priority for retries
@@ -590,16 +610,20 @@ def process_delivery_retries(dry_run: bool = False):
     log.info(f"  - Max retries reached: {stats['max_retries']}")
     log.info(f"  - No porter available: {stats['no_porter']}")
 
-if __name__ == "__main__":
+def run_cli(argv: Optional[List[str]] = None):
+    """Command-line entry point; also called in-process by the scheduler's task runner."""
     import argparse
     
     parser = argparse.ArgumentParser(description="Process failed deliveries with retry logic")
     parser.add_argument("--dry-run", action="store_true", help="Run without making changes")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
     
-    process_delivery_retries(dry_run=args.dry_run)
\ No newline at end of file
+    process_delivery_retries(dry_run=args.dry_run)
+
+if __name__ == "__main__":
+    run_cli()
\ No newline at end of file
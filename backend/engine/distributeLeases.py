@@ -3,9 +3,11 @@
 Lease Distribution Script for La Serenissima.
 
 This script:
-1. For each land, finds all buildings on that land
+1. Fetches the lands with owners, the buildings with a LeasePrice and the citizens once, and
+   joins the buildings to their land by LandId in memory
 2. For each building, transfers the LeasePrice from the building owner to the land owner
-3. Creates notifications for both land owners and building owners
+   (minus a tax to ConsiglioDeiDieci) through a Ledger, committed in batches at the end
+3. Creates notifications for both land owners and building owners, in batches
 4. Generates an admin summary with statistics including top gainers and losers
 
 Run this script daily to process lease payments between building owners and land owners.
@@ -24,10 +26,16 @@ from collections import defaultdict
 from pyairtable import Api, Table
 from dotenv import load_dotenv
 
+try:
+    import numpy as np
+except ImportError:  # Optional: calculate_tax_rates() falls back to calculate_tax_rate() per land
+    np = None
+
 # Base tax rate for lease payments (20%)
 BASE_TAX_RATE = 0.20
 # Maximum tax rate for undeveloped land (50%)
 MAX_TAX_RATE = 0.50
+AIRTABLE_BATCH_SIZE = 10
 
 # Get Telegram credentials
 TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
@@ -51,6 +59,7 @@ if PROJECT_ROOT_LEASES not in sys.path:
     sys.path.insert(0, PROJECT_ROOT_LEASES)
 
 from backend.engine.utils.activity_helpers import LogColors, log_header # Import shared LogColors and log_header
+from backend.engine.utils.ledger import Ledger
 from backend.engine.utils.relationship_helpers import update_trust_score_for_activity, TRUST_SCORE_SUCCESS_MEDIUM, TRUST_SCORE_FAILURE_MEDIUM # Import relationship helper
 
 def initialize_airtable():
@@ -90,179 +99,81 @@ def get_all_lands(tables) -> List[Dict]:
         log.error(f"Error fetching lands: {e}")
         return []
 
-def get_buildings_on_land(tables, land_id: str, land_record: Dict) -> List[Dict]:
-    """Fetch all buildings on a specific land."""
-    # Get the LandId from the land record
-    land_id_value = land_record['fields'].get('LandId', '')
-    if not land_id_value:
-        log.warning(f"Land {land_id} has no LandId field, skipping")
-        return []
-    
-    log.info(f"Fetching buildings on land {land_id} (LandId: {land_id_value})...")
+def get_lease_buildings_by_land(tables) -> Dict[str, List[Dict]]:
+    """Fetch all buildings with an owner and a lease amount, grouped by their Land (LandId)."""
+    log.info("Fetching all buildings with lease amounts...")
     
+    formula = "NOT({Citizen} = BLANK())"
     try:
-        # Use the LandId field to query buildings - improved formula with better error handling
-        formula = f"AND({{Land}}='{land_id_value}', NOT({{Citizen}} = BLANK()))"
-        
-        # First try with the formula that requires LeasePrice
         try:
             buildings = tables['buildings'].all(formula=f"AND({formula}, NOT({{LeasePrice}} = BLANK()))")
-            log.info(f"Found {len(buildings)} buildings with lease amounts on land {land_id}")
-            return buildings
         except Exception as e:
             log.warning(f"Error with specific formula, trying more general query: {e}")
-            
-            # If that fails, try a more general query
-            buildings = tables['buildings'].all(formula=formula)
-            
-            # Filter buildings with lease amounts manually
-            buildings_with_lease = [b for b in buildings if b['fields'].get('LeasePrice')]
-            log.info(f"Found {len(buildings_with_lease)} buildings with lease amounts on land {land_id} (after filtering)")
-            return buildings_with_lease
-            
+            # If that fails, try a more general query and filter buildings with lease amounts manually
+            buildings = [b for b in tables['buildings'].all(formula=formula) if b['fields'].get('LeasePrice')]
     except Exception as e:
-        log.error(f"Error fetching buildings on land {land_id}: {e}")
-        # Add more detailed error logging
+        log.error(f"Error fetching buildings: {e}")
         if hasattr(e, 'response') and e.response:
             log.error(f"Response status: {e.response.status_code}")
             log.error(f"Response content: {e.response.text}")
-        return []
-
-def find_citizen_by_identifier(tables, identifier: str) -> Optional[Dict]:
-    """Find a citizen by username or wallet address."""
-    log.info(f"Looking up citizen: {identifier}")
-    
-    # Handle known special cases
-    if identifier == "ConsiglioDeiDieci":
-        # Try different variations of the name
-        variations = ["ConsiglioDeiDieci", "Consiglio Dei Dieci", "Consiglio dei Dieci"]
-        for variation in variations:
-            try:
-                formula = f"{{Username}}='{variation}'"
-                citizens = tables['citizens'].all(formula=formula)
-                if citizens:
-                    log.info(f"Found citizen by special case variation: {variation}")
-                    return citizens[0]
-            except Exception:
-                continue
-    
-    try:
-        # First try to find by username
-        formula = f"{{Username}}='{identifier}'"
-        citizens = tables['citizens'].all(formula=formula)
-        
-        if citizens:
-            log.info(f"Found citizen by username: {identifier}")
-            return citizens[0]
-        
-        # If not found, try by wallet address
-        formula = f"{{Wallet}}='{identifier}'"
-        citizens = tables['citizens'].all(formula=formula)
-        
-        if citizens:
-            log.info(f"Found citizen by wallet address: {identifier}")
-            return citizens[0]
-        
-        log.warning(f"Citizen not found: {identifier}")
-        return None
-    except Exception as e:
-        log.error(f"Error finding citizen {identifier}: {e}")
-        return None
-
-def update_compute_balance(tables, citizen_id: str, amount: float, operation: str = "add") -> Optional[Dict]:
-    """Update a citizen's compute balance."""
-    log.info(f"Updating compute balance for citizen {citizen_id}: {operation} {amount}")
-    
-    try:
-        # Get the citizen record
-        citizen = tables['citizens'].get(citizen_id)
-        if not citizen:
-            log.warning(f"Citizen not found: {citizen_id}")
-            return None
-        
-        # Get current Ducats
-        current_price = citizen['fields'].get('Ducats', 0)
-        
-        # Calculate new amount
-        if operation == "add":
-            new_amount = current_price + amount
-        elif operation == "subtract":
-            new_amount = current_price - amount
-            if new_amount < 0:
-                log.warning(f"Citizen {citizen_id} has insufficient funds: {current_price} < {amount}")
-                return None
-        else:
-            log.error(f"Invalid operation: {operation}")
-            return None
-        
-        # Update the citizen record
-        updated_citizen = tables['citizens'].update(citizen_id, {
-            'Ducats': new_amount
-        })
-        
-        log.info(f"Updated compute balance for citizen {citizen_id}: {current_price} -> {new_amount}")
-        return updated_citizen
-    except Exception as e:
-        log.error(f"Error updating compute balance for citizen {citizen_id}: {e}")
-        return None
+        return {}
+    
+    buildings_by_land = defaultdict(list)
+    for building in buildings:
+        land_id_value = building['fields'].get('Land')
+        if land_id_value:
+            buildings_by_land[land_id_value].append(building)
+    log.info(f"Found {len(buildings)} buildings with lease amounts on {len(buildings_by_land)} lands")
+    return buildings_by_land
 
-def create_transaction_record(tables, from_citizen: str, to_citizen: str, amount: float, land_id: str, building_id: str) -> Optional[Dict]:
-    """Create a transaction record for a lease payment."""
-    log.info(f"Creating transaction record for lease payment: {from_citizen} -> {to_citizen}, amount: {amount}")
-    
-    try:
-        now = datetime.datetime.now().isoformat()
-        
-        # Create the transaction record
-        transaction = tables['transactions'].create({
-            "Type": "lease_payment",
-            "Asset": f"lease_{land_id}_{building_id}",
-            "Seller": to_citizen,     # Land owner is the seller of land use (receiving payment)
-            "Buyer": from_citizen,  # Building owner is the buyer of land use (paying)
-            "Price": amount,
-            "CreatedAt": now,
-            "ExecutedAt": now,
-            "Notes": json.dumps({
-                "land_id": land_id,
-                "building_id": building_id,
-                "payment_type": "lease",
-                "payment_date": now
-            })
+def lease_transaction_fields(from_citizen: str, to_citizen: str, amount: float, land_id: str, building_id: str) -> Dict[str, Any]:
+    """Fields of the TRANSACTIONS record for a lease payment."""
+    now = datetime.datetime.now().isoformat()
+    return {
+        "Type": "lease_payment",
+        "Asset": f"lease_{land_id}_{building_id}",
+        "Seller": to_citizen,     # Land owner is the seller of land use (receiving payment)
+        "Buyer": from_citizen,  # Building owner is the buyer of land use (paying)
+        "Price": amount,
+        "CreatedAt": now,
+        "ExecutedAt": now,
+        "Notes": json.dumps({
+            "land_id": land_id,
+            "building_id": building_id,
+            "payment_type": "lease",
+            "payment_date": now
         })
-        
-        log.info(f"Created transaction record: {transaction['id']}")
-        return transaction
-    except Exception as e:
-        log.error(f"Error creating transaction record: {e}")
-        return None
+    }
 
-def create_notification(tables, citizen: str, content: str, details: Dict) -> Optional[Dict]:
-    """Create a notification for a citizen."""
-    log.info(f"Creating notification for citizen {citizen}: {content}")
-    
+def notification_fields(citizen: str, content: str, details: Dict) -> Optional[Dict[str, Any]]:
+    """Fields of a lease_payment notification for a citizen, created in batch by create_notifications()."""
     # Skip notification if citizen is empty or None
     if not citizen:
         log.warning(f"Cannot create notification: citizen is empty")
         return None
     
-    try:
-        now = datetime.datetime.now().isoformat()
-        
-        # Create the notification record
-        notification = tables['notifications'].create({
-            "Type": "lease_payment",
-            "Content": content,
-            "Details": json.dumps(details),
-            "CreatedAt": now,
-            "ReadAt": None,
-            "Citizen": citizen
-        })
-        
-        log.info(f"Created notification: {notification['id']}")
-        return notification
-    except Exception as e:
-        log.error(f"Error creating notification for citizen {citizen}: {e}")
-        return None
+    return {
+        "Type": "lease_payment",
+        "Content": content,
+        "Details": json.dumps(details),
+        "CreatedAt": datetime.datetime.now().isoformat(),
+        "ReadAt": None,
+        "Citizen": citizen
+    }
+
+def create_notifications(tables, notifications: List[Optional[Dict[str, Any]]]) -> int:
+    """Create the notification records in batches of 10. Returns how many were created."""
+    notifications = [n for n in notifications if n]
+    created = 0
+    for i in range(0, len(notifications), AIRTABLE_BATCH_SIZE):
+        chunk = notifications[i:i + AIRTABLE_BATCH_SIZE]
+        try:
+            tables['notifications'].batch_create(chunk)
+            created += len(chunk)
+        except Exception as e:
+            log.error(f"Error creating {len(chunk)} notifications (for {', '.join(n['Citizen'] for n in chunk)}): {e}")
+    log.info(f"Created {created} of {len(notifications)} notifications")
+    return created
 
 def calculate_tax_rate(land: Dict) -> float:
     """Calculate the tax rate based on land development.
@@ -297,8 +208,35 @@ def calculate_tax_rate(land: Dict) -> float:
     
     return tax_rate
 
-def process_lease_payment(tables, land: Dict, building: Dict, dry_run: bool = False) -> Tuple[bool, float, float]:
-    """Process a lease payment from a building owner to a land owner."""
+def calculate_tax_rates(lands: List[Dict]) -> Dict[str, float]:
+    """calculate_tax_rate() for all lands at once, as {land record id: tax rate}."""
+    if np is None:
+        return {land['id']: calculate_tax_rate(land) for land in lands}
+    
+    building_points = np.array([float(land['fields'].get('BuildingPointsCount', 0) or 0) for land in lands])
+    # Lands without a BuildingsCount count as having at least 1 building, as in calculate_tax_rate()
+    buildings = np.array([float(land['fields'].get('BuildingsCount', 0) or 1) for land in lands])
+    developed = building_points > 0
+    development_ratios = np.minimum(np.divide(buildings, building_points, out=np.zeros_like(buildings), where=developed), 1.0)
+    tax_rates = np.clip(MAX_TAX_RATE - development_ratios * (MAX_TAX_RATE - BASE_TAX_RATE), BASE_TAX_RATE, MAX_TAX_RATE)
+    tax_rates = np.where(developed, tax_rates, MAX_TAX_RATE)
+    if len(lands):
+        log.info(f"Calculated tax rates for {len(lands)} lands: {tax_rates.min():.2%} to {tax_rates.max():.2%}, mean {tax_rates.mean():.2%}")
+    return {land['id']: float(rate) for land, rate in zip(lands, tax_rates)}
+
+def land_development_ratio(land: Dict) -> float:
+    """Ratio of buildings to building points of a land, as shown in the notifications."""
+    building_points_count = land['fields'].get('BuildingPointsCount', 0)
+    buildings_count = land['fields'].get('BuildingsCount', 0)
+    return min(float(buildings_count) / float(building_points_count), 1.0) if building_points_count > 0 else 0
+
+def process_lease_payment(tables, ledger: Ledger, land: Dict, building: Dict, tax_rate: float,
+                          notifications: List[Optional[Dict[str, Any]]], dry_run: bool = False) -> Tuple[bool, float, float]:
+    """
+    Record a lease payment from a building owner to a land owner (and its tax) in the ledger.
+    `tax_rate` is the land's rate from calculate_tax_rates(); notifications about a failed
+    payment are appended to `notifications`.
+    """
     land_id = land['id']
     land_name = land['fields'].get('HistoricalName', land['fields'].get('EnglishName', land_id))
     land_owner = land['fields'].get('Citizen', '')
@@ -330,9 +268,6 @@ def process_lease_payment(tables, land: Dict, building: Dict, dry_run: bool = Fa
         log.info(f"Building owner and land owner are the same ({building_owner}), skipping payment")
         return True, 0, 0  # Return True but 0 amount as this is not an error
     
-    # Calculate variable tax rate based on land development
-    tax_rate = calculate_tax_rate(land)
-    
     # Calculate tax amount based on variable tax rate
     tax_amount = lease_price * tax_rate
     # Calculate net amount after tax
@@ -340,15 +275,10 @@ def process_lease_payment(tables, land: Dict, building: Dict, dry_run: bool = Fa
     
     log.info(f"Lease amount: {lease_price}, Tax ({tax_rate:.2%}): {tax_amount}, Net to land owner: {net_amount}")
     
-    if dry_run:
-        log.info(f"[DRY RUN] Would transfer {net_amount} ⚜️ Ducats from {building_owner} to {land_owner}")
-        log.info(f"[DRY RUN] Would transfer {tax_amount} ⚜️ Ducats from {building_owner} to ConsiglioDeiDieci (tax)")
-        return True, net_amount, tax_amount
-    
     # Find citizen records
-    building_owner_record = find_citizen_by_identifier(tables, building_owner)
-    land_owner_record = find_citizen_by_identifier(tables, land_owner)
-    consiglio_record = find_citizen_by_identifier(tables, "ConsiglioDeiDieci")
+    building_owner_record = ledger.citizen(building_owner)
+    land_owner_record = ledger.citizen(land_owner)
+    consiglio_record = ledger.citizen("ConsiglioDeiDieci")
     
     if not building_owner_record:
         log.warning(f"Building owner {building_owner} not found, skipping payment")
@@ -362,19 +292,18 @@ def process_lease_payment(tables, land: Dict, building: Dict, dry_run: bool = Fa
         log.warning(f"ConsiglioDeiDieci not found, skipping tax collection")
         return False, 0, 0
     
-    # Check if building owner has enough funds
-    building_owner_balance = building_owner_record['fields'].get('Ducats', 0)
+    # Check if building owner has enough funds (running balance, after this run's earlier payments)
+    building_owner_balance = ledger.balance(building_owner)
     if building_owner_balance < lease_price:
         log.warning(f"Building owner {building_owner} has insufficient funds: {building_owner_balance} < {lease_price}")
+        if dry_run:
+            return False, 0, 0
         
         # Get development ratio for this land
-        building_points_count = land['fields'].get('BuildingPointsCount', 0)
-        buildings_count = land['fields'].get('BuildingsCount', 0)
-        development_ratio = min(float(buildings_count) / float(building_points_count), 1.0) if building_points_count > 0 else 0
+        development_ratio = land_development_ratio(land)
         
-        # Create notification about insufficient funds
-        create_notification(
-            tables,
+        # Notify about insufficient funds
+        notifications.append(notification_fields(
             building_owner,
             f"❌ **Insufficient funds** for lease payment of **{int(lease_price):,} ⚜️ Ducats** for your building **{building_name}** on **{land_name}**",
             {
@@ -392,11 +321,10 @@ def process_lease_payment(tables, land: Dict, building: Dict, dry_run: bool = Fa
                 "event_type": "lease_payment_failed",
                 "error_type": "insufficient_funds"
             }
-        )
+        ))
         
         # Also notify land owner about the missed payment
-        create_notification(
-            tables,
+        notifications.append(notification_fields(
             land_owner,
             f"❌ **Missed lease payment** of **{int(net_amount):,} ⚜️ Ducats** from **{building_owner}** for building **{building_name}** on your land **{land_name}**",
             {
@@ -414,72 +342,58 @@ def process_lease_payment(tables, land: Dict, building: Dict, dry_run: bool = Fa
                 "event_type": "lease_payment_failed",
                 "error_type": "insufficient_funds"
             }
-        )
+        ))
         # Trust impact: Building Owner failed to pay Land Owner
         if building_owner and land_owner: # land_owner is defined earlier in the function
             update_trust_score_for_activity(tables, building_owner, land_owner, TRUST_SCORE_FAILURE_MEDIUM, "lease_payment", False, "building_owner_insufficient_funds")
         
         return False, 0, 0
     
-    # Process the payment
-    # 1. Deduct full amount from building owner
-    update_compute_balance(tables, building_owner_record['id'], lease_price, "subtract")
-    
-    # 2. Add net amount to land owner
-    update_compute_balance(tables, land_owner_record['id'], net_amount, "add")
-    
-    # 3. Add tax amount to ConsiglioDeiDieci
-    update_compute_balance(tables, consiglio_record['id'], tax_amount, "add")
-    
-    # 4. Create transaction record for land owner payment
-    create_transaction_record(tables, building_owner, land_owner, net_amount, land_id, building_id)
-    
-    # 5. Create transaction record for tax payment
-    create_tax_transaction_record(tables, building_owner, "ConsiglioDeiDieci", tax_amount, land_id, building_id, tax_rate)
+    # Record the payment and the tax; balances and transaction records are written by ledger.commit(),
+    # which then applies the trust impact of the successful lease payment
+    if not ledger.transfer(building_owner, land_owner, net_amount,
+                           transaction=lease_transaction_fields(building_owner, land_owner, net_amount, land_id, building_id),
+                           on_commit=lambda: update_trust_score_for_activity(tables, building_owner, land_owner, TRUST_SCORE_SUCCESS_MEDIUM, "lease_payment", True)):
+        log.warning(f"Could not record lease payment of {net_amount} from {building_owner} to {land_owner}")
+        return False, 0, 0
+    if not ledger.transfer(building_owner, "ConsiglioDeiDieci", tax_amount,
+                           transaction=lease_tax_transaction_fields(building_owner, "ConsiglioDeiDieci", tax_amount, land_id, building_id, tax_rate)):
+        log.warning(f"Could not record lease tax of {tax_amount} from {building_owner}; the lease itself was paid")
+        tax_amount = 0
+
+    if dry_run:
+        log.info(f"[DRY RUN] Would transfer {net_amount} ⚜️ Ducats from {building_owner} to {land_owner}")
+        log.info(f"[DRY RUN] Would transfer {tax_amount} ⚜️ Ducats from {building_owner} to ConsiglioDeiDieci (tax)")
+        return True, net_amount, tax_amount
 
-    # Trust impact: Successful lease payment from Building Owner to Land Owner
-    if building_owner and land_owner:
-        update_trust_score_for_activity(tables, building_owner, land_owner, TRUST_SCORE_SUCCESS_MEDIUM, "lease_payment", True)
-    
     log.info(f"Successfully processed lease payment: {net_amount} to {land_owner}, {tax_amount} tax to ConsiglioDeiDieci")
     
     return True, net_amount, tax_amount
 
-def create_tax_transaction_record(tables, from_citizen: str, to_citizen: str, amount: float, land_id: str, building_id: str, tax_rate: float) -> Optional[Dict]:
-    """Create a transaction record for a lease tax payment."""
-    log.info(f"Creating tax transaction record: {from_citizen} -> {to_citizen}, amount: {amount}")
-    
-    try:
-        now = datetime.datetime.now().isoformat()
-        
-        # Create the transaction record
-        transaction = tables['transactions'].create({
-            "Type": "lease_tax",
-            "Asset": f"tax_{land_id}_{building_id}",
-            "Seller": to_citizen,     # ConsiglioDeiDieci is the seller/recipient of tax
-            "Buyer": from_citizen,  # Building owner is the buyer/payer of tax
-            "Price": amount,
-            "CreatedAt": now,
-            "ExecutedAt": now,
-            "Notes": json.dumps({
-                "land_id": land_id,
-                "building_id": building_id,
-                "payment_type": "lease_tax",
-                "tax_rate": f"{tax_rate * 100:.2f}%",
-                "payment_date": now
-            })
+def lease_tax_transaction_fields(from_citizen: str, to_citizen: str, amount: float, land_id: str, building_id: str, tax_rate: float) -> Dict[str, Any]:
+    """Fields of the TRANSACTIONS record for a lease tax payment."""
+    now = datetime.datetime.now().isoformat()
+    return {
+        "Type": "lease_tax",
+        "Asset": f"tax_{land_id}_{building_id}",
+        "Seller": to_citizen,     # ConsiglioDeiDieci is the seller/recipient of tax
+        "Buyer": from_citizen,  # Building owner is the buyer/payer of tax
+        "Price": amount,
+        "CreatedAt": now,
+        "ExecutedAt": now,
+        "Notes": json.dumps({
+            "land_id": land_id,
+            "building_id": building_id,
+            "payment_type": "lease_tax",
+            "tax_rate": f"{tax_rate * 100:.2f}%",
+            "payment_date": now
         })
-        
-        log.info(f"Created tax transaction record: {transaction['id']}")
-        return transaction
-    except Exception as e:
-        log.error(f"Error creating tax transaction record: {e}")
-        return None
+    }
 
-def create_land_owner_summary(tables, land_owner: str, land_name: str, buildings_data: List[Dict], total_amount: float) -> None:
-    """Create a summary notification for a land owner about all lease payments received."""
+def land_owner_summary_fields(land_owner: str, land_name: str, buildings_data: List[Dict], total_amount: float) -> Optional[Dict[str, Any]]:
+    """Summary notification for a land owner about all lease payments received for one land."""
     if not buildings_data:
-        return
+        return None
     
     # Calculate average tax rate for this land
     total_tax = sum(building.get("tax_amount", 0) for building in buildings_data)
@@ -501,12 +415,12 @@ def create_land_owner_summary(tables, land_owner: str, land_name: str, buildings
         "event_type": "lease_payments_received"
     }
     
-    create_notification(tables, land_owner, content, details)
+    return notification_fields(land_owner, content, details)
 
-def create_building_owner_summary(tables, building_owner: str, buildings_data: List[Dict], total_amount: float, total_tax: float) -> None:
-    """Create a summary notification for a building owner about all lease payments made."""
+def building_owner_summary_fields(building_owner: str, buildings_data: List[Dict], total_amount: float, total_tax: float) -> Optional[Dict[str, Any]]:
+    """Summary notification for a building owner about all lease payments made."""
     if not buildings_data:
-        return
+        return None
     
     # Calculate average tax rate
     total_lease = total_amount + total_tax
@@ -529,7 +443,7 @@ def create_building_owner_summary(tables, building_owner: str, buildings_data: L
         "event_type": "lease_payments_made"
     }
     
-    create_notification(tables, building_owner, content, details)
+    return notification_fields(building_owner, content, details)
 
 def test_telegram_connection():
     """Test the Telegram connection"""
@@ -611,8 +525,8 @@ def send_telegram_notification(message):
         log.error(f"Error sending Telegram notification: {str(e)}")
         return False
 
-def create_admin_summary(tables, lease_summary) -> None:
-    """Create a summary notification for the admin."""
+def admin_summary_fields(lease_summary) -> Optional[Dict[str, Any]]:
+    """Summary notification for the admin."""
     try:
         # Create notification content
         content = f"🏛️ **Lease distribution complete**: **{lease_summary['successful']}** payments processed, total: **{int(lease_summary['total_amount']):,} ⚜️ Ducats** to land owners, **{int(lease_summary['total_tax']):,} ⚜️ Ducats** in tax revenue."
@@ -634,19 +548,17 @@ def create_admin_summary(tables, lease_summary) -> None:
             "top_losers": [{"owner": owner, "amount": -amount} for owner, amount in top_losers]
         }
         
-        # Create the notification record
-        tables['notifications'].create({
+        return {
             "Type": "lease_distribution_summary",
             "Content": content,
             "Details": json.dumps(details),
             "CreatedAt": datetime.datetime.now().isoformat(),
             "ReadAt": None,
             "Citizen": "ConsiglioDeiDieci"  # Admin citizen
-        })
-        
-        log.info(f"Created admin summary notification")
+        }
     except Exception as e:
         log.error(f"Error creating admin summary notification: {e}")
+        return None
 
 def distribute_leases(dry_run: bool = False):
     """Main function to distribute lease payments from building owners to land owners."""
@@ -665,6 +577,9 @@ def distribute_leases(dry_run: bool = False):
             log.info("No lands with owners found. Lease distribution process complete.")
             return
         
+        buildings_by_land = get_lease_buildings_by_land(tables)
+        tax_rates = calculate_tax_rates(lands)
+        
         # Track lease payment statistics
         lease_summary = {
             "successful": 0,
@@ -674,10 +589,13 @@ def distribute_leases(dry_run: bool = False):
             "by_land_owner": defaultdict(float),      # Total received by each land owner
             "by_building_owner": defaultdict(float),  # Total paid by each building owner
             "by_building_owner_tax": defaultdict(float),  # Total tax paid by each building owner
-            "land_owner_buildings": defaultdict(list),  # Buildings data for each land owner
+            "land_owner_buildings": defaultdict(list),  # (land name, buildings data) for each land owner
             "building_owner_lands": defaultdict(list),   # Lands data for each building owner
             "land_income": {}  # Track income per land
         }
+        ledger = Ledger(tables, dry_run=dry_run).load()
+        notifications = []
+        land_income_updates = []
         
         for land in lands:
             try:
@@ -685,28 +603,33 @@ def distribute_leases(dry_run: bool = False):
                 land_name = land['fields'].get('HistoricalName', land['fields'].get('EnglishName', land_id))
                 land_owner = land['fields'].get('Owner', '')
             
-                log.info(f"Processing land {land_name} (ID: {land_id}) owned by {land_owner}")
-            
                 # Skip if no owner
                 if not land_owner:
                     log.warning(f"Land {land_id} has no owner, skipping")
                     continue
                 
-                # Get buildings on this land, passing the land record
-                buildings = get_buildings_on_land(tables, land_id, land)
+                land_id_value = land['fields'].get('LandId', '')
+                if not land_id_value:
+                    log.warning(f"Land {land_id} has no LandId field, skipping")
+                    continue
                 
+                # Buildings on this land, from the join on LandId
+                buildings = buildings_by_land.get(land_id_value, [])
                 if not buildings:
-                    log.info(f"No buildings with lease amounts found on land {land_id}")
                     continue
                 
+                log.info(f"Processing land {land_name} (ID: {land_id}) owned by {land_owner}: {len(buildings)} buildings with lease amounts")
+                
                 # Track lease payments for this land
                 land_total = 0
                 land_buildings_data = []
+                tax_rate = tax_rates[land_id]
+                development_ratio = land_development_ratio(land)
                 
                 for building in buildings:
                     try:
-                        # Process the lease payment - now returns net amount and tax amount
-                        success, net_amount, tax_amount = process_lease_payment(tables, land, building, dry_run)
+                        # Process the lease payment - returns net amount and tax amount
+                        success, net_amount, tax_amount = process_lease_payment(tables, ledger, land, building, tax_rate, notifications, dry_run)
                         
                         if success:
                             if net_amount > 0 or tax_amount > 0:  # Only count if actual payment was made
@@ -734,14 +657,6 @@ def distribute_leases(dry_run: bool = False):
                                 except (ValueError, TypeError):
                                     lease_price = 0
                                 
-                                # Calculate development ratio for this land
-                                building_points_count = land['fields'].get('BuildingPointsCount', 0)
-                                buildings_count = land['fields'].get('BuildingsCount', 0)
-                                development_ratio = min(float(buildings_count) / float(building_points_count), 1.0) if building_points_count > 0 else 0
-                                
-                                # Calculate tax rate for this land
-                                calculated_tax_rate = calculate_tax_rate(land)
-                                
                                 land_buildings_data.append({
                                     "building_id": building_id,
                                     "building_name": building_name,
@@ -750,7 +665,7 @@ def distribute_leases(dry_run: bool = False):
                                     "lease_price": lease_price,
                                     "net_amount": net_amount,
                                     "tax_amount": tax_amount,
-                                    "tax_rate": calculated_tax_rate,
+                                    "tax_rate": tax_rate,
                                     "development_rate": development_ratio
                                 })
                                 
@@ -766,7 +681,7 @@ def distribute_leases(dry_run: bool = False):
                                         "lease_price": lease_price,
                                         "net_amount": net_amount,
                                         "tax_amount": tax_amount,
-                                        "tax_rate": calculated_tax_rate,
+                                        "tax_rate": tax_rate,
                                         "development_rate": development_ratio
                                     })
                         else:
@@ -777,56 +692,51 @@ def distribute_leases(dry_run: bool = False):
                 
                 # Track the total income for this land
                 lease_summary["land_income"][land_id] = land_total
-                
-                # Update the LastIncome field in the LANDS table, even in dry-run mode
-                try:
-                    if land_total > 0:
-                        log.info(f"{'[DRY RUN] Would update' if dry_run else 'Updating'} LastIncome for land {land_id} to {land_total}")
-                        tables['lands'].update(land_id, {
-                            "LastIncome": land_total
-                        })
-                except Exception as update_error:
-                    log.error(f"Error updating LastIncome for land {land_id}: {update_error}")
+                if land_total > 0:
+                    land_income_updates.append({'id': land_id, 'fields': {"LastIncome": land_total}})
                 
                 # Add buildings data for this land to the summary
                 if land_buildings_data:
-                    lease_summary["land_owner_buildings"][land_owner].extend(land_buildings_data)
+                    lease_summary["land_owner_buildings"][land_owner].append((land_name, land_buildings_data))
             except Exception as land_error:
                 log.error(f"Error processing land {land.get('id', 'unknown')}: {land_error}")
                 continue
     
+        if not ledger.commit()['ok']:
+            log.error(f"{LogColors.FAIL}Lease payments were not fully written; skipping LastIncome and the payment summaries.{LogColors.ENDC}")
+            create_notifications(tables, notifications)  # Only the missed payment notifications, which stay true
+            return
         log.info(f"Lease distribution process complete. Successful: {lease_summary['successful']}, Failed: {lease_summary['failed']}")
         log.info(f"Total amount to land owners: {lease_summary['total_amount']}, Total tax collected: {lease_summary['total_tax']}")
         
+        # Update the LastIncome field in the LANDS table, even in dry-run mode
+        if land_income_updates:
+            log.info(f"{'[DRY RUN] Would update' if dry_run else 'Updating'} LastIncome for {len(land_income_updates)} lands")
+            for i in range(0, len(land_income_updates), AIRTABLE_BATCH_SIZE):
+                chunk = land_income_updates[i:i + AIRTABLE_BATCH_SIZE]
+                try:
+                    tables['lands'].batch_update(chunk)
+                except Exception as update_error:
+                    log.error(f"Error updating LastIncome for lands {', '.join(u['id'] for u in chunk)}: {update_error}")
+        
         # Create notifications for land owners
         if not dry_run:
             try:
-                for land_owner, buildings_data in lease_summary["land_owner_buildings"].items():
-                    total_received = lease_summary["by_land_owner"][land_owner]
-                    # Group buildings by land
-                    lands_data = {}
-                    for building in buildings_data:
-                        land_id = next((land['id'] for land in lands if land['fields'].get('Citizen') == land_owner), None)
-                        if land_id:
-                            land_name = next((land['fields'].get('HistoricalName', land['fields'].get('EnglishName', land_id)) 
-                                            for land in lands if land['id'] == land_id), land_id)
-                            if land_name not in lands_data:
-                                lands_data[land_name] = {"buildings": [], "total": 0}
-                            lands_data[land_name]["buildings"].append(building)
-                            lands_data[land_name]["total"] += building.get("net_amount", 0)
-                    
-                    # Create a notification for each land
-                    for land_name, data in lands_data.items():
-                        create_land_owner_summary(tables, land_owner, land_name, data["buildings"], data["total"])
+                # One notification per land for the land owners
+                for land_owner, lands_data in lease_summary["land_owner_buildings"].items():
+                    for land_name, buildings_data in lands_data:
+                        total = sum(building.get("net_amount", 0) for building in buildings_data)
+                        notifications.append(land_owner_summary_fields(land_owner, land_name, buildings_data, total))
                 
-                # Create notifications for building owners
+                # Notifications for building owners
                 for building_owner, lands_data in lease_summary["building_owner_lands"].items():
                     total_paid = -lease_summary["by_building_owner"].get(building_owner, 0)
                     total_tax = lease_summary["by_building_owner_tax"].get(building_owner, 0)
-                    create_building_owner_summary(tables, building_owner, lands_data, total_paid - total_tax, total_tax)
+                    notifications.append(building_owner_summary_fields(building_owner, lands_data, total_paid - total_tax, total_tax))
                 
-                # Create admin summary notification
-                create_admin_summary(tables, lease_summary)
+                # Admin summary notification
+                notifications.append(admin_summary_fields(lease_summary))
+                create_notifications(tables, notifications)
                 
                 # Send Telegram notification
                 if lease_summary["successful"] > 0:
@@ -22,8 +22,6 @@ import datetime
 import json
 import traceback # Ajout de l'import pour traceback
 from typing import Dict, List, Optional, Any
-import math # Pour math.inf
-import requests # Ajout de l'import pour requests
 from pyairtable import Api, Table
 from dotenv import load_dotenv
 
@@ -34,6 +32,7 @@ if PROJECT_ROOT not in sys.path:
 
 # Ajout des imports nécessaires pour le calcul de distance et l'échappement
 from backend.engine.utils.activity_helpers import calculate_haversine_distance_meters, _get_building_position_coords, _escape_airtable_value, LogColors, log_header
+from backend.engine.utils.definitions_cache import get_building_type_definitions
 
 # Set up logging
 logging.basicConfig(
@@ -60,42 +59,20 @@ BUILDING_PREFERENCES = {
 # --- Fonctions utilitaires pour les types et tiers de bâtiments (adaptées de citizenhousingmobility.py) ---
 
 def get_building_types_from_api() -> Dict:
-    """Get information about different building types from the API."""
-    try:
-        url = f"{API_BASE_URL}/api/building-types"
-        log.info(f"Fetching building types from API: {url}")
-        response = requests.get(url, timeout=10) # Ajout d'un timeout
-        response.raise_for_status() # Lèvera une exception pour les codes d'erreur HTTP
-        
-        response_data = response.json()
-        if response_data.get("success") and "buildingTypes" in response_data:
-            building_types = response_data["buildingTypes"]
-            log.info(f"Successfully fetched {len(building_types)} building types from API")
-            transformed_types = {}
-            for building in building_types:
-                if "type" in building and "name" in building: # Assurer que les champs clés existent
-                    building_type_key = building["type"]
-                    transformed_types[building_type_key] = {
-                        "type": building_type_key,
-                        "name": building["name"],
-                        "consumeTier": building.get("consumeTier"),
-                        "buildTier": building.get("buildTier"),
-                        "tier": building.get("tier"),
-                        # Conserver d'autres champs si nécessaire
-                    }
-            return transformed_types
-        else:
-            log.warning(f"Unexpected API response format for building types: {response_data}")
-            return {}
-    except requests.exceptions.RequestException as e: # Gérer les erreurs réseau/HTTP
-        log.error(f"Error fetching building types from API: {e}")
-        return {}
-    except json.JSONDecodeError as e: # Gérer les erreurs de parsing JSON
-        log.error(f"Error parsing JSON from building types API response: {e}")
-        return {}
-    except Exception as e: # Gérer les autres exceptions
-        log.error(f"An unexpected error occurred while fetching building types: {e}")
-        return {}
+    """Get information about different building types (shared definitions cache, API fallback to data/)."""
+    building_types = get_building_type_definitions(API_BASE_URL)
+    transformed_types = {}
+    for building_type_key, building in building_types.items():
+        if "name" in building:
+            transformed_types[building_type_key] = {
+                "type": building_type_key,
+                "name": building["name"],
+                "consumeTier": building.get("consumeTier"),
+                "buildTier": building.get("buildTier"),
+                "tier": building.get("tier"),
+            }
+    log.info(f"Loaded {len(transformed_types)} building types")
+    return transformed_types
 
 def get_allowed_building_tiers(social_class: str) -> List[int]:
     """Determine which building tiers a citizen can occupy based on their social class."""
@@ -21,7 +21,6 @@ import json
 import subprocess
 import datetime
 import time
-import requests
 from typing import Dict, List, Optional, Any
 from pyairtable import Api, Table
 from dotenv import load_dotenv
@@ -38,6 +37,7 @@ if _PROJECT_ROOT not in sys.path:
 
 # Import our citizen generator module
 from backend.scripts.generateCitizen import generate_citizen
+from backend.engine.utils.geodata import get_geodata
 
 # Set up logging
 logging.basicConfig(
@@ -90,32 +90,14 @@ def initialize_airtable():
         sys.exit(1)
 
 def get_polygon_centers():
-    """Fetch polygon centers from the API to use as positions for new citizens."""
-    try:
-        # Fetch polygon data from the API
-        response = requests.get('http://localhost:3000/api/get-polygons')
-        if response.status_code != 200:
-            log.error(f"Failed to fetch polygons: HTTP {response.status_code}")
-            return []
-        
-        data = response.json()
-        if not data.get('polygons'):
-            log.error("No polygons found in API response")
-            return []
-        
-        # Extract all polygon centers
-        centers = []
-        for polygon in data['polygons']:
-            if polygon.get('center'):
-                centers.append(polygon['center'])
-            elif polygon.get('centroid'):
-                centers.append(polygon['centroid'])
-        
-        log.info(f"Found {len(centers)} polygon centers for citizen positions")
-        return centers
-    except Exception as e:
-        log.error(f"Error fetching polygon centers: {e}")
+    """Polygon centers (from data/polygons, see utils/geodata.py) to use as positions for new citizens."""
+    geodata = get_geodata()
+    if geodata is None:
+        log.error("No polygon data found under data/polygons")
         return []
+    centers = geodata.polygon_centers()
+    log.info(f"Found {len(centers)} polygon centers for citizen positions")
+    return centers
 
 def get_vacant_housing_buildings(tables) -> List[Dict]:
     """Fetch vacant housing buildings from Airtable."""
@@ -14,7 +14,8 @@ from backend.engine.utils.activity_helpers import (
     _escape_airtable_value,
     _get_building_position_coords,
     _calculate_distance_meters,
-    get_path_between_points, # Corrected import name
+    get_paths_from_point,
+    get_paths_to_point,
     _has_recent_failed_activity_for_contract, # Assuming this might be used or adapted
     VENICE_TIMEZONE # Added import for VENICE_TIMEZONE
 )
@@ -136,6 +137,9 @@ def process_final_deliveries_from_galley(
             if not resources_for_delivery_by_contract:
                 continue
 
+            # (contract, resources, buyer building, buyer position) per deliverable batch; paths to all
+            # buyer buildings are then computed at once
+            deliveries = []
             for original_contract_id, resources_list in resources_for_delivery_by_contract.items():
                 if not resources_list: continue
 
@@ -156,7 +160,10 @@ def process_final_deliveries_from_galley(
                     log.warning(f"{LogColors.WARNING}BuyerBuilding {buyer_building_custom_id} has no position. Skipping delivery for {citizen_username}.{LogColors.ENDC}")
                     continue
 
-                path_to_buyer = get_path_between_points(citizen_current_pos, buyer_building_pos, transport_api_url)
+                deliveries.append((original_contract_id, resources_list, buyer_building_custom_id, buyer_building_pos))
+
+            paths_to_buyers = get_paths_from_point(citizen_current_pos, [delivery[3] for delivery in deliveries], transport_api_url)
+            for (original_contract_id, resources_list, buyer_building_custom_id, _), path_to_buyer in zip(deliveries, paths_to_buyers):
                 if path_to_buyer and path_to_buyer.get('success'):
                     notes_for_activity = f"🚢 Delivering resources from galley {current_galley_custom_id} to {buyer_building_custom_id} for contract {original_contract_id}."
                     transport_mode_from_path = path_to_buyer.get('transporter', 'citizen_carry') # Default if not specified by path
@@ -249,6 +256,9 @@ def process_galley_unloading_activities(
             
             log.info(f"{LogColors.OKBLUE}Processing galley {galley_custom_id} with {len(pending_import_contracts)} pending import contracts.{LogColors.ENDC}")
 
+            # (contract, citizen, citizen position) for every contract part assigned to an idle Occupant;
+            # paths to the galley are then computed for all of them at once
+            galley_tasks = []
             for contract_to_fetch in pending_import_contracts:
                 if not idle_citizens: 
                     log.info(f"{LogColors.OKBLUE}No more idle citizens for items in galley {galley_custom_id}.{LogColors.ENDC}")
@@ -362,7 +372,20 @@ def process_galley_unloading_activities(
                     idle_citizens.append(citizen_for_task) 
                     continue
 
-                path_to_galley = get_path_between_points(citizen_current_pos, galley_position, transport_api_url) 
+                galley_tasks.append((contract_to_fetch, citizen_for_task, citizen_current_pos))
+
+            if not galley_tasks:
+                continue
+
+            paths_to_galley = get_paths_to_point([task[2] for task in galley_tasks], galley_position, transport_api_url)
+            for (contract_to_fetch, citizen_for_task, _), path_to_galley in zip(galley_tasks, paths_to_galley):
+                original_contract_id = contract_to_fetch['fields'].get('ContractId')
+                resource_type = contract_to_fetch['fields'].get('ResourceType')
+                amount = float(contract_to_fetch['fields'].get('TargetAmount', 0))
+                citizen_custom_id = citizen_for_task['fields'].get('CitizenId')
+                citizen_username = citizen_for_task['fields'].get('Username', citizen_custom_id)
+                citizen_airtable_id = citizen_for_task['id']
+
                 if path_to_galley and path_to_galley.get('success'):
                     activity_created = try_create_fetch_from_galley_activity(
                         tables,
@@ -40,7 +40,8 @@ API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:3000") # Unused in th
 from backend.engine.utils.activity_helpers import VENICE_TIMEZONE # Import VENICE_TIMEZONE
 PAYMENT_INTERVAL_HOURS = 23 # Process contracts not paid in the last 23 hours
 
-from backend.engine.utils.activity_helpers import LogColors, log_header, _escape_airtable_value # Import log_header
+from backend.engine.utils.activity_helpers import LogColors, log_header # Import log_header
+from backend.engine.utils.ledger import Ledger
 from backend.engine.utils.relationship_helpers import update_trust_score_for_activity, TRUST_SCORE_SUCCESS_MEDIUM, TRUST_SCORE_FAILURE_MEDIUM # Import relationship helper
 
 # --- Helper Functions ---
@@ -84,39 +85,7 @@ def initialize_airtable() -> Optional[Dict[str, Table]]:
 
 # _escape_airtable_value is now imported
 
-def get_citizen_record_by_username(tables: Dict[str, Table], username: str) -> Optional[Dict]:
-    """Fetches a citizen record by their username."""
-    try:
-        formula = f"{{Username}} = '{_escape_airtable_value(username)}'"
-        records = tables["citizens"].all(formula=formula, max_records=1)
-        if records:
-            return records[0]
-        log.warning(f"{LogColors.WARNING}Citizen with username '{username}' not found.{LogColors.ENDC}")
-        return None
-    except Exception as e:
-        log.error(f"{LogColors.FAIL}Error fetching citizen '{username}': {e}{LogColors.ENDC}")
-        return None
-
-def update_citizen_ducats(tables: Dict[str, Table], citizen_id: str, amount_change: float, operation_log: str) -> bool:
-    """Updates a citizen's Ducats balance."""
-    try:
-        citizen_record = tables["citizens"].get(citizen_id)
-        if not citizen_record:
-            log.error(f"{LogColors.FAIL}Citizen record {citizen_id} not found for ducat update.{LogColors.ENDC}")
-            return False
-        
-        current_ducats = float(citizen_record['fields'].get('Ducats', 0.0))
-        new_ducats = current_ducats + amount_change
-        
-        tables["citizens"].update(citizen_id, {'Ducats': new_ducats})
-        log.info(f"{LogColors.OKGREEN}Ducats for citizen {citizen_record['fields'].get('Username', citizen_id)} ({operation_log}): {current_ducats:.2f} -> {new_ducats:.2f} (Change: {amount_change:.2f}){LogColors.ENDC}")
-        return True
-    except Exception as e:
-        log.error(f"{LogColors.FAIL}Error updating ducats for citizen {citizen_id}: {e}{LogColors.ENDC}")
-        return False
-
-def create_transaction_record(
-    tables: Dict[str, Table],
+def storage_transaction_fields(
     transaction_type: str,
     asset_id: str, # ContractId for storage payments
     asset_type: str, # "contract_storage_fee"
@@ -124,26 +93,19 @@ def create_transaction_record(
     buyer_username: str,
     price: float,
     notes_dict: Dict
-) -> bool:
-    """Creates a transaction record."""
-    try:
-        payload = {
-            "Type": transaction_type,
-            "Asset": asset_id,
-            "AssetType": asset_type,
-            "Seller": seller_username,
-            "Buyer": buyer_username,
-            "Price": price,
-            "Notes": json.dumps(notes_dict),
-            "CreatedAt": datetime.now(VENICE_TIMEZONE).isoformat(),
-            "ExecutedAt": datetime.now(VENICE_TIMEZONE).isoformat()
-        }
-        tables["transactions"].create(payload)
-        log.info(f"{LogColors.OKGREEN}Created transaction: {transaction_type} for {asset_id}, Amount: {price:.2f}, Buyer: {buyer_username}, Seller: {seller_username}.{LogColors.ENDC}")
-        return True
-    except Exception as e:
-        log.error(f"{LogColors.FAIL}Error creating transaction for {asset_id}: {e}{LogColors.ENDC}")
-        return False
+) -> Dict[str, Any]:
+    """Fields of a TRANSACTIONS record."""
+    return {
+        "Type": transaction_type,
+        "Asset": asset_id,
+        "AssetType": asset_type,
+        "Seller": seller_username,
+        "Buyer": buyer_username,
+        "Price": price,
+        "Notes": json.dumps(notes_dict),
+        "CreatedAt": datetime.now(VENICE_TIMEZONE).isoformat(),
+        "ExecutedAt": datetime.now(VENICE_TIMEZONE).isoformat()
+    }
 
 def create_notification(tables: Dict[str, Table], citizen_username: str, title: str, content: str, details: Optional[Dict] = None) -> bool:
     """Creates a notification for a citizen."""
@@ -190,6 +152,8 @@ def process_storage_payments(dry_run: bool = False):
 
     payments_processed = 0
     payments_failed_insufficient_funds = 0
+    ledger = Ledger(tables, dry_run=dry_run).load()
+    contract_updates: List[Dict] = []
 
     for contract_record in contracts_to_process:
         contract_airtable_id = contract_record['id']
@@ -215,16 +179,12 @@ def process_storage_payments(dry_run: bool = False):
 
         log.info(f"  Daily payment for {contract_custom_id}: {target_amount:.2f} units * {price_per_resource_daily:.2f} Ducats/unit = {daily_payment_amount:.2f} Ducats.")
 
-        buyer_citizen_record = get_citizen_record_by_username(tables, buyer_username)
-        seller_citizen_record = get_citizen_record_by_username(tables, seller_username)
-
-        if not buyer_citizen_record or not seller_citizen_record:
+        if not ledger.citizen(buyer_username) or not ledger.citizen(seller_username):
             log.warning(f"  Buyer ({buyer_username}) or Seller ({seller_username}) not found for contract {contract_custom_id}. Skipping.")
             continue
         
-        buyer_airtable_id = buyer_citizen_record['id']
-        seller_airtable_id = seller_citizen_record['id']
-        buyer_current_ducats = float(buyer_citizen_record['fields'].get('Ducats', 0.0))
+        # Running balance, after the payments already recorded this run
+        buyer_current_ducats = ledger.balance(buyer_username)
 
         if buyer_current_ducats < daily_payment_amount:
             log.warning(f"  {LogColors.WARNING}Buyer {buyer_username} (Balance: {buyer_current_ducats:.2f}) has insufficient funds for payment of {daily_payment_amount:.2f} for contract {contract_custom_id}.{LogColors.ENDC}")
@@ -242,54 +202,46 @@ def process_storage_payments(dry_run: bool = False):
                 create_notification(tables, seller_username, title_seller, content_seller, {"contractId": contract_custom_id, "amountDue": daily_payment_amount, "buyer": buyer_username})
             
             # Trust impact: Buyer failed to pay Seller for storage
-            if buyer_username and seller_username:
+            if not dry_run and buyer_username and seller_username:
                 update_trust_score_for_activity(tables, buyer_username, seller_username, TRUST_SCORE_FAILURE_MEDIUM, "storage_payment", False, "buyer_insufficient_funds")
             # Do not update LastExecutedAt, so it will be retried.
             continue 
 
+        transaction_notes = {
+            "contract_id": contract_custom_id,
+            "resource_type": resource_type,
+            "rented_capacity": target_amount,
+            "daily_price_per_unit": price_per_resource_daily,
+            "payment_type": "daily_storage_fee"
+        }
+        transaction = storage_transaction_fields("storage_fee_payment", contract_custom_id, "contract_storage_fee", seller_username, buyer_username, daily_payment_amount, transaction_notes)
+        # Balances and the transaction record are written by ledger.commit(), which then applies
+        # the trust impact of the successful storage payment
+        if not ledger.transfer(buyer_username, seller_username, daily_payment_amount, transaction=transaction,
+                               on_commit=lambda buyer=buyer_username, seller=seller_username: update_trust_score_for_activity(
+                                   tables, buyer, seller, TRUST_SCORE_SUCCESS_MEDIUM, "storage_payment", True)):
+            log.error(f"  {LogColors.FAIL}Could not record the payment for contract {contract_custom_id}.{LogColors.ENDC}")
+            continue
+        contract_updates.append({'id': contract_airtable_id, 'fields': {"LastExecutedAt": datetime.now(VENICE_TIMEZONE).isoformat()}})
+        payments_processed += 1
+
         if dry_run:
             log.info(f"  [DRY RUN] Would transfer {daily_payment_amount:.2f} Ducats from {buyer_username} to {seller_username} for contract {contract_custom_id}.")
             log.info(f"  [DRY RUN] Would create transaction record for this payment.")
             log.info(f"  [DRY RUN] Would update LastExecutedAt for contract {contract_custom_id} to {datetime.now(VENICE_TIMEZONE).isoformat()}.")
-            payments_processed += 1
-            continue
 
-        # Perform actual transfers and updates
-        payment_successful = True
-        if not update_citizen_ducats(tables, buyer_airtable_id, -daily_payment_amount, f"Storage fee paid for {contract_custom_id}"):
-            payment_successful = False
-        if payment_successful and not update_citizen_ducats(tables, seller_airtable_id, daily_payment_amount, f"Storage fee received for {contract_custom_id}"):
-            # Attempt to revert buyer's payment if seller update fails
-            update_citizen_ducats(tables, buyer_airtable_id, daily_payment_amount, f"Reversal: Storage fee for {contract_custom_id} (seller update failed)")
-            payment_successful = False
-        
-        if payment_successful:
-            transaction_notes = {
-                "contract_id": contract_custom_id,
-                "resource_type": resource_type,
-                "rented_capacity": target_amount,
-                "daily_price_per_unit": price_per_resource_daily,
-                "payment_type": "daily_storage_fee"
-            }
-            create_transaction_record(tables, "storage_fee_payment", contract_custom_id, "contract_storage_fee", seller_username, buyer_username, daily_payment_amount, transaction_notes)
-            
+    if not ledger.commit()['ok']:
+        # LastExecutedAt is left unchanged so the payments are retried
+        log.error(f"{LogColors.FAIL}Storage payments were not fully written; not updating LastExecutedAt of {len(contract_updates)} contracts.{LogColors.ENDC}")
+        return
+    if not dry_run:
+        for i in range(0, len(contract_updates), 10):
+            chunk = contract_updates[i:i + 10]
             try:
-                tables["contracts"].update(contract_airtable_id, {"LastExecutedAt": datetime.now(VENICE_TIMEZONE).isoformat()})
-                log.info(f"  Updated LastExecutedAt for contract {contract_custom_id}.")
-                payments_processed += 1
-                # Trust impact: Successful storage payment
-                if buyer_username and seller_username:
-                    update_trust_score_for_activity(tables, buyer_username, seller_username, TRUST_SCORE_SUCCESS_MEDIUM, "storage_payment", True)
+                tables["contracts"].batch_update(chunk)
+                log.info(f"  Updated LastExecutedAt for {len(chunk)} contracts.")
             except Exception as e_update_contract:
-                log.error(f"  {LogColors.FAIL}Error updating LastExecutedAt for contract {contract_custom_id}: {e_update_contract}. Payment was made but contract may be re-processed.{LogColors.ENDC}")
-                # This is a partial failure state. Ducats transferred, transaction logged, but contract might be paid again.
-        else:
-            log.error(f"  {LogColors.FAIL}Ducat transfer failed for contract {contract_custom_id}. No transaction or LastExecutedAt update.{LogColors.ENDC}")
-            # Trust impact: Ducat transfer failure (system error, not insufficient funds which is handled above)
-            if buyer_username and seller_username:
-                update_trust_score_for_activity(tables, buyer_username, seller_username, TRUST_SCORE_FAILURE_MEDIUM, "storage_payment_processing", False, "system_error")
-            # No specific count for this, as it's a failure within the attempt.
-            # The insufficient funds counter is for pre-check failures.
+                log.error(f"  {LogColors.FAIL}Error updating LastExecutedAt for contracts {[u['id'] for u in chunk]}: {e_update_contract}. Payments were made but these contracts may be re-processed.{LogColors.ENDC}")
 
     log.info(f"{LogColors.OKGREEN}Storage Contract Payment processing finished.{LogColors.ENDC}")
     log.info(f"Total payments processed (or simulated): {payments_processed}")
@@ -49,8 +49,27 @@ Processors should focus on:
 3. NOT creating new activities (this is the responsibility of activity creators)
 """
 
+import time
+SCRIPT_STARTED_AT = time.perf_counter() # Reference point for --profile-startup
+
 import os
 import sys
+import importlib.util
+
+# With --profile-startup, time every import from here on (see utils/startup_profiler.py).
+# The profiler is loaded from its file: importing it through backend.engine.utils would run
+# utils/__init__.py, which imports most of the engine before the profiler is installed.
+_PROFILER_MODULE = "backend.engine.utils.startup_profiler"
+if _PROFILER_MODULE in sys.modules: # In-process run from the scheduler
+    startup_profiler = sys.modules[_PROFILER_MODULE]
+else:
+    _profiler_spec = importlib.util.spec_from_file_location(
+        _PROFILER_MODULE, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils', 'startup_profiler.py'))
+    startup_profiler = importlib.util.module_from_spec(_profiler_spec)
+    sys.modules[_PROFILER_MODULE] = startup_profiler
+    _profiler_spec.loader.exec_module(startup_profiler)
+startup_profiler.install_if_requested(started_at=SCRIPT_STARTED_AT)
+
 import json
 import logging
 import argparse
@@ -100,6 +119,11 @@ from backend.engine.utils.activity_helpers import (
     _get_building_position_coords, # Added import
     get_path_between_points # Added import
 )
+from backend.engine.utils.world_snapshot import WorldSnapshot
+from backend.engine.utils.write_buffer import MutationBuffer, FlushError
+from backend.engine.utils.ducat_service import get_ducat_service
+from backend.engine.utils.adaptive_pool import AIMDController, AdaptiveWorkerPool, instrument_tables
+from backend.engine.utils.sqlite_storage import is_local_storage_enabled, initialize_local_tables
 
 # Set up logging
 logging.basicConfig(
@@ -108,7 +132,19 @@ logging.basicConfig(
 )
 log = logging.getLogger("process_activities")
 
+# Import helper functions from activity_helpers
+from backend.engine.utils.activity_helpers import (
+    get_building_types_from_api as get_building_type_definitions_from_api,
+    get_resource_types_from_api as get_resource_definitions_from_api
+)
+# Activity type -> processor, shared by all citizen threads (see activity_processors/registry.py)
+from backend.engine.activity_processors.registry import ACTIVITY_PROCESSORS
+from backend.engine.utils.path_cache import log_path_cache_stats
+from backend.engine.utils.path_codec import dump_path, load_path
+from backend.engine.utils.gondola_fees import GondolaFeeSettlement, gondola_travel_details
+
 # Placeholder for activities that are processed by expiring or simple state change
+@ACTIVITY_PROCESSORS.register("idle", "secure_warehouse")
 def process_placeholder_activity_fn(tables, activity_record, building_type_defs, resource_defs, api_base_url: Optional[str] = None): # Added api_base_url
     activity_guid = activity_record['fields'].get('ActivityId', activity_record['id'])
     activity_type = activity_record['fields'].get('Type')
@@ -116,84 +152,10 @@ def process_placeholder_activity_fn(tables, activity_record, building_type_defs,
     # Processors should only handle the current activity, not create follow-up activities
     return True
 
-# Import helper functions from activity_helpers
-from backend.engine.utils.activity_helpers import (
-    get_building_types_from_api as get_building_type_definitions_from_api,
-    get_resource_types_from_api as get_resource_definitions_from_api
-)
-# Import processors
-from backend.engine.activity_processors import (
-    process_deliver_resource_batch as process_deliver_resource_batch_fn,
-        process_goto_home as process_goto_home_fn,
-        process_goto_work as process_goto_work_fn,
-        process_production as process_production_fn,
-        process_fetch_resource as process_fetch_resource_fn,
-        process_eat as process_eat_fn,
-        process_pickup_from_galley, # Import new processor
-        process_deliver_resource_to_buyer, # Import new processor
-        process_leave_venice as process_leave_venice_fn,
-        process_deliver_construction_materials as process_deliver_construction_materials_fn,
-        process_construct_building as process_construct_building_fn,
-        process_goto_construction_site as process_goto_construction_site_fn,
-        # Import new processors
-        process_deliver_to_storage as process_deliver_to_storage_fn,
-        process_fetch_from_storage as process_fetch_from_storage_fn,
-        process_goto_building_for_storage_fetch as process_goto_building_for_storage_fetch_fn,
-        process_fetch_for_logistics_client as process_fetch_for_logistics_client_fn, # Already present
-        process_check_business_status as process_check_business_status_fn,
-        process_fishing_activity as process_fishing_activity_fn, # Import new processor
-        process_goto_location_fn, # Import goto_location processor
-        process_manage_guild_membership as process_manage_guild_membership_fn, # Import guild membership processor
-        # Import new building bid processors
-        process_inspect_building_for_purchase_fn,
-        process_submit_building_purchase_offer_fn,
-        process_execute_respond_to_building_bid_fn, 
-        process_execute_withdraw_building_bid_fn, 
-        process_finalize_manage_markup_buy_contract_fn, 
-        process_finalize_manage_storage_query_contract_fn,
-        process_finalize_update_citizen_profile_fn, # New, imported from __init__
-        process_manage_public_dock as process_manage_public_dock_fn, # Import new processor
-        process_work_on_art_fn, # Import new Artisti processor
-        process_read_book_fn, # Import new read_book processor
-        process_goto_inn as process_goto_inn_fn, # Import new goto_inn processor
-        process_deposit_items_at_location, # Import new processor
-        process_attend_theater_performance as process_attend_theater_performance_fn, # New theater processor
-        process_drink_at_inn as process_drink_at_inn_fn, # New drink at inn processor
-        process_use_public_bath as process_use_public_bath_fn, # New public bath processor
-        process_rest as process_rest_fn, # New rest processor
-        process_occupant_self_construction_fn, # New occupant self-construction processor
-        process_spread_rumor_fn, # Import spread_rumor processor
-        process_pray # Import pray processor
-)
-from backend.engine.activity_processors.manage_public_import_contract_processor import process_manage_public_import_contract_fn
-from backend.engine.activity_processors.bid_on_land_activity_processor import process_bid_on_land_fn
-from backend.engine.activity_processors.manage_public_sell_contract_processor import process_manage_public_sell_contract_fn
-from backend.engine.activity_processors.manage_import_contract_processor import process_manage_import_contract_fn
-from backend.engine.activity_processors.manage_logistics_service_contract_processor import process_manage_logistics_service_contract_fn
-from backend.engine.activity_processors.buy_available_land_processor import process_buy_available_land_fn
-from backend.engine.activity_processors.initiate_building_project_processor import process_initiate_building_project_fn
-from backend.engine.activity_processors.adjust_land_lease_price_processor import process_adjust_land_lease_price_fn
-from backend.engine.activity_processors.adjust_building_rent_price_processor import process_adjust_building_rent_price_fn
-from backend.engine.activity_processors.adjust_building_lease_price_processor import process_file_building_lease_adjustment_fn # New
-from backend.engine.activity_processors.adjust_business_wages_processor import process_adjust_business_wages_fn
-from backend.engine.activity_processors.change_business_manager_processor import process_change_business_manager_fn
-from backend.engine.activity_processors.request_loan_processor import process_request_loan_fn
-from backend.engine.activity_processors.offer_loan_processor import process_offer_loan_fn
-from backend.engine.activity_processors.send_message_processor import process_send_message_fn
-from backend.engine.activity_processors.reply_to_message_processor import process_reply_to_message_fn
-
-# Import new land management processors (these files will need to be created)
-from backend.engine.activity_processors.list_land_for_sale_processor import process_list_land_for_sale_fn
-from backend.engine.activity_processors.make_offer_for_land_processor import process_make_offer_for_land_fn
-from backend.engine.activity_processors.accept_land_offer_processor import process_accept_land_offer_fn
-from backend.engine.activity_processors.buy_listed_land_processor import process_buy_listed_land_fn
-from backend.engine.activity_processors.cancel_land_listing_processor import process_cancel_land_listing_fn
-from backend.engine.activity_processors.cancel_land_offer_processor import process_cancel_land_offer_fn
-from backend.engine.activity_processors.manage_public_storage_contract_processor import process_register_public_storage_offer_fn
-# Import du processeur spread_rumor est maintenant géré via ACTIVITY_PROCESSORS dans __init__.py
 
 # Load environment variables
 load_dotenv(os.path.join(PROJECT_ROOT, '.env'))
+startup_profiler.mark('imports_done')
 
 # --- Temporary Debug Prints for Telegram Env Vars ---
 TELEGRAM_BOT_TOKEN_DEBUG = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -205,9 +167,33 @@ log.info(f"[DEBUG TELEGRAM] TELEGRAM_CHAT_ID: {'Loaded' if TELEGRAM_CHAT_ID_DEBU
 # --- End Temporary Debug Prints ---
 
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:3000")
+WORKER_THREAD_NAME_PREFIX = "process-activities" # Worker thread names; the scheduler's task runner collects their logs by it
+
+# Keys used by the engine -> Airtable table names
+AIRTABLE_TABLE_NAMES = {
+    'activities': 'ACTIVITIES',
+    'resources': 'RESOURCES',
+    'citizens': 'CITIZENS',
+    'buildings': 'BUILDINGS',
+    'contracts': 'CONTRACTS',
+    'transactions': 'TRANSACTIONS',
+    'problems': 'PROBLEMS',
+    'relationships': 'RELATIONSHIPS',
+    'lands': 'LANDS',
+    'notifications': 'NOTIFICATIONS',
+    'stratagems': 'STRATAGEMS',
+    'messages': 'MESSAGES',
+    'processes': 'PROCESSES'
+}
+
+# Tables (and their HTTP session) kept across runs when the scheduler runs this script in-process
+_airtable_tables_cache: Dict[Any, Dict[str, Table]] = {}
 
 def initialize_airtable() -> Optional[Dict[str, Table]]:
-    """Initialize Airtable connection."""
+    """Initialize Airtable connection (or the local SQLite backend when SERENISSIMA_STORAGE_BACKEND=sqlite)."""
+    if is_local_storage_enabled():
+        return initialize_local_tables(AIRTABLE_TABLE_NAMES)
+
     api_key = os.environ.get('AIRTABLE_API_KEY')
     base_id = os.environ.get('AIRTABLE_BASE_ID')
 
@@ -223,6 +209,10 @@ def initialize_airtable() -> Optional[Dict[str, Table]]:
         log.error(f"{LogColors.FAIL}Airtable Base ID not configured.{LogColors.ENDC}")
         return None
     
+    cached_tables = _airtable_tables_cache.get((api_key, base_id))
+    if cached_tables is not None:
+        return cached_tables
+
     try:
         custom_session = requests.Session() 
         custom_session.trust_env = False    
@@ -242,21 +232,7 @@ def initialize_airtable() -> Optional[Dict[str, Table]]:
         api.session = custom_session # Assign custom session after instantiation
 
         # Construct Table instances using api.table()
-        tables = {
-            'activities': api.table(base_id, 'ACTIVITIES'),
-            'resources': api.table(base_id, 'RESOURCES'),
-            'citizens': api.table(base_id, 'CITIZENS'),
-            'buildings': api.table(base_id, 'BUILDINGS'),
-            'contracts': api.table(base_id, 'CONTRACTS'),
-            'transactions': api.table(base_id, 'TRANSACTIONS'),
-            'problems': api.table(base_id, 'PROBLEMS'),
-            'relationships': api.table(base_id, 'RELATIONSHIPS'),
-            'lands': api.table(base_id, 'LANDS'),
-            'notifications': api.table(base_id, 'NOTIFICATIONS'),
-            'stratagems': api.table(base_id, 'STRATAGEMS'),
-            'messages': api.table(base_id, 'MESSAGES'),
-            'processes': api.table(base_id, 'PROCESSES')
-        }
+        tables = {table_key: api.table(base_id, table_name) for table_key, table_name in AIRTABLE_TABLE_NAMES.items()}
 
         # Test connection with one primary table (e.g., citizens)
         log.info(f"{LogColors.OKBLUE}Testing Airtable connection by fetching one record from CITIZENS table...{LogColors.ENDC}")
@@ -264,7 +240,8 @@ def initialize_airtable() -> Optional[Dict[str, Table]]:
             # Ensure api_key is not None before attempting the call
             if not api_key:
                  raise ValueError("API key is None, cannot test connection.")
-            tables['citizens'].all(max_records=1) # Test CITIZENS table
+            with startup_profiler.phase('connection_test'):
+                tables['citizens'].all(max_records=1) # Test CITIZENS table
             log.info(f"{LogColors.OKGREEN}Airtable connection successful (tested CITIZENS).{LogColors.ENDC}")
             # Optionally, test LANDS table if critical for this script's core function
             # tables['LANDS'].all(max_records=1) 
@@ -273,6 +250,7 @@ def initialize_airtable() -> Optional[Dict[str, Table]]:
             log.error(f"{LogColors.FAIL}Airtable connection test failed: {conn_e}{LogColors.ENDC}")
             raise conn_e # Re-raise to be caught by the outer try-except
         
+        _airtable_tables_cache[(api_key, base_id)] = tables
         return tables
     except Exception as e:
         log.error(f"{LogColors.FAIL}Failed to initialize Airtable or connection test failed: {e}{LogColors.ENDC}")
@@ -338,37 +316,12 @@ def calculate_gondola_travel_details(path_json_string: Optional[str]) -> tuple[f
         return 0.0, 0.0
 
     try:
-        path_points = json.loads(path_json_string)
-    except json.JSONDecodeError:
-        log.error(f"{LogColors.FAIL}Failed to parse path JSON: {path_json_string}{LogColors.ENDC}")
-        return 0.0, 0.0
-
-    if not isinstance(path_points, list) or len(path_points) < 2:
+        path_points = load_path(path_json_string)
+    except ValueError:
+        log.error(f"{LogColors.FAIL}Failed to parse path: {path_json_string}{LogColors.ENDC}")
         return 0.0, 0.0
 
-    total_gondola_distance_km = 0.0
-    for i in range(len(path_points) - 1):
-        p1 = path_points[i]
-        p2 = path_points[i+1]
-
-        if isinstance(p1, dict) and p1.get("transportMode") == "gondola":
-            try:
-                lat1, lon1 = float(p1.get("lat", 0.0)), float(p1.get("lng", 0.0))
-                lat2, lon2 = float(p2.get("lat", 0.0)), float(p2.get("lng", 0.0))
-                if lat1 != 0.0 or lon1 != 0.0 or lat2 != 0.0 or lon2 != 0.0: # Avoid calculating for zero coords
-                    # Use the helper function, note it returns meters, convert to km
-                    segment_distance_meters = calculate_haversine_distance_meters(lat1, lon1, lat2, lon2)
-                    total_gondola_distance_km += segment_distance_meters / 1000.0
-            except (TypeError, ValueError) as e:
-                log.warning(f"{LogColors.WARNING}Could not parse coordinates for path segment: {p1} to {p2}. Error: {e}{LogColors.ENDC}")
-                continue
-    
-    fee = 0.0
-    if total_gondola_distance_km > 0:
-        fee = 10 + (5 * total_gondola_distance_km)
-        log.info(f"{LogColors.OKBLUE}Calculated gondola travel: Distance={total_gondola_distance_km:.2f} km, Fee={fee:.2f} Ducats.{LogColors.ENDC}")
-    
-    return total_gondola_distance_km, fee
+    return gondola_travel_details(path_points)
 
 def process_building_arrivals(tables: Dict[str, Table], dry_run: bool = False, forced_utc_datetime_override: Optional[datetime] = None):
     """Checks for buildings (e.g., merchant galleys) that have 'arrived'."""
@@ -449,7 +402,7 @@ def mark_started_activities_as_in_progress(
         log.error(f"{LogColors.FAIL}Error marking started activities as 'in_progress': {e}{LogColors.ENDC}")
 
 
-def main(dry_run: bool = False, target_citizen_username: Optional[str] = None, forced_venice_hour_override: Optional[int] = None, specific_activity_id: Optional[str] = None):
+def main(dry_run: bool = False, target_citizen_username: Optional[str] = None, forced_venice_hour_override: Optional[int] = None, specific_activity_id: Optional[str] = None, kinos_model_override: Optional[str] = None):
     header_message = "Process Activities Script"
     if specific_activity_id:
         header_message += f" for specific ActivityId '{specific_activity_id}'"
@@ -462,6 +415,7 @@ def main(dry_run: bool = False, target_citizen_username: Optional[str] = None, f
     counter_lock = threading.Lock()
     global_processed_count = 0
     global_failed_count = 0
+    ACTIVITY_PROCESSORS.reset_timings() # Per-type latency stats cover this run only
 
     forced_utc_datetime_for_check: Optional[datetime] = None
     if forced_venice_hour_override is not None:
@@ -475,88 +429,9 @@ def main(dry_run: bool = False, target_citizen_username: Optional[str] = None, f
         log.info(f"{LogColors.OKBLUE}Using current real UTC time for checks: {forced_utc_datetime_for_check.isoformat()}.{LogColors.ENDC}")
 
 
-    # Define a dictionary to map activity types to their processor functions
-    ACTIVITY_PROCESSORS = {
-        "deliver_resource_batch": process_deliver_resource_batch_fn,
-        "goto_home": process_goto_home_fn,
-        "goto_work": process_goto_work_fn,
-        "production": process_production_fn,
-        "fetch_resource": process_fetch_resource_fn,
-        "eat_from_inventory": process_eat_fn, # Dispatch to generic eat processor
-        "eat_at_home": process_eat_fn,        # Dispatch to generic eat processor
-        "eat_at_tavern": process_eat_fn,      # Dispatch to generic eat processor
-        # "fetch_from_galley": process_fetch_from_galley_fn, # This type is no longer directly created for processing this way
-        "pickup_from_galley": process_pickup_from_galley, # New processor for the pickup step
-        "deliver_resource_to_buyer": process_deliver_resource_to_buyer, # New processor for final delivery
-        "leave_venice": process_leave_venice_fn,
-        "deliver_construction_materials": process_deliver_construction_materials_fn,
-        "construct_building": process_construct_building_fn,
-        "goto_construction_site": process_goto_construction_site_fn,
-        "secure_warehouse": process_placeholder_activity_fn,
-        "deliver_to_storage": process_deliver_to_storage_fn,
-        "fetch_from_storage": process_fetch_from_storage_fn,
-        "goto_building_for_storage_fetch": process_goto_building_for_storage_fetch_fn,
-        "fetch_for_logistics_client": process_fetch_for_logistics_client_fn, # Already present
-        "check_business_status": process_check_business_status_fn,
-        "fishing": process_fishing_activity_fn, # New
-        "emergency_fishing": process_fishing_activity_fn, # New, uses same processor
-        "inspect_building_for_purchase": process_inspect_building_for_purchase_fn, # New
-        "submit_building_purchase_offer": process_submit_building_purchase_offer_fn, 
-        "execute_respond_to_building_bid": process_execute_respond_to_building_bid_fn, 
-        "execute_withdraw_building_bid": process_execute_withdraw_building_bid_fn, 
-        "finalize_manage_markup_buy_contract": process_finalize_manage_markup_buy_contract_fn, 
-        "finalize_manage_storage_query_contract": process_finalize_manage_storage_query_contract_fn,
-        "finalize_update_citizen_profile": process_finalize_update_citizen_profile_fn, # New
-        "manage_public_dock": process_manage_public_dock_fn, # New
-        "work_on_art": process_work_on_art_fn, # New Artisti activity
-        "read_book": process_read_book_fn, # Use new processor for read_book
-        "goto_inn": process_goto_inn_fn, # New mapping for goto_inn
-        "deposit_items_at_location": process_deposit_items_at_location, # New activity type
-        "attend_theater_performance": process_attend_theater_performance_fn, # New theater activity
-        "drink_at_inn": process_drink_at_inn_fn, # New drink at inn activity
-        "use_public_bath": process_use_public_bath_fn, # New public bath activity
-        "rest": process_rest_fn, # New rest processor
-        "occupant_self_construction": process_occupant_self_construction_fn, # New
-        "idle": process_placeholder_activity_fn,
-        "pray": process_pray, # Pray processor
-        "bid_on_land": process_bid_on_land_fn,
-        "goto_location": process_goto_location_fn, # New processor for multi-activity chains
-        "submit_land_bid": process_bid_on_land_fn, # Second step in bid_on_land chain
-        "prepare_goods_for_sale": process_manage_public_sell_contract_fn, # First step in manage_public_sell_contract chain
-        "register_public_sell_offer": process_manage_public_sell_contract_fn, # Final step in manage_public_sell_contract chain
-        "assess_import_needs": process_manage_import_contract_fn, # First step in manage_import_contract chain
-        "register_import_agreement": process_manage_import_contract_fn, # Final step in manage_import_contract chain
-        "register_public_import_agreement": process_manage_public_import_contract_fn, # Final step in manage_public_import_contract chain
-        "assess_logistics_needs": process_manage_logistics_service_contract_fn, # First step in manage_logistics_service_contract chain
-        "register_logistics_service_contract": process_manage_logistics_service_contract_fn, # Final step in manage_logistics_service_contract chain
-        "finalize_land_purchase": process_buy_available_land_fn, # Final step in buy_available_land chain
-        "inspect_land_plot": process_initiate_building_project_fn, # Second step in initiate_building_project chain
-        "submit_building_project": process_initiate_building_project_fn, # Final step in initiate_building_project chain
-        "file_lease_adjustment": process_adjust_land_lease_price_fn, # Final step in adjust_land_lease_price chain
-        "file_rent_adjustment": process_adjust_building_rent_price_fn, # Final step in adjust_building_rent_price chain
-        "file_building_lease_adjustment": process_file_building_lease_adjustment_fn, # Final step for adjust_building_lease_price
-        "update_wage_ledger": process_adjust_business_wages_fn, # Final step in adjust_business_wages chain
-        "finalize_operator_change": process_change_business_manager_fn, # Final step in change_business_manager chain
-        "submit_loan_application_form": process_request_loan_fn, # Final step in request_loan chain
-        "register_loan_offer_terms": process_offer_loan_fn, # Final step in offer_loan chain
-        "deliver_message_interaction": process_send_message_fn, # Final step in send_message chain
-        "reply_to_message": process_reply_to_message_fn, # Automatically created after receiving a message
-        "perform_guild_membership_action": process_manage_guild_membership_fn, # Final step in manage_guild_membership chain
-        "register_public_storage_offer": process_register_public_storage_offer_fn,
-        # "reply_to_message" will be handled specially below to pass args.model
-
-        # Land Management Processors
-        "finalize_list_land_for_sale": process_list_land_for_sale_fn,
-        "finalize_make_offer_for_land": process_make_offer_for_land_fn,
-        "execute_accept_land_offer": process_accept_land_offer_fn,
-        "execute_buy_listed_land": process_buy_listed_land_fn,
-        "execute_cancel_land_listing": process_cancel_land_listing_fn,
-        "execute_cancel_land_offer": process_cancel_land_offer_fn,
-        "spread_rumor": process_spread_rumor_fn, # Ajout du nouveau processeur
-        # process_buy_available_land_fn is already in the dict for "finalize_land_purchase"
-    }
-
-    tables = initialize_airtable()
+
+    with startup_profiler.phase('airtable_init'):
+        tables = initialize_airtable()
     if not tables:
         log.error(f"{LogColors.FAIL}Failed to initialize Airtable. Exiting.{LogColors.ENDC}")
         return
@@ -576,13 +451,23 @@ def main(dry_run: bool = False, target_citizen_username: Optional[str] = None, f
         log.info(f"{LogColors.WARNING}Targeting specific ActivityId '{specific_activity_id}'. Skipping pre-processing steps (arrivals, interruptions, rescheduling, marking in_progress).{LogColors.ENDC}")
 
     # Fetch definitions once
-    building_type_defs = get_building_type_definitions_from_api()
-    resource_defs = get_resource_definitions_from_api()
+    with startup_profiler.phase('definitions'):
+        building_type_defs = get_building_type_definitions_from_api()
+        resource_defs = get_resource_definitions_from_api()
 
     if not building_type_defs or not resource_defs:
         log.error(f"{LogColors.FAIL}Failed to fetch building or resource definitions. Exiting.{LogColors.ENDC}")
         return
 
+    # Buildings are not mutated by the position updates below, so one bulk read per tick serves every ToBuilding lookup.
+    # Citizens, resources and contracts are changed by processors and are still read live.
+    buildings_snapshot: Optional[WorldSnapshot] = None
+    if not specific_activity_id and not target_citizen_username:
+        try:
+            buildings_snapshot = WorldSnapshot.load(tables, include=('buildings',))
+        except Exception as e_snapshot:
+            log.error(f"{LogColors.FAIL}Failed to load buildings snapshot, falling back to per-lookup queries: {e_snapshot}{LogColors.ENDC}")
+
     # Shuffle the order of citizens to process if not targeting a specific citizen
     if not target_citizen_username:
         try:
@@ -614,6 +499,7 @@ def main(dry_run: bool = False, target_citizen_username: Optional[str] = None, f
             log.error(f"{LogColors.FAIL}Error fetching specific activity '{specific_activity_id}': {e_fetch_specific}{LogColors.ENDC}")
     else:
         activities_to_process_raw = get_concluded_unprocessed_activities(tables, target_citizen_username, forced_utc_datetime_for_check)
+        startup_profiler.mark('activities_fetched')
         # If processing for all citizens (not specific_activity_id and not target_citizen_username), group and shuffle
         if not target_citizen_username: # This implies not specific_activity_id either
             activities_by_citizen_for_processing: Dict[str, List[Dict]] = {}
@@ -686,10 +572,13 @@ def main(dry_run: bool = False, target_citizen_username: Optional[str] = None, f
         log.info(f"{LogColors.OKBLUE}No activities grouped by citizen to process. Exiting main processing loop.{LogColors.ENDC}")
         # Final summary log will be handled after this block
     else:
-        log.info(f"{LogColors.OKBLUE}Processing activities for {len(activities_by_citizen)} citizens in parallel (max 5 workers).{LogColors.ENDC}")
-        
-        MAX_WORKERS = 5
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # Concurrency follows Airtable latency/429s (AIMD) and all workers share one token bucket.
+        # Each citizen is a single task, so a citizen's activities still run sequentially.
+        worker_controller = AIMDController()
+        instrument_tables(tables, worker_controller)
+        log.info(f"{LogColors.OKBLUE}Processing activities for {len(activities_by_citizen)} citizens in parallel (adaptive, {worker_controller.limit} workers initially, max {worker_controller.max_limit}).{LogColors.ENDC}")
+
+        with AdaptiveWorkerPool(worker_controller, thread_name_prefix=WORKER_THREAD_NAME_PREFIX) as executor:
             future_to_citizen_activity = {}
             
             # Prepare a list of citizens to process. If target_citizen_username is set, only process that one.
@@ -722,9 +611,10 @@ def main(dry_run: bool = False, target_citizen_username: Optional[str] = None, f
                     building_type_defs,
                     resource_defs,
                     dry_run,
-                    args.model, # Pass the kinos_model_override from main args
+                    kinos_model_override, # KinOS model for reply_to_message
                     counter_lock,
-                    API_BASE_URL # Pass API_BASE_URL
+                    API_BASE_URL, # Pass API_BASE_URL
+                    buildings_snapshot
                 )
                 future_to_citizen_activity[future] = citizen_username_iter
 
@@ -747,6 +637,15 @@ def main(dry_run: bool = False, target_citizen_username: Optional[str] = None, f
                     import traceback
                     log.error(traceback.format_exc())
 
+        log.info(f"{LogColors.OKBLUE}Throughput: {executor.report(global_processed_count + global_failed_count)}{LogColors.ENDC}")
+
+        # Check the processors' payments against their transaction records
+        get_ducat_service(tables).reconcile()
+
+    for timing_line in ACTIVITY_PROCESSORS.timing_report():
+        log.info(f"{LogColors.OKBLUE}Processor timing - {timing_line}{LogColors.ENDC}")
+    log_path_cache_stats()
+
     summary_color = LogColors.OKGREEN if global_failed_count == 0 else LogColors.WARNING if global_processed_count > 0 else LogColors.FAIL
     log.info(f"{summary_color}Process Activities script finished. Total Processed: {global_processed_count}, Total Failed: {global_failed_count}.{LogColors.ENDC}")
 
@@ -760,98 +659,67 @@ def process_all_activities_for_one_citizen(
     dry_run: bool,
     kinos_model_override: Optional[str], # For reply_to_message
     lock: threading.Lock,
-    api_base_url_for_processors: str # Added to pass to processors
+    api_base_url_for_processors: str, # Added to pass to processors
+    buildings_snapshot: Optional[WorldSnapshot] = None # Read-only building lookups for position updates
 ) -> Tuple[int, int]:
     """
     Processes all activities for a single citizen. This function is intended to be run in a thread.
+    Writes from processors are collected in a MutationBuffer and flushed after each activity,
+    together with that activity's status, so a failed write only marks its own activity as error.
+    The gondola fees of the flushed activities are settled once all of them are done, so a crash
+    later in the run doesn't lose them.
     Returns a tuple (processed_count, failed_count) for this citizen.
     """
+    mutation_buffer = MutationBuffer(tables)
+    fee_settlement = GondolaFeeSettlement(tables, buildings_snapshot)
+    processed_count, failed_count = 0, 0
+    try:
+        processed_count, failed_count = _process_citizen_activities_buffered(
+            citizen_username_log_ctx, citizen_activities, mutation_buffer.tables,
+            building_type_defs, resource_defs, dry_run, kinos_model_override,
+            api_base_url_for_processors, fee_settlement, buildings_snapshot,
+            mutation_buffer, tables
+        )
+    finally:
+        # Only left over if an activity raised before its own flush; its status was not queued yet
+        try:
+            mutation_buffer.flush()
+        except FlushError as e_flush:
+            log.error(f"{LogColors.FAIL}Citizen {citizen_username_log_ctx}: leftover buffered writes failed: {e_flush}{LogColors.ENDC}")
+        if mutation_buffer.api_calls_saved:
+            log.info(f"{LogColors.OKBLUE}Citizen {citizen_username_log_ctx}: {mutation_buffer.api_calls_saved} buffered writes merged away.{LogColors.ENDC}")
+        try:
+            fee_settlement.settle(dry_run)
+        except Exception as e_settle:
+            log.error(f"{LogColors.FAIL}Citizen {citizen_username_log_ctx}: error settling gondola fees: {e_settle}{LogColors.ENDC}")
+    return processed_count, failed_count
+
+
+def _process_citizen_activities_buffered(
+    citizen_username_log_ctx: str,
+    citizen_activities: List[Dict],
+    tables: Dict[str, Table],
+    building_type_defs: Dict,
+    resource_defs: Dict,
+    dry_run: bool,
+    kinos_model_override: Optional[str],
+    api_base_url_for_processors: str,
+    fee_settlement: GondolaFeeSettlement,
+    buildings_snapshot: Optional[WorldSnapshot],
+    mutation_buffer: MutationBuffer,
+    raw_tables: Dict[str, Table]
+) -> Tuple[int, int]:
+    """
+    Body of process_all_activities_for_one_citizen; `tables` are the buffered tables of `mutation_buffer`
+    and `raw_tables` the unbuffered ones, used to mark an activity as error when its writes failed.
+    """
     thread_processed_count = 0
     thread_failed_count = 0
     
-    # Re-fetch ACTIVITY_PROCESSORS mapping here or ensure it's passed if it becomes dynamic
-    # For now, assume it's globally accessible as defined in main scope.
-    # If it's not, it needs to be passed or redefined.
-    # To be safe, let's copy the definition or relevant parts if it's complex.
-    # For simplicity, assuming ACTIVITY_PROCESSORS is accessible.
+    # ACTIVITY_PROCESSORS is the module-level registry, shared by all citizen threads.
     # Accessing args.model directly won't work in a thread if args is not passed.
     # kinos_model_override is now passed as an argument.
 
-    ACTIVITY_PROCESSORS = { # Copied from main for thread safety / clarity
-        "deliver_resource_batch": process_deliver_resource_batch_fn,
-        "goto_home": process_goto_home_fn,
-        "goto_work": process_goto_work_fn,
-        "production": process_production_fn,
-        "fetch_resource": process_fetch_resource_fn,
-        "eat_from_inventory": process_eat_fn,
-        "eat_at_home": process_eat_fn,
-        "eat_at_tavern": process_eat_fn,
-        "pickup_from_galley": process_pickup_from_galley,
-        "deliver_resource_to_buyer": process_deliver_resource_to_buyer,
-        "leave_venice": process_leave_venice_fn,
-        "deliver_construction_materials": process_deliver_construction_materials_fn,
-        "construct_building": process_construct_building_fn,
-        "goto_construction_site": process_goto_construction_site_fn,
-        "secure_warehouse": process_placeholder_activity_fn,
-        "deliver_to_storage": process_deliver_to_storage_fn,
-        "fetch_from_storage": process_fetch_from_storage_fn,
-        "goto_building_for_storage_fetch": process_goto_building_for_storage_fetch_fn,
-        "fetch_for_logistics_client": process_fetch_for_logistics_client_fn,
-        "check_business_status": process_check_business_status_fn,
-        "fishing": process_fishing_activity_fn,
-        "emergency_fishing": process_fishing_activity_fn,
-        "inspect_building_for_purchase": process_inspect_building_for_purchase_fn,
-        "submit_building_purchase_offer": process_submit_building_purchase_offer_fn,
-        "execute_respond_to_building_bid": process_execute_respond_to_building_bid_fn,
-        "execute_withdraw_building_bid": process_execute_withdraw_building_bid_fn,
-        "finalize_manage_markup_buy_contract": process_finalize_manage_markup_buy_contract_fn,
-        "finalize_manage_storage_query_contract": process_finalize_manage_storage_query_contract_fn,
-        "finalize_update_citizen_profile": process_finalize_update_citizen_profile_fn,
-        "manage_public_dock": process_manage_public_dock_fn,
-        "work_on_art": process_work_on_art_fn,
-        "read_book": process_read_book_fn,
-        "goto_inn": process_goto_inn_fn,
-        "deposit_items_at_location": process_deposit_items_at_location,
-        "attend_theater_performance": process_attend_theater_performance_fn,
-        "drink_at_inn": process_drink_at_inn_fn,
-        "use_public_bath": process_use_public_bath_fn, # New public bath activity
-        "rest": process_rest_fn, # New rest processor
-        "occupant_self_construction": process_occupant_self_construction_fn, # New
-        "idle": process_placeholder_activity_fn,
-        "pray": process_pray, # Pray processor
-        "bid_on_land": process_bid_on_land_fn,
-        "goto_location": process_goto_location_fn,
-        "submit_land_bid": process_bid_on_land_fn,
-        "prepare_goods_for_sale": process_manage_public_sell_contract_fn,
-        "register_public_sell_offer": process_manage_public_sell_contract_fn,
-        "assess_import_needs": process_manage_import_contract_fn,
-        "register_import_agreement": process_manage_import_contract_fn,
-        "register_public_import_agreement": process_manage_public_import_contract_fn,
-        "assess_logistics_needs": process_manage_logistics_service_contract_fn,
-        "register_logistics_service_contract": process_manage_logistics_service_contract_fn,
-        "finalize_land_purchase": process_buy_available_land_fn,
-        "inspect_land_plot": process_initiate_building_project_fn,
-        "submit_building_project": process_initiate_building_project_fn,
-        "file_lease_adjustment": process_adjust_land_lease_price_fn,
-        "file_rent_adjustment": process_adjust_building_rent_price_fn,
-        "file_building_lease_adjustment": process_file_building_lease_adjustment_fn,
-        "update_wage_ledger": process_adjust_business_wages_fn,
-        "finalize_operator_change": process_change_business_manager_fn,
-        "submit_loan_application_form": process_request_loan_fn,
-        "register_loan_offer_terms": process_offer_loan_fn,
-        "deliver_message_interaction": process_send_message_fn,
-        "reply_to_message": process_reply_to_message_fn,
-        "perform_guild_membership_action": process_manage_guild_membership_fn,
-        "register_public_storage_offer": process_register_public_storage_offer_fn,
-        "finalize_list_land_for_sale": process_list_land_for_sale_fn,
-        "finalize_make_offer_for_land": process_make_offer_for_land_fn,
-        "execute_accept_land_offer": process_accept_land_offer_fn,
-        "execute_buy_listed_land": process_buy_listed_land_fn,
-        "execute_cancel_land_listing": process_cancel_land_listing_fn,
-        "execute_cancel_land_offer": process_cancel_land_offer_fn,
-        "spread_rumor": process_spread_rumor_fn,
-    }
-
     for activity_record in citizen_activities:
         activity_type = activity_record['fields'].get('Type')
         activity_id_airtable = activity_record['id'] # Define activity_id_airtable here
@@ -863,29 +731,18 @@ def process_all_activities_for_one_citizen(
         
         if dry_run:
             log.info(f"{LogColors.OKCYAN}[DRY RUN] Citizen {citizen_username_log_ctx}: Would process activity {activity_guid} of type {activity_type}.{LogColors.ENDC}")
-            processor_exists = activity_type in ACTIVITY_PROCESSORS or \
-                               (activity_type == "reply_to_message" and process_reply_to_message_fn is not None)
+            processor_exists = activity_type in ACTIVITY_PROCESSORS
             if not processor_exists:
                 log.warning(f"{LogColors.WARNING}[DRY RUN] Citizen {citizen_username_log_ctx}: No processor for activity type: {activity_type} (ID: {activity_guid}). Would mark as failed.{LogColors.ENDC}")
                 processing_status = "failed"
         else:
-            processor_func = ACTIVITY_PROCESSORS.get(activity_type)
             try:
-                if activity_type == "reply_to_message":
-                    if not process_reply_to_message_fn(
-                        tables, activity_record, building_type_defs, resource_defs,
-                        kinos_model_override=kinos_model_override # Use passed override
-                    ):
+                # Inside the try: the first lookup of a type imports its processor module
+                processor = ACTIVITY_PROCESSORS.get(activity_type)
+                if processor:
+                    # The spec knows whether this processor takes api_base_url and the KinOS model (pray, reply_to_message)
+                    if not processor(tables, activity_record, building_type_defs, resource_defs, api_base_url_for_processors, kinos_model_override=kinos_model_override):
                         processing_status = "failed"
-                elif processor_func:
-                    # Pass api_base_url_for_processors to the processor function
-                    # For activities that use KinOS (pray, etc.), also pass kinos_model_override
-                    if activity_type == "pray":
-                        if not processor_func(tables, activity_record, building_type_defs, resource_defs, api_base_url_for_processors, kinos_model_override):
-                            processing_status = "failed"
-                    else:
-                        if not processor_func(tables, activity_record, building_type_defs, resource_defs, api_base_url_for_processors):
-                            processing_status = "failed"
                 else:
                     log.warning(f"{LogColors.WARNING}Citizen {citizen_username_log_ctx}: No processor for activity type: {activity_type} (ID: {activity_guid}). Marking as failed.{LogColors.ENDC}")
                     log.info(f"Available processors: {', '.join(sorted(ACTIVITY_PROCESSORS.keys()))}")
@@ -945,104 +802,25 @@ def process_all_activities_for_one_citizen(
                             thread_failed_count += 1 # Count these as additional failures for this citizen's batch
             except Exception as e_chain:
                 log.error(f"{LogColors.FAIL}Citizen {citizen_username_log_ctx}: Error checking for dependent activities for {activity_guid}: {e_chain}{LogColors.ENDC}")
-        
-        # Gondola Fee Processing
-        activity_path_json = activity_record['fields'].get('Path')
-        # citizen_username_for_fee = activity_record['fields'].get('Citizen') # Use citizen_username_log_ctx
-        activity_custom_id_for_fee = activity_record['fields'].get('ActivityId', activity_id_airtable)
-        transporter_username = activity_record['fields'].get('Transporter')
-
-        if activity_path_json and citizen_username_log_ctx and not dry_run:
-            gondola_distance_km, gondola_fee = calculate_gondola_travel_details(activity_path_json)
-            if gondola_fee > 0:
-                traveler_citizen_record = get_citizen_record(tables, citizen_username_log_ctx)
-                
-                fee_recipient_username = "ConsiglioDeiDieci" # Default recipient
-                recipient_found_from_path = False
 
-                # 1. Try to find recipient from path first
-                log.info(f"{LogColors.OKBLUE}Checking path for public_dock operator for activity {activity_guid}.{LogColors.ENDC}")
-                try:
-                    path_points = json.loads(activity_path_json) if activity_path_json else []
-                    for point in path_points:
-                        # Assuming path points of type 'dock' have a 'nodeId' that is the BuildingId of the dock
-                        if point.get("type") == "dock" and point.get("nodeId"):
-                            dock_building_id = point.get("nodeId")
-                            dock_record = get_building_record(tables, dock_building_id) 
-                            if dock_record and dock_record['fields'].get('Type') == 'public_dock':
-                                run_by_user = dock_record['fields'].get('RunBy')
-                                if run_by_user and run_by_user != "ConsiglioDeiDieci":
-                                    run_by_citizen_check = get_citizen_record(tables, run_by_user)
-                                    if run_by_citizen_check:
-                                        fee_recipient_username = run_by_user
-                                        recipient_found_from_path = True
-                                        log.info(f"{LogColors.OKBLUE}Gondola fee for activity {activity_guid} assigned to RunBy ({run_by_user}) of public_dock {dock_building_id} found in path.{LogColors.ENDC}")
-                                        break # Found a valid recipient from path
-                                    else:
-                                        log.warning(f"{LogColors.WARNING}RunBy user {run_by_user} for public_dock {dock_building_id} (from path) not found. Checking next dock in path.{LogColors.ENDC}")
-                                # else: Dock has no RunBy or RunBy is Consiglio, check next dock
-                            # else: Not a public_dock, or dock not found, check next point
-                except json.JSONDecodeError:
-                    log.error(f"{LogColors.FAIL}Failed to parse activity path JSON for activity {activity_guid} while checking for dock operator: {activity_path_json}{LogColors.ENDC}")
-                
-                # 2. If no recipient from path, try Transporter field
-                if not recipient_found_from_path:
-                    log.info(f"{LogColors.OKBLUE}No specific dock operator found in path for activity {activity_guid}. Checking Transporter field value: {transporter_username}.{LogColors.ENDC}")
-                    if transporter_username and transporter_username != "ConsiglioDeiDieci":
-                        transporter_citizen_record_check = get_citizen_record(tables, transporter_username)
-                        if transporter_citizen_record_check:
-                            fee_recipient_username = transporter_username
-                            log.info(f"{LogColors.OKBLUE}Gondola fee for activity {activity_guid} assigned to Transporter field value (citizen): {transporter_username}.{LogColors.ENDC}")
-                        else:
-                            # Transporter field had a name, but it's not a valid citizen. Fee remains with current fee_recipient_username (likely Consiglio).
-                            log.warning(f"{LogColors.WARNING}Transporter {transporter_username} in activity {activity_guid} was not a valid citizen. Fee defaults to {fee_recipient_username}.{LogColors.ENDC}")
-                    elif transporter_username == "ConsiglioDeiDieci":
-                         log.info(f"{LogColors.OKBLUE}Transporter field is 'ConsiglioDeiDieci'. Fee remains with {fee_recipient_username} (current value, likely ConsiglioDeiDieci unless path check found someone else).{LogColors.ENDC}")
-                    else: # transporter_username is None or empty
-                         log.info(f"{LogColors.OKBLUE}Transporter field is empty or None. Fee remains with {fee_recipient_username} (current value, likely ConsiglioDeiDieci unless path check found someone else).{LogColors.ENDC}")
-                
-                # At this point, fee_recipient_username is set (either specific operator or ConsiglioDeiDieci).
-                fee_recipient_record = get_citizen_record(tables, fee_recipient_username)
-
-                if traveler_citizen_record and fee_recipient_record:
-                    traveler_ducats = float(traveler_citizen_record['fields'].get('Ducats', 0))
-                    if traveler_ducats >= gondola_fee:
-                        recipient_ducats = float(fee_recipient_record['fields'].get('Ducats', 0))
-                        # VENICE_TIMEZONE is imported from activity_helpers
-                        now_venice_fee = datetime.now(VENICE_TIMEZONE) # Use imported VENICE_TIMEZONE
-                        now_iso_fee = now_venice_fee.isoformat()
-
-                        tables['citizens'].update(traveler_citizen_record['id'], {'Ducats': traveler_ducats - gondola_fee})
-                        tables['citizens'].update(fee_recipient_record['id'], {'Ducats': recipient_ducats + gondola_fee})
-                        
-                        transaction_payload = {
-                            "Type": "gondola_fee",
-                            "AssetType": "transport_activity",
-                            "Asset": activity_custom_id_for_fee,
-                            "Seller": fee_recipient_username, # Recipient of the fee
-                            "Buyer": citizen_username_log_ctx,  # Payer of the fee
-                            "Price": gondola_fee,
-                            "Notes": json.dumps({
-                                "activity_guid": activity_guid,
-                                "distance_km": round(gondola_distance_km, 2),
-                                "path_preview": activity_path_json[:100] + "..." if activity_path_json else "",
-                                "original_transporter_field": transporter_username # Log what was in the Transporter field
-                            }),
-                            "CreatedAt": now_iso_fee,
-                            "ExecutedAt": now_iso_fee
-                        }
-                        tables['transactions'].create(transaction_payload)
-                        log.info(f"{LogColors.OKGREEN}Citizen {citizen_username_log_ctx} paid {gondola_fee:.2f} Ducats gondola fee to {fee_recipient_username} for activity {activity_guid}. Distance: {gondola_distance_km:.2f} km.{LogColors.ENDC}")
-                    else:
-                        log.warning(f"{LogColors.WARNING}Citizen {citizen_username_log_ctx} has insufficient Ducats ({traveler_ducats:.2f}) for gondola fee ({gondola_fee:.2f}) for activity {activity_guid}.{LogColors.ENDC}")
-                else:
-                    if not traveler_citizen_record: log.error(f"{LogColors.FAIL}Traveler citizen {citizen_username_log_ctx} not found for gondola fee.{LogColors.ENDC}")
-                    if not fee_recipient_record: log.error(f"{LogColors.FAIL}Fee recipient citizen {fee_recipient_username} not found for gondola fee.{LogColors.ENDC}")
-        elif dry_run and activity_path_json and citizen_username_log_ctx:
-             gondola_distance_km, gondola_fee = calculate_gondola_travel_details(activity_path_json)
-             if gondola_fee > 0:
-                fee_recipient_username_dry_run = transporter_username if transporter_username and transporter_username != "ConsiglioDeiDieci" else "ConsiglioDeiDieci"
-                log.info(f"{LogColors.OKCYAN}[DRY RUN] Citizen {citizen_username_log_ctx}: Would process gondola fee of {gondola_fee:.2f} Ducats to {fee_recipient_username_dry_run} for activity {activity_guid} (Distance: {gondola_distance_km:.2f} km).{LogColors.ENDC}")
+        # Write this activity's effects and its status together. The status is written last and
+        # dropped if an effect failed, so only this activity is marked as error.
+        writes_flushed = True
+        try:
+            mutation_buffer.flush()
+        except FlushError as e_flush:
+            writes_flushed = False
+            log.error(f"{LogColors.FAIL}Citizen {citizen_username_log_ctx}: buffered writes of activity {activity_guid} failed, marking it as error: {e_flush}{LogColors.ENDC}")
+            update_activity_status(raw_tables, activity_id_airtable, "error")
+            if processing_status == "processed":
+                thread_processed_count -= 1
+                thread_failed_count += 1
+
+        # Gondola fees are recorded here and paid for the citizen's whole batch at the end (see utils/gondola_fees.py)
+        if citizen_username_log_ctx and writes_flushed:
+            gondola_fee = fee_settlement.record(activity_record, citizen_username_log_ctx)
+            if dry_run and gondola_fee:
+                log.info(f"{LogColors.OKCYAN}[DRY RUN] Citizen {citizen_username_log_ctx}: Would pay gondola fee of {gondola_fee.fee:.2f} Ducats for activity {activity_guid} (Distance: {gondola_fee.distance_km:.2f} km).{LogColors.ENDC}")
 
         # Update citizen's position
         # or if the activity doesn't involve changing location (e.g. eat_from_inventory, eat_at_home, eat_at_tavern if already there)
@@ -1065,7 +843,7 @@ def process_all_activities_for_one_citizen(
 
             if to_building_custom_id and citizen_username_log_ctx and not dry_run:
                 try:
-                    building_record_for_pos = get_building_record(tables, to_building_custom_id)
+                    building_record_for_pos = get_building_record(tables, to_building_custom_id, snapshot=buildings_snapshot)
                     citizen_record_for_pos = get_citizen_record(tables, citizen_username_log_ctx) # Use context username
 
                     if building_record_for_pos and citizen_record_for_pos:
@@ -1372,7 +1150,7 @@ def reschedule_created_activities_by_priority(
                                 if not dry_run:
                                     path_data = get_path_between_points(endeavor_previous_activity_end_location_coords, target_building_coords, transport_api_url)
                                     if path_data and path_data.get('success'):
-                                        new_path_json = json.dumps(path_data.get('path', []))
+                                        new_path_json = dump_path(path_data.get('path', []))
                                         new_duration_val = path_data.get('timing', {}).get('durationSeconds')
                                         if new_duration_val is not None:
                                             current_duration_seconds = float(new_duration_val)
@@ -1436,7 +1214,7 @@ def reschedule_created_activities_by_priority(
             log.info(f"Citizen {citizen_username}: No rescheduling updates needed after evaluation.")
 
 
-if __name__ == "__main__":
+def _build_arg_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Process concluded activities in La Serenissima.")
     parser.add_argument(
         "--model",
@@ -1465,6 +1243,27 @@ if __name__ == "__main__":
         type=str,
         help="Process a specific activity by its custom activityId, bypassing normal selection criteria."
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Log per-module import times, the connection test cost and time to first query."
+    )
+    return parser
 
-    main(args.dry_run, args.citizen, forced_venice_hour_override=args.hour, specific_activity_id=args.activityId)
+
+def run_cli(argv: Optional[List[str]] = None):
+    """Command-line entry point; also called in-process by the scheduler's task runner."""
+    args = _build_arg_parser().parse_args(argv)
+    if args.profile_startup:
+        # Already installed at import time when run as a script; in-process runs still time processor loads
+        startup_profiler.install()
+    try:
+        main(args.dry_run, args.citizen, forced_venice_hour_override=args.hour, specific_activity_id=args.activityId, kinos_model_override=args.model)
+    finally:
+        if startup_profiler.get_profiler() is not None:
+            log.info(f"Processor modules loaded for activity types: {', '.join(ACTIVITY_PROCESSORS.loaded_types()) or 'none'}")
+            startup_profiler.log_report()
+
+
+if __name__ == "__main__":
+    run_cli()
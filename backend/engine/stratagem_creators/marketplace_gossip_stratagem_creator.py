@@ -5,6 +5,7 @@ from datetime import datetime, timedelta, timezone
 from typing import Dict, Any, Optional, List
 from collections import Counter
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     VENICE_TIMEZONE,
     _escape_airtable_value,
@@ -133,7 +134,7 @@ def try_create(
             }
             goto_payload = {
                 "ActivityId": goto_activity_id, "Type": "goto_location", "Citizen": citizen_username,
-                "Path": json.dumps(path_to_target_location_data.get('path', [])),
+                "Path": dump_path(path_to_target_location_data.get('path', [])),
                 "StartDate": goto_start_utc.isoformat(), "EndDate": goto_end_utc.isoformat(),
                 "Status": "created", "Priority": 25, # Priorité moyenne-basse pour les rumeurs
                 "Title": f"Se rendre au lieu de rumeur {i+1}",
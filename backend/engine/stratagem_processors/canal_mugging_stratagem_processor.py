@@ -7,6 +7,7 @@ from typing import Dict, Any, Optional, List, Tuple
 from pyairtable import Table
 import requests # For fetching water graph and land details
 
+from backend.engine.utils.path_codec import dump_path
 from backend.engine.utils.activity_helpers import (
     LogColors,
     VENICE_TIMEZONE,
@@ -235,7 +236,7 @@ def process(
             start_date_iso=now_utc_dt.isoformat(),
             end_date_iso=(now_utc_dt + timedelta(seconds=path_data.get('timing', {}).get('durationSeconds', 1800))).isoformat(),
             to_building_id=target_land_id_custom or mugging_wp_id, # Use land ID if available, else wp_id
-            path_json=json.dumps(path_data.get("path", [])),
+            path_json=dump_path(path_data.get("path", [])),
             details_json=json.dumps(goto_notes), # Store structured details
             priority_override=HIGH_PRIORITY_GOTO,
             title=f"Travel to Ambush Point ({variant})"
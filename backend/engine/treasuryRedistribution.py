@@ -46,6 +46,7 @@ if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
 from backend.engine.utils.activity_helpers import LogColors, log_header # Import shared LogColors and log_header
+from backend.engine.utils.ledger import Ledger
 
 # Constants for redistribution percentages by social class
 REDISTRIBUTION_PERCENTAGES = {
@@ -89,33 +90,14 @@ def initialize_airtable():
         log.error(f"Failed to initialize Airtable: {e}")
         sys.exit(1)
 
-def get_consiglio_dei_dieci(tables) -> Optional[Dict]:
-    """Get the ConsiglioDeiDieci citizen record."""
-    log.info("Fetching ConsiglioDeiDieci record...")
-    
-    try:
-        # Try different variations of the name
-        for name_variation in ["ConsiglioDeiDieci", "Consiglio Dei Dieci", "Consiglio dei Dieci"]:
-            formula = f"{{Username}}='{name_variation}'"
-            records = tables['citizens'].all(formula=formula)
-            
-            if records:
-                log.info(f"Found ConsiglioDeiDieci record with username: {name_variation}")
-                return records[0]
-        
-        log.error("ConsiglioDeiDieci record not found")
-        return None
-    except Exception as e:
-        log.error(f"Error fetching ConsiglioDeiDieci record: {e}")
-        return None
-
-def get_citizens_by_social_class(tables) -> Dict[str, List[Dict]]:
-    """Fetch all citizens grouped by social class."""
+def get_citizens_by_social_class(tables, citizens: Optional[List[Dict]] = None) -> Dict[str, List[Dict]]:
+    """Fetch all citizens (unless already loaded) grouped by social class."""
     log.info("Fetching citizens grouped by social class...")
     
     try:
         # Get all citizens
-        citizens = tables['citizens'].all()
+        if citizens is None:
+            citizens = tables['citizens'].all()
         
         # Group by social class
         citizens_by_class = defaultdict(list)
@@ -133,95 +115,22 @@ def get_citizens_by_social_class(tables) -> Dict[str, List[Dict]]:
         log.error(f"Error fetching citizens: {e}")
         return {}
 
-def update_citizen_wealth(tables, citizen_id: str, amount: float) -> bool:
-    """Update a citizen's wealth."""
-    log.info(f"Updating wealth for citizen {citizen_id}: +{amount}")
-    
-    try:
-        # Get the citizen record
-        citizen = tables['citizens'].get(citizen_id)
-        if not citizen:
-            log.warning(f"Citizen not found: {citizen_id}")
-            return False
-        
-        # Get current wealth
-        current_wealth = citizen['fields'].get('Ducats', 0)
-        
-        # Calculate new wealth
-        new_wealth = current_wealth + amount
-        
-        # Update the citizen record
-        tables['citizens'].update(citizen_id, {
-            'Ducats': new_wealth
-        })
-        
-        log.info(f"Updated wealth for citizen {citizen_id}: {current_wealth} -> {new_wealth}")
-        return True
-    except Exception as e:
-        log.error(f"Error updating wealth for citizen {citizen_id}: {e}")
-        return False
-
-def update_compute_balance(tables, citizen_id: str, amount: float, operation: str = "add") -> bool:
-    """Update a citizen's compute balance."""
-    log.info(f"Updating compute balance for citizen {citizen_id}: {operation} {amount}")
-    
-    try:
-        # Get the citizen record
-        citizen = tables['citizens'].get(citizen_id)
-        if not citizen:
-            log.warning(f"Citizen not found: {citizen_id}")
-            return False
-        
-        # Get current Ducats
-        current_price = citizen['fields'].get('Ducats', 0)
-        
-        # Calculate new amount
-        if operation == "add":
-            new_amount = current_price + amount
-        elif operation == "subtract":
-            new_amount = current_price - amount
-        else:
-            log.error(f"Invalid operation: {operation}")
-            return False
-        
-        # Update the citizen record
-        tables['citizens'].update(citizen_id, {
-            'Ducats': new_amount
-        })
-        
-        log.info(f"Updated compute balance for citizen {citizen_id}: {current_price} -> {new_amount}")
-        return True
-    except Exception as e:
-        log.error(f"Error updating compute balance for citizen {citizen_id}: {e}")
-        return False
-
-def create_transaction_record(tables, from_citizen_username: str, to_citizen_username: str, amount: float) -> Optional[Dict]: # Renamed parameters for clarity
-    """Create a transaction record for a redistribution payment."""
-    log.info(f"Creating transaction record for redistribution payment: {from_citizen_username} -> {to_citizen_username}, amount: {amount}")
-    
-    try:
-        now = datetime.datetime.now().isoformat()
-        
-        # Create the transaction record
-        transaction = tables['transactions'].create({
-            "Type": "treasury_redistribution",
-            "Asset": f"redistribution_{now}",
-            "Seller": to_citizen_username,  # Citizen Username (Recipient of funds)
-            "Buyer": from_citizen_username,  # ConsiglioDeiDieci Username (Source of funds)
-            "Price": amount,
-            "CreatedAt": now,
-            "ExecutedAt": now,
-            "Notes": json.dumps({
-                "payment_type": "treasury_redistribution",
-                "payment_date": now
-            })
+def redistribution_transaction_fields(from_citizen_username: str, to_citizen_username: str, amount: float) -> Dict[str, Any]:
+    """Fields of the TRANSACTIONS record for a redistribution payment."""
+    now = datetime.datetime.now().isoformat()
+    return {
+        "Type": "treasury_redistribution",
+        "Asset": f"redistribution_{now}",
+        "Seller": to_citizen_username,  # Citizen Username (Recipient of funds)
+        "Buyer": from_citizen_username,  # ConsiglioDeiDieci Username (Source of funds)
+        "Price": amount,
+        "CreatedAt": now,
+        "ExecutedAt": now,
+        "Notes": json.dumps({
+            "payment_type": "treasury_redistribution",
+            "payment_date": now
         })
-        
-        log.info(f"Created transaction record: {transaction['id']}")
-        return transaction
-    except Exception as e:
-        log.error(f"Error creating transaction record: {e}")
-        return None
+    }
 
 def create_notification(tables, citizen_id: str, content: str, details: Dict) -> Optional[Dict]:
     """Create a notification for a citizen."""
@@ -393,13 +302,15 @@ def redistribute_treasury(dry_run: bool = False):
     
     tables = initialize_airtable()
     
+    # All balances are loaded once; the treasury may go below zero, as it always could
+    ledger = Ledger(tables, dry_run=dry_run, allow_overdraft=True).load()
+    
     # Get ConsiglioDeiDieci record
-    consiglio = get_consiglio_dei_dieci(tables)
+    consiglio = ledger.citizen("ConsiglioDeiDieci")
     if not consiglio:
         log.error("Cannot proceed without ConsiglioDeiDieci record")
         return
     
-    consiglio_id = consiglio['id']
     consiglio_username = consiglio['fields'].get('Username', 'ConsiglioDeiDieci')
     consiglio_balance = consiglio['fields'].get('Ducats', 0)
     
@@ -410,7 +321,7 @@ def redistribute_treasury(dry_run: bool = False):
     log.info(f"Amount to redistribute: {redistribution_amount} ⚜️ Ducats (1% of treasury)")
     
     # Get citizens by social class
-    citizens_by_class = get_citizens_by_social_class(tables)
+    citizens_by_class = get_citizens_by_social_class(tables, list(ledger.citizens.values()))
     
     # Calculate total weighted shares
     total_weighted_shares = 0
@@ -433,26 +344,6 @@ def redistribute_treasury(dry_run: bool = False):
         per_citizen_amounts[social_class] = amount_for_citizen_in_class
         log.info(f"Per-citizen amount for {social_class}: {amount_for_citizen_in_class} ⚜️ Ducats")
 
-    if dry_run:
-        log.info("[DRY RUN] Would make the following fixed daily payments:")
-        total_fixed_dry = 0
-        for social_class, fixed_amount in FIXED_DAILY_PAYMENTS.items():
-            citizens_count = len(citizens_by_class.get(social_class, []))
-            class_total_dry = citizens_count * fixed_amount
-            total_fixed_dry += class_total_dry
-            log.info(f"[DRY RUN] {social_class}: {fixed_amount} ⚜️ Ducats per citizen. Total for class ({citizens_count} citizens): {class_total_dry} ⚜️ Ducats")
-        
-        log.info("[DRY RUN] Would redistribute the following per-citizen amounts (percentage-based):")
-        for social_class, per_citizen_amount_val in per_citizen_amounts.items():
-            citizens_count = len(citizens_by_class.get(social_class, []))
-            class_total_dry_run = citizens_count * per_citizen_amount_val
-            log.info(f"[DRY RUN] {social_class}: {per_citizen_amount_val} ⚜️ Ducats per citizen. Total for class ({citizens_count} citizens): {class_total_dry_run} ⚜️ Ducats")
-        
-        log.info(f"[DRY RUN] Total fixed payments: {total_fixed_dry} ⚜️ Ducats")
-        log.info(f"[DRY RUN] Total percentage-based redistribution: {redistribution_amount} ⚜️ Ducats")
-        log.info(f"[DRY RUN] Grand total: {total_fixed_dry + redistribution_amount} ⚜️ Ducats")
-        return
-    
     # Track redistribution statistics
     redistribution_summary = {
         "total_amount": 0,
@@ -481,24 +372,22 @@ def redistribute_treasury(dry_run: bool = False):
                 citizen_username_recipient = citizen['fields'].get('Username', citizen_id)
                 citizen_name = f"{citizen['fields'].get('FirstName', '')} {citizen['fields'].get('LastName', '')}"
                 
-                # Update citizen's wealth
-                if update_citizen_wealth(tables, citizen_id, fixed_amount):
-                    # Create transaction record
-                    create_transaction_record(tables, consiglio_username, citizen_username_recipient, fixed_amount)
-                    
-                    # Create notification for citizen
-                    create_notification(
-                        tables,
-                        citizen_id,
-                        f"You received **{int(fixed_amount):,}** ⚜️ Ducats as your **Daily {social_class} Stipend** 📚",
-                        {
-                            "event_type": "fixed_daily_payment",
-                            "amount": fixed_amount,
-                            "social_class": social_class,
-                            "source": "ConsiglioDeiDieci"
-                        }
-                    )
-                    
+                # Record the payment; balances and the transaction record are written by ledger.commit(),
+                # which then creates the notification for the citizen
+                transaction = redistribution_transaction_fields(consiglio_username, citizen_username_recipient, fixed_amount)
+                notify_citizen = lambda citizen_id=citizen_id, fixed_amount=fixed_amount, social_class=social_class: create_notification(
+                    tables,
+                    citizen_id,
+                    f"You received **{int(fixed_amount):,}** ⚜️ Ducats as your **Daily {social_class} Stipend** 📚",
+                    {
+                        "event_type": "fixed_daily_payment",
+                        "amount": fixed_amount,
+                        "social_class": social_class,
+                        "source": "ConsiglioDeiDieci"
+                    }
+                )
+                if ledger.transfer(consiglio_username, citizen_username_recipient, fixed_amount, transaction=transaction,
+                                   on_commit=notify_citizen):
                     class_total += fixed_amount
                     class_citizens += 1
                     total_fixed_payments += fixed_amount
@@ -513,18 +402,6 @@ def redistribute_treasury(dry_run: bool = False):
             
             log.info(f"Paid total of {class_total} ⚜️ Ducats to {class_citizens} citizens of class {social_class}")
     
-    # Deduct fixed payments from ConsiglioDeiDieci
-    if total_fixed_payments > 0:
-        if not update_compute_balance(tables, consiglio_id, total_fixed_payments, "subtract"):
-            log.error(f"Failed to deduct {total_fixed_payments} fixed payments from ConsiglioDeiDieci")
-            return
-        log.info(f"Deducted {total_fixed_payments} ⚜️ Ducats for fixed daily payments")
-    
-    # Now deduct the percentage-based redistribution amount from ConsiglioDeiDieci
-    if not update_compute_balance(tables, consiglio_id, redistribution_amount, "subtract"):
-        log.error(f"Failed to deduct {redistribution_amount} from ConsiglioDeiDieci")
-        return
-    
     # Distribute percentage-based payments to citizens by social class
     for social_class, citizens in citizens_by_class.items():
         if social_class not in per_citizen_amounts:
@@ -544,24 +421,22 @@ def redistribute_treasury(dry_run: bool = False):
             citizen_username_recipient = citizen['fields'].get('Username', citizen_id) # Use Username for transaction
             citizen_name = f"{citizen['fields'].get('FirstName', '')} {citizen['fields'].get('LastName', '')}"
             
-            # Update citizen's wealth
-            if update_citizen_wealth(tables, citizen_id, per_citizen_amount):
-                # Create transaction record
-                create_transaction_record(tables, consiglio_username, citizen_username_recipient, per_citizen_amount)
-                
-                # Create notification for citizen
-                create_notification(
-                    tables,
-                    citizen_id, # Notification is still linked to Airtable record ID
-                    f"You received **{int(per_citizen_amount):,}** ⚜️ Ducats from the **Treasury Redistribution** 💰",
-                    {
-                        "event_type": "treasury_redistribution",
-                        "amount": per_citizen_amount,
-                        "social_class": social_class,
-                        "source": "ConsiglioDeiDieci"
-                    }
-                )
-                
+            # Record the payment; balances and the transaction record are written by ledger.commit(),
+            # which then creates the notification for the citizen
+            transaction = redistribution_transaction_fields(consiglio_username, citizen_username_recipient, per_citizen_amount)
+            notify_citizen = lambda citizen_id=citizen_id, per_citizen_amount=per_citizen_amount, social_class=social_class: create_notification(
+                tables,
+                citizen_id, # Notification is still linked to Airtable record ID
+                f"You received **{int(per_citizen_amount):,}** ⚜️ Ducats from the **Treasury Redistribution** 💰",
+                {
+                    "event_type": "treasury_redistribution",
+                    "amount": per_citizen_amount,
+                    "social_class": social_class,
+                    "source": "ConsiglioDeiDieci"
+                }
+            )
+            if ledger.transfer(consiglio_username, citizen_username_recipient, per_citizen_amount, transaction=transaction,
+                               on_commit=notify_citizen):
                 class_total += per_citizen_amount
                 class_citizens += 1
                 
@@ -575,6 +450,13 @@ def redistribute_treasury(dry_run: bool = False):
         
         log.info(f"Distributed total of {class_total} ⚜️ Ducats to {class_citizens} citizens of class {social_class}")
     
+    commit_summary = ledger.commit()  # Dry run: logs the balance diff
+    if dry_run:
+        return
+    if not commit_summary['ok']:
+        log.error(f"{LogColors.FAIL}Treasury redistribution was not written; skipping the admin and Telegram summaries.{LogColors.ENDC}")
+        return
+    
     # Create admin summary notification
     create_admin_summary(tables, redistribution_summary)
     
@@ -10,7 +10,9 @@ This script:
    - Current time
 3. Updates the Position field in the CITIZENS table
 
-Run this script every 5 minutes to keep citizen positions updated.
+Run this script every 5 minutes to keep citizen positions updated. Paths are measured once
+per activity and all positions are interpolated and written in one batch, so it is also
+cheap enough to run every minute.
 """
 
 import os
@@ -20,7 +22,6 @@ import logging
 import argparse
 import datetime
 import time
-import math
 from typing import Dict, List, Optional, Any, Tuple
 from pyairtable import Api, Table
 from dotenv import load_dotenv
@@ -43,6 +44,8 @@ if PROJECT_ROOT_POS not in sys.path:
     sys.path.insert(0, PROJECT_ROOT_POS)
 
 from backend.engine.utils.activity_helpers import LogColors, log_header # Import shared LogColors and log_header
+from backend.engine.utils.geo import haversine_meters
+from backend.engine.utils.path_positions import PathTrack, get_path_track, forget_path_tracks, positions_at
 
 def initialize_airtable():
     """Initialize Airtable connection."""
@@ -138,113 +141,75 @@ def get_building_position(tables, building_id: str) -> Optional[Dict]:
 
 def calculate_distance(point1: Dict, point2: Dict) -> float:
     """Calculate distance between two lat/lng points in meters."""
-    # Haversine formula
-    R = 6371000  # Earth radius in meters
-    
-    lat1 = math.radians(point1['lat'])
-    lng1 = math.radians(point1['lng'])
-    lat2 = math.radians(point2['lat'])
-    lng2 = math.radians(point2['lng'])
-    
-    dlat = lat2 - lat1
-    dlng = lng2 - lng1
-    
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
+    return haversine_meters(point1['lat'], point1['lng'], point2['lat'], point2['lng'])
 
 def calculate_position_along_path(path: List[Dict], progress: float) -> Dict:
     """Calculate position along a path based on progress (0.0 to 1.0)."""
     if not path or len(path) < 2:
         return path[0] if path else {"lat": 0, "lng": 0}
+    return PathTrack.from_points(path).position_at(progress)
+
+def calculate_progress(activity: Dict, current_time: Optional[datetime.datetime] = None) -> Optional[float]:
+    """Progress (0.0 to 1.0) of an activity between its StartDate and EndDate."""
+    start_time_str = activity['fields'].get('StartDate')
+    end_time_str = activity['fields'].get('EndDate')
     
-    # Calculate total path length
-    total_distance = 0
-    segments = []
-    
-    for i in range(len(path) - 1):
-        distance = calculate_distance(path[i], path[i+1])
-        segments.append({
-            "start": total_distance,
-            "end": total_distance + distance,
-            "distance": distance,
-            "index": i
-        })
-        total_distance += distance
+    if not start_time_str or not end_time_str:
+        log.warning(f"Missing start or end time for activity {activity['id']}")
+        return None
     
-    # Find the segment where the progress falls
-    target_distance = progress * total_distance
-    segment = next((s for s in segments if s["start"] <= target_distance <= s["end"]), segments[0])
+    # Parse times
+    start_time = datetime.datetime.fromisoformat(start_time_str.replace('Z', '+00:00'))
+    end_time = datetime.datetime.fromisoformat(end_time_str.replace('Z', '+00:00'))
+    current_time = current_time or datetime.datetime.now(datetime.timezone.utc)
     
-    # Calculate position within the segment
-    segment_progress = 0
-    if segment["distance"] > 0:
-        segment_progress = (target_distance - segment["start"]) / segment["distance"]
+    # Calculate progress (0.0 to 1.0)
+    total_duration = (end_time - start_time).total_seconds()
+    elapsed_time = (current_time - start_time).total_seconds()
     
-    segment_index = segment["index"]
-    p1 = path[segment_index]
-    p2 = path[segment_index + 1]
+    if total_duration <= 0:
+        log.warning(f"Invalid duration for activity {activity['id']}")
+        return None
     
-    # Interpolate between the two points
-    return {
-        "lat": p1["lat"] + (p2["lat"] - p1["lat"]) * segment_progress,
-        "lng": p1["lng"] + (p2["lng"] - p1["lng"]) * segment_progress
-    }
+    return min(1.0, max(0.0, elapsed_time / total_duration))
+
+def get_activity_track(activity: Dict) -> Optional[PathTrack]:
+    """Track of the activity's path, measured once per ActivityId (see utils/path_positions.py)."""
+    path_str = activity['fields'].get('Path')
+    if not path_str:
+        return None
+    activity_key = activity['fields'].get('ActivityId') or activity['id']
+    track = get_path_track(activity_key, path_str)
+    if track is None:
+        log.warning(f"Insufficient valid points in path for activity {activity['id']}")
+    return track
 
 def calculate_current_position(activity: Dict) -> Optional[Dict]:
     """Calculate the current position of a citizen based on their activity path."""
     try:
-        # Parse the path
-        path_str = activity['fields'].get('Path')
-        if not path_str:
+        track = get_activity_track(activity)
+        if track is None:
             return None
-        
-        path = json.loads(path_str) if isinstance(path_str, str) else path_str
-        
-        if not path or not isinstance(path, list) or len(path) < 2:
-            log.warning(f"Invalid path for activity {activity['id']}")
+        progress = calculate_progress(activity)
+        if progress is None:
             return None
-        
-        # Validate each point in the path
-        valid_path = []
-        for point in path:
-            if isinstance(point, dict) and 'lat' in point and 'lng' in point:
-                valid_path.append(point)
-        
-        if len(valid_path) < 2:
-            log.warning(f"Insufficient valid points in path for activity {activity['id']}")
-            return None
-        
-        # Get start and end times
-        start_time_str = activity['fields'].get('StartDate')
-        end_time_str = activity['fields'].get('EndDate')
-        
-        if not start_time_str or not end_time_str:
-            log.warning(f"Missing start or end time for activity {activity['id']}")
-            return None
-        
-        # Parse times
-        start_time = datetime.datetime.fromisoformat(start_time_str.replace('Z', '+00:00'))
-        end_time = datetime.datetime.fromisoformat(end_time_str.replace('Z', '+00:00'))
-        current_time = datetime.datetime.now(datetime.timezone.utc)
-        
-        # Calculate progress (0.0 to 1.0)
-        total_duration = (end_time - start_time).total_seconds()
-        elapsed_time = (current_time - start_time).total_seconds()
-        
-        if total_duration <= 0:
-            log.warning(f"Invalid duration for activity {activity['id']}")
-            return None
-        
-        progress = min(1.0, max(0.0, elapsed_time / total_duration))
-        
-        # Calculate position along the path
-        return calculate_position_along_path(valid_path, progress)
+        return track.position_at(progress)
     except Exception as e:
         log.error(f"Error calculating position for activity {activity['id']}: {e}")
         return None
 
+def get_citizen_record_ids(tables) -> Dict[str, str]:
+    """CitizenId and Username -> Airtable record id, from a single fetch of the citizens table."""
+    record_ids = {}
+    try:
+        for citizen in tables['citizens'].all(fields=['CitizenId', 'Username']):
+            for key in (citizen['fields'].get('CitizenId'), citizen['fields'].get('Username')):
+                if key:
+                    record_ids[key] = citizen['id']
+    except Exception as e:
+        log.error(f"Error fetching citizens: {e}")
+    return record_ids
+
 def update_citizen_position(tables, citizen_id: str, position: Dict) -> bool:
     """Update the position of a citizen in the database."""
     try:
@@ -279,7 +244,7 @@ def update_citizen_positions(dry_run: bool = False):
     # Group activities by citizen
     citizen_activities = {}
     for activity in activities:
-        citizen_id = activity['fields'].get('CitizenId')
+        citizen_id = activity['fields'].get('CitizenId') or activity['fields'].get('Citizen')
         if not citizen_id:
             continue
         
@@ -290,26 +255,52 @@ def update_citizen_positions(dry_run: bool = False):
     
     log.info(f"Found activities for **{len(citizen_activities)}** citizens 👥")
     
-    # Update positions for each citizen
-    success_count = 0
-    for citizen_id, activities in citizen_activities.items():
-        # Sort activities by end date (most recent first)
-        activities.sort(key=lambda a: a['fields'].get('EndDate', ''), reverse=True)
-        
-        # Use the most recent activity to calculate position
-        activity = activities[0]
-        position = calculate_current_position(activity)
-        
-        if not position:
+    # Use the most recent activity (by end date) of each citizen to calculate its position
+    now_utc = datetime.datetime.now(datetime.timezone.utc)
+    citizen_ids, tracks, progresses = [], [], []
+    for citizen_id, activities_for_citizen in citizen_activities.items():
+        activity = max(activities_for_citizen, key=lambda a: a['fields'].get('EndDate', ''))
+        try:
+            track = get_activity_track(activity)
+            progress = calculate_progress(activity, now_utc) if track else None
+        except Exception as e:
+            log.error(f"Error calculating position for activity {activity['id']}: {e}")
+            track = progress = None
+        if track is None or progress is None:
             log.warning(f"Could not calculate position for citizen {citizen_id}")
             continue
-        
-        if dry_run:
+        citizen_ids.append(citizen_id)
+        tracks.append(track)
+        progresses.append(progress)
+    
+    # Paths of finished activities are not needed anymore
+    forget_path_tracks({a['fields'].get('ActivityId') or a['id'] for a in activities})
+    positions = positions_at(tracks, progresses)
+    
+    if dry_run:
+        for citizen_id, position in zip(citizen_ids, positions):
             log.info(f"🔍 [DRY RUN] Would update position for citizen **{citizen_id}**: {position}")
-            success_count += 1
-        else:
-            if update_citizen_position(tables, citizen_id, position):
-                success_count += 1
+        success_count = len(positions)
+    else:
+        record_ids = get_citizen_record_ids(tables)
+        updates = []
+        for citizen_id, position in zip(citizen_ids, positions):
+            record_id = record_ids.get(citizen_id)
+            if not record_id:
+                log.warning(f"Citizen {citizen_id} not found")
+                continue
+            updates.append({'id': record_id, 'fields': {
+                'Position': json.dumps(position),
+                'Point': f"citizen_{position['lat']}_{position['lng']}"
+            }})
+        success_count = 0
+        if updates:
+            try:
+                tables['citizens'].batch_update(updates)
+                success_count = len(updates)
+                log.info(f"Updated positions for **{success_count}** citizens 📍")
+            except Exception as e:
+                log.error(f"Error updating citizen positions: {e}")
     
     log.info(f"✅ Position update complete. Successfully updated **{success_count}** out of **{len(citizen_activities)}** citizens")
 
@@ -9,10 +9,15 @@ import math # Added for Haversine distance
 import os # Added import for os module
 import textwrap # For log_header
 from colorama import Fore, Style # For log_header
-from typing import Dict, List, Optional, Any, Tuple, Union # Added Tuple and Union
+from typing import Dict, Iterator, List, Optional, Any, Tuple, Union # Added Tuple and Union
 from pyairtable import Table, Api # Import Table and Api for type hinting
 from dateutil import parser as dateutil_parser # For robust date parsing
 from dotenv import load_dotenv
+from backend.engine.utils.world_snapshot import WorldSnapshot, get_active_snapshot
+from backend.engine.utils.geo import haversine_meters
+from backend.engine.utils.spatial_index import BuildingSpatialIndex, SpatialIndex, get_building_spatial_index as _get_building_spatial_index
+from backend.engine.utils.definitions_cache import get_building_type_definitions, get_resource_type_definitions
+from backend.engine.utils.geodata import get_geodata
 
 log = logging.getLogger(__name__)
 
@@ -130,6 +135,11 @@ def _get_building_position_coords(building_record: Dict) -> Optional[Dict[str, f
         return position
     return None
 
+def _planar_distance_meters(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """_calculate_distance_meters() on plain coordinates (the metric of the building and water point indexes)."""
+    distance_degrees = math.sqrt((lat1 - lat2) ** 2 + (lng1 - lng2) ** 2)
+    return distance_degrees * 111000  # Rough approximation (1 degree ~ 111km)
+
 def _calculate_distance_meters(pos1: Optional[Dict[str, float]], pos2: Optional[Dict[str, float]]) -> float:
     """Calculate approximate distance in meters between two lat/lng points."""
     if not pos1 or not pos2 or 'lat' not in pos1 or 'lng' not in pos1 or 'lat' not in pos2 or 'lng' not in pos2:
@@ -143,29 +153,24 @@ def _calculate_distance_meters(pos1: Optional[Dict[str, float]], pos2: Optional[
         log.warning(f"{LogColors.WARNING}Invalid coordinate types for distance calculation: pos1={pos1}, pos2={pos2}{LogColors.ENDC}")
         return float('inf')
 
-    from math import sqrt, pow # Keep import local if not used elsewhere globally
-    distance_degrees = sqrt(pow(lat1 - lat2, 2) + pow(lng1 - lng2, 2))
-    return distance_degrees * 111000  # Rough approximation (1 degree ~ 111km)
+    return _planar_distance_meters(lat1, lng1, lat2, lng2)
 
 def calculate_haversine_distance_meters(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate the great circle distance in meters between two points on the earth."""
-    R = 6371000  # Radius of Earth in meters
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-
-    a = math.sin(delta_phi / 2.0)**2 + \
-        math.cos(phi1) * math.cos(phi2) * \
-        math.sin(delta_lambda / 2.0)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    distance = R * c
-    return distance
+    return haversine_meters(lat1, lon1, lat2, lon2)
 
 CITIZEN_CARRY_CAPACITY = 20.0 # Max items a citizen can carry
 DEFAULT_CITIZEN_CARRY_CAPACITY = CITIZEN_CARRY_CAPACITY # Default fallback capacity
 
+
+def get_building_spatial_index(tables: Optional[Dict[str, Table]], snapshot: Optional[WorldSnapshot] = None) -> Optional[BuildingSpatialIndex]:
+    """
+    Grid index over all buildings (by Type and SubCategory) for nearest-building queries.
+    Built once per active WorldSnapshot, else from one bulk fetch of tables['buildings'].
+    """
+    snapshot = snapshot or get_active_snapshot()
+    return _get_building_spatial_index(tables, snapshot, _get_building_position_coords, _planar_distance_meters)
+
 def get_citizen_effective_carry_capacity(citizen_record: Dict[str, Any]) -> float:
     """Gets the effective carry capacity for a citizen, checking for an override."""
     if not citizen_record or 'fields' not in citizen_record:
@@ -186,94 +191,63 @@ def get_citizen_effective_carry_capacity(citizen_record: Dict[str, Any]) -> floa
     return DEFAULT_CITIZEN_CARRY_CAPACITY
 
 def get_building_types_from_api(api_base_url: Optional[str] = None) -> Dict:
-    """Get building types information from the API."""
-    if api_base_url is None:
-        api_base_url = os.getenv("API_BASE_URL", "http://localhost:3000")
+    """Get building types information (served from the shared definitions cache, see definitions_cache.py)."""
     try:
-        url = f"{api_base_url}/api/building-types"
-        log.info(f"{LogColors.OKBLUE}Fetching building types from API: {url}{LogColors.ENDC}")
-        response = requests.get(url, timeout=15) # Added timeout
-        response.raise_for_status() # Raise an exception for HTTP errors
-        data = response.json()
-        
-        if data.get("success") and "buildingTypes" in data:
-            building_types = data["buildingTypes"]
-            # Transform the data into a dictionary keyed by building type
-            building_defs = {}
-            for bt in building_types:
-                if "type" in bt:
-                    building_defs[bt["type"]] = {
-                        "type": bt["type"],
-                        "name": bt.get("name"),
-                        "category": bt.get("category"),
-                        "subCategory": bt.get("subCategory"),
-                        "constructionCosts": bt.get("constructionCosts", {}),
-                        "constructionMinutes": bt.get("constructionMinutes"),
-                        "size": bt.get("size"),
-                        "pointType": bt.get("pointType"),
-                        "consumeTier": bt.get("consumeTier"),
-                        "buildTier": bt.get("buildTier"),
-                        "tier": bt.get("tier"),
-                        "productionInformation": bt.get("productionInformation", {}),
-                        "canImport": bt.get("canImport"),
-                        "dailyInfluence": bt.get("dailyInfluence"), # Ajout de dailyInfluence
-                        # Copier d'autres champs utiles directement s'ils existent dans bt
-                        # Par exemple, si vous avez des champs comme "description", "maxOccupants", etc.
-                        # vous pouvez les ajouter ici:
-                        # "description": bt.get("description"),
-                        # "maxOccupants": bt.get("maxOccupants"),
-                        # "commercialStorage": bt.get("commercialStorage") # Exemple d'un autre champ potentiellement utile
-                    }
-            log.info(f"{LogColors.OKGREEN}Successfully fetched {len(building_defs)} building types from API.{LogColors.ENDC}")
-            return building_defs
-        else:
-            log.error(f"{LogColors.FAIL}Unexpected API response format for building types: {data}{LogColors.ENDC}")
+        building_types = get_building_type_definitions(api_base_url)
+        if not building_types:
+            log.error(f"{LogColors.FAIL}No building types available from API, cache or data files.{LogColors.ENDC}")
             return {}
-    except requests.exceptions.RequestException as e_req:
-        log.error(f"{LogColors.FAIL}RequestException fetching building types from API ({url}): {e_req}{LogColors.ENDC}")
-        return {}
-    except json.JSONDecodeError as e_json:
-        log.error(f"{LogColors.FAIL}JSONDecodeError fetching building types from API: {e_json}{LogColors.ENDC}")
-        return {}
+        # Transform the data into a dictionary keyed by building type
+        building_defs = {}
+        for bt in building_types.values():
+            if "type" in bt:
+                building_defs[bt["type"]] = {
+                    "type": bt["type"],
+                    "name": bt.get("name"),
+                    "category": bt.get("category"),
+                    "subCategory": bt.get("subCategory"),
+                    "constructionCosts": bt.get("constructionCosts", {}),
+                    "constructionMinutes": bt.get("constructionMinutes"),
+                    "size": bt.get("size"),
+                    "pointType": bt.get("pointType"),
+                    "consumeTier": bt.get("consumeTier"),
+                    "buildTier": bt.get("buildTier"),
+                    "tier": bt.get("tier"),
+                    "productionInformation": bt.get("productionInformation", {}),
+                    "canImport": bt.get("canImport"),
+                    "dailyInfluence": bt.get("dailyInfluence"), # Ajout de dailyInfluence
+                }
+        log.info(f"{LogColors.OKGREEN}Loaded {len(building_defs)} building types.{LogColors.ENDC}")
+        return building_defs
     except Exception as e:
-        log.error(f"{LogColors.FAIL}Exception fetching building types from API: {str(e)}{LogColors.ENDC}")
+        log.error(f"{LogColors.FAIL}Exception loading building types: {str(e)}{LogColors.ENDC}")
         return {}
 
 def get_resource_types_from_api(api_base_url: Optional[str] = None) -> Dict:
-    """Get resource types information from the API."""
-    if api_base_url is None:
-        api_base_url = os.getenv("API_BASE_URL", "http://localhost:3000")
+    """Get resource types information keyed by resource id (served from the shared definitions cache)."""
     try:
-        url = f"{api_base_url}/api/resource-types"
-        log.info(f"{LogColors.OKBLUE}Fetching resource types from API: {url}{LogColors.ENDC}")
-        response = requests.get(url, timeout=15) # Added timeout
-        response.raise_for_status() # Raise an exception for HTTP errors
-        data = response.json()
-        
-        if data.get("success") and "resourceTypes" in data:
-            resource_types = data["resourceTypes"]
-            # Transform the data into a dictionary keyed by resource id
-            resource_defs = {res["id"]: res for res in resource_types if "id" in res}
-            log.info(f"{LogColors.OKGREEN}Successfully fetched {len(resource_defs)} resource types from API.{LogColors.ENDC}")
-            return resource_defs
-        else:
-            log.error(f"{LogColors.FAIL}Unexpected API response format for resource types: {data}{LogColors.ENDC}")
+        resource_defs = get_resource_type_definitions(api_base_url)
+        if not resource_defs:
+            log.error(f"{LogColors.FAIL}No resource types available from API, cache or data files.{LogColors.ENDC}")
             return {}
-    except requests.exceptions.RequestException as e_req:
-        log.error(f"{LogColors.FAIL}RequestException fetching resource types from API ({url}): {e_req}{LogColors.ENDC}")
-        return {}
-    except json.JSONDecodeError as e_json:
-        log.error(f"{LogColors.FAIL}JSONDecodeError fetching resource types from API: {e_json}{LogColors.ENDC}")
-        return {}
+        log.info(f"{LogColors.OKGREEN}Loaded {len(resource_defs)} resource types.{LogColors.ENDC}")
+        return resource_defs
     except Exception as e:
-        log.error(f"{LogColors.FAIL}Exception fetching resource types from API: {str(e)}{LogColors.ENDC}")
+        log.error(f"{LogColors.FAIL}Exception loading resource types: {str(e)}{LogColors.ENDC}")
         return {}
 
-def get_citizen_record(tables: Dict[str, Table], username: str) -> Optional[Dict]:
-    """Fetches a citizen record by username."""
+def get_citizen_record(tables: Dict[str, Table], username: str, snapshot: Optional[WorldSnapshot] = None) -> Optional[Dict]:
+    """Fetches a citizen record by username (served from the world snapshot when one is available)."""
     if not username:
         log.error(f"{LogColors.FAIL}Empty username provided to get_citizen_record{LogColors.ENDC}")
         return None
+
+    snapshot = snapshot or get_active_snapshot()
+    if snapshot and snapshot.has_table('citizens'):
+        citizen = snapshot.get_citizen(username)
+        if not citizen:
+            log.warning(f"{LogColors.WARNING}Citizen with username or CitizenId '{username}' not found in world snapshot.{LogColors.ENDC}")
+        return citizen
     
     # Vérifier que tables contient bien la table 'citizens'
     if 'citizens' not in tables:
@@ -542,6 +516,29 @@ def is_docks_open_time(current_venice_time: Optional[datetime.datetime] = None)
     now_venice = current_venice_time or datetime.datetime.now(VENICE_TIMEZONE)
     return DOCKS_OPEN_START_HOUR <= now_venice.hour < DOCKS_OPEN_END_HOUR
 
+def _find_path_native(start_position: Dict[str, float], end_position: Dict[str, float]) -> Optional[Dict]:
+    """
+    Path from the path cache or the in-process router (backend.engine.utils.pathfinding),
+    or None to use the transport API.
+    """
+    from backend.engine.utils import pathfinding, path_cache  # both import this module
+    cached_path = path_cache.get_cached_path(start_position, end_position)
+    if cached_path:
+        return cached_path
+    if not pathfinding.is_native_pathfinding_enabled():
+        return None
+    try:
+        native_path = pathfinding.find_path(start_position, end_position)
+    except Exception as e:
+        log.error(f"{LogColors.FAIL}Native pathfinding failed, falling back to the transport API: {e}{LogColors.ENDC}", exc_info=True)
+        return None
+    path_cache.cache_path(start_position, end_position, native_path)
+    return native_path
+
+def _cache_api_path(start_position: Dict[str, float], end_position: Dict[str, float], result: Optional[Dict]):
+    from backend.engine.utils import path_cache
+    path_cache.cache_path(start_position, end_position, result)
+
 def get_path_between_points(start_position: Dict, end_position: Dict, transport_api_url: str) -> Optional[Dict]:
     """Get a path between two points using the transport API."""
     log.info(f"{LogColors.OKBLUE}Getting path from {start_position} to {end_position}{LogColors.ENDC}")
@@ -555,6 +552,10 @@ def get_path_between_points(start_position: Dict, end_position: Dict, transport_
         end_lat = end_position.get('lat', end_position.get('x', end_position.get('latitude')))
         end_lng = end_position.get('lng', end_position.get('y', end_position.get('longitude')))
         
+        native_path = _find_path_native({"lat": start_lat, "lng": start_lng}, {"lat": end_lat, "lng": end_lng})
+        if native_path:
+            return native_path
+
         # Call the transport API
         response = requests.post(
             transport_api_url, # Use passed URL
@@ -575,17 +576,63 @@ def get_path_between_points(start_position: Dict, end_position: Dict, transport_
             log.error(f"{LogColors.FAIL}Transport API returned error: {result.get('error')}{LogColors.ENDC}")
             return None
         
+        _cache_api_path({"lat": start_lat, "lng": start_lng}, {"lat": end_lat, "lng": end_lng}, result)
         return result
     except Exception as e:
         log.error(f"{LogColors.FAIL}Error calling transport API: {e}{LogColors.ENDC}")
         return None
 
-def get_citizen_current_load(tables: Dict[str, Table], citizen_username: str) -> float:
+def _get_paths_batch(start_positions: List[Dict], end_positions: List[Dict], native_paths: Optional[List[Optional[Dict]]],
+                     transport_api_url: str) -> Iterator[Optional[Dict]]:
+    """
+    Yields the native batch results in order; pairs without a native path go through
+    get_path_between_points when reached, so callers that stop early skip those requests.
+    """
+    from backend.engine.utils import path_cache
+    for index, (start_position, end_position) in enumerate(zip(start_positions, end_positions)):
+        native_path = native_paths[index] if native_paths else None
+        if native_path:
+            path_cache.cache_path(start_position, end_position, native_path)
+            yield native_path
+        else:
+            yield get_path_between_points(start_position, end_position, transport_api_url)
+
+def get_paths_from_point(start_position: Dict, end_positions: List[Dict], transport_api_url: str) -> Iterator[Optional[Dict]]:
+    """
+    Paths from one point to each of `end_positions`, yielded in order (None where no path was found).
+    The in-process router answers all of them with a single graph expansion; the rest go
+    through get_path_between_points one by one, as they are consumed.
+    """
+    from backend.engine.utils import pathfinding
+    native_paths = None
+    if end_positions and pathfinding.is_native_pathfinding_enabled():
+        try:
+            native_paths = pathfinding.find_paths_from(start_position, end_positions)
+        except Exception as e:
+            log.error(f"{LogColors.FAIL}Native batch pathfinding failed, falling back to single requests: {e}{LogColors.ENDC}", exc_info=True)
+    return _get_paths_batch([start_position] * len(end_positions), end_positions, native_paths, transport_api_url)
+
+def get_paths_to_point(start_positions: List[Dict], end_position: Dict, transport_api_url: str) -> Iterator[Optional[Dict]]:
+    """Paths from each of `start_positions` to one point (e.g. candidate porters to a pickup); see get_paths_from_point."""
+    from backend.engine.utils import pathfinding
+    native_paths = None
+    if start_positions and pathfinding.is_native_pathfinding_enabled():
+        try:
+            native_paths = pathfinding.find_paths_to(start_positions, end_position)
+        except Exception as e:
+            log.error(f"{LogColors.FAIL}Native batch pathfinding failed, falling back to single requests: {e}{LogColors.ENDC}", exc_info=True)
+    return _get_paths_batch(start_positions, [end_position] * len(start_positions), native_paths, transport_api_url)
+
+def get_citizen_current_load(tables: Dict[str, Table], citizen_username: str, snapshot: Optional[WorldSnapshot] = None) -> float:
     """Calculates the total count of resources currently carried by a citizen."""
-    formula = f"AND({{Asset}}='{_escape_airtable_value(citizen_username)}', {{AssetType}}='citizen')"
     current_load = 0.0
     try:
-        resources_carried = tables['resources'].all(formula=formula)
+        snapshot = snapshot or get_active_snapshot()
+        if snapshot and snapshot.has_table('resources'):
+            resources_carried = snapshot.get_resources(citizen_username, 'citizen')
+        else:
+            formula = f"AND({{Asset}}='{_escape_airtable_value(citizen_username)}', {{AssetType}}='citizen')"
+            resources_carried = tables['resources'].all(formula=formula)
         for resource in resources_carried:
             current_load += float(resource['fields'].get('Count', 0))
         log.debug(f"{LogColors.OKBLUE}Citizen {citizen_username} current load: {current_load}{LogColors.ENDC}")
@@ -604,18 +651,21 @@ def get_closest_food_provider(
     """
     log.info(f"{LogColors.OKBLUE}Searching for the closest food provider (inn, tavern, retail_food) with active food sales to position: {citizen_position}{LogColors.ENDC}")
     try:
-        # Formula to find inns, taverns, or constructed retail_food shops
-        formula_potential_providers = "AND(OR({Type}='inn', {Type}='tavern', {SubCategory}='retail_food'), {IsConstructed}=TRUE())"
-        potential_food_providers = tables['buildings'].all(formula=formula_potential_providers)
-        
-        if not potential_food_providers:
-            log.info(f"{LogColors.OKBLUE}No inns, taverns, or retail_food shops found in the database.{LogColors.ENDC}")
+        spatial_index = get_building_spatial_index(tables)
+        if spatial_index is None or not citizen_position:
+            log.warning(f"{LogColors.WARNING}No building index or position available to search for food providers.{LogColors.ENDC}")
             return None
 
         closest_selling_provider = None
         min_distance = float('inf')
 
-        for provider_record in potential_food_providers:
+        # Nearest first: contracts are only checked until the first provider selling food
+        for provider_record, distance in spatial_index.iter_nearest_matching(
+            float(citizen_position['lat']), float(citizen_position['lng']),
+            types=('inn', 'tavern'), subcategories=('retail_food',)
+        ):
+            if not provider_record['fields'].get('IsConstructed'):
+                continue
             provider_custom_id = provider_record['fields'].get('BuildingId', provider_record['id'])
             provider_sells_food_now = False
             for food_type_id_check in FOOD_RESOURCE_TYPES_FOR_EATING:
@@ -632,15 +682,9 @@ def get_closest_food_provider(
                     log.warning(f"Error checking contracts for provider {provider_custom_id}, food {food_type_id_check}: {e_contract_check}")
             
             if provider_sells_food_now:
-                provider_position = _get_building_position_coords(provider_record)
-                if provider_position:
-                    distance = _calculate_distance_meters(citizen_position, provider_position)
-                    if distance < min_distance:
-                        min_distance = distance
-                        closest_selling_provider = provider_record
-                else:
-                    log.warning(f"{LogColors.WARNING}Food provider {provider_record.get('id')} (sells food) has no valid position data.{LogColors.ENDC}")
-            # else: log.debug(f"Provider {provider_custom_id} does not currently sell any of FOOD_RESOURCE_TYPES_FOR_EATING.")
+                min_distance = distance
+                closest_selling_provider = provider_record
+                break
 
         if closest_selling_provider:
             provider_id_log = closest_selling_provider['fields'].get('BuildingId', closest_selling_provider['id'])
@@ -658,7 +702,8 @@ def get_closest_building_of_type(
     tables: Dict[str, Table], 
     reference_position: Dict[str, float], 
     building_type: str,
-    max_distance_meters: Optional[float] = None # Optional max distance
+    max_distance_meters: Optional[float] = None, # Optional max distance
+    snapshot: Optional[WorldSnapshot] = None
 ) -> Optional[Dict]:
     """
     Finds the closest building of a specific type to the reference_position.
@@ -679,34 +724,24 @@ def get_closest_building_of_type(
             log.error(f"{LogColors.FAIL}max_distance_meters has unexpected type {type(max_distance_meters)} ('{max_distance_meters}'). Ignoring max_distance_meters constraint.{LogColors.ENDC}")
             max_distance_meters_internal = None
         
-        # Filter by type directly in the formula for efficiency
-        formula = f"{{Type}}='{_escape_airtable_value(building_type)}'"
-        buildings_of_type = tables['buildings'].all(formula=formula)
+        spatial_index = get_building_spatial_index(tables, snapshot)
+        buildings_of_type = spatial_index.of_type(building_type) if spatial_index else None
         
-        if not buildings_of_type:
+        if not buildings_of_type or not reference_position:
             log.info(f"{LogColors.OKBLUE}No buildings of type '{building_type}' found.{LogColors.ENDC}")
             return None
 
         closest_building = None
         min_distance = float('inf')
-
-        for building_record in buildings_of_type:
-            building_position = _get_building_position_coords(building_record)
-            if building_position:
-                distance = _calculate_distance_meters(reference_position, building_position)
-                if distance < min_distance:
-                    if max_distance_meters_internal is None or distance <= max_distance_meters_internal:
-                        min_distance = distance
-                        closest_building = building_record
-            else:
-                log.warning(f"{LogColors.WARNING}Building {building_record.get('id')} of type '{building_type}' has no valid position data.{LogColors.ENDC}")
+        nearest = buildings_of_type.nearest(
+            float(reference_position['lat']), float(reference_position['lng']), k=1, max_distance=max_distance_meters_internal
+        )
+        if nearest:
+            closest_building, min_distance = nearest[0]
         
         if closest_building:
             building_id_log = closest_building['fields'].get('BuildingId', closest_building['id'])
             log.info(f"{LogColors.OKGREEN}Closest '{building_type}' found: {building_id_log} at distance {min_distance:.2f}m.{LogColors.ENDC}")
-            if max_distance_meters_internal is not None and min_distance > max_distance_meters_internal:
-                log.info(f"{LogColors.OKBLUE}However, it exceeds the max distance of {max_distance_meters_internal}m.{LogColors.ENDC}")
-                return None # Exceeds max distance
         else:
             log.info(f"{LogColors.OKBLUE}No buildings of type '{building_type}' with valid positions found (or none within max_distance if specified).{LogColors.ENDC}")
         return closest_building
@@ -714,15 +749,18 @@ def get_closest_building_of_type(
         log.error(f"{LogColors.FAIL}Error finding closest building of type '{building_type}': {e}{LogColors.ENDC}")
         return None
 
-def get_citizen_workplace(tables: Dict[str, Table], citizen_custom_id: str, citizen_username: str) -> Optional[Dict]:
+def get_citizen_workplace(tables: Dict[str, Table], citizen_custom_id: str, citizen_username: str, snapshot: Optional[WorldSnapshot] = None) -> Optional[Dict]:
     """Find the workplace building for a citizen."""
     log.info(f"{LogColors.OKBLUE}Finding workplace for citizen {citizen_custom_id} (Username: {citizen_username}){LogColors.ENDC}")
     
     try:
-        # Get buildings where this citizen is the occupant and the category is business
-        formula = f"AND({{Occupant}}='{_escape_airtable_value(citizen_username)}', {{Category}}='business')"
-        
-        workplaces = tables['buildings'].all(formula=formula)
+        snapshot = snapshot or get_active_snapshot()
+        if snapshot and snapshot.has_table('buildings'):
+            workplaces = snapshot.get_buildings_occupied_by(citizen_username, category='business')
+        else:
+            # Get buildings where this citizen is the occupant and the category is business
+            formula = f"AND({{Occupant}}='{_escape_airtable_value(citizen_username)}', {{Category}}='business')"
+            workplaces = tables['buildings'].all(formula=formula)
         
         if workplaces:
             # Check if the workplace has a BuildingId
@@ -739,16 +777,18 @@ def get_citizen_workplace(tables: Dict[str, Table], citizen_custom_id: str, citi
         log.error(f"{LogColors.FAIL}Error finding workplace for citizen {citizen_custom_id}: {e}{LogColors.ENDC}")
         return None
 
-def get_citizen_home(tables: Dict[str, Table], citizen_username_for_occupant: str) -> Optional[Dict]:
+def get_citizen_home(tables: Dict[str, Table], citizen_username_for_occupant: str, snapshot: Optional[WorldSnapshot] = None) -> Optional[Dict]:
     """Find the home building for a citizen using their username for the Occupant field."""
     log.info(f"{LogColors.OKBLUE}Finding home for citizen (occupant: {citizen_username_for_occupant}){LogColors.ENDC}")
     
     try:
-        
-        # Get buildings where this citizen is the occupant and the category is 'home'
-        formula = f"AND({{Occupant}}='{_escape_airtable_value(citizen_username_for_occupant)}', {{Category}}='home')"
-        
-        homes = tables['buildings'].all(formula=formula)
+        snapshot = snapshot or get_active_snapshot()
+        if snapshot and snapshot.has_table('buildings'):
+            homes = snapshot.get_buildings_occupied_by(citizen_username_for_occupant, category='home')
+        else:
+            # Get buildings where this citizen is the occupant and the category is 'home'
+            formula = f"AND({{Occupant}}='{_escape_airtable_value(citizen_username_for_occupant)}', {{Category}}='home')"
+            homes = tables['buildings'].all(formula=formula)
         
         if homes:
             # Check if the home has a BuildingId
@@ -766,12 +806,16 @@ def get_citizen_home(tables: Dict[str, Table], citizen_username_for_occupant: st
         log.error(f"{LogColors.FAIL}Error finding home for citizen {citizen_username_for_occupant}: {e}{LogColors.ENDC}")
         return None
 
-def get_citizen_businesses_run(tables: Dict[str, Table], citizen_username: str) -> List[Dict]:
+def get_citizen_businesses_run(tables: Dict[str, Table], citizen_username: str, snapshot: Optional[WorldSnapshot] = None) -> List[Dict]:
     """Fetches all business buildings run by a specific citizen."""
     log.info(f"{LogColors.OKBLUE}Finding businesses run by citizen {citizen_username}{LogColors.ENDC}")
     try:
-        formula = f"AND({{RunBy}}='{_escape_airtable_value(citizen_username)}', {{Category}}='business')"
-        businesses = tables['buildings'].all(formula=formula)
+        snapshot = snapshot or get_active_snapshot()
+        if snapshot and snapshot.has_table('buildings'):
+            businesses = snapshot.get_buildings_run_by(citizen_username, category='business')
+        else:
+            formula = f"AND({{RunBy}}='{_escape_airtable_value(citizen_username)}', {{Category}}='business')"
+            businesses = tables['buildings'].all(formula=formula)
         if businesses:
             log.info(f"{LogColors.OKGREEN}Found {len(businesses)} businesses run by {citizen_username}.{LogColors.ENDC}")
         else:
@@ -789,12 +833,16 @@ def get_building_type_info(building_type: str, building_type_definitions: Dict)
         log.warning(f"{LogColors.WARNING}Building type '{building_type}' not found in pre-fetched definitions.{LogColors.ENDC}")
     return bt_info
 
-def get_building_resources(tables: Dict[str, Table], building_id: str) -> Dict[str, float]:
+def get_building_resources(tables: Dict[str, Table], building_id: str, snapshot: Optional[WorldSnapshot] = None) -> Dict[str, float]:
     """Get all resources in a building, returned as a dictionary of resource_type -> count."""
     try:
-        escaped_building_id = _escape_airtable_value(building_id)
-        formula = f"AND({{Asset}}='{escaped_building_id}', {{AssetType}}='building')"
-        resources = tables['resources'].all(formula=formula)
+        snapshot = snapshot or get_active_snapshot()
+        if snapshot and snapshot.has_table('resources'):
+            resources = snapshot.get_resources(building_id, 'building')
+        else:
+            escaped_building_id = _escape_airtable_value(building_id)
+            formula = f"AND({{Asset}}='{escaped_building_id}', {{AssetType}}='building')"
+            resources = tables['resources'].all(formula=formula)
         
         resource_dict = {}
         for resource in resources:
@@ -818,7 +866,7 @@ def find_path_between_buildings_or_coords(
     """
     Finds a path between two locations, which can be building records, 
     coordinate dictionaries {lat, lng}, or building_id dictionaries {building_id: "..."}.
-    Uses the transport API.
+    Uses the in-process router, falling back to the transport API.
     """
     start_pos_coords: Optional[Dict[str, float]] = None
     end_pos_coords: Optional[Dict[str, float]] = None
@@ -860,21 +908,23 @@ def find_path_between_buildings_or_coords(
         return None
 
     final_transport_api_url = transport_api_url or f"{api_base_url}/api/transport"
-    log.info(f"{LogColors.OKBLUE}Finding path between locations using API: {final_transport_api_url}{LogColors.ENDC}")
     log.debug(f"Pathfinding from: {start_pos_coords} to: {end_pos_coords}")
 
     try:
-        response = requests.post(
-            final_transport_api_url,
-            json={
-                "startPoint": start_pos_coords,
-                "endPoint": end_pos_coords,
-                "startDate": datetime.datetime.now(pytz.UTC).isoformat()
-            }
-        )
-        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-        
-        data = response.json()
+        data = _find_path_native(start_pos_coords, end_pos_coords)
+        if data is None:
+            log.info(f"{LogColors.OKBLUE}Finding path between locations using API: {final_transport_api_url}{LogColors.ENDC}")
+            response = requests.post(
+                final_transport_api_url,
+                json={
+                    "startPoint": start_pos_coords,
+                    "endPoint": end_pos_coords,
+                    "startDate": datetime.datetime.now(pytz.UTC).isoformat()
+                }
+            )
+            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+            data = response.json()
+            _cache_api_path(start_pos_coords, end_pos_coords, data)
         if data.get("success") and "path" in data:
             log.info(f"{LogColors.OKGREEN}Found path with {len(data['path'])} points.{LogColors.ENDC}")
             # Add duration_minutes if durationSeconds is available from the transport API
@@ -920,6 +970,11 @@ def find_path_between_buildings(from_building: Dict, to_building: Dict, api_base
             log.warning(f"{LogColors.WARNING}Missing position data for buildings in find_path_between_buildings{LogColors.ENDC}")
             return None
         
+        native_path = _find_path_native(from_position, to_position)
+        if native_path:
+            log.info(f"{LogColors.OKGREEN}Found path between buildings with {len(native_path['path'])} points{LogColors.ENDC}")
+            return native_path
+
         url = f"{api_base_url}/api/transport"
         log.info(f"{LogColors.OKBLUE}Finding path between buildings using API: {url}{LogColors.ENDC}")
         
@@ -936,6 +991,7 @@ def find_path_between_buildings(from_building: Dict, to_building: Dict, api_base
             data = response.json()
             if data.get("success") and "path" in data:
                 log.info(f"{LogColors.OKGREEN}Found path between buildings with {len(data['path'])} points{LogColors.ENDC}")
+                _cache_api_path(from_position, to_position, data)
                 return data
             else:
                 log.warning(f"{LogColors.WARNING}No path found between buildings: {data.get('error', 'Unknown error')}{LogColors.ENDC}")
@@ -990,18 +1046,27 @@ def get_citizen_contracts(tables: Dict[str, Table], citizen_id: str) -> List[Dic
         log.error(f"{LogColors.FAIL}Error getting contracts for citizen {citizen_id}: {e}{LogColors.ENDC}")
         return []
 
-def get_idle_citizens(tables: Dict[str, Table], now_utc_for_check_override: Optional[datetime.datetime] = None) -> List[Dict]: # Ajout du paramètre
+def get_idle_citizens(
+    tables: Dict[str, Table],
+    now_utc_for_check_override: Optional[datetime.datetime] = None, # Ajout du paramètre
+    snapshot: Optional[WorldSnapshot] = None
+) -> List[Dict]:
     """Fetch all citizens who are currently idle (no active activities)."""
     log.info(f"{LogColors.OKBLUE}Fetching idle citizens...{LogColors.ENDC}")
     
     try:
-        all_citizens = tables['citizens'].all()
+        snapshot = snapshot or get_active_snapshot()
+        if snapshot and snapshot.has_table('citizens') and snapshot.has_table('activities'):
+            # The snapshot's activities are already restricted to non-terminal statuses
+            all_citizens = snapshot.all_records('citizens')
+            all_potentially_active_activities = snapshot.all_records('activities')
+        else:
+            all_citizens = tables['citizens'].all()
+            # Fetch all activities not yet in a terminal state ('processed' or 'failed')
+            non_terminal_activities_formula = "NOT(OR({Status} = 'processed', {Status} = 'failed'))"
+            all_potentially_active_activities = tables['activities'].all(formula=non_terminal_activities_formula)
         log.info(f"{LogColors.OKBLUE}Found {len(all_citizens)} total citizens.{LogColors.ENDC}")
         
-        # Fetch all activities not yet in a terminal state ('processed' or 'failed')
-        non_terminal_activities_formula = "NOT(OR({Status} = 'processed', {Status} = 'failed'))"
-        all_potentially_active_activities = tables['activities'].all(formula=non_terminal_activities_formula)
-        
         # Utiliser l'override si fourni, sinon l'heure actuelle réelle
         now_utc_to_use = now_utc_for_check_override if now_utc_for_check_override else datetime.datetime.now(pytz.utc)
         if now_utc_for_check_override:
@@ -1108,11 +1173,16 @@ def _fetch_and_assign_random_starting_position(tables: Dict[str, Table], citizen
         log.error(f"{LogColors.FAIL}General error fetching or assigning random position for {citizen_custom_id}: {e_general}{LogColors.ENDC}")
         return None
 
-def get_building_record(tables: Dict[str, Table], building_id_input: Union[str, List[str], Tuple[str, ...]]) -> Optional[Dict]:
+def get_building_record(
+    tables: Dict[str, Table],
+    building_id_input: Union[str, List[str], Tuple[str, ...]],
+    snapshot: Optional[WorldSnapshot] = None
+) -> Optional[Dict]:
     """
     Fetches a building record by its custom BuildingId.
     Handles cases where building_id_input might be a string, or a list/tuple containing a single string ID
     (common for linked/lookup fields from Airtable).
+    Served from the world snapshot when one is passed in or active.
     """
     actual_building_id_str: Optional[str] = None
     if isinstance(building_id_input, str):
@@ -1140,6 +1210,14 @@ def get_building_record(tables: Dict[str, Table], building_id_input: Union[str,
         log.error(f"{LogColors.FAIL}Could not determine a valid string BuildingId from input: {building_id_input}{LogColors.ENDC}")
         return None
 
+    snapshot = snapshot or get_active_snapshot()
+    if snapshot and snapshot.has_table('buildings'):
+        building = snapshot.get_building(actual_building_id_str)
+        if building:
+            return building
+        # Buildings created after the snapshot was loaded (e.g. new galleys) are looked up live.
+        log.debug(f"Building '{actual_building_id_str}' not in world snapshot, querying Airtable.")
+
     formula = f"{{BuildingId}} = '{_escape_airtable_value(actual_building_id_str)}'"
     try:
         records = tables['buildings'].all(formula=formula, max_records=1)
@@ -1199,27 +1277,19 @@ def get_closest_building_to_position(
     min_distance = float('inf')
 
     try:
-        all_buildings = tables['buildings'].all() # Consider filtering if performance becomes an issue
-        if not all_buildings:
+        spatial_index = get_building_spatial_index(tables)
+        if spatial_index is None or not len(spatial_index.all):
             log.info(f"{LogColors.OKBLUE}No buildings found in the database to check for closest.{LogColors.ENDC}")
             return None
 
-        for building_record in all_buildings:
-            building_pos = _get_building_position_coords(building_record)
-            if building_pos:
-                distance = _calculate_distance_meters(position_coords, building_pos)
-                if distance < min_distance:
-                    min_distance = distance
-                    closest_building_record = building_record
+        nearest = spatial_index.all.nearest(float(position_coords['lat']), float(position_coords['lng']), k=1, max_distance=max_distance_meters)
+        if nearest:
+            closest_building_record, min_distance = nearest[0]
         
-        if closest_building_record and min_distance <= max_distance_meters:
+        if closest_building_record:
             building_id_log = closest_building_record['fields'].get('BuildingId', closest_building_record['id'])
             log.info(f"{LogColors.OKGREEN}Closest building to {position_coords} is {building_id_log} at {min_distance:.2f}m (within {max_distance_meters}m limit).{LogColors.ENDC}")
             return closest_building_record
-        elif closest_building_record: # Found a building, but it's too far
-            building_id_log = closest_building_record['fields'].get('BuildingId', closest_building_record['id'])
-            log.info(f"{LogColors.OKBLUE}Closest building {building_id_log} is at {min_distance:.2f}m, which exceeds the {max_distance_meters}m limit.{LogColors.ENDC}")
-            return None
         else: # No building with valid position found or no buildings at all
             log.info(f"{LogColors.OKBLUE}No building found within {max_distance_meters}m of {position_coords}.{LogColors.ENDC}")
             return None
@@ -1231,16 +1301,21 @@ def get_closest_building_to_position(
 def get_building_storage_details(
     tables: Dict[str, Table],
     building_custom_id: str,
-    owner_username: str
+    owner_username: str,
+    snapshot: Optional[WorldSnapshot] = None
 ) -> Tuple[float, Dict[str, float]]:
     """Gets total stored volume and a dict of resource_type -> amount for a building and owner."""
     total_volume = 0.0
     resources_map: Dict[str, float] = {}
-    formula = (f"AND({{Asset}}='{_escape_airtable_value(building_custom_id)}', "
-               f"{{AssetType}}='building', "
-               f"{{Owner}}='{_escape_airtable_value(owner_username)}')")
     try:
-        resource_records = tables["resources"].all(formula=formula)
+        snapshot = snapshot or get_active_snapshot()
+        if snapshot and snapshot.has_table('resources'):
+            resource_records = snapshot.get_resources(building_custom_id, 'building', owner=owner_username)
+        else:
+            formula = (f"AND({{Asset}}='{_escape_airtable_value(building_custom_id)}', "
+                       f"{{AssetType}}='building', "
+                       f"{{Owner}}='{_escape_airtable_value(owner_username)}')")
+            resource_records = tables["resources"].all(formula=formula)
         for record in resource_records:
             count = float(record['fields'].get('Count', 0.0))
             resource_type = record['fields'].get('Type')
@@ -1307,15 +1382,19 @@ def create_resource_record(
         log.error(f"{LogColors.FAIL}Error creating resource record for {resource_type_id}, {asset_type} {asset_id}: {e}{LogColors.ENDC}")
         return None
 
-def get_citizen_inventory_details(tables: Dict[str, Table], citizen_username: str) -> List[Dict[str, Any]]:
+def get_citizen_inventory_details(tables: Dict[str, Table], citizen_username: str, snapshot: Optional[WorldSnapshot] = None) -> List[Dict[str, Any]]:
     """
     Fetches a detailed list of resources in a citizen's inventory.
     Each item in the list is a dict: {"ResourceId": type, "Amount": count, "Owner": owner_username, "AirtableRecordId": record_id}
     """
     inventory_details: List[Dict[str, Any]] = []
-    formula = f"AND({{Asset}}='{_escape_airtable_value(citizen_username)}', {{AssetType}}='citizen')"
     try:
-        resources_carried = tables['resources'].all(formula=formula)
+        snapshot = snapshot or get_active_snapshot()
+        if snapshot and snapshot.has_table('resources'):
+            resources_carried = snapshot.get_resources(citizen_username, 'citizen')
+        else:
+            formula = f"AND({{Asset}}='{_escape_airtable_value(citizen_username)}', {{AssetType}}='citizen')"
+            resources_carried = tables['resources'].all(formula=formula)
         for resource_record in resources_carried:
             fields = resource_record['fields']
             inventory_details.append({
@@ -1558,26 +1637,10 @@ def update_citizen_ducats(
         log.error(f"{LogColors.FAIL}Citizen Airtable ID is required to update ducats.{LogColors.ENDC}")
         return False
 
-    try:
-        citizen_record = tables['citizens'].get(citizen_airtable_id)
-        if not citizen_record:
-            log.error(f"{LogColors.FAIL}Citizen with Airtable ID {citizen_airtable_id} not found. Cannot update ducats.{LogColors.ENDC}")
-            return False
-
-        current_ducats = float(citizen_record['fields'].get('Ducats', 0.0))
-        new_ducats = current_ducats + amount_change
-        
-        citizen_username = citizen_record['fields'].get('Username', citizen_airtable_id) # For logging and transaction
-
-        if new_ducats < 0 and amount_change < 0: # Check only if spending leads to negative
-            log.warning(f"{LogColors.WARNING}Citizen {citizen_username} has insufficient ducats ({current_ducats:.2f}) for transaction of {amount_change:.2f}. Required: {abs(amount_change):.2f}.{LogColors.ENDC}")
-            # Optionally, create a problem record here
-            return False # Transaction fails if it would result in negative balance from spending
-
-        tables['citizens'].update(citizen_airtable_id, {'Ducats': new_ducats})
-        log.info(f"{LogColors.OKGREEN}Updated ducats for citizen {citizen_username} (ID: {citizen_airtable_id}). Old: {current_ducats:.2f}, Change: {amount_change:.2f}, New: {new_ducats:.2f}. Reason: {reason}{LogColors.ENDC}")
+    # The balance service serializes concurrent changes to the same citizen (imported here: it imports this module)
+    from backend.engine.utils.ducat_service import get_ducat_service
 
-        # Create transaction record
+    try:
         transaction_type = "expense" if amount_change < 0 else "income"
         if "fee" in reason.lower():
             transaction_type = "fee_payment"
@@ -1587,6 +1650,15 @@ def update_citizen_ducats(
             transaction_type = "rent_payment"
         # Add more specific types as needed
 
+        ducat_service = get_ducat_service(tables)
+        new_ducats = ducat_service.adjust(citizen_airtable_id, amount_change, reason, transaction_type=transaction_type)
+        if new_ducats is None:
+            # Citizen not found, or spending would result in a negative balance (logged by the service)
+            return False
+        citizen_username = ducat_service.username(citizen_airtable_id) or citizen_airtable_id # For logging and transaction
+        log.info(f"{LogColors.OKGREEN}Updated ducats for citizen {citizen_username} (ID: {citizen_airtable_id}). Change: {amount_change:.2f}, New: {new_ducats:.2f}. Reason: {reason}{LogColors.ENDC}")
+
+        # Create transaction record
         transaction_payload = {
             "Type": transaction_type,
             "Price": abs(amount_change), # Price is always positive
@@ -1920,12 +1992,20 @@ def _get_res_display_name_module(resource_id: str, resource_definitions_dict: Di
 _water_graph_cache: Optional[Dict] = None
 _water_graph_last_fetch_time: Optional[datetime.datetime] = None
 _WATER_GRAPH_CACHE_TTL_SECONDS = 300  # Cache for 5 minutes
+_fishable_water_index: Optional[Tuple[Dict, SpatialIndex]] = None  # (water graph it was built from, index)
 
 
 def _get_water_graph_data(api_base_url: str) -> Optional[Dict]:
-    """Fetches water graph data from the API, with caching."""
+    """
+    Water points ({'waterPoints': [...]}) from data/watergraph.json, loaded once per process (see
+    utils/geodata.py). Falls back to the API, with caching, when the file isn't available.
+    """
     global _water_graph_cache, _water_graph_last_fetch_time
-    
+
+    geodata = get_geodata()
+    if geodata is not None and geodata.water_ids:
+        return geodata.water_graph()
+
     now = datetime.datetime.now(pytz.UTC)
     if _water_graph_cache and _water_graph_last_fetch_time and \
        (now - _water_graph_last_fetch_time).total_seconds() < _WATER_GRAPH_CACHE_TTL_SECONDS:
@@ -1950,6 +2030,27 @@ def _get_water_graph_data(api_base_url: str) -> Optional[Dict]:
         return None
 
 
+def _get_fishable_water_index(water_graph: Dict) -> SpatialIndex:
+    """Grid index over the water points with hasFish, rebuilt when the cached water graph is refreshed."""
+    global _fishable_water_index
+    if _fishable_water_index is not None and _fishable_water_index[0] is water_graph:
+        return _fishable_water_index[1]
+    index = SpatialIndex(distance_fn=_planar_distance_meters)
+    for point_data in water_graph.get("waterPoints", []):
+        if not point_data.get("hasFish"):
+            continue
+        position_field = point_data.get("position")
+        if not position_field or not isinstance(position_field, dict):
+            log.warning(f"Water point {point_data.get('id', 'Unknown ID')} missing or invalid 'position' field. Skipping.")
+            continue
+        try:
+            index.insert(float(position_field.get("lat", 0.0)), float(position_field.get("lng", 0.0)), point_data)
+        except (ValueError, TypeError):
+            log.warning(f"Water point {point_data.get('id', 'Unknown ID')} has invalid lat/lng in position field: {position_field}. Skipping.")
+    _fishable_water_index = (water_graph, index)
+    return index
+
+
 def _find_closest_fishable_water_point(
     citizen_position: Dict[str, float], 
     api_base_url: str,
@@ -1961,41 +2062,16 @@ def _find_closest_fishable_water_point(
         log.warning("No water graph data or water points available for fishing.")
         return None, None, None
 
-    fishable_points = [wp for wp in water_graph["waterPoints"] if wp.get("hasFish")]
-    if not fishable_points:
+    fishable_index = _get_fishable_water_index(water_graph)
+    if not fishable_index:
         log.info("No water points with fish found.")
         return None, None, None
 
     closest_point_record = None
     min_distance = float('inf')
-
-    for point_data in fishable_points:
-        # Correctly access nested position data
-        position_field = point_data.get("position")
-        if not position_field or not isinstance(position_field, dict):
-            log.warning(f"Water point {point_data.get('id', 'Unknown ID')} missing or invalid 'position' field. Skipping.")
-            continue
-            
-        try:
-            point_lat = float(position_field.get("lat", 0.0))
-            point_lng = float(position_field.get("lng", 0.0))
-        except (ValueError, TypeError):
-            log.warning(f"Water point {point_data.get('id', 'Unknown ID')} has invalid lat/lng in position field: {position_field}. Skipping.")
-            continue
-
-        point_pos = {"lat": point_lat, "lng": point_lng}
-        # Check for (0,0) might not be necessary if API guarantees valid coords for fishable points,
-        # but as a safeguard if 0,0 is an invalid location:
-        if point_lat == 0.0 and point_lng == 0.0: 
-            log.debug(f"Water point {point_data.get('id', 'Unknown ID')} has coordinates (0,0). Skipping if this is considered invalid.")
-            # Depending on game logic, (0,0) might be a valid sea point or an error indicator.
-            # If it's an error, 'continue' here. For now, assume it could be valid.
-            # continue 
-
-        distance = _calculate_distance_meters(citizen_position, point_pos)
-        if distance < min_distance:
-            min_distance = distance
-            closest_point_record = point_data
+    nearest = fishable_index.nearest(float(citizen_position['lat']), float(citizen_position['lng']), k=1)
+    if nearest:
+        closest_point_record, min_distance = nearest[0]
     
     if closest_point_record:
         # Correctly access nested position data for the chosen point
@@ -0,0 +1,269 @@
+"""
+Adaptive worker pool for La Serenissima engine scripts.
+
+Activity processing spends almost all of its time blocked on HTTP, so the right number of
+workers depends on how fast Airtable answers and whether it is throttling us. This module
+provides:
+
+- TokenBucket: a rate limiter shared by every worker (Airtable allows ~5 requests/sec per base).
+- AIMDController: grows the concurrency limit by one while requests stay fast and unthrottled,
+  and halves it on 429 responses or when latency degrades.
+- RateLimitedAdapter: a requests adapter that takes a token before each request and reports
+  latency/status to the controller. `instrument_tables()` mounts it on the Airtable sessions.
+- AdaptiveWorkerPool: runs one task per shard (citizen), so activities of one citizen stay
+  sequential, with at most `controller.limit` tasks running at once.
+
+Usage:
+    controller = AIMDController()
+    instrument_tables(tables, controller)
+    with AdaptiveWorkerPool(controller) as pool:
+        future = pool.submit(process_citizen, ...)
+    log.info(pool.report(activities_done))
+"""
+
+import os
+import time
+import logging
+import threading
+import concurrent.futures
+from typing import Any, Callable, Dict, Optional
+
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+AIRTABLE_REQUESTS_PER_SECOND = float(os.getenv("AIRTABLE_REQUESTS_PER_SECOND", "5"))
+ACTIVITY_WORKERS_MIN = int(os.getenv("ACTIVITY_WORKERS_MIN", "2"))
+ACTIVITY_WORKERS_MAX = int(os.getenv("ACTIVITY_WORKERS_MAX", "32"))
+ACTIVITY_WORKERS_INITIAL = int(os.getenv("ACTIVITY_WORKERS_INITIAL", "5"))
+
+THROTTLE_STATUS_CODES = (429, 503)
+DEFAULT_LATENCY_CEILING_SECONDS = 2.0
+DEFAULT_INCREASE_EVERY = 20         # successful requests between additive increases
+DEFAULT_THROTTLE_PAUSE_SECONDS = 30  # Airtable asks clients to wait 30s after a 429
+
+
+class TokenBucket:
+    """Thread-safe token bucket. `acquire()` blocks until a token is available."""
+
+    def __init__(self, rate: float = AIRTABLE_REQUESTS_PER_SECOND, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Takes `tokens`, sleeping as needed. Returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                else:
+                    delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float):
+        """Stops handing out tokens for `seconds` (used after a 429) and empties the bucket."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class AIMDController:
+    """
+    Additive-increase / multiplicative-decrease controller for the concurrency limit.
+    Request outcomes are fed in by RateLimitedAdapter; workers wait on `acquire_slot()`.
+    """
+
+    def __init__(
+        self,
+        min_limit: int = ACTIVITY_WORKERS_MIN,
+        max_limit: int = ACTIVITY_WORKERS_MAX,
+        initial_limit: int = ACTIVITY_WORKERS_INITIAL,
+        bucket: Optional[TokenBucket] = None,
+        latency_ceiling: float = DEFAULT_LATENCY_CEILING_SECONDS,
+        increase_every: int = DEFAULT_INCREASE_EVERY,
+        throttle_pause: float = DEFAULT_THROTTLE_PAUSE_SECONDS
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial_limit))
+        self.bucket = bucket or TokenBucket()
+        self.latency_ceiling = latency_ceiling
+        self.increase_every = increase_every
+        self.throttle_pause = throttle_pause
+
+        self._condition = threading.Condition()
+        self._active = 0
+        self._successes_since_change = 0
+        self._samples_since_change = 0
+        self._latency_ewma: Optional[float] = None
+
+        # Stats for the end-of-run report
+        self.requests = 0
+        self.throttled = 0
+        self.total_latency = 0.0
+        self.peak_limit = self.limit
+        self.lowest_limit = self.limit
+
+    # --- Slots ---
+
+    def acquire_slot(self):
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+
+    def release_slot(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+
+    # --- Feedback ---
+
+    def record_request(self, latency: float, status_code: Optional[int], retry_after: Optional[float] = None):
+        throttled = status_code in THROTTLE_STATUS_CODES
+        with self._condition:
+            self.requests += 1
+            self.total_latency += latency
+            self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+            self._samples_since_change += 1
+
+            if throttled:
+                self.throttled += 1
+                self._decrease(f"HTTP {status_code}")
+            elif self._latency_ewma > self.latency_ceiling:
+                if self._samples_since_change >= 5:
+                    self._decrease(f"latency {self._latency_ewma:.2f}s")
+            else:
+                self._successes_since_change += 1
+                if self._successes_since_change >= self.increase_every and self.limit < self.max_limit:
+                    self._set_limit(self.limit + 1)
+                    self._condition.notify()
+
+        if throttled:
+            self.bucket.pause(retry_after if retry_after is not None else self.throttle_pause)
+
+    def _decrease(self, reason: str):
+        new_limit = max(self.min_limit, self.limit // 2)
+        if new_limit < self.limit:
+            log.warning(f"AIMD: reducing concurrency {self.limit} -> {new_limit} ({reason}).")
+            self._set_limit(new_limit)
+        # Let the EWMA recover from the sample that triggered the decrease
+        self._latency_ewma = None
+        self._successes_since_change = 0
+        self._samples_since_change = 0
+
+    def _set_limit(self, new_limit: int):
+        self.limit = new_limit
+        self._successes_since_change = 0
+        self.peak_limit = max(self.peak_limit, new_limit)
+        self.lowest_limit = min(self.lowest_limit, new_limit)
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """HTTPAdapter that takes a token per request and reports latency/status to the controller."""
+
+    def __init__(self, controller: AIMDController, **kwargs):
+        self.controller = controller
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        self.controller.bucket.acquire()
+        start = time.monotonic()
+        response = None
+        try:
+            response = super().send(request, **kwargs)
+            return response
+        finally:
+            status_code = response.status_code if response is not None else None
+            # 429s absorbed by the urllib3 retry strategy only show up in the retry history
+            retry_history = getattr(getattr(getattr(response, 'raw', None), 'retries', None), 'history', None) or ()
+            if status_code not in THROTTLE_STATUS_CODES:
+                throttled_retry = next((h.status for h in retry_history if h.status in THROTTLE_STATUS_CODES), None)
+                status_code = throttled_retry or status_code
+            retry_after = None
+            if response is not None and response.headers.get('Retry-After'):
+                try:
+                    retry_after = float(response.headers['Retry-After'])
+                except ValueError:
+                    pass
+            self.controller.record_request(time.monotonic() - start, status_code, retry_after)
+
+
+def instrument_tables(tables: Dict[str, Any], controller: AIMDController) -> int:
+    """
+    Mounts a RateLimitedAdapter on the HTTP session behind the given pyairtable tables.
+    Tables without an HTTP session (e.g. the SQLite backend) are left alone.
+    Returns the number of sessions instrumented.
+    """
+    sessions = {}
+    for table in tables.values():
+        session = getattr(getattr(table, 'api', None), 'session', None)
+        if session is not None and hasattr(session, 'mount'):
+            sessions[id(session)] = session
+    for session in sessions.values():
+        # Keep the retry strategy of the adapter being replaced (pyairtable's Api(retry_strategy=...))
+        existing_retries = getattr(session.get_adapter('https://api.airtable.com'), 'max_retries', 0)
+        session.mount('https://', RateLimitedAdapter(controller, max_retries=existing_retries))
+    return len(sessions)
+
+
+class AdaptiveWorkerPool:
+    """
+    Thread pool whose effective concurrency follows `controller.limit`.
+    Threads up to `controller.max_limit` exist, but only `limit` run tasks at the same time.
+    """
+
+    def __init__(self, controller: AIMDController, thread_name_prefix: str = "adaptive-worker"):
+        self.controller = controller
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=controller.max_limit, thread_name_prefix=thread_name_prefix
+        )
+        self.started_at = time.time()
+        self.tasks_completed = 0
+        self._stats_lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> concurrent.futures.Future:
+        return self._executor.submit(self._run_gated, fn, *args, **kwargs)
+
+    def _run_gated(self, fn: Callable, *args, **kwargs):
+        self.controller.acquire_slot()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.controller.release_slot()
+            with self._stats_lock:
+                self.tasks_completed += 1
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self) -> 'AdaptiveWorkerPool':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=True)
+
+    def report(self, items_processed: int) -> str:
+        """One-line throughput summary for the end of a run."""
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        c = self.controller
+        avg_latency = (c.total_latency / c.requests) if c.requests else 0.0
+        return (f"{items_processed} activities for {self.tasks_completed} citizens in {elapsed:.1f}s "
+                f"({items_processed / elapsed:.2f} activities/sec). Concurrency {c.lowest_limit}-{c.peak_limit} "
+                f"(final {c.limit}), {c.requests} Airtable requests, avg latency {avg_latency:.2f}s, "
+                f"{c.throttled} throttled.")
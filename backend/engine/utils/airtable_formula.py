@@ -0,0 +1,690 @@
+"""
+Parser for the subset of the Airtable formula language used by the engine.
+
+Turns strings such as
+    AND({Asset}='building_1', {AssetType}='building', {Count}>0)
+into a small AST, and compiles that AST either to SQLite SQL over records stored as JSON
+(see sqlite_storage.py) or to a Python predicate over {'id', 'fields'} records, so the same
+formula can be evaluated against a WorldSnapshot or any other in-memory record list:
+
+    is_stocked = compile_predicate("AND({AssetType}='building', {Count}>0)")
+    stocked = [r for r in records if is_stocked(r)]
+    # or: filter_records(records, "AND({AssetType}='building', {Count}>0)")
+
+Parsed ASTs and compiled predicates are cached per formula string.
+
+Supported: string/number literals, {Field} references, parentheses, the operators
+= != < > <= >= & + - * /, and the functions AND, OR, NOT, IF, TRUE, FALSE, BLANK,
+LOWER, UPPER, LEN, FIND, SEARCH, ARRAYJOIN, NOW, IS_AFTER, IS_BEFORE,
+DATETIME_PARSE, DATETIME_DIFF, DATEADD, RECORD_ID.
+"""
+
+import re
+import datetime
+import functools
+from typing import Callable, Dict, Iterable, List, Optional, Any, Tuple
+
+import pytz
+from dateutil import parser as dateutil_parser
+
+
+class FormulaError(ValueError):
+    """Raised when a formula cannot be tokenized, parsed or compiled."""
+
+
+# --- AST ---
+
+class Literal:
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __repr__(self):
+        return f"Literal({self.value!r})"
+
+
+class FieldRef:
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return f"FieldRef({self.name!r})"
+
+
+class Call:
+    __slots__ = ('name', 'args')
+
+    def __init__(self, name: str, args: List[Any]):
+        self.name = name
+        self.args = args
+
+    def __repr__(self):
+        return f"Call({self.name}, {self.args!r})"
+
+
+class BinaryOp:
+    __slots__ = ('op', 'left', 'right')
+
+    def __init__(self, op: str, left: Any, right: Any):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def __repr__(self):
+        return f"BinaryOp({self.op!r}, {self.left!r}, {self.right!r})"
+
+
+class UnaryMinus:
+    __slots__ = ('operand',)
+
+    def __init__(self, operand: Any):
+        self.operand = operand
+
+    def __repr__(self):
+        return f"UnaryMinus({self.operand!r})"
+
+
+SUPPORTED_FUNCTIONS = {
+    'AND', 'OR', 'NOT', 'IF', 'TRUE', 'FALSE', 'BLANK', 'LOWER', 'UPPER', 'LEN',
+    'FIND', 'SEARCH', 'ARRAYJOIN', 'NOW', 'IS_AFTER', 'IS_BEFORE', 'DATETIME_PARSE',
+    'DATETIME_DIFF', 'DATEADD', 'RECORD_ID',
+}
+COMPARISON_OPERATORS = ('=', '!=', '<', '>', '<=', '>=')
+
+# --- Tokenizer ---
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<field>\{[^}]*\})
+  | (?P<string>'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*")
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<op><=|>=|!=|<>|=|<|>|&|\+|-|\*|/)
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<comma>,)
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+""", re.VERBOSE)
+
+
+def _unescape_string(raw: str) -> str:
+    body = raw[1:-1]
+    return re.sub(r"\\(.)", r"\1", body)
+
+
+def tokenize(formula: str) -> List[Tuple[str, Any]]:
+    tokens: List[Tuple[str, Any]] = []
+    pos = 0
+    while pos < len(formula):
+        match = _TOKEN_RE.match(formula, pos)
+        if not match:
+            raise FormulaError(f"Unexpected character {formula[pos]!r} at position {pos} in formula: {formula}")
+        kind = match.lastgroup
+        text = match.group()
+        pos = match.end()
+        if kind == 'ws':
+            continue
+        if kind == 'field':
+            tokens.append(('field', text[1:-1]))
+        elif kind == 'string':
+            tokens.append(('string', _unescape_string(text)))
+        elif kind == 'number':
+            tokens.append(('number', float(text) if '.' in text else int(text)))
+        elif kind == 'op':
+            tokens.append(('op', '!=' if text == '<>' else text))
+        else:
+            tokens.append((kind, text))
+    return tokens
+
+
+# --- Parser (precedence: comparison < concatenation < additive < multiplicative < unary) ---
+
+class _Parser:
+    def __init__(self, formula: str):
+        self.formula = formula
+        self.tokens = tokenize(formula)
+        self.pos = 0
+
+    def peek(self) -> Optional[Tuple[str, Any]]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def advance(self) -> Tuple[str, Any]:
+        token = self.peek()
+        if token is None:
+            raise FormulaError(f"Unexpected end of formula: {self.formula}")
+        self.pos += 1
+        return token
+
+    def expect(self, kind: str):
+        token = self.advance()
+        if token[0] != kind:
+            raise FormulaError(f"Expected {kind} but found {token[1]!r} in formula: {self.formula}")
+        return token
+
+    def parse(self):
+        node = self.parse_comparison()
+        if self.peek() is not None:
+            raise FormulaError(f"Unexpected token {self.peek()[1]!r} in formula: {self.formula}")
+        return node
+
+    def _parse_binary(self, operators: Tuple[str, ...], next_level):
+        node = next_level()
+        while self.peek() and self.peek()[0] == 'op' and self.peek()[1] in operators:
+            op = self.advance()[1]
+            node = BinaryOp(op, node, next_level())
+        return node
+
+    def parse_comparison(self):
+        return self._parse_binary(COMPARISON_OPERATORS, self.parse_concat)
+
+    def parse_concat(self):
+        return self._parse_binary(('&',), self.parse_additive)
+
+    def parse_additive(self):
+        return self._parse_binary(('+', '-'), self.parse_multiplicative)
+
+    def parse_multiplicative(self):
+        return self._parse_binary(('*', '/'), self.parse_unary)
+
+    def parse_unary(self):
+        token = self.peek()
+        if token and token == ('op', '-'):
+            self.advance()
+            return UnaryMinus(self.parse_unary())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind, value = self.advance()
+        if kind == 'string' or kind == 'number':
+            return Literal(value)
+        if kind == 'field':
+            return FieldRef(value)
+        if kind == 'lparen':
+            node = self.parse_comparison()
+            self.expect('rparen')
+            return node
+        if kind == 'name':
+            name = value.upper()
+            if name not in SUPPORTED_FUNCTIONS:
+                raise FormulaError(f"Unsupported function {value}() in formula: {self.formula}")
+            self.expect('lparen')
+            args = []
+            if self.peek() and self.peek()[0] != 'rparen':
+                args.append(self.parse_comparison())
+                while self.peek() and self.peek()[0] == 'comma':
+                    self.advance()
+                    args.append(self.parse_comparison())
+            self.expect('rparen')
+            return Call(name, args)
+        raise FormulaError(f"Unexpected token {value!r} in formula: {self.formula}")
+
+
+FORMULA_CACHE_SIZE = 2048
+
+
+@functools.lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def parse_formula(formula: str):
+    """
+    Parses an Airtable formula string into an AST.
+    Results are cached per string; the returned AST is shared and must not be mutated.
+    """
+    if not formula or not formula.strip():
+        raise FormulaError("Empty formula")
+    return _Parser(formula).parse()
+
+
+# --- Runtime helpers shared by the SQL functions ---
+
+DATETIME_UNITS_SECONDS = {
+    'seconds': 1, 'second': 1, 's': 1,
+    'minutes': 60, 'minute': 60, 'm': 60,
+    'hours': 3600, 'hour': 3600, 'h': 3600,
+    'days': 86400, 'day': 86400, 'd': 86400,
+    'weeks': 604800, 'week': 604800, 'w': 604800,
+}
+
+
+def to_utc_datetime(value: Any) -> Optional[datetime.datetime]:
+    """Parses an Airtable date value into an aware UTC datetime, or None."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime.datetime):
+        dt = value
+    else:
+        try:
+            dt = dateutil_parser.isoparse(str(value))
+        except (ValueError, TypeError):
+            return None
+    if dt.tzinfo is None:
+        dt = pytz.utc.localize(dt)
+    return dt.astimezone(pytz.utc)
+
+
+def normalize_datetime(value: Any) -> Optional[str]:
+    """Returns a UTC ISO string that sorts chronologically, or None if the value is not a date."""
+    dt = to_utc_datetime(value)
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.%f') if dt else None
+
+
+def looks_like_datetime(value: Any) -> bool:
+    return isinstance(value, str) and bool(re.match(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}", value))
+
+
+def datetime_diff(date1: Any, date2: Any, unit: str = 'seconds') -> Optional[float]:
+    dt1, dt2 = to_utc_datetime(date1), to_utc_datetime(date2)
+    if not dt1 or not dt2:
+        return None
+    seconds = (dt1 - dt2).total_seconds()
+    return int(seconds // DATETIME_UNITS_SECONDS.get(str(unit).lower(), 1))
+
+
+def date_add(date: Any, count: Any, unit: str) -> Optional[str]:
+    dt = to_utc_datetime(date)
+    if not dt:
+        return None
+    seconds = float(count or 0) * DATETIME_UNITS_SECONDS.get(str(unit).lower(), 1)
+    return (dt + datetime.timedelta(seconds=seconds)).isoformat()
+
+
+def now_iso() -> str:
+    return datetime.datetime.now(pytz.utc).isoformat()
+
+
+# --- SQL compiler ---
+
+class SQLCompiler:
+    """
+    Compiles a formula AST into a SQLite WHERE expression over a `fields` JSON column.
+    `field_expression` is the exact expression used by the expression indexes, so
+    equality tests on indexed fields can use them.
+    """
+
+    def __init__(self, fields_column: str = 'fields', id_column: str = 'id'):
+        self.fields_column = fields_column
+        self.id_column = id_column
+
+    @staticmethod
+    def field_path(name: str) -> str:
+        return '$."' + name.replace('"', '\\"') + '"'
+
+    def field_expression(self, name: str) -> str:
+        return f"json_extract({self.fields_column}, {self._quote(self.field_path(name))})"
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        return "'" + value.replace("'", "''") + "'"
+
+    def compile(self, node) -> Tuple[str, List[Any]]:
+        params: List[Any] = []
+        sql = self._compile(node, params)
+        return sql, params
+
+    def _compile(self, node, params: List[Any]) -> str:
+        if isinstance(node, Literal):
+            params.append(node.value)
+            return '?'
+        if isinstance(node, FieldRef):
+            return self.field_expression(node.name)
+        if isinstance(node, UnaryMinus):
+            return f"(-{self._compile(node.operand, params)})"
+        if isinstance(node, BinaryOp):
+            return self._compile_binary(node, params)
+        if isinstance(node, Call):
+            return self._compile_call(node, params)
+        raise FormulaError(f"Cannot compile node {node!r}")
+
+    @staticmethod
+    def _is_blank(node) -> bool:
+        return isinstance(node, Call) and node.name == 'BLANK' or (isinstance(node, Literal) and node.value == '')
+
+    def _compile_binary(self, node: BinaryOp, params: List[Any]) -> str:
+        op = node.op
+        if op == '&':
+            return f"(COALESCE({self._compile(node.left, params)}, '') || COALESCE({self._compile(node.right, params)}, ''))"
+        if op in ('+', '-', '*', '/'):
+            return f"(COALESCE({self._compile(node.left, params)}, 0) {op} COALESCE({self._compile(node.right, params)}, 0))"
+
+        # Comparisons. Blank fields compare equal to '' / BLANK() and unequal to anything else.
+        left, right = node.left, node.right
+        if op in ('=', '!=') and any(isinstance(n, Call) and n.name == 'FALSE' for n in (left, right)):
+            # Unchecked checkboxes are absent from the record, which Airtable treats as FALSE()
+            other = right if isinstance(left, Call) and left.name == 'FALSE' else left
+            return f"(COALESCE({self._compile(other, params)}, 0) {op} 0)"
+        if self._is_blank(right) or self._is_blank(left):
+            other = left if self._is_blank(right) else right
+            other_sql = self._compile(other, params)
+            if op == '=':
+                return f"({other_sql} IS NULL OR {other_sql} = '' OR {other_sql} = 0)"
+            if op == '!=':
+                return f"({other_sql} IS NOT NULL AND {other_sql} != '' AND {other_sql} != 0)"
+
+        # Dates given as ISO literals are compared chronologically, not as strings.
+        if op != '=' and op != '!=' and any(isinstance(n, Literal) and looks_like_datetime(n.value) for n in (left, right)):
+            left_sql = f"at_datetime({self._compile(left, params)})"
+            right_sql = f"at_datetime({self._compile(right, params)})"
+            return f"({left_sql} {op} {right_sql})"
+
+        left_sql = self._compile(left, params)
+        right_sql = self._compile(right, params)
+        if op == '!=':
+            return f"({left_sql} IS NULL OR {left_sql} != {right_sql})"
+        if op in ('<', '<=', '>', '>=') and any(isinstance(n, Literal) and isinstance(n.value, (int, float)) for n in (left, right)):
+            # Airtable treats blank number fields as 0 in numeric comparisons
+            if isinstance(left, FieldRef):
+                left_sql = f"COALESCE({left_sql}, 0)"
+            if isinstance(right, FieldRef):
+                right_sql = f"COALESCE({right_sql}, 0)"
+        return f"({left_sql} {op} {right_sql})"
+
+    def _compile_call(self, node: Call, params: List[Any]) -> str:
+        name, args = node.name, node.args
+        if name == 'AND':
+            return '(' + ' AND '.join(self._truthy(a, params) for a in args) + ')' if args else '1'
+        if name == 'OR':
+            return '(' + ' OR '.join(self._truthy(a, params) for a in args) + ')' if args else '0'
+        if name == 'NOT':
+            return f"(NOT {self._truthy(args[0], params)})"
+        if name == 'IF':
+            cond = self._truthy(args[0], params)
+            then_sql = self._compile(args[1], params)
+            else_sql = self._compile(args[2], params) if len(args) > 2 else 'NULL'
+            return f"(CASE WHEN {cond} THEN {then_sql} ELSE {else_sql} END)"
+
+        # Arguments are compiled in order so that '?' placeholders line up with params
+        args_sql = [self._compile(a, params) for a in args]
+        compiled = lambda i: args_sql[i]
+        if name == 'TRUE':
+            return '1'
+        if name == 'FALSE':
+            return '0'
+        if name == 'BLANK':
+            return 'NULL'
+        if name == 'LOWER':
+            return f"LOWER({compiled(0)})"
+        if name == 'UPPER':
+            return f"UPPER({compiled(0)})"
+        if name == 'LEN':
+            return f"LENGTH(COALESCE({compiled(0)}, ''))"
+        if name == 'FIND':
+            return f"INSTR(COALESCE({compiled(1)}, ''), {compiled(0)})"
+        if name == 'SEARCH':
+            return f"INSTR(LOWER(COALESCE({compiled(1)}, '')), LOWER({compiled(0)}))"
+        if name == 'ARRAYJOIN':
+            separator = compiled(1) if len(args) > 1 else "', '"
+            return f"at_arrayjoin({compiled(0)}, {separator})"
+        if name == 'NOW':
+            return 'at_now()'
+        if name == 'IS_AFTER':
+            return f"(at_datetime({compiled(0)}) > at_datetime({compiled(1)}))"
+        if name == 'IS_BEFORE':
+            return f"(at_datetime({compiled(0)}) < at_datetime({compiled(1)}))"
+        if name == 'DATETIME_PARSE':
+            return compiled(0)
+        if name == 'DATETIME_DIFF':
+            unit = compiled(2) if len(args) > 2 else "'seconds'"
+            return f"at_datetime_diff({compiled(0)}, {compiled(1)}, {unit})"
+        if name == 'DATEADD':
+            return f"at_dateadd({compiled(0)}, {compiled(1)}, {compiled(2)})"
+        if name == 'RECORD_ID':
+            return self.id_column
+        raise FormulaError(f"Unsupported function {name}()")
+
+    def _truthy(self, node, params: List[Any]) -> str:
+        """Wraps non-boolean expressions so that blank/empty/0 are false, as in Airtable."""
+        sql = self._compile(node, params)
+        if isinstance(node, BinaryOp) and node.op in COMPARISON_OPERATORS:
+            return sql
+        if isinstance(node, Call) and node.name in ('AND', 'OR', 'NOT', 'IS_AFTER', 'IS_BEFORE', 'TRUE', 'FALSE'):
+            return sql
+        return f"(COALESCE({sql}, 0) NOT IN (0, ''))"
+
+    def compile_where(self, node) -> Tuple[str, List[Any]]:
+        params: List[Any] = []
+        return self._truthy(node, params), params
+
+
+def formula_to_sql(formula: str, fields_column: str = 'fields') -> Tuple[str, List[Any]]:
+    """Compiles an Airtable formula into a (WHERE-expression, parameters) pair."""
+    return SQLCompiler(fields_column).compile_where(parse_formula(formula))
+
+
+# --- Python predicate compiler ---
+
+def _is_blank_value(value: Any) -> bool:
+    return value is None or value == '' or value == 0 or value == []
+
+
+def _to_text(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ', '.join(str(v) for v in value)
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return str(value)
+
+
+def _to_number(value: Any) -> Any:
+    if value is None or value == '':
+        return 0
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _scalar(value: Any) -> Any:
+    # Linked/lookup fields come back as lists; Airtable compares them as their joined text
+    return _to_text(value) if isinstance(value, list) else value
+
+
+_ORDERING = {
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+def _ordered(op: str, left: Any, right: Any) -> bool:
+    """Ordering comparison; blanks and incomparable values are false, as in SQL."""
+    if left is None or right is None:
+        return False
+    if isinstance(left, (int, float)) != isinstance(right, (int, float)):
+        left, right = _to_number(left), _to_number(right)
+    try:
+        return _ORDERING[op](left, right)
+    except TypeError:
+        return False
+
+
+class PredicateCompiler:
+    """
+    Compiles a formula AST into a Python callable taking an Airtable-shaped record
+    ({'id': ..., 'fields': {...}}). Blank, checkbox and date semantics match SQLCompiler,
+    so a formula selects the same records locally as it does from SQLite.
+    """
+
+    def compile(self, node) -> Callable[[Dict], Any]:
+        if isinstance(node, Literal):
+            value = node.value
+            return lambda record: value
+        if isinstance(node, FieldRef):
+            name = node.name
+            return lambda record: record.get('fields', {}).get(name)
+        if isinstance(node, UnaryMinus):
+            operand = self.compile(node.operand)
+            def negate(record):
+                value = operand(record)
+                value = _to_number(value) if value is not None else None
+                return -value if isinstance(value, (int, float)) else None
+            return negate
+        if isinstance(node, BinaryOp):
+            return self._compile_binary(node)
+        if isinstance(node, Call):
+            return self._compile_call(node)
+        raise FormulaError(f"Cannot compile node {node!r}")
+
+    def compile_predicate(self, node) -> Callable[[Dict], bool]:
+        evaluate = self.compile(node)
+        return lambda record: not _is_blank_value(evaluate(record))
+
+    def _compile_binary(self, node: BinaryOp) -> Callable[[Dict], Any]:
+        op = node.op
+        left_node, right_node = node.left, node.right
+        left, right = self.compile(left_node), self.compile(right_node)
+
+        if op == '&':
+            return lambda record: _to_text(left(record)) + _to_text(right(record))
+        if op in ('+', '-', '*', '/'):
+            return self._compile_arithmetic(op, left, right)
+
+        if op in ('=', '!=') and any(isinstance(n, Call) and n.name == 'FALSE' for n in (left_node, right_node)):
+            other = right if isinstance(left_node, Call) and left_node.name == 'FALSE' else left
+            if op == '=':
+                return lambda record: (other(record) or 0) == 0
+            return lambda record: (other(record) or 0) != 0
+
+        if SQLCompiler._is_blank(left_node) or SQLCompiler._is_blank(right_node):
+            other = left if SQLCompiler._is_blank(right_node) else right
+            if op == '=':
+                return lambda record: _is_blank_value(other(record))
+            if op == '!=':
+                return lambda record: not _is_blank_value(other(record))
+
+        if op not in ('=', '!=') and any(isinstance(n, Literal) and looks_like_datetime(n.value) for n in (left_node, right_node)):
+            return lambda record: _ordered(op, normalize_datetime(left(record)), normalize_datetime(right(record)))
+
+        if op == '=':
+            def equals(record):
+                l, r = _scalar(left(record)), _scalar(right(record))
+                return l is not None and r is not None and l == r
+            return equals
+        if op == '!=':
+            def not_equals(record):
+                l, r = _scalar(left(record)), _scalar(right(record))
+                return l is None or (r is not None and l != r)
+            return not_equals
+
+        if any(isinstance(n, Literal) and isinstance(n.value, (int, float)) for n in (left_node, right_node)):
+            # Airtable treats blank number fields as 0 in numeric comparisons
+            if isinstance(left_node, FieldRef):
+                left = self._coalesce_zero(left)
+            if isinstance(right_node, FieldRef):
+                right = self._coalesce_zero(right)
+        return lambda record: _ordered(op, _scalar(left(record)), _scalar(right(record)))
+
+    @staticmethod
+    def _coalesce_zero(evaluate: Callable[[Dict], Any]) -> Callable[[Dict], Any]:
+        def coalesced(record):
+            value = evaluate(record)
+            return 0 if value is None else value
+        return coalesced
+
+    @staticmethod
+    def _compile_arithmetic(op: str, left: Callable, right: Callable) -> Callable[[Dict], Any]:
+        def arithmetic(record):
+            l, r = _to_number(left(record)), _to_number(right(record))
+            try:
+                if op == '+':
+                    return l + r
+                if op == '-':
+                    return l - r
+                if op == '*':
+                    return l * r
+                return l / r
+            except (TypeError, ZeroDivisionError):
+                return None
+        return arithmetic
+
+    def _compile_call(self, node: Call) -> Callable[[Dict], Any]:
+        name = node.name
+        args = [self.compile(a) for a in node.args]
+        arg = lambda i: args[i]
+
+        if name == 'AND':
+            conditions = [self.compile_predicate(a) for a in node.args]
+            return lambda record: all(c(record) for c in conditions)
+        if name == 'OR':
+            conditions = [self.compile_predicate(a) for a in node.args]
+            return lambda record: any(c(record) for c in conditions)
+        if name == 'NOT':
+            condition = self.compile_predicate(node.args[0])
+            return lambda record: not condition(record)
+        if name == 'IF':
+            condition = self.compile_predicate(node.args[0])
+            then_value = arg(1)
+            else_value = arg(2) if len(args) > 2 else (lambda record: None)
+            return lambda record: then_value(record) if condition(record) else else_value(record)
+        if name == 'TRUE':
+            return lambda record: True
+        if name == 'FALSE':
+            return lambda record: False
+        if name == 'BLANK':
+            return lambda record: None
+        if name in ('LOWER', 'UPPER'):
+            convert = str.lower if name == 'LOWER' else str.upper
+            value = arg(0)
+            return lambda record: None if value(record) is None else convert(_to_text(value(record)))
+        if name == 'LEN':
+            value = arg(0)
+            return lambda record: len(_to_text(value(record)))
+        if name in ('FIND', 'SEARCH'):
+            needle, haystack = arg(0), arg(1)
+            fold = (lambda text: text.lower()) if name == 'SEARCH' else (lambda text: text)
+            return lambda record: fold(_to_text(haystack(record))).find(fold(_to_text(needle(record)))) + 1
+        if name == 'ARRAYJOIN':
+            value = arg(0)
+            separator = arg(1) if len(args) > 1 else (lambda record: ', ')
+            def arrayjoin(record):
+                items = value(record)
+                if isinstance(items, list):
+                    return _to_text(separator(record)).join(str(v) for v in items)
+                return _to_text(items)
+            return arrayjoin
+        if name == 'NOW':
+            # Evaluated per call, never at compile time: compiled predicates are cached
+            return lambda record: now_iso()
+        if name in ('IS_AFTER', 'IS_BEFORE'):
+            op = '>' if name == 'IS_AFTER' else '<'
+            first, second = arg(0), arg(1)
+            return lambda record: _ordered(op, normalize_datetime(first(record)), normalize_datetime(second(record)))
+        if name == 'DATETIME_PARSE':
+            return arg(0)
+        if name == 'DATETIME_DIFF':
+            first, second = arg(0), arg(1)
+            unit = arg(2) if len(args) > 2 else (lambda record: 'seconds')
+            return lambda record: datetime_diff(first(record), second(record), unit(record))
+        if name == 'DATEADD':
+            date, count, unit = arg(0), arg(1), arg(2)
+            return lambda record: date_add(date(record), count(record), unit(record))
+        if name == 'RECORD_ID':
+            return lambda record: record.get('id')
+        raise FormulaError(f"Unsupported function {name}()")
+
+
+@functools.lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def compile_predicate(formula: str) -> Callable[[Dict], bool]:
+    """Returns a cached predicate for the formula, true for the records Airtable would return."""
+    return PredicateCompiler().compile_predicate(parse_formula(formula))
+
+
+def filter_records(records: Iterable[Dict], formula: Optional[str], max_records: Optional[int] = None) -> List[Dict]:
+    """Applies an Airtable formula to in-memory records. A falsy formula keeps every record."""
+    predicate = compile_predicate(formula) if formula else None
+    matched: List[Dict] = []
+    for record in records:
+        if predicate is None or predicate(record):
+            matched.append(record)
+            if max_records is not None and len(matched) >= max_records:
+                break
+    return matched
+
+
+def formula_cache_info() -> Dict[str, Any]:
+    """Hit/miss counters of the parse and predicate caches, for tick reports."""
+    return {'parse': parse_formula.cache_info()._asdict(), 'predicate': compile_predicate.cache_info()._asdict()}
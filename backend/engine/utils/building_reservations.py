@@ -0,0 +1,66 @@
+"""
+Per-building reservation locks for parallel activity creation.
+
+When citizens are processed concurrently, two co-workers (or two residents of one home)
+could both read the same building stock or contracts and create activities that claim the
+same goods. `BuildingReservations.reserve()` serializes citizens that share a building while
+letting everyone else run in parallel. Locks are always taken in sorted order, so citizens
+reserving several buildings cannot deadlock each other.
+
+Only the citizen's own buildings are reserved: shops, contracts and stock elsewhere that two
+citizens pick at the same time are not, which is why parallel creation is opt-in
+(createActivities.py --parallel).
+
+Usage:
+    reservations = BuildingReservations()
+    with reservations.reserve(['bld_home_1', 'bld_workshop_7']):
+        process_citizen_activity(...)
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from backend.engine.utils.world_snapshot import WorldSnapshot
+
+
+class BuildingReservations:
+    """Lazily created re-entrant lock per BuildingId."""
+
+    def __init__(self):
+        self._locks: Dict[str, threading.RLock] = {}
+        self._guard = threading.Lock()
+        self.contended = 0
+
+    def _lock_for(self, building_id: str) -> threading.RLock:
+        with self._guard:
+            lock = self._locks.get(building_id)
+            if lock is None:
+                lock = self._locks[building_id] = threading.RLock()
+            return lock
+
+    @contextmanager
+    def reserve(self, building_ids: Iterable[Optional[str]]) -> Iterator[List[str]]:
+        """Holds the locks of all given buildings for the duration of the block."""
+        ordered_ids = sorted({b for b in building_ids if b})
+        acquired: List[threading.RLock] = []
+        try:
+            for building_id in ordered_ids:
+                lock = self._lock_for(building_id)
+                if not lock.acquire(blocking=False):
+                    with self._guard:
+                        self.contended += 1
+                    lock.acquire()
+                acquired.append(lock)
+            yield ordered_ids
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+
+def buildings_to_reserve_for(citizen_record: Dict, snapshot: Optional[WorldSnapshot]) -> List[str]:
+    """BuildingIds a citizen's activity creation may claim from: the buildings they occupy (home, workplace)."""
+    username = citizen_record['fields'].get('Username')
+    if not username or not snapshot:
+        return []
+    return [b['fields']['BuildingId'] for b in snapshot.get_buildings_occupied_by(username) if b['fields'].get('BuildingId')]
@@ -0,0 +1,257 @@
+"""
+Process-wide cache for building type and resource type definitions.
+
+Every engine script used to fetch /api/building-types and /api/resource-types from the
+Next.js app on startup. This module serves them from, in order:
+
+1. an in-memory memo (per process, refreshed after DEFINITIONS_CACHE_TTL_SECONDS),
+2. a version-stamped JSON file under data/.definitions_cache/ shared by all scripts,
+3. the API (conditional request with the stored ETag when there is one),
+4. a stale disk cache if the API is down,
+5. the source files in data/buildings/ and data/resources/, shaped like the API output.
+
+Both caches are keyed by kind and API base URL, so scripts pointed at different
+deployments never share definitions.
+
+The functions return the raw API items keyed by `type` (buildings) or `id` (resources);
+callers that need a reduced shape (see activity_helpers.get_building_types_from_api)
+transform them as before.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Any, Tuple
+
+import requests
+
+log = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+DATA_DIR = os.path.join(PROJECT_ROOT, 'data')
+DEFINITIONS_CACHE_DIR = os.getenv("DEFINITIONS_CACHE_DIR", os.path.join(DATA_DIR, '.definitions_cache'))
+DEFINITIONS_CACHE_TTL_SECONDS = int(os.getenv("DEFINITIONS_CACHE_TTL_SECONDS", "3600"))
+DEFINITIONS_API_TIMEOUT_SECONDS = 15
+
+# kind -> (API path, response key, item key field, source directory under data/)
+DEFINITION_KINDS: Dict[str, Tuple[str, str, str, str]] = {
+    'building_types': ('/api/building-types', 'buildingTypes', 'type', 'buildings'),
+    'resource_types': ('/api/resource-types', 'resourceTypes', 'id', 'resources'),
+}
+
+_memo: Dict[Tuple[str, str], Tuple[float, Dict[str, Dict]]] = {}  # (kind, api_base_url) -> (loaded at, definitions)
+_memo_lock = threading.Lock()
+
+
+def _cache_path(kind: str, api_base_url: str) -> str:
+    url_key = hashlib.sha256(api_base_url.rstrip('/').encode('utf-8')).hexdigest()[:12]
+    return os.path.join(DEFINITIONS_CACHE_DIR, f"{kind}-{url_key}.json")
+
+
+def _version_of(items: List[Dict]) -> str:
+    return hashlib.sha256(json.dumps(items, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def _read_disk_cache(kind: str, api_base_url: str) -> Optional[Dict[str, Any]]:
+    path = _cache_path(kind, api_base_url)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        return cached if isinstance(cached.get('items'), list) else None
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log.warning(f"Ignoring unreadable definitions cache {path}: {e}")
+        return None
+
+
+def _write_disk_cache(kind: str, api_base_url: str, items: List[Dict], etag: Optional[str], source: str):
+    path = _cache_path(kind, api_base_url)
+    payload = {
+        'kind': kind,
+        'api_base_url': api_base_url,
+        'version': _version_of(items),
+        'etag': etag,
+        'source': source,
+        'fetched_at': time.time(),
+        'items': items,
+    }
+    try:
+        os.makedirs(DEFINITIONS_CACHE_DIR, exist_ok=True)
+        # Write then rename so concurrent scripts never read a half-written file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log.warning(f"Could not write definitions cache {path}: {e}")
+
+
+def _touch_disk_cache(kind: str, api_base_url: str, cached: Dict[str, Any]):
+    cached['fetched_at'] = time.time()
+    _write_disk_cache(kind, api_base_url, cached['items'], cached.get('etag'), cached.get('source', 'api'))
+
+
+def _fetch_from_api(kind: str, api_base_url: str, cached: Optional[Dict[str, Any]]) -> Optional[List[Dict]]:
+    """Returns fresh items, the cached items on 304 Not Modified, or None on failure."""
+    api_path, response_key, _, _ = DEFINITION_KINDS[kind]
+    url = f"{api_base_url}{api_path}"
+    headers = {}
+    if cached and cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+    try:
+        log.info(f"Fetching {kind} from API: {url}")
+        response = requests.get(url, headers=headers, timeout=DEFINITIONS_API_TIMEOUT_SECONDS)
+        if response.status_code == 304 and cached:
+            _touch_disk_cache(kind, api_base_url, cached)
+            return cached['items']
+        response.raise_for_status()
+        data = response.json()
+        if not data.get('success') or response_key not in data:
+            log.error(f"Unexpected API response format for {kind}: {str(data)[:200]}")
+            return None
+        items = data[response_key]
+        _write_disk_cache(kind, api_base_url, items, response.headers.get('ETag'), 'api')
+        return items
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log.error(f"Error fetching {kind} from API ({url}): {e}")
+        return None
+
+
+def _load_building_types_from_files(buildings_dir: str) -> List[Dict]:
+    """Mirrors app/api/building-types/route.ts."""
+    items = []
+    for root, _, files in os.walk(buildings_dir):
+        for file_name in sorted(files):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(root, file_name), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning(f"Skipping unreadable building definition {file_name}: {e}")
+                continue
+            path_parts = os.path.relpath(root, buildings_dir).split(os.sep)
+            path_parts = [p for p in path_parts if p != '.']
+            items.append({
+                'type': file_name[:-len('.json')],
+                'name': data.get('name'),
+                'category': data.get('category') or (path_parts[0] if path_parts else 'Uncategorized'),
+                'subCategory': data.get('subCategory') or (path_parts[1] if len(path_parts) > 1 else 'General'),
+                'buildTier': data.get('buildTier') or 5,
+                'pointType': data.get('pointType') or 'building',
+                'size': data.get('size') or 1,
+                'constructionCosts': data.get('constructionCosts'),
+                'maintenanceCost': data.get('maintenanceCost') or 0,
+                'shortDescription': data.get('shortDescription') or '',
+                'productionInformation': data.get('productionInformation'),
+                'canImport': data.get('canImport') or False,
+                'commercialStorage': data.get('commercialStorage') or False,
+                'constructionMinutes': data.get('constructionMinutes') or 0,
+                'dailyInfluence': data.get('dailyInfluence') or 0,
+                'specialWorkHours': data.get('specialWorkHours'),
+            })
+    return items
+
+
+def _load_resource_types_from_files(resources_dir: str) -> List[Dict]:
+    """Mirrors app/api/resource-types/route.ts."""
+    items = []
+    for root, _, files in os.walk(resources_dir):
+        for file_name in sorted(files):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(root, file_name), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning(f"Skipping unreadable resource definition {file_name}: {e}")
+                continue
+            resource_id = file_name[:-len('.json')]
+            path_parts = [p for p in os.path.relpath(root, resources_dir).split(os.sep) if p != '.']
+            items.append({
+                'id': resource_id,
+                'name': data.get('name') or resource_id,
+                'icon': data.get('icon'),
+                'category': data.get('category') or (path_parts[0] if path_parts else 'Uncategorized'),
+                'subCategory': data.get('subCategory') or (path_parts[1] if len(path_parts) > 1 else None),
+                'tier': data.get('tier'),
+                'description': data.get('description') or '',
+                'importPrice': data.get('importPrice') or 0,
+                'lifetimeHours': data.get('lifetimeHours'),
+                'consumptionHours': data.get('consumptionHours'),
+            })
+    return items
+
+
+def _load_from_files(kind: str) -> List[Dict]:
+    source_dir = os.path.join(DATA_DIR, DEFINITION_KINDS[kind][3])
+    if not os.path.isdir(source_dir):
+        return []
+    if kind == 'building_types':
+        return _load_building_types_from_files(source_dir)
+    return _load_resource_types_from_files(source_dir)
+
+
+def _resolve_items(kind: str, api_base_url: str) -> List[Dict]:
+    cached = _read_disk_cache(kind, api_base_url)
+    if cached and time.time() - cached.get('fetched_at', 0) < DEFINITIONS_CACHE_TTL_SECONDS:
+        log.info(f"Loaded {len(cached['items'])} {kind} from disk cache (version {cached.get('version')}).")
+        return cached['items']
+
+    items = _fetch_from_api(kind, api_base_url, cached)
+    if items is not None:
+        return items
+
+    if cached:
+        log.warning(f"API unavailable, using stale {kind} cache (version {cached.get('version')}).")
+        return cached['items']
+
+    items = _load_from_files(kind)
+    if items:
+        log.warning(f"API unavailable and no cache, loaded {len(items)} {kind} from data/{DEFINITION_KINDS[kind][3]}.")
+        _write_disk_cache(kind, api_base_url, items, None, 'files')
+    return items
+
+
+def get_definitions(kind: str, api_base_url: Optional[str] = None, force_refresh: bool = False) -> Dict[str, Dict]:
+    """Definitions of one kind ('building_types' or 'resource_types'), keyed by type/id."""
+    if kind not in DEFINITION_KINDS:
+        raise ValueError(f"Unknown definitions kind '{kind}'")
+    if api_base_url is None:
+        api_base_url = os.getenv("API_BASE_URL", "http://localhost:3000")
+
+    with _memo_lock:
+        memo_key = (kind, api_base_url)
+        memoized = _memo.get(memo_key)
+        if memoized and not force_refresh and time.time() - memoized[0] < DEFINITIONS_CACHE_TTL_SECONDS:
+            return dict(memoized[1])
+
+        key_field = DEFINITION_KINDS[kind][2]
+        if force_refresh:
+            items = _fetch_from_api(kind, api_base_url, None) or _resolve_items(kind, api_base_url)
+        else:
+            items = _resolve_items(kind, api_base_url)
+        definitions = {item[key_field]: item for item in items if isinstance(item, dict) and key_field in item}
+        if definitions:
+            _memo[memo_key] = (time.time(), definitions)
+        return dict(definitions)
+
+
+def get_building_type_definitions(api_base_url: Optional[str] = None) -> Dict[str, Dict]:
+    """Raw building type definitions keyed by type."""
+    return get_definitions('building_types', api_base_url)
+
+
+def get_resource_type_definitions(api_base_url: Optional[str] = None) -> Dict[str, Dict]:
+    """Raw resource type definitions keyed by resource id."""
+    return get_definitions('resource_types', api_base_url)
+
+
+def clear_definitions_memo():
+    """Drops the in-memory copies (the disk cache is kept)."""
+    with _memo_lock:
+        _memo.clear()
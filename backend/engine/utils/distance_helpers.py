@@ -8,6 +8,8 @@ import math
 import json
 from typing import Dict, List, Tuple, Optional, Union
 
+from backend.engine.utils.spatial_index import SpatialIndex
+
 
 def parse_position(pos: Union[Dict[str, float], str]) -> Dict[str, float]:
     """
@@ -100,9 +102,38 @@ def estimate_walking_time(distance_meters: float) -> float:
     return distance_meters / WALKING_SPEED_METERS_PER_MINUTE
 
 
+def _position_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """calculate_distance() on plain coordinates (the metric used by SpatialIndexes built here)."""
+    return calculate_distance({'lat': lat1, 'lng': lng1}, {'lat': lat2, 'lng': lng2})
+
+
+def build_location_index(locations: List[Dict]) -> SpatialIndex:
+    """
+    Grid index over location dicts (each with a 'position' field), for callers that run
+    find_nearest_locations() many times against the same locations.
+    
+    Args:
+        locations: List of location dicts, each must have 'position' field
+        
+    Returns:
+        SpatialIndex whose items are the location dicts
+    """
+    index = SpatialIndex(distance_fn=_position_distance)
+    for loc in locations:
+        if 'position' not in loc or not loc['position']:
+            continue
+        try:
+            position = parse_position(loc['position'])
+            index.insert(float(position['lat']), float(position['lng']), loc)
+        except (ValueError, KeyError, TypeError):
+            # Skip locations with invalid position data
+            continue
+    return index
+
+
 def find_nearest_locations(
     citizen_pos: Union[Dict[str, float], str], 
-    locations: List[Dict], 
+    locations: Union[List[Dict], SpatialIndex], 
     max_distance: Optional[float] = None,
     limit: Optional[int] = None
 ) -> List[Tuple[Dict, float]]:
@@ -111,7 +142,8 @@ def find_nearest_locations(
     
     Args:
         citizen_pos: Citizen's position with 'lat' and 'lng' (or string representation)
-        locations: List of location dicts, each must have 'position' field
+        locations: List of location dicts, each must have 'position' field,
+                   or an index from build_location_index()
         max_distance: Maximum distance in meters (optional)
         limit: Maximum number of results to return (optional)
         
@@ -121,6 +153,12 @@ def find_nearest_locations(
     # Parse citizen position if needed
     citizen_pos_parsed = parse_position(citizen_pos)
     
+    if isinstance(locations, SpatialIndex):
+        lat, lng = float(citizen_pos_parsed['lat']), float(citizen_pos_parsed['lng'])
+        if limit:
+            return locations.nearest(lat, lng, k=limit, max_distance=max_distance)
+        return list(locations.iter_nearest(lat, lng, max_distance=max_distance))
+    
     locations_with_distance = []
     
     for loc in locations:
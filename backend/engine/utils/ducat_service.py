@@ -0,0 +1,353 @@
+"""
+Contention-safe Ducats balances for processors running in parallel threads.
+
+Processors used to pay with an unsynchronized read-modify-write of the citizen record:
+read Ducats, then update it to `ducats - cost`. Two threads paying the same merchant (or
+ConsiglioDeiDieci) at once both read the same balance and one of the two payments is lost.
+
+The DucatService serializes the changes to each account with one of DUCAT_LOCK_STRIPES locks
+(picked by hashing the record id), while payments between unrelated accounts don't wait for
+each other. A transfer takes both stripes in index order, so two opposite transfers can't
+deadlock. Changes are written through while the lock is held: the current Ducats are read
+again (one query for both accounts of a transfer), checked, and `current + change` is written
+(one batch_update) before the lock is released. A balance passed in with a citizen record is
+never trusted, so writers that still update Ducats themselves are not overwritten.
+
+The locks and the journal belong to the underlying CITIZENS table: every service obtained for
+the same table shares them, while each writes through the tables it was obtained with (e.g.
+the snapshot-tracking tables of a tick, so the snapshot sees the new balances).
+
+Every change is appended to a journal (record id, delta, new balance, reason), written to
+DUCAT_JOURNAL_DIR/journal-<UTC day>.jsonl in batches of DUCAT_JOURNAL_BATCH_SIZE entries, on
+reconcile() and at exit. reconcile() checks that the journaled payments since the previous
+reconciliation have their TRANSACTIONS records and reports how many balances changed outside
+the service between two of its writes.
+
+    service = get_ducat_service(tables)
+    if service.transfer(payer_record, merchant_record, cost, reason="...", transaction_type="tavern_meal"):
+        tables['transactions'].create({...})
+    ...
+    service.reconcile()    # end of run
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+import datetime
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from backend.engine.utils.activity_helpers import LogColors, _escape_airtable_value
+from backend.engine.utils.world_snapshot import SnapshotTrackingTable
+
+log = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+DUCAT_JOURNAL_DIR = os.getenv("DUCAT_JOURNAL_DIR", os.path.join(PROJECT_ROOT, 'data', '.ducat_journal'))
+DUCAT_JOURNAL_BATCH_SIZE = int(os.getenv("DUCAT_JOURNAL_BATCH_SIZE", "50"))
+DUCAT_LOCK_STRIPES = int(os.getenv("DUCAT_LOCK_STRIPES", "64"))
+RECONCILE_MARGIN_SECONDS = 60  # CreatedAt of a transaction may precede its journal entry slightly
+BALANCE_EPSILON = 1e-6
+
+CitizenRef = Union[str, Dict[str, Any]]  # Airtable record id, or a citizen record (only its id is used)
+
+
+def _ducats(record: Dict) -> float:
+    try:
+        return float(record['fields'].get('Ducats', 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class JournalEntry:
+    __slots__ = ('seq', 'record_id', 'username', 'delta', 'balance', 'reason', 'transaction_type', 'at')
+
+    def __init__(self, seq: int, record_id: str, username: str, delta: float, balance: float,
+                 reason: str, transaction_type: Optional[str]):
+        self.seq = seq
+        self.record_id = record_id
+        self.username = username
+        self.delta = delta
+        self.balance = balance  # Ducats written by this change
+        self.reason = reason
+        self.transaction_type = transaction_type  # Set on the entry whose TRANSACTIONS record reconcile() looks for
+        self.at = time.time()
+
+    def to_json(self) -> str:
+        return json.dumps({'seq': self.seq, 'pid': os.getpid(), 'at': datetime.datetime.fromtimestamp(self.at, datetime.timezone.utc).isoformat(),
+                           'record_id': self.record_id, 'username': self.username, 'delta': self.delta, 'balance': self.balance,
+                           'reason': self.reason, 'transaction_type': self.transaction_type})
+
+
+class DucatJournal:
+    """Append-only journal of balance changes, written to `directory` in batches."""
+
+    def __init__(self, directory: str = DUCAT_JOURNAL_DIR, batch_size: int = DUCAT_JOURNAL_BATCH_SIZE):
+        self.directory = directory
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._seq = 0
+        self._unwritten: List[JournalEntry] = []
+        self._unreconciled: List[JournalEntry] = []
+        self._reconciled_at = time.time()
+
+    def append(self, record_id: str, username: str, delta: float, balance: float, reason: str, transaction_type: Optional[str]):
+        with self._lock:
+            self._seq += 1
+            entry = JournalEntry(self._seq, record_id, username, delta, balance, reason, transaction_type)
+            self._unwritten.append(entry)
+            self._unreconciled.append(entry)
+            full = len(self._unwritten) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Appends the unwritten entries to today's file; returns how many were written. Kept for the next flush on error."""
+        with self._write_lock:
+            with self._lock:
+                entries, self._unwritten = self._unwritten, []
+            if not entries:
+                return 0
+            day = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d')
+            path = os.path.join(self.directory, f"journal-{day}.jsonl")
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(entry.to_json() + '\n' for entry in entries))
+            except OSError as e:
+                log.warning(f"{LogColors.WARNING}DucatService: could not write {len(entries)} journal entries to {path}: {e}{LogColors.ENDC}")
+                with self._lock:
+                    self._unwritten = entries + self._unwritten
+                return 0
+            return len(entries)
+
+    def take_unreconciled(self) -> Tuple[List[JournalEntry], float]:
+        """The entries since the previous call and when that call was made."""
+        with self._lock:
+            entries, since = self._unreconciled, self._reconciled_at
+            self._unreconciled, self._reconciled_at = [], time.time()
+        return entries, since
+
+    def unwritten_count(self) -> int:
+        return len(self._unwritten)
+
+
+class _AccountBook:
+    """Locks, journal and counters shared by every service of one CITIZENS table."""
+
+    def __init__(self, stripes: int = DUCAT_LOCK_STRIPES, journal: Optional[DucatJournal] = None):
+        self.stripes = [threading.Lock() for _ in range(max(1, stripes))]
+        self.journal = journal or DucatJournal()
+        self.usernames: Dict[str, str] = {}
+        self.written: Dict[str, float] = {}  # Record id -> Ducats the service last wrote
+        self.stats_lock = threading.Lock()
+        self.stats = {'changes': 0, 'rejected': 0, 'writes': 0, 'failed_writes': 0,
+                      'drift_accounts': 0, 'drift_total': 0.0}
+
+
+class DucatService:
+    """Striped-lock Ducats changes, read and written through to the CITIZENS table under the account's lock."""
+
+    def __init__(self, tables: Dict[str, Any], book: Optional[_AccountBook] = None):
+        self.citizens_table = tables['citizens']
+        self.transactions_table = tables.get('transactions')
+        self._book = book or _AccountBook()
+        self.stats = self._book.stats
+
+    # --- Locks ---
+
+    def _stripe_index(self, record_id: str) -> int:
+        return hash(record_id) % len(self._book.stripes)
+
+    def _locks_for(self, record_ids: Iterable[str]) -> List[threading.Lock]:
+        # Always acquired in stripe order, so concurrent multi-account operations can't deadlock
+        return [self._book.stripes[i] for i in sorted({self._stripe_index(rid) for rid in record_ids})]
+
+    def _count(self, stat: str, amount: float = 1):
+        with self._book.stats_lock:
+            self.stats[stat] += amount
+
+    # --- Accounts ---
+
+    def _record_id(self, citizen: CitizenRef) -> Optional[str]:
+        return citizen.get('id') if isinstance(citizen, dict) else citizen
+
+    def _read(self, record_ids: List[str]) -> Optional[Dict[str, float]]:
+        """Current Ducats of the given citizens (one query); None if they couldn't be read. Call with their stripes held."""
+        formula = "OR(" + ", ".join(f"RECORD_ID()='{_escape_airtable_value(rid)}'" for rid in record_ids) + ")"
+        try:
+            records = self.citizens_table.all(formula=formula, fields=['Username', 'Ducats'])
+        except Exception as e:
+            log.error(f"{LogColors.FAIL}DucatService: error reading the balances of {', '.join(record_ids)}: {e}{LogColors.ENDC}")
+            return None
+        balances = {}
+        for record in records:
+            record_id = record['id']
+            balances[record_id] = _ducats(record)
+            self._book.usernames[record_id] = record['fields'].get('Username', record_id)
+            last_written = self._book.written.get(record_id)
+            if last_written is not None and abs(balances[record_id] - last_written) > BALANCE_EPSILON:
+                # Changed outside the service since our last write
+                self._count('drift_accounts')
+                self._count('drift_total', balances[record_id] - last_written)
+        for record_id in record_ids:
+            if record_id not in balances:
+                log.error(f"{LogColors.FAIL}DucatService: citizen {record_id} not found.{LogColors.ENDC}")
+        return balances
+
+    def _write(self, new_balances: Dict[str, float]) -> bool:
+        """Writes the given balances (one batch_update). Call with their stripes held."""
+        try:
+            self.citizens_table.batch_update([{'id': rid, 'fields': {'Ducats': ducats}} for rid, ducats in new_balances.items()])
+        except Exception as e:
+            self._count('failed_writes')
+            log.error(f"{LogColors.FAIL}DucatService: error writing the balances of {', '.join(self.username(rid) or rid for rid in new_balances)}: {e}{LogColors.ENDC}")
+            return False
+        self._count('writes')
+        self._book.written.update(new_balances)
+        return True
+
+    def balance(self, citizen: CitizenRef) -> Optional[float]:
+        """Current balance, read from the CITIZENS table."""
+        record_id = self._record_id(citizen)
+        if not record_id:
+            return None
+        with self._book.stripes[self._stripe_index(record_id)]:
+            balances = self._read([record_id])
+        return balances.get(record_id) if balances else None
+
+    def username(self, citizen: CitizenRef) -> Optional[str]:
+        """Username of a citizen the service has read."""
+        record_id = self._record_id(citizen)
+        return self._book.usernames.get(record_id) if record_id else None
+
+    # --- Changes ---
+
+    def _journal_change(self, record_id: str, delta: float, balance: float, reason: str, transaction_type: Optional[str]):
+        self._count('changes')
+        self._book.journal.append(record_id, self._book.usernames.get(record_id, record_id), delta, balance, reason, transaction_type)
+
+    def adjust(self, citizen: CitizenRef, amount_change: float, reason: str = "",
+               transaction_type: Optional[str] = None, allow_negative: bool = False) -> Optional[float]:
+        """
+        Adds `amount_change` (negative to spend) to a citizen's balance. Returns the new balance,
+        or None if the citizen is unknown, spending would make the balance negative or the write failed.
+        """
+        record_id = self._record_id(citizen)
+        if not record_id:
+            return None
+        with self._book.stripes[self._stripe_index(record_id)]:
+            balances = self._read([record_id])
+            if not balances or record_id not in balances:
+                return None
+            current = balances[record_id]
+            if amount_change < 0 and not allow_negative and current + amount_change < -BALANCE_EPSILON:
+                self._count('rejected')
+                log.warning(f"{LogColors.WARNING}Citizen {self.username(record_id)} has insufficient ducats ({current:.2f}) for a change of {amount_change:.2f}. Reason: {reason}{LogColors.ENDC}")
+                return None
+            new_balance = current + amount_change
+            if amount_change != 0:
+                if not self._write({record_id: new_balance}):
+                    return None
+                self._journal_change(record_id, amount_change, new_balance, reason, transaction_type)
+        return new_balance
+
+    def transfer(self, payer: CitizenRef, payee: CitizenRef, amount: float, reason: str = "",
+                 transaction_type: Optional[str] = None, allow_negative: bool = False) -> bool:
+        """
+        Moves `amount` Ducats from payer to payee atomically. False if either is unknown, the payer
+        can't cover it or the write failed (then neither balance changed).
+        """
+        payer_id, payee_id = self._record_id(payer), self._record_id(payee)
+        if not payer_id or not payee_id or amount < 0:
+            return False
+        locks = self._locks_for([payer_id, payee_id])
+        for lock in locks:
+            lock.acquire()
+        try:
+            balances = self._read([payer_id] if payer_id == payee_id else [payer_id, payee_id])
+            if not balances or payer_id not in balances or payee_id not in balances:
+                return False
+            if not allow_negative and balances[payer_id] + BALANCE_EPSILON < amount:
+                self._count('rejected')
+                log.warning(f"{LogColors.WARNING}Citizen {self.username(payer_id)} has insufficient ducats ({balances[payer_id]:.2f}) to pay {amount:.2f} to {self.username(payee_id)}. Reason: {reason}{LogColors.ENDC}")
+                return False
+            if payer_id != payee_id and amount > 0:
+                new_balances = {payer_id: balances[payer_id] - amount, payee_id: balances[payee_id] + amount}
+                # Both balances in one batch_update: either both change or neither does
+                if not self._write(new_balances):
+                    return False
+                self._journal_change(payer_id, -amount, new_balances[payer_id], reason, transaction_type)
+                self._journal_change(payee_id, amount, new_balances[payee_id], reason, None)
+            return True
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    # --- Reconciliation ---
+
+    def reconcile(self) -> Dict[str, Any]:
+        """
+        Writes the journal, then checks its entries since the last reconciliation against
+        TRANSACTIONS: every entry with a transaction_type should have a record of that Type and
+        Price. Returns a summary with the missing records and the drift from balance changes
+        made outside the service.
+        """
+        journal = self._book.journal
+        journal.flush()
+        entries, since = journal.take_unreconciled()
+        summary = {'entries': len(entries), 'unwritten_entries': journal.unwritten_count(),
+                   'failed_writes': self.stats['failed_writes'], 'missing_transactions': [],
+                   'drift_accounts': self.stats['drift_accounts'], 'drift_total': self.stats['drift_total']}
+        expected = Counter((e.transaction_type, round(abs(e.delta), 2)) for e in entries if e.transaction_type)
+        if expected and self.transactions_table is not None:
+            since_iso = datetime.datetime.fromtimestamp(since - RECONCILE_MARGIN_SECONDS, datetime.timezone.utc).isoformat()
+            type_conditions = [f"{{Type}}='{_escape_airtable_value(t)}'" for t in sorted({t for t, _ in expected})]
+            formula = f"AND(IS_AFTER({{CreatedAt}}, '{since_iso}'), OR({', '.join(type_conditions)}))"
+            try:
+                records = self.transactions_table.all(formula=formula, fields=['Type', 'Price'])
+                found = Counter((r['fields'].get('Type'), round(float(r['fields'].get('Price') or 0), 2)) for r in records)
+                missing = expected - found
+                summary['missing_transactions'] = [{'type': t, 'price': p, 'count': n} for (t, p), n in missing.items()]
+            except Exception as e:
+                log.error(f"{LogColors.FAIL}DucatService: error reading TRANSACTIONS for reconciliation: {e}{LogColors.ENDC}")
+        problems = summary['missing_transactions'] or summary['failed_writes'] or summary['unwritten_entries']
+        color = LogColors.WARNING if problems else LogColors.OKBLUE
+        log.info(f"{color}DucatService reconciliation: {summary['entries']} journal entries "
+                 f"({summary['unwritten_entries']} not yet written to {journal.directory}), "
+                 f"{sum(m['count'] for m in summary['missing_transactions'])} without a transaction record, "
+                 f"{summary['failed_writes']} failed writes, {summary['drift_accounts']} balances changed "
+                 f"outside the service (net {summary['drift_total']:+.2f}).{LogColors.ENDC}")
+        return summary
+
+
+# id(CITIZENS table) -> (table, its account book); the table is kept so its id can't be reused
+_books: Dict[int, Tuple[Any, _AccountBook]] = {}
+_books_lock = threading.Lock()
+
+
+def _flush_journals():
+    for _, book in list(_books.values()):
+        book.journal.flush()
+
+
+atexit.register(_flush_journals)  # Scripts that never reconcile keep their journal entries
+
+
+def get_ducat_service(tables: Dict[str, Any]) -> DucatService:
+    """
+    A service writing through `tables`, sharing its locks and journal with every other service of
+    the same underlying CITIZENS table, so every thread paying from the same account shares its lock.
+    """
+    citizens_table = tables['citizens']
+    if isinstance(citizens_table, SnapshotTrackingTable):
+        citizens_table = citizens_table.table
+    with _books_lock:
+        entry = _books.get(id(citizens_table))
+        if entry is None or entry[0] is not citizens_table:
+            entry = _books[id(citizens_table)] = (citizens_table, _AccountBook())
+    return DucatService(tables, entry[1])
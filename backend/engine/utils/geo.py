@@ -0,0 +1,80 @@
+"""
+Great-circle distances, one pair at a time or in batches.
+
+The engine had several hand-written distance functions (activity_helpers,
+distance_helpers, citizenhousingmobility, ...), some of them rough planar approximations.
+They now all delegate to this module:
+
+- `haversine_meters(lat1, lng1, lat2, lng2)`: one pair, plain `math` (fastest for single calls);
+- `distances(origins, targets)`: N x M matrix for N origins and M targets, computed with NumPy
+  in one pass when it is installed (a list of lists from the scalar kernel otherwise);
+- `distances_from(origin, targets)`: one row of the above.
+
+Points may be (lat, lng) tuples/lists, {'lat', 'lng'} dicts or an N x 2 array. Both paths use
+the same formula and Earth radius, so batch and scalar results agree to float precision.
+"""
+
+import math
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # Optional: distances() falls back to the scalar kernel
+    np = None
+
+EARTH_RADIUS_METERS = 6371000.0
+
+Point = Union[Tuple[float, float], Sequence[float], Dict[str, float]]
+
+
+def haversine_meters(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in meters between two points."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lng2 - lng1)
+    a = math.sin(delta_phi / 2.0) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2.0) ** 2
+    return EARTH_RADIUS_METERS * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _as_pair(point: Point) -> Tuple[float, float]:
+    if isinstance(point, dict):
+        return float(point['lat']), float(point['lng'])
+    return float(point[0]), float(point[1])
+
+
+def to_coordinates(points: Any) -> Any:
+    """N x 2 float64 array of (lat, lng) (a list of pairs without NumPy)."""
+    if np is not None:
+        if isinstance(points, np.ndarray):
+            return points.astype(np.float64, copy=False).reshape(-1, 2)
+        return np.array([_as_pair(p) for p in points], dtype=np.float64).reshape(-1, 2)
+    return [_as_pair(p) for p in points]
+
+
+def distances(origins: Any, targets: Any) -> Any:
+    """
+    Pairwise great-circle distances in meters: result[i][j] is the distance from origins[i]
+    to targets[j]. Returns an N x M NumPy array, or a list of lists without NumPy.
+    """
+    origin_coords = to_coordinates(origins)
+    target_coords = to_coordinates(targets)
+    if np is None:
+        return [[haversine_meters(o[0], o[1], t[0], t[1]) for t in target_coords] for o in origin_coords]
+
+    phi1 = np.radians(origin_coords[:, 0])[:, None]
+    phi2 = np.radians(target_coords[:, 0])[None, :]
+    delta_phi = phi2 - phi1
+    delta_lambda = np.radians(target_coords[:, 1])[None, :] - np.radians(origin_coords[:, 1])[:, None]
+    a = np.sin(delta_phi / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2.0) ** 2
+    return EARTH_RADIUS_METERS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def distances_from(origin: Point, targets: Any) -> Any:
+    """Distances in meters from one origin to each target (1-D array, or a list without NumPy)."""
+    return distances([origin], targets)[0]
+
+
+def to_list(values: Any) -> List[float]:
+    """A distances()/distances_from() result row as a list of floats."""
+    return values.tolist() if np is not None and isinstance(values, np.ndarray) else list(values)
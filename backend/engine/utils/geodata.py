@@ -0,0 +1,352 @@
+"""
+Static geodata (land polygons and the water graph) loaded once per process.
+
+Several scripts downloaded the full polygon or water graph payloads from the Next.js API on
+every run (createimportactivities / createmarketgalley for dock canal points, immigration for
+polygon centers, the fishing helpers for water points), although the API only reads
+data/polygons/*.json and data/watergraph.json. `get_geodata()` reads those files directly and
+keeps only what the engine uses, as compact arrays:
+
+- coordinates as N x 2 float64 arrays of (lat, lng), NaN where a point has none (lists of
+  tuples without NumPy): polygon centers, canal points (edge and water side), building points,
+  water points;
+- ids in lists, with dicts from id to row.
+
+The parsed arrays are pickled to data/.geodata/geodata.pickle with a version hash of the source
+files (name, size, mtime) and of the array backend, so later processes start from the pickle
+instead of parsing about 2 MB of JSON. Stale or unreadable caches are rebuilt.
+
+    geodata = get_geodata()
+    geodata.dock_canal_point(dock_building_id)   # {'id', 'polygonId', 'edge', 'water'} or None
+    geodata.polygon_centers()                    # [{'lat', 'lng'}, ...]
+    geodata.building_points(polygon_id)          # [{'id', 'polygonId', 'lat', 'lng', 'buildingType'}, ...]
+    geodata.water_points(fish_only=True)         # [{'id', 'position', 'hasFish'}, ...]
+
+This module has no engine imports so any helper module can use it.
+"""
+
+import os
+import glob
+import json
+import math
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional: coordinates are kept as lists of (lat, lng) tuples
+    np = None
+
+log = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+DATA_DIR = os.path.join(PROJECT_ROOT, 'data')
+WATER_GRAPH_FILE = 'watergraph.json'
+POLYGONS_SUBDIR = 'polygons'
+
+GEODATA_CACHE_DIR = os.getenv("GEODATA_CACHE_DIR", os.path.join(DATA_DIR, '.geodata'))
+GEODATA_CACHE_FILE = 'geodata.pickle'
+GEODATA_FORMAT_VERSION = 1
+VERSION_CHECK_INTERVAL_SECONDS = 30
+
+NAN_POINT = (math.nan, math.nan)
+
+
+def _source_files(data_dir: str) -> List[str]:
+    files = sorted(glob.glob(os.path.join(data_dir, POLYGONS_SUBDIR, '*.json')))
+    water_graph_path = os.path.join(data_dir, WATER_GRAPH_FILE)
+    if os.path.exists(water_graph_path):
+        files.append(water_graph_path)
+    return files
+
+
+def source_version(data_dir: str = DATA_DIR) -> Optional[str]:
+    """Hash of the source files' names, sizes and mtimes (no reading); None without any."""
+    files = _source_files(data_dir)
+    if not files:
+        return None
+    version_hash = hashlib.sha256(f"{GEODATA_FORMAT_VERSION}:{'numpy' if np is not None else 'list'}".encode('utf-8'))
+    for path in files:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        version_hash.update(f"|{os.path.relpath(path, data_dir)}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+    return version_hash.hexdigest()[:16]
+
+
+def _pair(point: Any) -> Tuple[float, float]:
+    if isinstance(point, dict):
+        try:
+            return float(point['lat']), float(point['lng'])
+        except (KeyError, TypeError, ValueError):
+            pass
+    return NAN_POINT
+
+
+def _coordinates(pairs: List[Tuple[float, float]]) -> Any:
+    if np is not None:
+        return np.array(pairs, dtype=np.float64).reshape(-1, 2)
+    return list(pairs)
+
+
+def _point_dict(coordinates: Any, row: int) -> Optional[Dict[str, float]]:
+    lat, lng = float(coordinates[row][0]), float(coordinates[row][1])
+    if math.isnan(lat) or math.isnan(lng):
+        return None
+    return {'lat': lat, 'lng': lng}
+
+
+class GeoData:
+    """Arrays built from the polygon files and the water graph, with id -> row indexes."""
+
+    def __init__(self, state: Dict[str, Any]):
+        self.version: str = state['version']
+        self.polygon_ids: List[str] = state['polygon_ids']
+        self.polygon_center_coords = state['polygon_center_coords']
+        self.canal_ids: List[str] = state['canal_ids']
+        self.canal_polygons: List[int] = state['canal_polygons']
+        self.canal_edge_coords = state['canal_edge_coords']
+        self.canal_water_coords = state['canal_water_coords']
+        self.building_point_ids: List[str] = state['building_point_ids']
+        self.building_point_polygons: List[int] = state['building_point_polygons']
+        self.building_point_types: List[Optional[str]] = state['building_point_types']
+        self.building_point_coords = state['building_point_coords']
+        self.water_ids: List[str] = state['water_ids']
+        self.water_coords = state['water_coords']
+        self.water_has_fish: List[bool] = state['water_has_fish']
+
+        self.polygon_rows = {polygon_id: row for row, polygon_id in enumerate(self.polygon_ids)}
+        self.canal_rows = {canal_id: row for row, canal_id in enumerate(self.canal_ids)}
+        self.building_point_rows = {point_id: row for row, point_id in enumerate(self.building_point_ids)}
+        self._water_graph: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_sources(cls, data_dir: str = DATA_DIR, version: Optional[str] = None) -> 'GeoData':
+        """Parses the JSON files (the slow path the cache avoids)."""
+        polygon_ids, polygon_centers = [], []
+        canal_ids, canal_polygons, canal_edges, canal_water = [], [], [], []
+        building_point_ids, building_point_polygons, building_point_types, building_points = [], [], [], []
+
+        for path in sorted(glob.glob(os.path.join(data_dir, POLYGONS_SUBDIR, '*.json'))):
+            try:
+                with open(path, 'rb') as f:
+                    polygon_data = json.loads(f.read())
+            except (OSError, ValueError) as e:
+                log.warning(f"Skipping unreadable polygon file {path}: {e}")
+                continue
+            if not isinstance(polygon_data, dict):
+                continue
+            # Same id as /api/get-polygons: the file name
+            row = len(polygon_ids)
+            polygon_ids.append(os.path.splitext(os.path.basename(path))[0])
+            polygon_centers.append(_pair(polygon_data.get('center') or polygon_data.get('centroid')))
+            for canal_point in polygon_data.get('canalPoints') or []:
+                if isinstance(canal_point, dict) and canal_point.get('id'):
+                    canal_ids.append(canal_point['id'])
+                    canal_polygons.append(row)
+                    canal_edges.append(_pair(canal_point.get('edge')))
+                    canal_water.append(_pair(canal_point.get('water')))
+            for building_point in polygon_data.get('buildingPoints') or []:
+                if isinstance(building_point, dict) and building_point.get('id'):
+                    building_point_ids.append(building_point['id'])
+                    building_point_polygons.append(row)
+                    building_point_types.append(building_point.get('buildingType'))
+                    building_points.append(_pair(building_point))
+
+        water_ids, water_points, water_has_fish = [], [], []
+        water_graph_path = os.path.join(data_dir, WATER_GRAPH_FILE)
+        if os.path.exists(water_graph_path):
+            try:
+                with open(water_graph_path, 'rb') as f:
+                    water_graph = json.loads(f.read())
+                for water_point in water_graph.get('waterPoints') or []:
+                    if isinstance(water_point, dict) and water_point.get('id'):
+                        water_ids.append(water_point['id'])
+                        water_points.append(_pair(water_point.get('position')))
+                        water_has_fish.append(bool(water_point.get('hasFish')))
+            except (OSError, ValueError, AttributeError) as e:
+                log.warning(f"Skipping unreadable water graph {water_graph_path}: {e}")
+
+        return cls({
+            'version': version or source_version(data_dir) or '',
+            'polygon_ids': polygon_ids,
+            'polygon_center_coords': _coordinates(polygon_centers),
+            'canal_ids': canal_ids,
+            'canal_polygons': canal_polygons,
+            'canal_edge_coords': _coordinates(canal_edges),
+            'canal_water_coords': _coordinates(canal_water),
+            'building_point_ids': building_point_ids,
+            'building_point_polygons': building_point_polygons,
+            'building_point_types': building_point_types,
+            'building_point_coords': _coordinates(building_points),
+            'water_ids': water_ids,
+            'water_coords': _coordinates(water_points),
+            'water_has_fish': water_has_fish,
+        })
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'polygon_ids': self.polygon_ids,
+            'polygon_center_coords': self.polygon_center_coords,
+            'canal_ids': self.canal_ids,
+            'canal_polygons': self.canal_polygons,
+            'canal_edge_coords': self.canal_edge_coords,
+            'canal_water_coords': self.canal_water_coords,
+            'building_point_ids': self.building_point_ids,
+            'building_point_polygons': self.building_point_polygons,
+            'building_point_types': self.building_point_types,
+            'building_point_coords': self.building_point_coords,
+            'water_ids': self.water_ids,
+            'water_coords': self.water_coords,
+            'water_has_fish': self.water_has_fish,
+        }
+
+    # --- Accessors ---
+
+    def polygon_center(self, polygon_id: str) -> Optional[Dict[str, float]]:
+        row = self.polygon_rows.get(polygon_id)
+        return None if row is None else _point_dict(self.polygon_center_coords, row)
+
+    def polygon_centers(self) -> List[Dict[str, float]]:
+        """Center (or centroid) of every polygon that has one."""
+        centers = (_point_dict(self.polygon_center_coords, row) for row in range(len(self.polygon_ids)))
+        return [center for center in centers if center]
+
+    def _canal_point(self, row: int) -> Dict[str, Any]:
+        return {
+            'id': self.canal_ids[row],
+            'polygonId': self.polygon_ids[self.canal_polygons[row]],
+            'edge': _point_dict(self.canal_edge_coords, row),
+            'water': _point_dict(self.canal_water_coords, row),
+        }
+
+    def dock_canal_point(self, dock_id: str, polygon_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Canal point of a dock (its BuildingId) with both edge and water coordinates; None otherwise."""
+        row = self.canal_rows.get(dock_id)
+        if row is None:
+            return None
+        point = self._canal_point(row)
+        if polygon_id is not None and point['polygonId'] != polygon_id:
+            return None
+        if point['edge'] is None or point['water'] is None:
+            return None
+        return point
+
+    def canal_points(self, polygon_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        polygon_row = self.polygon_rows.get(polygon_id) if polygon_id is not None else None
+        if polygon_id is not None and polygon_row is None:
+            return []
+        return [self._canal_point(row) for row in range(len(self.canal_ids))
+                if polygon_row is None or self.canal_polygons[row] == polygon_row]
+
+    def _building_point(self, row: int) -> Dict[str, Any]:
+        point = _point_dict(self.building_point_coords, row) or {'lat': None, 'lng': None}
+        return {
+            'id': self.building_point_ids[row],
+            'polygonId': self.polygon_ids[self.building_point_polygons[row]],
+            'lat': point['lat'],
+            'lng': point['lng'],
+            'buildingType': self.building_point_types[row],
+        }
+
+    def building_point(self, point_id: str) -> Optional[Dict[str, Any]]:
+        row = self.building_point_rows.get(point_id)
+        return None if row is None else self._building_point(row)
+
+    def building_points(self, polygon_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        polygon_row = self.polygon_rows.get(polygon_id) if polygon_id is not None else None
+        if polygon_id is not None and polygon_row is None:
+            return []
+        return [self._building_point(row) for row in range(len(self.building_point_ids))
+                if polygon_row is None or self.building_point_polygons[row] == polygon_row]
+
+    def water_points(self, fish_only: bool = False) -> List[Dict[str, Any]]:
+        points = []
+        for row, water_id in enumerate(self.water_ids):
+            if fish_only and not self.water_has_fish[row]:
+                continue
+            position = _point_dict(self.water_coords, row)
+            if position:
+                points.append({'id': water_id, 'position': position, 'hasFish': self.water_has_fish[row]})
+        return points
+
+    def water_graph(self) -> Dict[str, Any]:
+        """{'waterPoints': [...]} like /api/get-water-graph, without connections. Built once, same object after."""
+        if self._water_graph is None:
+            self._water_graph = {'waterPoints': self.water_points()}
+        return self._water_graph
+
+
+def _cache_path(cache_dir: str) -> str:
+    return os.path.join(cache_dir, GEODATA_CACHE_FILE)
+
+
+def _read_cache(cache_dir: str, version: str) -> Optional[GeoData]:
+    try:
+        with open(_cache_path(cache_dir), 'rb') as f:
+            state = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:  # Truncated file, other NumPy version, ...
+        log.warning(f"Ignoring unreadable geodata cache: {e}")
+        return None
+    if not isinstance(state, dict) or state.get('version') != version:
+        return None
+    try:
+        return GeoData(state)
+    except KeyError as e:
+        log.warning(f"Ignoring geodata cache without {e}")
+        return None
+
+
+def _write_cache(cache_dir: str, geodata: GeoData):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{_cache_path(cache_dir)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(geodata.to_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, _cache_path(cache_dir))
+    except OSError as e:
+        log.warning(f"Could not write the geodata cache: {e}")
+
+
+def load_geodata(data_dir: str = DATA_DIR, cache_dir: Optional[str] = GEODATA_CACHE_DIR) -> Optional[GeoData]:
+    """GeoData from the cache when it matches the source files, else parsed (and cached). None without data."""
+    version = source_version(data_dir)
+    if version is None:
+        return None
+    if cache_dir:
+        cached = _read_cache(cache_dir, version)
+        if cached is not None:
+            return cached
+    started_at = time.perf_counter()
+    geodata = GeoData.from_sources(data_dir, version)
+    log.info(f"Geodata parsed in {(time.perf_counter() - started_at) * 1000:.0f} ms: {len(geodata.polygon_ids)} polygons, "
+             f"{len(geodata.canal_ids)} canal points, {len(geodata.building_point_ids)} building points, {len(geodata.water_ids)} water points.")
+    if cache_dir:
+        _write_cache(cache_dir, geodata)
+    return geodata
+
+
+_geodata: Optional[GeoData] = None
+_geodata_checked_at = 0.0
+_geodata_lock = threading.Lock()
+
+
+def get_geodata() -> Optional[GeoData]:
+    """The process-wide GeoData; reloaded when the source files change. None when data/ has none."""
+    global _geodata, _geodata_checked_at
+    with _geodata_lock:
+        now = time.time()
+        if _geodata is not None and now - _geodata_checked_at < VERSION_CHECK_INTERVAL_SECONDS:
+            return _geodata
+        _geodata_checked_at = now
+        if _geodata is None or _geodata.version != source_version(DATA_DIR):
+            _geodata = load_geodata()
+        return _geodata
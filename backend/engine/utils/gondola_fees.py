@@ -0,0 +1,287 @@
+"""
+Gondola fee settlement for one processActivities run.
+
+Every processed activity whose path includes gondola segments costs the traveler
+GONDOLA_BASE_FEE + GONDOLA_FEE_PER_KM per km. The fee used to be paid inline after each
+activity: parse the path again, get_building_record() for every dock on it, get_citizen_record()
+for its operator, the traveler and the recipient, then two citizen updates and a transaction.
+
+A citizen's thread now only `record()`s the fee of each activity whose writes were flushed (the
+path is parsed once, in the worker). Once the citizen's activities are done, `settle()` pays the
+batch, so fees never wait in memory for the rest of the run:
+
+1. resolves dock operators from a public_dock BuildingId -> RunBy map, built from the run's
+   buildings snapshot or one filtered fetch (cached for DOCK_OPERATORS_TTL_SECONDS);
+2. looks up every citizen involved in one fetch;
+3. picks each fee's recipient as before: the first dock operator on the path, else the
+   Transporter, else ConsiglioDeiDieci. Fees are accepted in recording order against running
+   balances, so a traveler who can't pay is skipped as before;
+4. nets the accepted fees per (payer, payee) and pays each pair's total with one
+   DucatService transfer, which checks and writes both balances under the accounts' locks;
+5. creates one gondola_fee transaction per paid activity (batch_create), whose Notes list
+   the activities settled by the same transfer.
+
+    settlement = GondolaFeeSettlement(tables, buildings_snapshot)   # one per citizen batch
+    settlement.record(activity_record, citizen_username)
+    settlement.settle(dry_run=False)
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.engine.utils.activity_helpers import (
+    LogColors,
+    VENICE_TIMEZONE,
+    _escape_airtable_value,
+    calculate_haversine_distance_meters
+)
+from backend.engine.utils.ducat_service import get_ducat_service
+from backend.engine.utils.path_codec import load_path
+
+log = logging.getLogger(__name__)
+
+GONDOLA_BASE_FEE = 10.0
+GONDOLA_FEE_PER_KM = 5.0
+DEFAULT_FEE_RECIPIENT = "ConsiglioDeiDieci"
+DOCK_OPERATORS_TTL_SECONDS = int(os.getenv("DOCK_OPERATORS_TTL_SECONDS", "300"))
+USERNAMES_PER_QUERY = 50  # Keeps OR() formulas well under Airtable's URL length limit
+
+
+def gondola_travel_details(path_points: List[Dict[str, Any]]) -> Tuple[float, float]:
+    """(km travelled by gondola, fee) for a list of path points; (0, 0) without gondola segments."""
+    total_gondola_distance_km = 0.0
+    for p1, p2 in zip(path_points, path_points[1:]):
+        if isinstance(p1, dict) and isinstance(p2, dict) and p1.get("transportMode") == "gondola":
+            try:
+                lat1, lon1 = float(p1.get("lat", 0.0)), float(p1.get("lng", 0.0))
+                lat2, lon2 = float(p2.get("lat", 0.0)), float(p2.get("lng", 0.0))
+            except (TypeError, ValueError) as e:
+                log.warning(f"{LogColors.WARNING}Could not parse coordinates for path segment: {p1} to {p2}. Error: {e}{LogColors.ENDC}")
+                continue
+            if lat1 != 0.0 or lon1 != 0.0 or lat2 != 0.0 or lon2 != 0.0:  # Avoid calculating for zero coords
+                total_gondola_distance_km += calculate_haversine_distance_meters(lat1, lon1, lat2, lon2) / 1000.0
+
+    if total_gondola_distance_km <= 0:
+        return 0.0, 0.0
+    return total_gondola_distance_km, GONDOLA_BASE_FEE + GONDOLA_FEE_PER_KM * total_gondola_distance_km
+
+
+def path_dock_ids(path_points: List[Dict[str, Any]]) -> List[str]:
+    """nodeIds of the dock points of a path, in travel order."""
+    return [point['nodeId'] for point in path_points
+            if isinstance(point, dict) and point.get('type') == 'dock' and point.get('nodeId')]
+
+
+# (buildings table object id, loaded_at, BuildingId -> RunBy) when no snapshot is available
+_dock_operators: Optional[Tuple[int, float, Dict[str, str]]] = None
+_dock_operators_lock = threading.Lock()
+
+
+def get_dock_operators(tables: Dict[str, Any], buildings_snapshot: Optional[Any] = None) -> Dict[str, str]:
+    """BuildingId -> RunBy of the public docks that are run by someone."""
+    global _dock_operators
+    if buildings_snapshot is not None and buildings_snapshot.has_table('buildings'):
+        docks = buildings_snapshot.get_buildings_of_type('public_dock')
+        return {d['fields']['BuildingId']: d['fields']['RunBy'] for d in docks
+                if d['fields'].get('BuildingId') and d['fields'].get('RunBy')}
+
+    with _dock_operators_lock:
+        cached = _dock_operators
+        if cached is not None and cached[0] == id(tables['buildings']) and time.time() - cached[1] < DOCK_OPERATORS_TTL_SECONDS:
+            return cached[2]
+        docks = tables['buildings'].all(formula="{Type}='public_dock'", fields=['BuildingId', 'RunBy'])
+        operators = {d['fields']['BuildingId']: d['fields']['RunBy'] for d in docks
+                     if d['fields'].get('BuildingId') and d['fields'].get('RunBy')}
+        _dock_operators = (id(tables['buildings']), time.time(), operators)
+        return operators
+
+
+def invalidate_dock_operators():
+    """Drops the fetched dock map, e.g. after a dock changed operator."""
+    global _dock_operators
+    with _dock_operators_lock:
+        _dock_operators = None
+
+
+class GondolaFee:
+    """A fee recorded for one processed activity."""
+
+    __slots__ = ('payer', 'activity_guid', 'distance_km', 'fee', 'dock_ids', 'transporter', 'recipient')
+
+    def __init__(self, payer: str, activity_guid: str, distance_km: float, fee: float,
+                 dock_ids: List[str], transporter: Optional[str]):
+        self.payer = payer
+        self.activity_guid = activity_guid
+        self.distance_km = distance_km
+        self.fee = fee
+        self.dock_ids = dock_ids
+        self.transporter = transporter
+        self.recipient: Optional[str] = None
+
+
+class GondolaFeeSettlement:
+    """Collects the gondola fees of a citizen batch and pays them in one batched pass."""
+
+    def __init__(self, tables: Dict[str, Any], buildings_snapshot: Optional[Any] = None):
+        self.tables = tables
+        self.buildings_snapshot = buildings_snapshot
+        self._fees: List[GondolaFee] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._fees)
+
+    def record(self, activity_record: Dict, payer_username: str) -> Optional[GondolaFee]:
+        """Records the fee owed for an activity's path, if any. Safe to call from citizen threads."""
+        fields = activity_record['fields']
+        activity_path = fields.get('Path')
+        if not activity_path or not payer_username:
+            return None
+        activity_guid = fields.get('ActivityId', activity_record['id'])
+        try:
+            path_points = load_path(activity_path)
+        except ValueError:
+            log.error(f"{LogColors.FAIL}Failed to parse activity path for activity {activity_guid} while computing the gondola fee: {activity_path}{LogColors.ENDC}")
+            return None
+
+        distance_km, fee = gondola_travel_details(path_points)
+        if fee <= 0:
+            return None
+        gondola_fee = GondolaFee(payer_username, activity_guid, distance_km, fee,
+                                 path_dock_ids(path_points), fields.get('Transporter'))
+        with self._lock:
+            self._fees.append(gondola_fee)
+        log.info(f"{LogColors.OKBLUE}Recorded gondola fee of {fee:.2f} Ducats for activity {activity_guid} ({distance_km:.2f} km).{LogColors.ENDC}")
+        return gondola_fee
+
+    def _fetch_citizens(self, usernames: List[str]) -> Dict[str, Dict]:
+        """Username -> citizen record (Username and Ducats only), a few OR() queries for all of them."""
+        citizens = {}
+        for i in range(0, len(usernames), USERNAMES_PER_QUERY):
+            chunk = usernames[i:i + USERNAMES_PER_QUERY]
+            formula = "OR(" + ", ".join(f"{{Username}}='{_escape_airtable_value(u)}'" for u in chunk) + ")"
+            for record in self.tables['citizens'].all(formula=formula, fields=['Username', 'Ducats']):
+                if record['fields'].get('Username'):
+                    citizens[record['fields']['Username']] = record
+        return citizens
+
+    def _resolve_recipient(self, fee: GondolaFee, dock_operators: Dict[str, str], citizens: Dict[str, Dict]) -> str:
+        for dock_id in fee.dock_ids:
+            run_by = dock_operators.get(dock_id)
+            if not run_by or run_by == DEFAULT_FEE_RECIPIENT:
+                continue
+            if run_by in citizens:
+                log.info(f"{LogColors.OKBLUE}Gondola fee for activity {fee.activity_guid} assigned to RunBy ({run_by}) of public_dock {dock_id} found in path.{LogColors.ENDC}")
+                return run_by
+            log.warning(f"{LogColors.WARNING}RunBy user {run_by} for public_dock {dock_id} (from path) not found. Checking next dock in path.{LogColors.ENDC}")
+
+        if fee.transporter and fee.transporter != DEFAULT_FEE_RECIPIENT:
+            if fee.transporter in citizens:
+                log.info(f"{LogColors.OKBLUE}Gondola fee for activity {fee.activity_guid} assigned to Transporter field value (citizen): {fee.transporter}.{LogColors.ENDC}")
+                return fee.transporter
+            log.warning(f"{LogColors.WARNING}Transporter {fee.transporter} in activity {fee.activity_guid} was not a valid citizen. Fee defaults to {DEFAULT_FEE_RECIPIENT}.{LogColors.ENDC}")
+        return DEFAULT_FEE_RECIPIENT
+
+    def settle(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Pays every recorded fee; returns counts and the total amount paid."""
+        with self._lock:
+            fees, self._fees = self._fees, []
+        summary = {'fees': len(fees), 'paid': 0, 'skipped': 0, 'amount': 0.0, 'transactions': 0, 'transfers': 0}
+        if not fees:
+            return summary
+
+        try:
+            dock_operators = get_dock_operators(self.tables, self.buildings_snapshot)
+        except Exception as e:
+            log.error(f"{LogColors.FAIL}Could not load public dock operators, fees go to the Transporter or {DEFAULT_FEE_RECIPIENT}: {e}{LogColors.ENDC}")
+            dock_operators = {}
+
+        usernames = {DEFAULT_FEE_RECIPIENT}
+        for fee in fees:
+            usernames.add(fee.payer)
+            usernames.update(dock_operators[d] for d in fee.dock_ids if d in dock_operators)
+            if fee.transporter:
+                usernames.add(fee.transporter)
+        citizens = self._fetch_citizens(sorted(usernames))
+
+        # Accept fees in recording order against running balances, then net them per (payer, payee)
+        balances = {username: float(record['fields'].get('Ducats', 0) or 0) for username, record in citizens.items()}
+        pairs: 'OrderedDict[Tuple[str, str], List[GondolaFee]]' = OrderedDict()
+        for fee in fees:
+            fee.recipient = self._resolve_recipient(fee, dock_operators, citizens)
+            if fee.payer not in citizens or fee.recipient not in citizens:
+                missing = fee.payer if fee.payer not in citizens else fee.recipient
+                log.error(f"{LogColors.FAIL}Citizen {missing} not found for gondola fee of activity {fee.activity_guid}.{LogColors.ENDC}")
+                summary['skipped'] += 1
+                continue
+            if fee.recipient == fee.payer:
+                log.info(f"{LogColors.OKBLUE}Citizen {fee.payer} operates the gondola of activity {fee.activity_guid}; no fee to pay.{LogColors.ENDC}")
+                summary['skipped'] += 1
+                continue
+            if balances[fee.payer] < fee.fee:
+                log.warning(f"{LogColors.WARNING}Citizen {fee.payer} has insufficient Ducats ({balances[fee.payer]:.2f}) for gondola fee ({fee.fee:.2f}) for activity {fee.activity_guid}.{LogColors.ENDC}")
+                summary['skipped'] += 1
+                continue
+            balances[fee.payer] -= fee.fee
+            balances[fee.recipient] += fee.fee
+            pairs.setdefault((fee.payer, fee.recipient), []).append(fee)
+            summary['paid'] += 1
+            summary['amount'] += fee.fee
+
+        if not pairs:
+            return summary
+
+        if dry_run:
+            for (payer, payee), pair_fees in pairs.items():
+                log.info(f"{LogColors.OKCYAN}[DRY RUN] Would settle {len(pair_fees)} gondola fee(s) of {sum(f.fee for f in pair_fees):.2f} Ducats from {payer} to {payee}.{LogColors.ENDC}")
+            return summary
+
+        ducat_service = get_ducat_service(self.tables)
+        now_iso = datetime.now(VENICE_TIMEZONE).isoformat()
+        transactions = []
+        for (payer, payee), pair_fees in pairs.items():
+            amount = sum(fee.fee for fee in pair_fees)
+            # The balance may have changed since it was fetched: the transfer checks it again
+            if not ducat_service.transfer(citizens[payer]['id'], citizens[payee]['id'], amount,
+                                          reason=f"Gondola fees of {len(pair_fees)} activities"):
+                log.warning(f"{LogColors.WARNING}Could not settle {len(pair_fees)} gondola fee(s) of {amount:.2f} Ducats from {payer} to {payee}.{LogColors.ENDC}")
+                summary['paid'] -= len(pair_fees)
+                summary['skipped'] += len(pair_fees)
+                summary['amount'] -= amount
+                continue
+            summary['transfers'] += 1
+            settled_with = [fee.activity_guid for fee in pair_fees]
+            transactions.extend({
+                "Type": "gondola_fee",
+                "AssetType": "transport_activity",
+                "Asset": fee.activity_guid,
+                "Seller": payee,  # Recipient of the fee
+                "Buyer": payer,  # Payer of the fee
+                "Price": fee.fee,
+                "Notes": json.dumps({
+                    "activity_guid": fee.activity_guid,
+                    "distance_km": round(fee.distance_km, 2),
+                    "fee": round(fee.fee, 2),
+                    "original_transporter_field": fee.transporter,
+                    "settled_with": settled_with  # Activities paid by the same transfer
+                }),
+                "CreatedAt": now_iso,
+                "ExecutedAt": now_iso
+            } for fee in pair_fees)
+
+        if transactions:
+            try:
+                self.tables['transactions'].batch_create(transactions)
+                summary['transactions'] = len(transactions)
+            except Exception as e:
+                log.error(f"{LogColors.FAIL}Gondola fees were paid but their {len(transactions)} transactions could not be created: {e}{LogColors.ENDC}")
+
+        log.info(f"{LogColors.OKGREEN}Settled {summary['paid']} gondola fees ({summary['amount']:.2f} Ducats) as {summary['transfers']} transfers "
+                 f"and {summary['transactions']} transactions; {summary['skipped']} skipped.{LogColors.ENDC}")
+        return summary
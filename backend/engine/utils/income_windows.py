@@ -0,0 +1,162 @@
+"""
+Rolling income and expense windows for calculateIncomeAndTurnover.
+
+The script used to download the whole TRANSACTIONS table every evening to sum the last 24
+hours, 7 days and 30 days per citizen, so its cost grew with the simulation's history.
+IncomeWindows keeps, per citizen, WINDOW_DAYS day buckets of income and of expenses
+(array('d'): float64, 240 bytes each) indexed by UTC day, and is persisted between runs in
+data/.financials/. A run only fetches the transactions executed since the previous run:
+
+    windows = load_income_windows()
+    since = windows.fetch_start(now)              # previous run - overlap (or 30 days on the first run)
+    windows.advance_to(now)                       # zeroes the buckets of days that left the window
+    for tx in transactions executed after `since`:
+        if windows.is_new(tx['id'], executed_at):     # overlap re-fetches are skipped
+            windows.add(recipient_id, payer_id, executed_at, price)
+    windows.totals(record_id)                     # {'Weekly': (income, expenses), 'Monthly': (...)}
+    save_income_windows(windows)
+
+Weekly and Monthly are calendar-day windows: today's bucket plus the 6 (29) previous UTC
+days. The daily figures stay an exact rolling 24 hours: fetch_start() always reaches back at
+least 24 hours, so the caller sums them from the fetched transactions.
+
+Transactions can be created after the run with an ExecutedAt slightly in the past (ledger
+commits, buffered writes); the fetch starts LATE_TRANSACTION_OVERLAP_SECONDS before the
+previous run and the ids already counted in that overlap are remembered.
+"""
+
+import os
+import logging
+import pickle
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+FINANCIALS_STATE_DIR = os.getenv("FINANCIALS_STATE_DIR", os.path.join(PROJECT_ROOT, 'data', '.financials'))
+FINANCIALS_STATE_FILE = 'income_windows.pickle'
+STATE_FORMAT_VERSION = 1
+
+WINDOW_DAYS = 30
+WEEK_DAYS = 7
+LATE_TRANSACTION_OVERLAP_SECONDS = int(os.getenv("LATE_TRANSACTION_OVERLAP_SECONDS", "3600"))
+SECONDS_PER_DAY = 86400
+
+
+def utc_day(moment: datetime) -> int:
+    """Days since the epoch (UTC) of a timezone-aware datetime."""
+    return int(moment.timestamp() // SECONDS_PER_DAY)
+
+
+def _empty_buckets() -> array:
+    return array('d', bytes(8 * WINDOW_DAYS))
+
+
+class IncomeWindows:
+    """Per-citizen day buckets of income and expenses over the last WINDOW_DAYS days."""
+
+    def __init__(self, state: Optional[Dict] = None):
+        state = state or {}
+        self.last_run: Optional[datetime] = state.get('last_run')
+        self.day: Optional[int] = state.get('day')  # UTC day the buckets were last advanced to
+        self.income: Dict[str, array] = state.get('income', {})
+        self.expenses: Dict[str, array] = state.get('expenses', {})
+        self.recent_ids: Dict[str, float] = state.get('recent_ids', {})  # transaction id -> ExecutedAt timestamp
+        self.changed = set()  # Citizens whose buckets changed in this run
+
+    def to_state(self) -> Dict:
+        return {'format': STATE_FORMAT_VERSION, 'last_run': self.last_run, 'day': self.day,
+                'income': self.income, 'expenses': self.expenses, 'recent_ids': self.recent_ids}
+
+    def fetch_start(self, now: datetime) -> datetime:
+        """Earliest ExecutedAt this run needs: the previous run minus the overlap, and at least 24 hours back."""
+        if self.last_run is None:
+            return now - timedelta(days=WINDOW_DAYS)
+        return min(self.last_run - timedelta(seconds=LATE_TRANSACTION_OVERLAP_SECONDS), now - timedelta(days=1))
+
+    def advance_to(self, now: datetime):
+        """Zeroes the buckets of the days that left the window since the last run."""
+        today = utc_day(now)
+        if self.day is not None and today - self.day < WINDOW_DAYS:
+            expired = [d % WINDOW_DAYS for d in range(self.day + 1, today + 1)]
+        else:
+            expired = list(range(WINDOW_DAYS)) if self.day is not None else []
+        if expired:
+            for buckets_by_citizen in (self.income, self.expenses):
+                for record_id, buckets in buckets_by_citizen.items():
+                    if any(buckets[i] for i in expired):
+                        for i in expired:
+                            buckets[i] = 0.0
+                        self.changed.add(record_id)
+        self.day = today
+
+    def is_new(self, transaction_id: str, executed_at: datetime) -> bool:
+        """False for a transaction already counted by an earlier run (re-fetched by the overlap)."""
+        if transaction_id in self.recent_ids:
+            return False
+        self.recent_ids[transaction_id] = executed_at.timestamp()
+        return True
+
+    def add(self, recipient_id: Optional[str], payer_id: Optional[str], executed_at: datetime, price: float):
+        day = utc_day(executed_at)
+        if self.day is None or day > self.day or self.day - day >= WINDOW_DAYS:
+            return  # In the future of this run (clock skew) or already out of the window
+        index = day % WINDOW_DAYS
+        if recipient_id:
+            self.income.setdefault(recipient_id, _empty_buckets())[index] += price
+            self.changed.add(recipient_id)
+        if payer_id:
+            self.expenses.setdefault(payer_id, _empty_buckets())[index] += price
+            self.changed.add(payer_id)
+
+    def totals(self, record_id: str) -> Dict[str, Tuple[float, float]]:
+        """{'Weekly': (income, expenses), 'Monthly': (income, expenses)} of a citizen."""
+        week = [(self.day - d) % WINDOW_DAYS for d in range(WEEK_DAYS)] if self.day is not None else []
+        income = self.income.get(record_id)
+        expenses = self.expenses.get(record_id)
+        return {
+            'Weekly': (sum(income[i] for i in week) if income else 0.0, sum(expenses[i] for i in week) if expenses else 0.0),
+            'Monthly': (sum(income) if income else 0.0, sum(expenses) if expenses else 0.0),
+        }
+
+    def finish_run(self, now: datetime, citizen_ids: Iterable[str]):
+        """Records the run, forgets transaction ids older than the next overlap and citizens that no longer exist."""
+        self.last_run = now
+        keep_after = (now - timedelta(days=1, seconds=LATE_TRANSACTION_OVERLAP_SECONDS)).timestamp()
+        self.recent_ids = {tx_id: ts for tx_id, ts in self.recent_ids.items() if ts >= keep_after}
+        existing = set(citizen_ids)
+        for buckets_by_citizen in (self.income, self.expenses):
+            for record_id in [r for r in buckets_by_citizen if r not in existing]:
+                del buckets_by_citizen[record_id]
+
+
+def _state_path(state_dir: str) -> str:
+    return os.path.join(state_dir, FINANCIALS_STATE_FILE)
+
+
+def load_income_windows(state_dir: str = FINANCIALS_STATE_DIR) -> IncomeWindows:
+    """Windows saved by the previous run; empty (first run: 30 days are fetched) if there are none."""
+    try:
+        with open(_state_path(state_dir), 'rb') as f:
+            state = pickle.load(f)
+    except FileNotFoundError:
+        return IncomeWindows()
+    except Exception as e:  # Truncated file, ...
+        log.warning(f"Ignoring unreadable income windows state: {e}")
+        return IncomeWindows()
+    if not isinstance(state, dict) or state.get('format') != STATE_FORMAT_VERSION:
+        return IncomeWindows()
+    return IncomeWindows(state)
+
+
+def save_income_windows(windows: IncomeWindows, state_dir: str = FINANCIALS_STATE_DIR):
+    try:
+        os.makedirs(state_dir, exist_ok=True)
+        tmp_path = f"{_state_path(state_dir)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(windows.to_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, _state_path(state_dir))
+    except OSError as e:
+        log.warning(f"Could not save the income windows state: {e}")
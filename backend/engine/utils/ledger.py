@@ -0,0 +1,304 @@
+"""
+Double-entry ledger for the daily payment scripts.
+
+dailywages, dailyrentpayments, distributeLeases, dailyloanpayments, paystoragecontracts and
+treasuryRedistribution used to settle each payment on its own: look up payer and payee (and
+ConsiglioDeiDieci for taxes) with one query each, read-modify-write both Ducats balances and
+create a TRANSACTIONS record, so a daily run cost thousands of API calls.
+
+A Ledger loads every citizen's balance with one fetch. Each `transfer()` is checked against
+the running in-memory balance of the payer and recorded as two postings (the payer's debit and
+the payee's credit, which always sum to zero) plus the TRANSACTIONS record to create.
+`commit()` nets the postings per citizen and writes them back: the touched balances are read
+again (so changes made by other processes during the run are kept), then one Ducats update per
+citizen and all transaction records are sent with batch_update / batch_create in chunks of 10.
+If the balances can't be re-read nothing is written. If a chunk of balance updates fails, the
+chunks already written are rolled back to the re-read balances and no transaction records are
+created; the summary's 'ok' (the transfers took effect) is then False. A rollback that fails
+too is logged with the balances to restore ('rollback_failed' in the summary).
+A failed transaction record is logged but doesn't undo its transfer.
+
+Side effects of a payment (notifications, trust updates) are passed as `on_commit` and run by
+`commit()` once the balances are written, never in a dry run:
+
+    ledger = Ledger(tables, dry_run=dry_run).load()
+    if not ledger.transfer(payer, payee, amount, transaction={"Type": "wage_payment", ...},
+                           on_commit=lambda: notify(payer, payee)):
+        ...                                   # not paid: unknown citizen or insufficient funds
+    if ledger.commit()['ok']:                 # dry run: logs the balance diff and writes nothing
+        ...                                   # run summaries
+
+Accounts are resolved by Username, then Wallet, then the known misspellings of
+ConsiglioDeiDieci, like the scripts' former find_citizen_by_identifier().
+"""
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from backend.engine.utils.activity_helpers import LogColors, _escape_airtable_value
+
+log = logging.getLogger(__name__)
+
+CONSIGLIO_USERNAME = "ConsiglioDeiDieci"
+CONSIGLIO_ALIASES = ("Consiglio Dei Dieci", "Consiglio dei Dieci", "ConsiglioDeidieci")
+AIRTABLE_BATCH_SIZE = 10
+RECORD_IDS_PER_QUERY = 50  # Keeps OR() formulas well under Airtable's URL length limit
+BALANCE_EPSILON = 1e-6
+
+Posting = Tuple[str, float, int]  # (username, signed amount, entry index)
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _ducats(record: Dict) -> float:
+    try:
+        return float(record['fields'].get('Ducats', 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class LedgerError(Exception):
+    """Raised when the postings of a ledger don't balance."""
+
+
+class Ledger:
+    """In-memory Ducats balances of all citizens, with the transfers of one run as postings."""
+
+    def __init__(self, tables: Dict[str, Any], dry_run: bool = False, allow_overdraft: bool = False):
+        self.tables = tables
+        self.dry_run = dry_run
+        self.allow_overdraft = allow_overdraft
+        self.citizens: Dict[str, Dict] = {}     # Username -> citizen record as loaded
+        self.opening: Dict[str, float] = {}     # Username -> balance at load
+        self.balances: Dict[str, float] = {}    # Username -> running balance
+        self._by_wallet: Dict[str, str] = {}
+        self.postings: List[Posting] = []
+        self.entries: List[Dict[str, Any]] = []  # {'payer', 'payee', 'amount', 'transaction', 'on_commit'}
+        self.committed = False
+        self._lock = threading.Lock()
+
+    def load(self, citizens: Optional[List[Dict]] = None) -> 'Ledger':
+        """Loads every citizen's balance (one paginated fetch unless `citizens` is given)."""
+        if citizens is None:
+            citizens = self.tables['citizens'].all()
+        for record in citizens:
+            username = record['fields'].get('Username')
+            if not username:
+                continue
+            self.citizens[username] = record
+            self.opening[username] = self.balances[username] = _ducats(record)
+            wallet = record['fields'].get('Wallet')
+            if wallet:
+                self._by_wallet.setdefault(wallet, username)
+        log.info(f"{LogColors.OKBLUE}Ledger loaded {len(self.citizens)} citizen balances.{LogColors.ENDC}")
+        return self
+
+    # --- Accounts ---
+
+    def resolve(self, identifier: Optional[str]) -> Optional[str]:
+        """Username of the citizen with this Username or Wallet; None if unknown."""
+        if not identifier:
+            return None
+        if identifier in self.citizens:
+            return identifier
+        if identifier in self._by_wallet:
+            return self._by_wallet[identifier]
+        if identifier == CONSIGLIO_USERNAME:
+            for alias in CONSIGLIO_ALIASES:
+                if alias in self.citizens:
+                    return alias
+        return None
+
+    def citizen(self, identifier: Optional[str]) -> Optional[Dict]:
+        """The citizen record as loaded (its Ducats field is the opening balance)."""
+        username = self.resolve(identifier)
+        return self.citizens.get(username) if username else None
+
+    def balance(self, identifier: Optional[str]) -> Optional[float]:
+        """Running balance, including the transfers recorded so far."""
+        username = self.resolve(identifier)
+        return self.balances.get(username) if username else None
+
+    # --- Postings ---
+
+    def transfer(self, payer: str, payee: str, amount: float, transaction: Optional[Dict[str, Any]] = None,
+                 allow_overdraft: Optional[bool] = None, on_commit: Optional[Callable[[], Any]] = None) -> bool:
+        """
+        Moves `amount` Ducats from payer to payee. Returns False (and records nothing) if either
+        is unknown or the payer can't cover it. `transaction` is the TRANSACTIONS record created
+        on commit; `on_commit` is called by commit() once the balances are written. A transfer to
+        oneself succeeds without postings.
+        """
+        amount = float(amount)
+        if amount < 0:
+            raise ValueError(f"Transfer amount must not be negative: {amount}")
+        payer_username, payee_username = self.resolve(payer), self.resolve(payee)
+        if payer_username is None or payee_username is None:
+            log.warning(f"{LogColors.WARNING}Ledger: cannot transfer {amount:.2f} from {payer} to {payee}: "
+                        f"{payer if payer_username is None else payee} not found.{LogColors.ENDC}")
+            return False
+        overdraft = self.allow_overdraft if allow_overdraft is None else allow_overdraft
+        with self._lock:
+            if self.committed:
+                raise LedgerError("Ledger already committed")
+            if not overdraft and self.balances[payer_username] + BALANCE_EPSILON < amount:
+                return False
+            index = len(self.entries)
+            if payer_username == payee_username or amount == 0:
+                self.entries.append({'payer': payer_username, 'payee': payee_username, 'amount': 0.0, 'transaction': None, 'on_commit': on_commit})
+                return True
+            self.entries.append({'payer': payer_username, 'payee': payee_username, 'amount': amount, 'transaction': transaction, 'on_commit': on_commit})
+            self.postings.append((payer_username, -amount, index))
+            self.postings.append((payee_username, amount, index))
+            self.balances[payer_username] -= amount
+            self.balances[payee_username] += amount
+        return True
+
+    def net_changes(self) -> 'OrderedDict[str, float]':
+        """Username -> net Ducats change of the run, for citizens whose balance changed."""
+        totals: 'OrderedDict[str, float]' = OrderedDict()
+        for username, amount, _ in self.postings:
+            totals[username] = totals.get(username, 0.0) + amount
+        return OrderedDict((u, delta) for u, delta in totals.items() if abs(delta) > BALANCE_EPSILON)
+
+    def diff(self) -> List[Dict[str, Any]]:
+        """Balance changes as [{'username', 'before', 'after', 'delta'}], largest changes first."""
+        rows = [{'username': u, 'before': self.opening[u], 'after': self.opening[u] + delta, 'delta': delta}
+                for u, delta in self.net_changes().items()]
+        rows.sort(key=lambda row: abs(row['delta']), reverse=True)
+        return rows
+
+    def log_diff(self, limit: int = 50):
+        rows = self.diff()
+        log.info(f"{LogColors.OKCYAN}[DRY RUN] Ledger: {len(self.postings) // 2} transfers, {len(rows)} balance changes:{LogColors.ENDC}")
+        for row in rows[:limit]:
+            log.info(f"{LogColors.OKCYAN}[DRY RUN]   {row['username']}: {row['before']:.2f} -> {row['after']:.2f} ({row['delta']:+.2f}){LogColors.ENDC}")
+        if len(rows) > limit:
+            log.info(f"{LogColors.OKCYAN}[DRY RUN]   ... and {len(rows) - limit} more.{LogColors.ENDC}")
+
+    def check_balanced(self):
+        """Raises LedgerError unless every entry's postings, and all postings together, sum to zero."""
+        per_entry: Dict[int, float] = {}
+        for _, amount, index in self.postings:
+            per_entry[index] = per_entry.get(index, 0.0) + amount
+        unbalanced = [index for index, total in per_entry.items() if abs(total) > BALANCE_EPSILON]
+        if unbalanced:
+            raise LedgerError(f"{len(unbalanced)} unbalanced ledger entries, e.g. {self.entries[unbalanced[0]]}")
+
+    # --- Commit ---
+
+    def _current_balances(self, usernames: List[str]) -> Dict[str, float]:
+        """Balances as they are now in the table (other processes may have changed them since load)."""
+        record_ids = {self.citizens[u]['id']: u for u in usernames}
+        current = {}
+        for chunk in _chunks(list(record_ids), RECORD_IDS_PER_QUERY):
+            formula = "OR(" + ", ".join(f"RECORD_ID()='{_escape_airtable_value(rid)}'" for rid in chunk) + ")"
+            for record in self.tables['citizens'].all(formula=formula, fields=['Ducats']):
+                if record['id'] in record_ids:
+                    current[record_ids[record['id']]] = _ducats(record)
+        return current
+
+    def _run_on_commit(self, entry_indexes: Iterable[int]) -> int:
+        """Calls the on_commit callbacks of the given entries; a failing callback is logged and skipped."""
+        called = 0
+        for index in entry_indexes:
+            callback = self.entries[index]['on_commit']
+            if callback is None:
+                continue
+            try:
+                callback()
+                called += 1
+            except Exception as e:
+                entry = self.entries[index]
+                log.error(f"{LogColors.FAIL}Ledger: on_commit of the transfer {entry['payer']} -> {entry['payee']} "
+                          f"({entry['amount']:.2f}) failed: {e}{LogColors.ENDC}")
+        return called
+
+    def _roll_back(self, written: List[Dict[str, Any]], current: Dict[str, float], summary: Dict[str, Any]):
+        """Writes the re-read balances back over the given updates."""
+        usernames = {self.citizens[u]['id']: u for u in current}
+        restores = [{'id': update['id'], 'fields': {'Ducats': current[usernames[update['id']]]}} for update in written]
+        for chunk in _chunks(restores, AIRTABLE_BATCH_SIZE):
+            try:
+                self.tables['citizens'].batch_update(chunk)
+                summary['rolled_back'] += len(chunk)
+            except Exception as e:
+                summary['rollback_failed'] += len(chunk)
+                log.critical(f"{LogColors.FAIL}Ledger: could not roll back {len(chunk)} citizen balances, restore them by hand: "
+                             f"{e}. Balances to restore: {json.dumps(chunk)}{LogColors.ENDC}")
+
+    def commit(self) -> Dict[str, Any]:
+        """
+        Writes the net balance changes, then the transaction records, then runs the on_commit
+        callbacks. Nothing is written if the touched balances can't be re-read. If a chunk of
+        balance updates fails, the chunks already written are restored to the re-read balances
+        and no transaction is created nor callback run: 'ok' is then False, and callers must not
+        record the payments as made. In dry-run mode, only logs the diff.
+        """
+        self.check_balanced()
+        changes = self.net_changes()
+        transfers = len(self.postings) // 2
+        summary = {'ok': True, 'transfers': transfers, 'citizen_updates': 0, 'transactions': 0,
+                   'failed_updates': 0, 'failed_transactions': 0, 'rolled_back': 0, 'rollback_failed': 0}
+        if self.dry_run:
+            self.log_diff()
+            return summary
+        with self._lock:
+            if self.committed:
+                raise LedgerError("Ledger already committed")
+            self.committed = True
+
+        if changes:
+            try:
+                current = self._current_balances(list(changes))
+            except Exception as e:
+                log.error(f"{LogColors.FAIL}Ledger: could not re-read {len(changes)} balances, nothing written "
+                          f"({transfers} transfers dropped): {e}{LogColors.ENDC}")
+                summary['ok'] = False
+                return summary
+            missing = [u for u in changes if u not in current]
+            if missing:
+                log.error(f"{LogColors.FAIL}Ledger: {len(missing)} citizens no longer found ({', '.join(missing[:10])}), "
+                          f"nothing written ({transfers} transfers dropped).{LogColors.ENDC}")
+                summary['ok'] = False
+                return summary
+            updates = [{'id': self.citizens[u]['id'], 'fields': {'Ducats': current[u] + delta}}
+                       for u, delta in changes.items()]
+            written: List[Dict[str, Any]] = []
+            for chunk in _chunks(updates, AIRTABLE_BATCH_SIZE):
+                try:
+                    self.tables['citizens'].batch_update(chunk)
+                except Exception as e:
+                    summary['failed_updates'] = len(updates) - len(written)
+                    log.error(f"{LogColors.FAIL}Ledger: error updating {len(chunk)} citizen balances: {e}. Updates: {json.dumps(chunk)}{LogColors.ENDC}")
+                    break
+                written.extend(chunk)
+            summary['citizen_updates'] = len(written)
+            if summary['failed_updates']:
+                log.error(f"{LogColors.FAIL}Ledger: {summary['failed_updates']} balance updates failed, rolling back the "
+                          f"{len(written)} already written and dropping {transfers} transfers.{LogColors.ENDC}")
+                self._roll_back(written, current, summary)
+                summary['ok'] = False
+                return summary
+
+        transactions = [entry['transaction'] for entry in self.entries if entry['transaction']]
+        for chunk in _chunks(transactions, AIRTABLE_BATCH_SIZE):
+            try:
+                self.tables['transactions'].batch_create(chunk)
+                summary['transactions'] += len(chunk)
+            except Exception as e:
+                summary['failed_transactions'] += len(chunk)
+                log.error(f"{LogColors.FAIL}Ledger: error creating {len(chunk)} transaction records: {e}. Records: {json.dumps(chunk)}{LogColors.ENDC}")
+        self._run_on_commit(range(len(self.entries)))
+
+        color = LogColors.OKGREEN if not summary['failed_transactions'] else LogColors.WARNING
+        log.info(f"{color}Ledger committed {summary['transfers']} transfers: {summary['citizen_updates']} balance updates, "
+                 f"{summary['transactions']} transactions ({summary['failed_updates']} updates and "
+                 f"{summary['failed_transactions']} transactions failed).{LogColors.ENDC}")
+        return summary
@@ -0,0 +1,268 @@
+"""
+Cache for path results (transport API or in-process router).
+
+Citizens travel between the same building pairs every day (home -> workplace, workplace ->
+market), and every trip used to compute the same path again. Results are cached by their
+endpoints, quantized to PATH_CACHE_DECIMALS decimal places (5 = about one meter), in:
+
+1. an LRU-bounded in-memory tier (PATH_CACHE_MAX_ENTRIES), per process;
+2. optionally (PATH_CACHE_DISK=1), a SQLite file under data/.path_cache/ shared by every
+   scheduler task, whether it runs in-process or as a subprocess.
+
+Entries carry the version of the navigation data (size and mtime of the graph files) they were
+computed on; when the files change, older entries are ignored and the memory tier is cleared.
+Entries also expire after PATH_CACHE_TTL_SECONDS, since the transporter (RunBy of the docks on
+the path) can change.
+
+A hit returns a copy with the time-dependent fields re-stamped: timing.startDate is now,
+timing.endDate is now + durationSeconds. The first and last path points are moved to the exact
+requested endpoints.
+
+`get_path_cache_stats()` returns hit/miss counters; `log_path_cache_stats()` logs them.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import pytz
+
+from backend.engine.utils.activity_helpers import LogColors
+from backend.engine.utils.pathfinding import DATA_DIR, NAVIGATION_GRAPH_FILE, WATER_GRAPH_FILE, POLYGONS_SUBDIR
+
+log = logging.getLogger(__name__)
+
+PATH_CACHE_ENABLED = os.getenv("PATH_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PATH_CACHE_MAX_ENTRIES = int(os.getenv("PATH_CACHE_MAX_ENTRIES", "5000"))
+PATH_CACHE_DECIMALS = int(os.getenv("PATH_CACHE_DECIMALS", "5"))
+PATH_CACHE_TTL_SECONDS = int(os.getenv("PATH_CACHE_TTL_SECONDS", str(24 * 3600)))
+PATH_CACHE_DISK = os.getenv("PATH_CACHE_DISK", "false").lower() in ("1", "true", "yes")
+PATH_CACHE_DIR = os.getenv("PATH_CACHE_DIR", os.path.join(DATA_DIR, '.path_cache'))
+PATH_CACHE_DISK_MAX_ENTRIES = int(os.getenv("PATH_CACHE_DISK_MAX_ENTRIES", "100000"))
+VERSION_CHECK_INTERVAL_SECONDS = 30
+
+CacheKey = Tuple[float, float, float, float]
+
+
+def _quantize(point: Dict[str, float]) -> Tuple[float, float]:
+    return round(float(point['lat']), PATH_CACHE_DECIMALS), round(float(point['lng']), PATH_CACHE_DECIMALS)
+
+
+def make_key(start: Dict[str, float], end: Dict[str, float]) -> CacheKey:
+    return _quantize(start) + _quantize(end)
+
+
+def _navigation_data_version() -> str:
+    """Cheap signature of the navigation data files (size and mtime; no reading)."""
+    parts = []
+    for path in (os.path.join(DATA_DIR, NAVIGATION_GRAPH_FILE), os.path.join(DATA_DIR, WATER_GRAPH_FILE),
+                 os.path.join(DATA_DIR, POLYGONS_SUBDIR)):
+        try:
+            stat = os.stat(path)
+            parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            parts.append('-')
+    return '|'.join(parts)
+
+
+def restamp(result: Dict[str, Any], start: Dict[str, float], end: Dict[str, float],
+            now: Optional[datetime.datetime] = None) -> Dict[str, Any]:
+    """Updates the time-dependent fields and the exact endpoints of a cached result, in place."""
+    now = now or datetime.datetime.now(pytz.UTC)
+    timing = result.get('timing')
+    if isinstance(timing, dict):
+        timing['startDate'] = now.isoformat()
+        try:
+            timing['endDate'] = (now + datetime.timedelta(seconds=float(timing.get('durationSeconds') or 0))).isoformat()
+        except (TypeError, ValueError):
+            pass
+    path = result.get('path')
+    if isinstance(path, list) and path:
+        path[0]['lat'], path[0]['lng'] = float(start['lat']), float(start['lng'])
+        path[-1]['lat'], path[-1]['lng'] = float(end['lat']), float(end['lng'])
+    return result
+
+
+class _DiskTier:
+    """SQLite key/value store: key -> (version, stored_at, result JSON)."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'paths.sqlite')
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS paths ("
+                "key TEXT PRIMARY KEY, version TEXT NOT NULL, stored_at REAL NOT NULL, result TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS paths_stored_at ON paths(stored_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, version: str, min_stored_at: float) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT result FROM paths WHERE key = ? AND version = ? AND stored_at >= ?", (key, version, min_stored_at)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, version: str, result_json: str):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO paths (key, version, stored_at, result) VALUES (?, ?, ?, ?)",
+                (key, version, time.time(), result_json)
+            )
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                # Keep the newest entries only; stale versions go first since they are never read again
+                conn.execute("DELETE FROM paths WHERE version != ?", (version,))
+                conn.execute(
+                    "DELETE FROM paths WHERE key NOT IN (SELECT key FROM paths ORDER BY stored_at DESC LIMIT ?)",
+                    (PATH_CACHE_DISK_MAX_ENTRIES,)
+                )
+
+
+class PathCache:
+    def __init__(self, max_entries: int = PATH_CACHE_MAX_ENTRIES, disk_directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[CacheKey, Tuple[float, str]]' = OrderedDict()  # key -> (stored_at, result JSON)
+        self._lock = threading.Lock()
+        self._version = _navigation_data_version()
+        self._version_checked_at = time.time()
+        self._disk: Optional[_DiskTier] = None
+        if disk_directory:
+            try:
+                self._disk = _DiskTier(disk_directory)
+            except (OSError, sqlite3.Error) as e:
+                log.warning(f"{LogColors.WARNING}Path cache disk tier unavailable ({e}); using memory only.{LogColors.ENDC}")
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'invalidations': 0}
+
+    def _current_version(self) -> str:
+        now = time.time()
+        if now - self._version_checked_at >= VERSION_CHECK_INTERVAL_SECONDS:
+            self._version_checked_at = now
+            version = _navigation_data_version()
+            if version != self._version:
+                log.info(f"{LogColors.OKBLUE}Navigation data changed; clearing the path cache.{LogColors.ENDC}")
+                self._version = version
+                self._entries.clear()
+                self.stats['invalidations'] += 1
+        return self._version
+
+    def get(self, start: Dict[str, float], end: Dict[str, float]) -> Optional[Dict[str, Any]]:
+        key = make_key(start, end)
+        min_stored_at = time.time() - PATH_CACHE_TTL_SECONDS
+        with self._lock:
+            version = self._current_version()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= min_stored_at:
+                self._entries.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return restamp(json.loads(entry[1]), start, end)
+            if entry is not None:
+                del self._entries[key]
+
+        if self._disk is not None:
+            try:
+                result_json = self._disk.get(json.dumps(key), version, min_stored_at)
+            except sqlite3.Error as e:
+                log.warning(f"{LogColors.WARNING}Path cache disk read failed: {e}{LogColors.ENDC}")
+                result_json = None
+            if result_json is not None:
+                with self._lock:
+                    self._store_in_memory(key, result_json)
+                    self.stats['disk_hits'] += 1
+                return restamp(json.loads(result_json), start, end)
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def _store_in_memory(self, key: CacheKey, result_json: str):
+        self._entries[key] = (time.time(), result_json)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def put(self, start: Dict[str, float], end: Dict[str, float], result: Dict[str, Any]):
+        """Caches a successful result (the caller keeps its own object; the cache stores a copy)."""
+        if not result or not result.get('success') or not result.get('path'):
+            return
+        key = make_key(start, end)
+        result_json = json.dumps(result)
+        with self._lock:
+            version = self._current_version()
+            self._store_in_memory(key, result_json)
+            self.stats['stores'] += 1
+        if self._disk is not None:
+            try:
+                self._disk.put(json.dumps(key), version, result_json)
+            except sqlite3.Error as e:
+                log.warning(f"{LogColors.WARNING}Path cache disk write failed: {e}{LogColors.ENDC}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+_cache: Optional[PathCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_path_cache() -> Optional[PathCache]:
+    """The process-wide cache, or None when PATH_CACHE_ENABLED is off."""
+    global _cache
+    if not PATH_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PathCache(disk_directory=PATH_CACHE_DIR if PATH_CACHE_DISK else None)
+    return _cache
+
+
+def get_cached_path(start: Dict[str, float], end: Dict[str, float]) -> Optional[Dict[str, Any]]:
+    cache = get_path_cache()
+    return cache.get(start, end) if cache else None
+
+
+def cache_path(start: Dict[str, float], end: Dict[str, float], result: Optional[Dict[str, Any]]):
+    cache = get_path_cache()
+    if cache and result:
+        cache.put(start, end, result)
+
+
+def get_path_cache_stats() -> Optional[Dict[str, Any]]:
+    cache = _cache
+    return cache.get_stats() if cache else None
+
+
+def log_path_cache_stats():
+    stats = get_path_cache_stats()
+    if not stats:
+        return
+    log.info(f"{LogColors.OKBLUE}Path cache: {stats['hit_rate']:.1%} hit rate "
+             f"({stats['memory_hits']} memory hits, {stats['disk_hits']} disk hits, {stats['misses']} misses), "
+             f"{stats['entries']} entries, {stats['evictions']} evictions, {stats['invalidations']} invalidations.{LogColors.ENDC}")
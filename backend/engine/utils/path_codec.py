@@ -0,0 +1,230 @@
+"""
+Compact encoding of activity Path payloads.
+
+A Path is stored as JSON: a list of points like
+{"lat": 45.43, "lng": 12.33, "type": "canal", "nodeId": "...", "polygonId": "...",
+ "transportMode": "gondola", "isIntermediatePoint": true}. It makes ACTIVITIES rows large and
+every reader pays a json.loads. The compact form is a string "pc1:" + base64 of a
+zlib-compressed binary block:
+
+    uint8   format version (1)
+    uint32  number of points N
+    uint32  byte length L of the string table, then L bytes: the UTF-8 strings joined by NUL
+    int32   2N coordinates in microdegrees: first lat/lng absolute, then deltas to the previous point
+    uint8   N type codes, uint8 N transportMode codes      # 0 = key absent, 1 = null, 2 + i = string i
+    uint16  N nodeId codes, uint16 N polygonId codes       # same scheme
+    uint8   N isIntermediatePoint flags                    # 0 = absent, 1 = false, 2 = true
+
+All integers are little-endian. Decoding a compact path gives back the JSON form with the
+coordinates rounded to 6 decimal places (about 0.1 m). Points with other keys or values can't
+be encoded; `dump_path()` then writes JSON.
+
+Readers use `load_path()`, which accepts both forms, so PATH_ENCODING=compact can be enabled
+at any time. The default stays json. The frontend gets JSON either way, because the
+activities API route decodes compact paths (lib/utils/pathCodec.ts). Every Path writer goes
+through `dump_path()`, or `dumpPath()` in lib/utils/pathCodec.ts for the create-activity route.
+"""
+
+import os
+import json
+import zlib
+import base64
+import struct
+import binascii
+from array import array
+from itertools import accumulate
+from typing import Any, Dict, List, Optional
+
+PATH_ENCODING = os.getenv("PATH_ENCODING", "json").lower()  # "json" or "compact"
+
+COMPACT_PATH_PREFIX = 'pc1:'
+FORMAT_VERSION = 1
+MICRODEGREES = 1_000_000
+ABSENT, NULL = 0, 1
+
+STRING_FIELDS = ('type', 'transportMode', 'nodeId', 'polygonId')
+POINT_KEYS = ('lat', 'lng') + STRING_FIELDS + ('isIntermediatePoint',)
+ENCODABLE_KEYS = frozenset(POINT_KEYS)
+
+_LITTLE_ENDIAN = struct.pack('=H', 1) == struct.pack('<H', 1)
+
+
+def _to_bytes(values: array) -> bytes:
+    if not _LITTLE_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if not _LITTLE_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def is_compact_path(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(COMPACT_PATH_PREFIX)
+
+
+def encode_path(points: List[Dict[str, Any]]) -> str:
+    """Compact form of a list of path points. Raises ValueError for points it can't represent."""
+    strings: List[str] = []
+    string_codes: Dict[str, int] = {}
+
+    def code_of(point: Dict[str, Any], key: str) -> int:
+        if key not in point:
+            return ABSENT
+        value = point[key]
+        if value is None:
+            return NULL
+        if not isinstance(value, str):
+            raise ValueError(f"Path point field {key} is not a string: {value!r}")
+        code = string_codes.get(value)
+        if code is None:
+            code = string_codes[value] = len(strings) + 2
+            strings.append(value)
+        return code
+
+    # Codes are collected in lists and range-checked before the typed arrays are built, so an
+    # out-of-range value is a ValueError rather than the OverflowError array.append() raises
+    coordinates: List[int] = []
+    types: List[int] = []
+    modes: List[int] = []
+    flags: List[int] = []
+    node_ids: List[int] = []
+    polygon_ids: List[int] = []
+    previous_lat = previous_lng = 0
+    for point in points:
+        if (not isinstance(point, dict) or not ENCODABLE_KEYS.issuperset(point)
+                or not isinstance(point.get('lat'), (int, float)) or not isinstance(point.get('lng'), (int, float))):
+            raise ValueError(f"Path point can't be encoded: {point!r}")
+        lat = int(round(point['lat'] * MICRODEGREES))
+        lng = int(round(point['lng'] * MICRODEGREES))
+        coordinates.append(lat - previous_lat)
+        coordinates.append(lng - previous_lng)
+        previous_lat, previous_lng = lat, lng
+        types.append(code_of(point, 'type'))
+        modes.append(code_of(point, 'transportMode'))
+        node_ids.append(code_of(point, 'nodeId'))
+        polygon_ids.append(code_of(point, 'polygonId'))
+        if 'isIntermediatePoint' in point:
+            if not isinstance(point['isIntermediatePoint'], bool):
+                raise ValueError(f"Path point isIntermediatePoint is not a boolean: {point['isIntermediatePoint']!r}")
+            flags.append(2 if point['isIntermediatePoint'] else 1)
+        else:
+            flags.append(ABSENT)
+    if len(strings) > 0xFFFF - 2 or max(types, default=0) > 0xFF or max(modes, default=0) > 0xFF:
+        raise ValueError("Path has too many distinct strings to encode")
+    if any(not -0x80000000 <= delta <= 0x7FFFFFFF for delta in coordinates):
+        raise ValueError("Path coordinates are out of range")
+
+    if any('\0' in value for value in strings):
+        raise ValueError("Path strings can't contain NUL characters")
+    string_table = '\0'.join(strings).encode('utf-8')
+    parts = [struct.pack('<BII', FORMAT_VERSION, len(points), len(string_table)), string_table]
+    parts += [_to_bytes(array('i', coordinates)), bytes(types), bytes(modes),
+              _to_bytes(array('H', node_ids)), _to_bytes(array('H', polygon_ids)), bytes(flags)]
+    return COMPACT_PATH_PREFIX + base64.b64encode(zlib.compress(b''.join(parts))).decode('ascii')
+
+
+def _decode_arrays(value: str):
+    """(string table, coordinates, type, mode, nodeId, polygonId codes, flags) of a compact path."""
+    if not is_compact_path(value):
+        raise ValueError("Not a compact path")
+    try:
+        data = zlib.decompress(base64.b64decode(value[len(COMPACT_PATH_PREFIX):]))
+        version, count, table_length = struct.unpack_from('<BII', data, 0)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact path version {version}")
+        offset = struct.calcsize('<BII')
+        table: List[Any] = [None, None]  # ABSENT and NULL
+        if table_length:
+            table += data[offset:offset + table_length].decode('utf-8').split('\0')
+        offset += table_length
+
+        arrays = []
+        for typecode, size, n in (('i', 4, 2 * count), ('B', 1, count), ('B', 1, count), ('H', 2, count), ('H', 2, count), ('B', 1, count)):
+            arrays.append(_from_bytes(typecode, data[offset:offset + size * n]))
+            offset += size * n
+    except (zlib.error, struct.error, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f"Malformed compact path: {e}") from e
+    if len(arrays[-1]) != count or offset != len(data) or max(max(a, default=0) for a in arrays[1:5]) >= len(table):
+        raise ValueError("Malformed compact path: unexpected length or string index")
+    return (table, *arrays)
+
+
+def decode_path_columns(value: str) -> Dict[str, List[Any]]:
+    """
+    Compact path as columns, faster than decode_path() when only some fields are needed:
+    {'lat': [...], 'lng': [...], 'type': [...], 'transportMode': [...], 'nodeId': [...],
+    'polygonId': [...], 'isIntermediatePoint': [...]}, with None where a point has no value.
+    Raises ValueError if it is malformed.
+    """
+    table, coordinates, types, modes, node_ids, polygon_ids, flags = _decode_arrays(value)
+    return {
+        'lat': [lat / MICRODEGREES for lat in accumulate(coordinates[0::2])],
+        'lng': [lng / MICRODEGREES for lng in accumulate(coordinates[1::2])],
+        'type': [table[code] for code in types],
+        'transportMode': [table[code] for code in modes],
+        'nodeId': [table[code] for code in node_ids],
+        'polygonId': [table[code] for code in polygon_ids],
+        'isIntermediatePoint': [None if flag == ABSENT else flag == 2 for flag in flags],
+    }
+
+
+def decode_path(value: str) -> List[Dict[str, Any]]:
+    """JSON form (list of point dicts) of a compact path. Raises ValueError if it is malformed."""
+    table, coordinates, types, modes, node_ids, polygon_ids, flags = _decode_arrays(value)
+    lats = accumulate(coordinates[0::2])
+    lngs = accumulate(coordinates[1::2])
+    points = []
+    for lat, lng, type_code, mode_code, node_code, polygon_code, flag in zip(lats, lngs, types, modes, node_ids, polygon_ids, flags):
+        point: Dict[str, Any] = {'lat': lat / MICRODEGREES, 'lng': lng / MICRODEGREES}
+        if type_code:
+            point['type'] = table[type_code]
+        if mode_code:
+            point['transportMode'] = table[mode_code]
+        if node_code:
+            point['nodeId'] = table[node_code]
+        if polygon_code:
+            point['polygonId'] = table[polygon_code]
+        if flag:
+            point['isIntermediatePoint'] = flag == 2
+        points.append(point)
+    return points
+
+
+def load_path(value: Any) -> List[Dict[str, Any]]:
+    """
+    Points of a Path field in either form (JSON string, compact string or an already parsed list).
+    Empty for None/''. Raises ValueError (json.JSONDecodeError for bad JSON) if it can't be read.
+    """
+    if not value:
+        return []
+    if isinstance(value, list):
+        return value
+    if is_compact_path(value):
+        return decode_path(value)
+    points = json.loads(value)
+    return points if isinstance(points, list) else []
+
+
+def load_path_columns(value: Any) -> Dict[str, List[Any]]:
+    """Like load_path() but as decode_path_columns() columns; JSON paths are transposed after parsing."""
+    if is_compact_path(value):
+        return decode_path_columns(value)
+    points = [point for point in load_path(value) if isinstance(point, dict)]
+    return {key: [point.get(key) for point in points] for key in POINT_KEYS}
+
+
+def dump_path(points: Optional[List[Dict[str, Any]]], encoding: Optional[str] = None) -> str:
+    """Path field value for a list of points, in the PATH_ENCODING form (JSON if it can't be encoded compactly)."""
+    points = points or []
+    if (encoding or PATH_ENCODING) == 'compact' and points:
+        try:
+            return encode_path(points)
+        except ValueError:
+            pass
+    return json.dumps(points)
@@ -0,0 +1,142 @@
+"""
+Positions of citizens along their activity paths.
+
+updatecitizenpositions used to recompute every segment length of a path on each call and
+scan the segments linearly for the current progress. A PathTrack holds the cumulative
+distances of a path, computed once; the position at a given progress (0.0 to 1.0 of the
+path length) is found by binary search and interpolated linearly between the two points
+of that segment.
+
+Tracks are cached by ActivityId (PATH_TRACK_CACHE_SIZE entries, LRU) so a script running
+every minute only measures each path once per activity:
+
+    track = get_path_track(activity_id, activity['fields']['Path'])
+    track.position_at(0.4)                   # {'lat': ..., 'lng': ...}
+    positions_at([track1, track2], [0.1, 0.7])   # batch, vectorized with NumPy when installed
+"""
+
+import os
+import bisect
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional: positions_at() falls back to one binary search per track
+    np = None
+
+from backend.engine.utils.geo import haversine_meters
+from backend.engine.utils.path_codec import load_path_columns
+
+PATH_TRACK_CACHE_SIZE = int(os.getenv("PATH_TRACK_CACHE_SIZE", "10000"))
+
+
+class PathTrack:
+    """A path's points with the cumulative distance in meters at each point."""
+
+    __slots__ = ('lats', 'lngs', 'cumulative', 'total')
+
+    def __init__(self, lats: List[float], lngs: List[float]):
+        self.lats = [float(lat) for lat in lats]
+        self.lngs = [float(lng) for lng in lngs]
+        cumulative = [0.0]
+        for i in range(1, len(self.lats)):
+            cumulative.append(cumulative[-1] + haversine_meters(self.lats[i - 1], self.lngs[i - 1], self.lats[i], self.lngs[i]))
+        self.cumulative = cumulative
+        self.total = cumulative[-1]
+
+    @classmethod
+    def from_points(cls, points: List[Dict[str, Any]]) -> 'PathTrack':
+        return cls([p['lat'] for p in points], [p['lng'] for p in points])
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def segment_at(self, distance: float) -> int:
+        """Index of the first segment whose end is at or past `distance`."""
+        return min(max(bisect.bisect_left(self.cumulative, distance) - 1, 0), len(self.lats) - 2)
+
+    def position_at(self, progress: float) -> Dict[str, float]:
+        if len(self.lats) < 2 or self.total <= 0:
+            return {'lat': self.lats[0], 'lng': self.lngs[0]}
+        target = min(1.0, max(0.0, progress)) * self.total
+        i = self.segment_at(target)
+        length = self.cumulative[i + 1] - self.cumulative[i]
+        fraction = (target - self.cumulative[i]) / length if length > 0 else 0.0
+        return {
+            'lat': self.lats[i] + (self.lats[i + 1] - self.lats[i]) * fraction,
+            'lng': self.lngs[i] + (self.lngs[i + 1] - self.lngs[i]) * fraction,
+        }
+
+
+def parse_path_coordinates(path: Any) -> Tuple[List[float], List[float]]:
+    """Latitudes and longitudes of the points of a Path field (JSON or compact string, or a list) that have both."""
+    columns = load_path_columns(path)
+    pairs = [(lat, lng) for lat, lng in zip(columns['lat'], columns['lng']) if lat is not None and lng is not None]
+    return [lat for lat, _ in pairs], [lng for _, lng in pairs]
+
+
+# ActivityId -> (Path field value, track); the Path value detects paths rewritten for the same activity
+_tracks: 'OrderedDict[str, Tuple[Any, PathTrack]]' = OrderedDict()
+_tracks_lock = threading.Lock()
+
+
+def get_path_track(activity_id: str, path: Any) -> Optional[PathTrack]:
+    """Cached track of an activity's path; None when it has fewer than two valid points."""
+    with _tracks_lock:
+        cached = _tracks.get(activity_id)
+        if cached is not None and cached[0] == path:
+            _tracks.move_to_end(activity_id)
+            return cached[1]
+    lats, lngs = parse_path_coordinates(path)
+    if len(lats) < 2:
+        return None
+    track = PathTrack(lats, lngs)
+    with _tracks_lock:
+        _tracks[activity_id] = (path, track)
+        _tracks.move_to_end(activity_id)
+        while len(_tracks) > PATH_TRACK_CACHE_SIZE:
+            _tracks.popitem(last=False)
+    return track
+
+
+def forget_path_tracks(active_activity_ids: Optional[set] = None):
+    """Drops cached tracks of activities that are no longer active (all of them when None)."""
+    with _tracks_lock:
+        if active_activity_ids is None:
+            _tracks.clear()
+            return
+        for activity_id in [a for a in _tracks if a not in active_activity_ids]:
+            del _tracks[activity_id]
+
+
+def positions_at(tracks: List[PathTrack], progresses: List[float]) -> List[Dict[str, float]]:
+    """
+    Position on each track at the matching progress. With NumPy, all tracks are searched at once:
+    the normalized cumulative distances of track k are offset by 2k, so one searchsorted over
+    the concatenation finds every segment.
+    """
+    if np is None or not tracks:
+        return [track.position_at(progress) for track, progress in zip(tracks, progresses)]
+
+    lats = np.concatenate([np.asarray(track.lats) for track in tracks])
+    lngs = np.concatenate([np.asarray(track.lngs) for track in tracks])
+    sizes = np.array([len(track) for track in tracks])
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    totals = np.array([track.total for track in tracks])
+    safe_totals = np.where(totals > 0, totals, 1.0)
+    keys = np.concatenate([np.asarray(track.cumulative) / safe_totals[k] + 2.0 * k for k, track in enumerate(tracks)])
+
+    progress = np.clip(np.asarray(progresses, dtype=np.float64), 0.0, 1.0)
+    progress = np.where(totals > 0, progress, 0.0)
+    queries = progress + 2.0 * np.arange(len(tracks))
+    segment = np.searchsorted(keys, queries, side='left') - 1
+    segment = np.clip(segment, starts, starts + sizes - 2)
+
+    key_from, key_to = keys[segment], keys[segment + 1]
+    span = key_to - key_from
+    fraction = np.where(span > 0, (queries - key_from) / np.where(span > 0, span, 1.0), 0.0)
+    out_lats = lats[segment] + (lats[segment + 1] - lats[segment]) * fraction
+    out_lngs = lngs[segment] + (lngs[segment + 1] - lngs[segment]) * fraction
+    return [{'lat': lat, 'lng': lng} for lat, lng in zip(out_lats.tolist(), out_lngs.tolist())]
@@ -0,0 +1,760 @@
+"""
+In-process pathfinding for La Serenissima.
+
+The engine used to POST every path request to the Next.js transport API (/api/transport),
+which paid a network hop and a server-side graph search per activity. This module loads the
+static navigation data once per process and answers the same questions locally:
+
+- data/polygons/*.json: land polygons (point-in-polygon) and centroids,
+- data/navigation-graph.json: bridges between polygons (source/target points and length),
+- data/watergraph.json: the canal network used by gondolas.
+
+Docks are the constructed public_dock buildings, read from the active WorldSnapshot or the
+BUILDINGS table (refreshed every PUBLIC_DOCKS_TTL_SECONDS), as the transport API's 'real' mode
+only uses docks that were built. The combined graph has walking edges between the bridge ends,
+docks and centroid of each polygon, walking edges across bridges, gondola edges along the water
+graph and gondola edges between each dock and its nearest water points. `find_path()` runs A* on travel time, with a
+haversine heuristic at gondola speed, and returns the transport API response shape:
+{success, path, timing: {startDate, endDate, durationSeconds, distanceMeters}, journey, transporter}.
+
+Batch queries expand the graph once instead of once per pair: `find_paths_from(start, ends)` and
+`find_paths_to(starts, end)` return one path per target, `find_travel_cost_matrix(starts, ends)`
+returns travel times and distances for every pair (POST /api/paths/batch exposes them over HTTP).
+
+Dock points of a path have type 'dock' and the dock's BuildingId as nodeId, and the transporter
+is the RunBy of the first dock on the path that has one, as in the API.
+
+The transport API stays the default; set PATHFINDING_BACKEND=native to answer path requests
+in-process.
+"""
+
+import os
+import json
+import glob
+import heapq
+import hashlib
+import logging
+import threading
+import time
+import datetime
+import copy
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pytz
+
+from backend.engine.utils.activity_helpers import LogColors, _get_building_position_coords
+from backend.engine.utils.geo import haversine_meters
+from backend.engine.utils.world_snapshot import get_active_snapshot
+
+log = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+DATA_DIR = os.path.join(PROJECT_ROOT, 'data')
+NAVIGATION_GRAPH_FILE = 'navigation-graph.json'
+WATER_GRAPH_FILE = 'watergraph.json'
+POLYGONS_SUBDIR = 'polygons'
+
+PATHFINDING_BACKEND = os.getenv("PATHFINDING_BACKEND", "api").lower()
+PUBLIC_DOCKS_TTL_SECONDS = int(os.getenv("PUBLIC_DOCKS_TTL_SECONDS", "300"))
+
+# Same speeds as app/api/transport/route.ts
+WALKING_SPEED_MPS = 1.4
+GONDOLA_SPEED_MPS = WALKING_SPEED_MPS * 2
+
+DOCK_WATER_LINKS = 2         # water graph points each dock connects to
+OFF_LAND_WATER_LINKS = 3     # water graph points a start/end point on the water connects to
+
+# Edge: (neighbor node id, distance in meters, mode, intermediate points drawn along the edge)
+Edge = Tuple[str, float, str, Tuple[Dict[str, float], ...]]
+
+
+def is_native_pathfinding_enabled() -> bool:
+    return PATHFINDING_BACKEND == 'native'
+
+
+def _edge_seconds(distance: float, mode: str) -> float:
+    return distance / (GONDOLA_SPEED_MPS if mode == 'gondola' else WALKING_SPEED_MPS)
+
+
+def _point_key(prefix: str, point: Dict[str, float]) -> str:
+    return f"{prefix}_{float(point['lat']):.6f}_{float(point['lng']):.6f}"
+
+
+def _point_in_ring(lat: float, lng: float, ring: List[Tuple[float, float]]) -> bool:
+    """Ray casting, same test as TransportService.isPointInPolygon."""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        lat_i, lng_i = ring[i]
+        lat_j, lng_j = ring[j]
+        if (lng_i > lng) != (lng_j > lng) and lat < (lat_j - lat_i) * (lng - lng_i) / (lng_j - lng_i) + lat_i:
+            inside = not inside
+        j = i
+    return inside
+
+
+class LandPolygon:
+    def __init__(self, polygon_id: str, ring: List[Tuple[float, float]], centroid: Optional[Dict[str, float]]):
+        self.id = polygon_id
+        self.ring = ring
+        self.centroid = centroid
+        if ring:
+            lats = [p[0] for p in ring]
+            lngs = [p[1] for p in ring]
+            self.bbox = (min(lats), min(lngs), max(lats), max(lngs))
+        else:
+            self.bbox = None
+        self.portals: List[str] = []  # node ids reachable on foot inside this polygon
+
+    def contains(self, lat: float, lng: float) -> bool:
+        if not self.bbox:
+            return False
+        min_lat, min_lng, max_lat, max_lng = self.bbox
+        if lat < min_lat or lat > max_lat or lng < min_lng or lng > max_lng:
+            return False
+        return _point_in_ring(lat, lng, self.ring)
+
+
+class NavigationNetwork:
+    """Combined walking/gondola graph built from the static data files."""
+
+    def __init__(self):
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.adjacency: Dict[str, List[Edge]] = {}
+        self.polygons: Dict[str, LandPolygon] = {}
+        self.water_node_ids: List[str] = []
+        self.dock_node_ids: List[str] = []
+        self.version = ''
+
+    # --- Construction ---
+
+    def _add_node(self, node_id: str, point: Dict[str, float], node_type: str, polygon_id: Optional[str] = None, **extra):
+        if node_id not in self.nodes:
+            self.nodes[node_id] = {'lat': float(point['lat']), 'lng': float(point['lng']), 'type': node_type, 'polygonId': polygon_id, **extra}
+            self.adjacency[node_id] = []
+        return node_id
+
+    def _add_edge(self, a: str, b: str, distance: float, mode: str, intermediate: Iterable[Dict[str, float]] = (), both_ways: bool = True):
+        if a == b:
+            return
+        intermediate = tuple(intermediate)
+        if not any(edge[0] == b and edge[2] == mode for edge in self.adjacency[a]):
+            self.adjacency[a].append((b, distance, mode, intermediate))
+        if both_ways and not any(edge[0] == a and edge[2] == mode for edge in self.adjacency[b]):
+            self.adjacency[b].append((a, distance, mode, tuple(reversed(intermediate))))
+
+    def _distance(self, a: str, b: str) -> float:
+        node_a, node_b = self.nodes[a], self.nodes[b]
+        return haversine_meters(node_a['lat'], node_a['lng'], node_b['lat'], node_b['lng'])
+
+    @classmethod
+    def load(cls, data_dir: str = DATA_DIR) -> 'NavigationNetwork':
+        network = cls()
+        # Content hash of the data files: identifies the graph that derived data was computed on
+        version_hash = hashlib.sha256()
+
+        def read_json(path: str) -> Any:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            version_hash.update(os.path.basename(path).encode('utf-8'))
+            version_hash.update(raw)
+            return json.loads(raw)
+
+        polygons_dir = os.path.join(data_dir, POLYGONS_SUBDIR)
+        for path in sorted(glob.glob(os.path.join(polygons_dir, '*.json'))):
+            try:
+                polygon_data = read_json(path)
+            except (OSError, ValueError) as e:
+                log.warning(f"{LogColors.WARNING}Skipping unreadable polygon file {path}: {e}{LogColors.ENDC}")
+                continue
+            # Some polygon files have no 'id' field; the file name is the polygon id
+            network._load_polygon(polygon_data, os.path.splitext(os.path.basename(path))[0])
+
+        navigation_graph_path = os.path.join(data_dir, NAVIGATION_GRAPH_FILE)
+        if os.path.exists(navigation_graph_path):
+            network._load_bridges(read_json(navigation_graph_path).get('enhanced', {}))
+
+        water_graph_path = os.path.join(data_dir, WATER_GRAPH_FILE)
+        if os.path.exists(water_graph_path):
+            network._load_water_graph(read_json(water_graph_path).get('waterPoints', []))
+
+        network._link_polygon_portals()
+        network.version = version_hash.hexdigest()[:16]
+        log.info(f"{LogColors.OKBLUE}Navigation network loaded: {len(network.polygons)} polygons, {len(network.nodes)} nodes, "
+                 f"{sum(len(edges) for edges in network.adjacency.values())} edges.{LogColors.ENDC}")
+        return network
+
+    def _load_polygon(self, polygon_data: Dict, default_id: str):
+        polygon_id = polygon_data.get('id') or default_id
+        ring = [(float(p['lat']), float(p['lng'])) for p in polygon_data.get('coordinates') or [] if 'lat' in p and 'lng' in p]
+        centroid = polygon_data.get('centroid') or polygon_data.get('center')
+        polygon = self.polygons[polygon_id] = LandPolygon(polygon_id, ring, centroid)
+        if centroid:
+            polygon.portals.append(self._add_node(f"center_{polygon_id}", centroid, 'center', polygon_id))
+
+    def _load_bridges(self, enhanced_graph: Dict[str, Dict]):
+        for source_polygon_id, polygon_entry in enhanced_graph.items():
+            source_polygon = self.polygons.get(source_polygon_id)
+            if source_polygon is None:
+                # Polygon file missing: fall back to the centroid recorded in the navigation graph
+                source_polygon = self.polygons[source_polygon_id] = LandPolygon(source_polygon_id, [], polygon_entry.get('centroid'))
+                if polygon_entry.get('centroid'):
+                    source_polygon.portals.append(self._add_node(f"center_{source_polygon_id}", polygon_entry['centroid'], 'center', source_polygon_id))
+            for connection in polygon_entry.get('connections') or []:
+                source_point, target_point = connection.get('sourcePoint'), connection.get('targetPoint')
+                target_polygon_id = connection.get('targetId')
+                if not source_point or not target_point or not target_polygon_id:
+                    continue
+                source_node = self._add_node(_point_key('bridge', source_point), source_point, 'bridge', source_polygon_id)
+                target_node = self._add_node(_point_key('bridge', target_point), target_point, 'bridge', target_polygon_id)
+                if source_node not in source_polygon.portals:
+                    source_polygon.portals.append(source_node)
+                target_polygon = self.polygons.setdefault(target_polygon_id, LandPolygon(target_polygon_id, [], None))
+                if target_node not in target_polygon.portals:
+                    target_polygon.portals.append(target_node)
+                distance = connection.get('distance') or self._distance(source_node, target_node)
+                self._add_edge(source_node, target_node, float(distance), 'walking')
+
+    def _load_water_graph(self, water_points: List[Dict]):
+        for water_point in water_points:
+            if water_point.get('id') and water_point.get('position'):
+                self._add_node(water_point['id'], water_point['position'], 'water')
+                self.water_node_ids.append(water_point['id'])
+        for water_point in water_points:
+            source_id = water_point.get('id')
+            if source_id not in self.nodes:
+                continue
+            for connection in water_point.get('connections') or []:
+                target_id = connection.get('targetId')
+                if target_id not in self.nodes:
+                    continue
+                distance = connection.get('distance') or self._distance(source_id, target_id)
+                self._add_edge(source_id, target_id, float(distance), 'gondola', connection.get('intermediatePoints') or ())
+
+    def _nearest(self, lat: float, lng: float, node_ids: Iterable[str], k: int) -> List[Tuple[float, str]]:
+        distances = [
+            (haversine_meters(lat, lng, self.nodes[node_id]['lat'], self.nodes[node_id]['lng']), node_id)
+            for node_id in node_ids
+        ]
+        return heapq.nsmallest(k, distances)
+
+    def _link_polygon_portals(self):
+        for polygon in self.polygons.values():
+            portals = polygon.portals
+            for i, a in enumerate(portals):
+                for b in portals[i + 1:]:
+                    self._add_edge(a, b, self._distance(a, b), 'walking')
+
+    def _dock_polygon(self, position: Dict[str, float], land_id: Optional[str]) -> Optional[LandPolygon]:
+        """Polygon a dock is reached from on foot: its LandId, the polygon containing it, else the one with the nearest centroid."""
+        polygon = self.polygons.get(land_id) if land_id else None
+        polygon = polygon or self.polygon_containing(position['lat'], position['lng'])
+        if polygon is None:
+            centers = [node_id for node_id, node in self.nodes.items() if node['type'] == 'center']
+            nearest = self._nearest(position['lat'], position['lng'], centers, 1)
+            polygon = self.polygons.get(self.nodes[nearest[0][1]]['polygonId']) if nearest else None
+        return polygon
+
+    def with_docks(self, docks: List[Dict[str, Any]]) -> 'NavigationNetwork':
+        """
+        Copy of this network with the given docks ({'id', 'lat', 'lng', 'landId', 'runBy'}) linked
+        to their polygon on foot and to the nearest water points by gondola. The static network is
+        left untouched, so routes already running on it are not affected.
+        """
+        network = NavigationNetwork()
+        network.nodes = dict(self.nodes)
+        network.adjacency = {node_id: list(edges) for node_id, edges in self.adjacency.items()}
+        network.polygons = {}
+        for polygon_id, polygon in self.polygons.items():
+            polygon = network.polygons[polygon_id] = copy.copy(polygon)
+            polygon.portals = list(polygon.portals)
+        network.water_node_ids = self.water_node_ids
+        dock_hash = hashlib.sha256()
+        for dock in sorted(docks, key=lambda d: d['id']):
+            polygon = network._dock_polygon(dock, dock.get('landId'))
+            dock_id = network._add_node(dock['id'], dock, 'dock', polygon.id if polygon else None, runBy=dock.get('runBy'))
+            network.dock_node_ids.append(dock_id)
+            dock_hash.update(f"{dock_id}:{dock['lat']:.6f}:{dock['lng']:.6f};".encode('utf-8'))
+            if polygon is not None:
+                for portal_id in polygon.portals:
+                    network._add_edge(dock_id, portal_id, network._distance(dock_id, portal_id), 'walking')
+                polygon.portals.append(dock_id)
+            for distance, water_id in network._nearest(dock['lat'], dock['lng'], network.water_node_ids, DOCK_WATER_LINKS):
+                network._add_edge(dock_id, water_id, distance, 'gondola')
+        # Derived data (the travel matrix) depends on where the docks are, not on who runs them
+        network.version = f"{self.version}-{dock_hash.hexdigest()[:8]}"
+        return network
+
+    def dock_operator(self, dock_ids: List[str]) -> Optional[str]:
+        """RunBy of the first of these docks that is run by someone, like fetchTransporterDetails in the API."""
+        for dock_id in dock_ids:
+            node = self.nodes.get(dock_id)
+            if node is not None and node.get('runBy'):
+                return node['runBy']
+        return None
+
+    # --- Queries ---
+
+    def polygon_containing(self, lat: float, lng: float) -> Optional[LandPolygon]:
+        for polygon in self.polygons.values():
+            if polygon.contains(lat, lng):
+                return polygon
+        return None
+
+    def _endpoint_links(self, point: Dict[str, float], polygon: Optional[LandPolygon]) -> List[Tuple[str, float, str]]:
+        """(node id, distance, mode) edges connecting a free point to the graph."""
+        lat, lng = float(point['lat']), float(point['lng'])
+        if polygon is not None and polygon.portals:
+            return [
+                (node_id, haversine_meters(lat, lng, self.nodes[node_id]['lat'], self.nodes[node_id]['lng']), 'walking')
+                for node_id in polygon.portals
+            ]
+        # On the water (or on land without any mapped access): board at the nearest water points
+        return [(node_id, distance, 'gondola') for distance, node_id in self._nearest(lat, lng, self.water_node_ids, OFF_LAND_WATER_LINKS)]
+
+    def find_route(self, start: Dict[str, float], end: Dict[str, float]) -> Optional[Dict[str, Any]]:
+        """
+        A* on travel time from `start` to `end` ({lat, lng}).
+        Returns {'points', 'distance', 'duration', 'walkingDistance', 'waterDistance'} or None.
+        """
+        start_lat, start_lng = float(start['lat']), float(start['lng'])
+        end_lat, end_lng = float(end['lat']), float(end['lng'])
+        start_polygon = self.polygon_containing(start_lat, start_lng)
+        end_polygon = self.polygon_containing(end_lat, end_lng)
+
+        START, GOAL = '__start__', '__goal__'
+        start_links = self._endpoint_links(start, start_polygon)
+        goal_links: Dict[str, Tuple[float, str]] = {node_id: (distance, mode) for node_id, distance, mode in self._endpoint_links(end, end_polygon)}
+        if start_polygon is not None and end_polygon is not None and start_polygon.id == end_polygon.id:
+            start_links.append((GOAL, haversine_meters(start_lat, start_lng, end_lat, end_lng), 'walking'))
+
+        def heuristic(node_id: str) -> float:
+            node = self.nodes[node_id]
+            return haversine_meters(node['lat'], node['lng'], end_lat, end_lng) / GONDOLA_SPEED_MPS
+
+        best_cost: Dict[str, float] = {START: 0.0}
+        came_from: Dict[str, Tuple[str, float, str, Tuple]] = {}
+        open_heap: List[Tuple[float, int, str]] = []
+        counter = 0
+        for node_id, distance, mode in start_links:
+            cost = _edge_seconds(distance, mode)
+            if cost < best_cost.get(node_id, float('inf')):
+                best_cost[node_id] = cost
+                came_from[node_id] = (START, distance, mode, ())
+                counter += 1
+                heapq.heappush(open_heap, (cost + (0.0 if node_id == GOAL else heuristic(node_id)), counter, node_id))
+
+        closed = set()
+        while open_heap:
+            _, _, node_id = heapq.heappop(open_heap)
+            if node_id == GOAL:
+                break
+            if node_id in closed:
+                continue
+            closed.add(node_id)
+            cost_here = best_cost[node_id]
+            neighbors: List[Edge] = list(self.adjacency[node_id])
+            if node_id in goal_links:
+                distance, mode = goal_links[node_id]
+                neighbors.append((GOAL, distance, mode, ()))
+            for neighbor_id, distance, mode, intermediate in neighbors:
+                new_cost = cost_here + _edge_seconds(distance, mode)
+                if new_cost < best_cost.get(neighbor_id, float('inf')):
+                    best_cost[neighbor_id] = new_cost
+                    came_from[neighbor_id] = (node_id, distance, mode, intermediate)
+                    counter += 1
+                    estimate = new_cost + (0.0 if neighbor_id == GOAL else heuristic(neighbor_id))
+                    heapq.heappush(open_heap, (estimate, counter, neighbor_id))
+        else:
+            return None
+        if GOAL not in came_from:
+            return None
+
+        # Walk back from the goal: list of (node id, edge used to reach it)
+        steps: List[Tuple[str, Tuple[str, float, str, Tuple]]] = []
+        node_id = GOAL
+        while node_id != START:
+            edge = came_from[node_id]
+            steps.append((node_id, edge))
+            node_id = edge[0]
+        steps.reverse()
+        return self._assemble_route(steps, start_lat, start_lng, start_polygon, end_lat, end_lng, end_polygon)
+
+    def _assemble_route(self, steps: List[Tuple[str, Tuple[str, float, str, Tuple]]], start_lat: float, start_lng: float,
+                        start_polygon: Optional[LandPolygon], end_lat: float, end_lng: float,
+                        end_polygon: Optional[LandPolygon]) -> Dict[str, Any]:
+        """Route dict from the (node id, edge used to reach it) steps; the last node id is the goal."""
+        start_point = {'lat': start_lat, 'lng': start_lng, 'nodeId': None, 'type': 'start',
+                       'polygonId': start_polygon.id if start_polygon else None}
+        points: List[Dict[str, Any]] = [start_point]
+        walking_distance = water_distance = 0.0
+        last_index = len(steps) - 1
+        for index, (node_id, (_, distance, mode, intermediate)) in enumerate(steps):
+            # transportMode on a point is the mode of the segment leaving it (as in TransportService)
+            points[-1]['transportMode'] = mode
+            if mode == 'gondola':
+                water_distance += distance
+            else:
+                walking_distance += distance
+            for extra in intermediate:
+                points.append({'lat': float(extra['lat']), 'lng': float(extra['lng']), 'nodeId': None, 'type': 'water',
+                               'polygonId': None, 'transportMode': mode, 'isIntermediatePoint': True})
+            if index == last_index:
+                points.append({'lat': end_lat, 'lng': end_lng, 'nodeId': None, 'type': 'end',
+                               'polygonId': end_polygon.id if end_polygon else None, 'transportMode': 'walking'})
+            else:
+                node = self.nodes[node_id]
+                points.append({'lat': node['lat'], 'lng': node['lng'], 'nodeId': node_id, 'type': node['type'],
+                               'polygonId': node['polygonId'], 'transportMode': 'walking'})
+
+        return {
+            'points': points,
+            'distance': walking_distance + water_distance,
+            'walkingDistance': walking_distance,
+            'waterDistance': water_distance,
+            'duration': walking_distance / WALKING_SPEED_MPS + water_distance / GONDOLA_SPEED_MPS,
+        }
+
+    def routes_from(self, start: Dict[str, float], ends: List[Dict[str, float]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Fastest routes from `start` to each of `ends` with a single Dijkstra expansion (stopped once
+        every node linking to a target is settled). Same route dicts as find_route, None where unreachable.
+        """
+        start_lat, start_lng = float(start['lat']), float(start['lng'])
+        start_polygon = self.polygon_containing(start_lat, start_lng)
+        targets = []
+        for end in ends:
+            end_lat, end_lng = float(end['lat']), float(end['lng'])
+            end_polygon = self.polygon_containing(end_lat, end_lng)
+            targets.append((end_lat, end_lng, end_polygon, self._endpoint_links(end, end_polygon)))
+
+        START = '__start__'
+        pending = {node_id for target in targets for node_id, _, _ in target[3]}
+        settled: Dict[str, float] = {}
+        came_from: Dict[str, Tuple[str, float, str, Tuple]] = {}
+        heap: List[Tuple[float, int, str, Tuple[str, float, str, Tuple]]] = []
+        counter = 0
+        for node_id, distance, mode in self._endpoint_links(start, start_polygon):
+            counter += 1
+            heapq.heappush(heap, (_edge_seconds(distance, mode), counter, node_id, (START, distance, mode, ())))
+        while heap and pending:
+            cost_here, _, node_id, edge = heapq.heappop(heap)
+            if node_id in settled:
+                continue
+            settled[node_id] = cost_here
+            came_from[node_id] = edge
+            pending.discard(node_id)
+            for neighbor_id, distance, mode, intermediate in self.adjacency[node_id]:
+                if neighbor_id not in settled:
+                    counter += 1
+                    heapq.heappush(heap, (cost_here + _edge_seconds(distance, mode), counter, neighbor_id,
+                                          (node_id, distance, mode, intermediate)))
+
+        routes: List[Optional[Dict[str, Any]]] = []
+        for end_lat, end_lng, end_polygon, links in targets:
+            best_cost, best_last = float('inf'), None
+            if start_polygon is not None and end_polygon is not None and start_polygon.id == end_polygon.id:
+                distance = haversine_meters(start_lat, start_lng, end_lat, end_lng)
+                best_cost, best_last = distance / WALKING_SPEED_MPS, (START, distance, 'walking', ())
+            for node_id, distance, mode in links:
+                if node_id in settled and settled[node_id] + _edge_seconds(distance, mode) < best_cost:
+                    best_cost, best_last = settled[node_id] + _edge_seconds(distance, mode), (node_id, distance, mode, ())
+            if best_last is None:
+                routes.append(None)
+                continue
+            steps: List[Tuple[str, Tuple[str, float, str, Tuple]]] = [(None, best_last)]
+            node_id = best_last[0]
+            while node_id != START:
+                edge = came_from[node_id]
+                steps.append((node_id, edge))
+                node_id = edge[0]
+            steps.reverse()
+            routes.append(self._assemble_route(steps, start_lat, start_lng, start_polygon, end_lat, end_lng, end_polygon))
+        return routes
+
+    def travel_costs(self, starts: List[Dict[str, float]], ends: List[Dict[str, float]]) -> List[List[Optional[Tuple[float, float]]]]:
+        """
+        (seconds, meters) from each start to each end, None where unreachable: one Dijkstra per point
+        on the smaller side (the graph is undirected, so either side can be the source).
+        """
+        if not starts or not ends:
+            return [[None] * len(ends) for _ in starts]
+        transpose = len(ends) < len(starts)
+        sources, sinks = (ends, starts) if transpose else (starts, ends)
+        attached_sinks = [self.attach(point) for point in sinks]
+        rows = []
+        for point in sources:
+            origin = self.attach(point)
+            node_costs = self.costs_from(origin)
+            rows.append([self.cost_to(origin, node_costs, sink) for sink in attached_sinks])
+        return [list(column) for column in zip(*rows)] if transpose else rows
+
+    # --- One-to-many travel costs ---
+
+    def attach(self, point: Dict[str, float]) -> Tuple[float, float, Optional[str], List[Tuple[str, float, str]]]:
+        """(lat, lng, polygon id, links to the graph) for a free point; reusable across cost queries."""
+        lat, lng = float(point['lat']), float(point['lng'])
+        polygon = self.polygon_containing(lat, lng)
+        return lat, lng, polygon.id if polygon else None, self._endpoint_links(point, polygon)
+
+    def costs_from(self, origin) -> Dict[str, Tuple[float, float]]:
+        """Dijkstra from an attached origin: node id -> (seconds, meters) along the fastest route."""
+        best: Dict[str, Tuple[float, float]] = {}
+        heap: List[Tuple[float, float, str]] = []
+        for node_id, distance, mode in origin[3]:
+            heapq.heappush(heap, (_edge_seconds(distance, mode), distance, node_id))
+        while heap:
+            seconds, meters, node_id = heapq.heappop(heap)
+            if node_id in best:
+                continue
+            best[node_id] = (seconds, meters)
+            for neighbor_id, distance, mode, _ in self.adjacency[node_id]:
+                if neighbor_id not in best:
+                    heapq.heappush(heap, (seconds + _edge_seconds(distance, mode), meters + distance, neighbor_id))
+        return best
+
+    def cost_to(self, origin, node_costs: Dict[str, Tuple[float, float]], target) -> Optional[Tuple[float, float]]:
+        """(seconds, meters) from `origin` to an attached target, given costs_from(origin); None if unreachable."""
+        best: Optional[Tuple[float, float]] = None
+        if origin[2] is not None and origin[2] == target[2]:
+            distance = haversine_meters(origin[0], origin[1], target[0], target[1])
+            best = (distance / WALKING_SPEED_MPS, distance)
+        for node_id, distance, mode in target[3]:
+            reached = node_costs.get(node_id)
+            if reached is None:
+                continue
+            candidate = (reached[0] + _edge_seconds(distance, mode), reached[1] + distance)
+            if best is None or candidate[0] < best[0]:
+                best = candidate
+        return best
+
+
+_network: Optional[NavigationNetwork] = None
+_network_lock = threading.Lock()
+# (dock key, network with those docks) and (loaded_at, docks) of the last BUILDINGS fetch
+_docked_network: Optional[Tuple[Tuple, NavigationNetwork]] = None
+_public_docks: Optional[Tuple[float, List[Dict[str, Any]]]] = None
+_buildings_table: Optional[Any] = None
+
+
+def _static_network() -> Optional[NavigationNetwork]:
+    """The process-wide network without docks, loaded on first use. None if the data files are missing."""
+    global _network
+    if _network is None:
+        with _network_lock:
+            if _network is None:
+                try:
+                    network = NavigationNetwork.load()
+                except (OSError, ValueError) as e:
+                    log.error(f"{LogColors.FAIL}Could not load navigation data from {DATA_DIR}: {e}{LogColors.ENDC}")
+                    return None
+                if not network.nodes:
+                    log.error(f"{LogColors.FAIL}No navigation data found in {DATA_DIR}.{LogColors.ENDC}")
+                    return None
+                _network = network
+    return _network
+
+
+def _default_buildings_table() -> Optional[Any]:
+    """BUILDINGS table from the environment, for callers that don't pass their tables."""
+    global _buildings_table
+    if _buildings_table is None:
+        from backend.engine.utils.sqlite_storage import is_local_storage_enabled, initialize_local_tables
+        if is_local_storage_enabled():
+            _buildings_table = initialize_local_tables({'buildings': 'BUILDINGS'})['buildings']
+        else:
+            api_key, base_id = os.getenv('AIRTABLE_API_KEY', '').strip(), os.getenv('AIRTABLE_BASE_ID', '').strip()
+            if not api_key or not base_id:
+                return None
+            from pyairtable import Api
+            _buildings_table = Api(api_key).table(base_id, 'BUILDINGS')
+    return _buildings_table
+
+
+def _dock_entry(record: Dict) -> Optional[Dict[str, Any]]:
+    fields = record['fields']
+    position = _get_building_position_coords(record)
+    if not fields.get('BuildingId') or not position or not fields.get('IsConstructed'):
+        return None
+    return {'id': fields['BuildingId'], 'lat': float(position['lat']), 'lng': float(position['lng']),
+            'landId': fields.get('LandId'), 'runBy': fields.get('RunBy')}
+
+
+def get_public_docks(tables: Optional[Dict[str, Any]] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Constructed public docks ({'id', 'lat', 'lng', 'landId', 'runBy'}) from the active snapshot,
+    else from tables['buildings'] (or the BUILDINGS table of the environment), cached for
+    PUBLIC_DOCKS_TTL_SECONDS. None if they can't be read.
+    """
+    global _public_docks
+    snapshot = get_active_snapshot()
+    if snapshot is not None and snapshot.has_table('buildings'):
+        return [dock for dock in map(_dock_entry, snapshot.get_buildings_of_type('public_dock')) if dock]
+
+    cached = _public_docks
+    if cached is not None and time.time() - cached[0] < PUBLIC_DOCKS_TTL_SECONDS:
+        return cached[1]
+    buildings_table = tables['buildings'] if tables and 'buildings' in tables else _default_buildings_table()
+    if buildings_table is None:
+        log.warning(f"{LogColors.WARNING}No BUILDINGS table available to read the public docks.{LogColors.ENDC}")
+        return cached[1] if cached else None
+    try:
+        records = buildings_table.all(formula="AND({Type}='public_dock', {IsConstructed}=TRUE())",
+                                      fields=['BuildingId', 'Position', 'Point', 'LandId', 'RunBy', 'IsConstructed'])
+    except Exception as e:
+        log.error(f"{LogColors.FAIL}Could not read the public docks: {e}{LogColors.ENDC}")
+        return cached[1] if cached else None
+    docks = [dock for dock in map(_dock_entry, records) if dock]
+    _public_docks = (time.time(), docks)
+    return docks
+
+
+def get_navigation_network(tables: Optional[Dict[str, Any]] = None) -> Optional[NavigationNetwork]:
+    """
+    The process-wide network with the current public docks (see get_public_docks). None if the
+    data files are missing.
+    """
+    global _docked_network
+    network = _static_network()
+    if network is None:
+        return None
+    docks = get_public_docks(tables)
+    if docks is None:
+        docks = []
+    dock_key = tuple(sorted((d['id'], d['lat'], d['lng'], d['landId'], d['runBy']) for d in docks))
+    cached = _docked_network
+    if cached is not None and cached[0] == dock_key:
+        return cached[1]
+    with _network_lock:
+        if _docked_network is None or _docked_network[0] != dock_key:
+            _docked_network = (dock_key, network.with_docks(docks))
+            log.info(f"{LogColors.OKBLUE}Navigation network linked to {len(docks)} public docks.{LogColors.ENDC}")
+        return _docked_network[1]
+
+
+def extract_journey(path: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Same as extractJourneyFromPath in app/api/transport/route.ts."""
+    journey = []
+    current_land_id = None
+    for point in path:
+        if point.get('isIntermediatePoint'):
+            continue
+        if point.get('polygonId') and point['polygonId'] != current_land_id:
+            current_land_id = point['polygonId']
+            journey.append({'type': 'land', 'id': point['polygonId'], 'position': {'lat': point['lat'], 'lng': point['lng']}})
+        if point.get('type') == 'bridge' and point.get('nodeId'):
+            journey.append({'type': 'bridge', 'id': point['nodeId'], 'position': {'lat': point['lat'], 'lng': point['lng']}})
+        if point.get('type') == 'dock' and point.get('nodeId'):
+            journey.append({'type': 'dock', 'id': point['nodeId'], 'position': {'lat': point['lat'], 'lng': point['lng']},
+                            'transportMode': point.get('transportMode') or 'gondola'})
+    return journey
+
+
+def find_path(
+    start: Dict[str, float],
+    end: Dict[str, float],
+    start_date: Optional[datetime.datetime] = None,
+    transporter_lookup: Optional[Callable[[List[str]], Optional[str]]] = None,
+    tables: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Path between two {lat, lng} points in the transport API response shape, or None when the
+    network is unavailable or no route exists (callers then fall back to the API).
+    """
+    network = get_navigation_network(tables)
+    if network is None:
+        return None
+    route = network.find_route(start, end)
+    if route is None:
+        log.warning(f"{LogColors.WARNING}Native pathfinding found no route from {start} to {end}.{LogColors.ENDC}")
+        return None
+    return _path_response(network, route, start_date, transporter_lookup)
+
+
+def _path_response(network: NavigationNetwork, route: Dict[str, Any], start_date: Optional[datetime.datetime],
+                   transporter_lookup: Optional[Callable[[List[str]], Optional[str]]]) -> Dict[str, Any]:
+    path = route['points']
+    transporter = None
+    if route['waterDistance'] > 0:
+        dock_ids = [p['nodeId'] for p in path if p.get('type') == 'dock' and p.get('nodeId')]
+        transporter = (transporter_lookup or network.dock_operator)(dock_ids)
+
+    start_date = start_date or datetime.datetime.now(pytz.UTC)
+    end_date = start_date + datetime.timedelta(seconds=route['duration'])
+    return {
+        'success': True,
+        'path': path,
+        'timing': {
+            'startDate': start_date.isoformat(),
+            'endDate': end_date.isoformat(),
+            'durationSeconds': route['duration'],
+            'distanceMeters': route['distance'],
+        },
+        'journey': extract_journey(path),
+        'transporter': transporter,
+    }
+
+
+def _reverse_route(route: Dict[str, Any]) -> Dict[str, Any]:
+    """The same route travelled backwards (every edge of the network can be used both ways)."""
+    forward = route['points']
+    points = []
+    for index, point in enumerate(reversed(forward)):
+        point = dict(point)
+        if point['type'] in ('start', 'end'):
+            point['type'] = 'end' if point['type'] == 'start' else 'start'
+        # The segment leaving this point is the forward segment that arrived at it
+        source_index = len(forward) - 2 - index
+        point['transportMode'] = forward[source_index]['transportMode'] if source_index >= 0 else 'walking'
+        points.append(point)
+    return dict(route, points=points)
+
+
+def find_paths_from(
+    start: Dict[str, float],
+    ends: List[Dict[str, float]],
+    start_date: Optional[datetime.datetime] = None,
+    transporter_lookup: Optional[Callable[[List[str]], Optional[str]]] = None,
+    tables: Optional[Dict[str, Any]] = None
+) -> Optional[List[Optional[Dict[str, Any]]]]:
+    """
+    Paths from one point to many, from a single graph expansion, in the find_path response shape
+    (None entries for unreachable targets). None when the network is unavailable.
+    """
+    network = get_navigation_network(tables)
+    if network is None:
+        return None
+    return [_path_response(network, route, start_date, transporter_lookup) if route else None
+            for route in network.routes_from(start, ends)]
+
+
+def find_paths_to(
+    starts: List[Dict[str, float]],
+    end: Dict[str, float],
+    start_date: Optional[datetime.datetime] = None,
+    transporter_lookup: Optional[Callable[[List[str]], Optional[str]]] = None,
+    tables: Optional[Dict[str, Any]] = None
+) -> Optional[List[Optional[Dict[str, Any]]]]:
+    """Paths from many points to one (e.g. candidate porters to a pickup), from a single graph expansion."""
+    network = get_navigation_network(tables)
+    if network is None:
+        return None
+    return [_path_response(network, _reverse_route(route), start_date, transporter_lookup) if route else None
+            for route in network.routes_from(end, starts)]
+
+
+def find_travel_cost_matrix(starts: List[Dict[str, float]], ends: List[Dict[str, float]],
+                            tables: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, List[List[Optional[float]]]]]:
+    """
+    {'durations': seconds, 'distances': meters}, each a len(starts) x len(ends) list of lists with
+    None for unreachable pairs (for assignment problems such as porters to cargo). None when the
+    network is unavailable.
+    """
+    network = get_navigation_network(tables)
+    if network is None:
+        return None
+    costs = network.travel_costs(starts, ends)
+    return {
+        'durations': [[cost[0] if cost else None for cost in row] for row in costs],
+        'distances': [[cost[1] if cost else None for cost in row] for row in costs],
+    }
@@ -0,0 +1,220 @@
+"""
+Spatial indexes for nearest-neighbor queries over buildings and water points.
+
+The closest-building helpers used to fetch every candidate from Airtable and compute a
+haversine distance to each of them on every call. A SpatialIndex is a uniform grid in projected
+meters: points are bucketed into square cells (SPATIAL_INDEX_CELL_METERS) and queries visit
+cells in rings of growing size around the query point, so they only look at nearby items.
+
+    index = SpatialIndex(distance_fn=calculate_haversine_distance_meters)
+    index.insert(lat, lng, building_record)
+    index.nearest(lat, lng, k=3, max_distance=500)   # [(record, meters), ...]
+    index.within(lat, lng, radius=200)               # sorted by distance
+    for record, meters in index.iter_nearest(lat, lng): ...   # lazily, nearest first
+
+BuildingSpatialIndex groups one SpatialIndex per building Type and per SubCategory. Use
+`get_building_spatial_index(tables, snapshot, ...)`: it is built once per WorldSnapshot (one tick),
+or from a single bulk fetch kept for BUILDING_INDEX_TTL_SECONDS when no snapshot is active.
+
+This module has no engine imports so any helper module can use it; callers pass the distance
+function used for the reported distances (the grid only uses its own projection to prune).
+"""
+
+import os
+import math
+import time
+import heapq
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+SPATIAL_INDEX_CELL_METERS = float(os.getenv("SPATIAL_INDEX_CELL_METERS", "100"))
+BUILDING_INDEX_TTL_SECONDS = int(os.getenv("BUILDING_INDEX_TTL_SECONDS", "120"))
+
+METERS_PER_DEGREE_LAT = 111320.0
+REFERENCE_LAT = 45.4371  # Venice; the projection is only used to bucket and prune
+METERS_PER_DEGREE_LNG = METERS_PER_DEGREE_LAT * math.cos(math.radians(REFERENCE_LAT))
+# Distances from the caller's distance_fn may differ slightly from the projected ones;
+# a ring is only considered exhausted with this much margin
+PRUNING_SLACK = 0.98
+
+DistanceFn = Callable[[float, float, float, float], float]
+
+
+def project(lat: float, lng: float) -> Tuple[float, float]:
+    """Equirectangular projection to meters around Venice."""
+    return lng * METERS_PER_DEGREE_LNG, lat * METERS_PER_DEGREE_LAT
+
+
+def projected_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    x1, y1 = project(lat1, lng1)
+    x2, y2 = project(lat2, lng2)
+    return math.hypot(x2 - x1, y2 - y1)
+
+
+class SpatialIndex:
+    """Uniform grid over (lat, lng, item) entries."""
+
+    def __init__(self, cell_meters: float = SPATIAL_INDEX_CELL_METERS, distance_fn: Optional[DistanceFn] = None):
+        self.cell_meters = cell_meters
+        self.distance_fn = distance_fn or projected_distance
+        self._cells: Dict[Tuple[int, int], List[Tuple[float, float, Any]]] = defaultdict(list)
+        self._bounds: Optional[List[int]] = None  # [min_cx, min_cy, max_cx, max_cy]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _cell_of(self, lat: float, lng: float) -> Tuple[int, int]:
+        x, y = project(lat, lng)
+        return int(math.floor(x / self.cell_meters)), int(math.floor(y / self.cell_meters))
+
+    def insert(self, lat: float, lng: float, item: Any):
+        cx, cy = self._cell_of(lat, lng)
+        self._cells[(cx, cy)].append((lat, lng, item))
+        self._size += 1
+        if self._bounds is None:
+            self._bounds = [cx, cy, cx, cy]
+        else:
+            b = self._bounds
+            b[0], b[1], b[2], b[3] = min(b[0], cx), min(b[1], cy), max(b[2], cx), max(b[3], cy)
+
+    def _ring_cells(self, cx: int, cy: int, ring: int) -> Iterator[Tuple[int, int]]:
+        if ring == 0:
+            yield cx, cy
+            return
+        for dx in range(-ring, ring + 1):
+            yield cx + dx, cy - ring
+            yield cx + dx, cy + ring
+        for dy in range(-ring + 1, ring):
+            yield cx - ring, cy + dy
+            yield cx + ring, cy + dy
+
+    def iter_nearest(self, lat: float, lng: float, max_distance: Optional[float] = None) -> Iterator[Tuple[Any, float]]:
+        """Yields (item, distance) nearest first, stopping past max_distance."""
+        if self._bounds is None:
+            return
+        cx, cy = self._cell_of(lat, lng)
+        min_cx, min_cy, max_cx, max_cy = self._bounds
+        last_ring = max(cx - min_cx, max_cx - cx, cy - min_cy, max_cy - cy, 0)
+        candidates: List[Tuple[float, int, Any]] = []
+        counter = 0
+        for ring in range(last_ring + 1):
+            for cell in self._ring_cells(cx, cy, ring):
+                for item_lat, item_lng, item in self._cells.get(cell, ()):
+                    distance = self.distance_fn(lat, lng, item_lat, item_lng)
+                    if max_distance is None or distance <= max_distance:
+                        counter += 1
+                        heapq.heappush(candidates, (distance, counter, item))
+            # Everything in rings further out is at least `ring` cells away
+            bound = ring * self.cell_meters * PRUNING_SLACK
+            while candidates and candidates[0][0] <= bound:
+                distance, _, item = heapq.heappop(candidates)
+                yield item, distance
+            if max_distance is not None and bound > max_distance:
+                return
+        while candidates:
+            distance, _, item = heapq.heappop(candidates)
+            yield item, distance
+
+    def nearest(self, lat: float, lng: float, k: int = 1, max_distance: Optional[float] = None,
+                predicate: Optional[Callable[[Any], bool]] = None) -> List[Tuple[Any, float]]:
+        """Up to k (item, distance) pairs, nearest first; `predicate` filters items."""
+        results = []
+        for item, distance in self.iter_nearest(lat, lng, max_distance):
+            if predicate is None or predicate(item):
+                results.append((item, distance))
+                if len(results) >= k:
+                    break
+        return results
+
+    def within(self, lat: float, lng: float, radius: float) -> List[Tuple[Any, float]]:
+        """All (item, distance) pairs within `radius`, nearest first."""
+        return list(self.iter_nearest(lat, lng, max_distance=radius))
+
+
+class BuildingSpatialIndex:
+    """SpatialIndexes over building records: all buildings, by Type and by SubCategory."""
+
+    def __init__(self, buildings: List[Dict], position_fn: Callable[[Dict], Optional[Dict[str, float]]],
+                 distance_fn: Optional[DistanceFn] = None):
+        self.built_at = time.time()
+        self.distance_fn = distance_fn
+        self.all = SpatialIndex(distance_fn=distance_fn)
+        self.by_type: Dict[str, SpatialIndex] = {}
+        self.by_subcategory: Dict[str, SpatialIndex] = {}
+        skipped = 0
+        for record in buildings:
+            position = position_fn(record)
+            if not position:
+                skipped += 1
+                continue
+            lat, lng = float(position['lat']), float(position['lng'])
+            fields = record['fields']
+            self.all.insert(lat, lng, record)
+            if fields.get('Type'):
+                self._index_for(self.by_type, fields['Type']).insert(lat, lng, record)
+            if fields.get('SubCategory'):
+                self._index_for(self.by_subcategory, fields['SubCategory']).insert(lat, lng, record)
+        log.debug(f"BuildingSpatialIndex: {len(self.all)} buildings indexed, {skipped} without position.")
+
+    def _index_for(self, indexes: Dict[str, SpatialIndex], key: str) -> SpatialIndex:
+        index = indexes.get(key)
+        if index is None:
+            index = indexes[key] = SpatialIndex(distance_fn=self.distance_fn)
+        return index
+
+    def of_type(self, building_type: str) -> SpatialIndex:
+        return self.by_type.get(building_type) or SpatialIndex(distance_fn=self.distance_fn)
+
+    def of_subcategory(self, subcategory: str) -> SpatialIndex:
+        return self.by_subcategory.get(subcategory) or SpatialIndex(distance_fn=self.distance_fn)
+
+    def iter_nearest_matching(self, lat: float, lng: float, types: Tuple[str, ...] = (), subcategories: Tuple[str, ...] = (),
+                              max_distance: Optional[float] = None) -> Iterator[Tuple[Dict, float]]:
+        """Nearest-first merge over several Type/SubCategory indexes (each building yielded once)."""
+        iterators = [self.of_type(t).iter_nearest(lat, lng, max_distance) for t in types]
+        iterators += [self.of_subcategory(s).iter_nearest(lat, lng, max_distance) for s in subcategories]
+        seen = set()
+        for record, distance in heapq.merge(*iterators, key=lambda pair: pair[1]):
+            if record['id'] in seen:
+                continue
+            seen.add(record['id'])
+            yield record, distance
+
+
+# Index built from a bulk fetch when no WorldSnapshot is active: (tables object id, index)
+_fetched_index: Optional[Tuple[int, BuildingSpatialIndex]] = None
+_fetched_index_lock = threading.Lock()
+
+
+def get_building_spatial_index(tables: Optional[Dict[str, Any]], snapshot: Optional[Any],
+                               position_fn: Callable[[Dict], Optional[Dict[str, float]]],
+                               distance_fn: Optional[DistanceFn] = None) -> Optional[BuildingSpatialIndex]:
+    """
+    The building index for the current tick: attached to the snapshot when one with buildings is
+    given, otherwise built from one tables['buildings'].all() and reused for
+    BUILDING_INDEX_TTL_SECONDS. None if neither is available.
+    """
+    global _fetched_index
+    if snapshot is not None and snapshot.has_table('buildings'):
+        return snapshot.building_spatial_index(position_fn, distance_fn)
+    if not tables or tables.get('buildings') is None:
+        return None
+    with _fetched_index_lock:
+        cached = _fetched_index
+        if cached is not None and cached[0] == id(tables['buildings']) and time.time() - cached[1].built_at < BUILDING_INDEX_TTL_SECONDS:
+            return cached[1]
+        index = BuildingSpatialIndex(tables['buildings'].all(), position_fn, distance_fn)
+        _fetched_index = (id(tables['buildings']), index)
+        return index
+
+
+def invalidate_building_spatial_index():
+    """Drops the fetched (non-snapshot) index, e.g. after buildings were created or moved."""
+    global _fetched_index
+    with _fetched_index_lock:
+        _fetched_index = None
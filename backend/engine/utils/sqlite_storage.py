@@ -0,0 +1,291 @@
+"""
+Local SQLite storage backend for La Serenissima.
+
+Implements the subset of the pyairtable Table API the engine uses
+(all(formula=, max_records=, fields=, sort=), first, get, create, update, delete, batch_*)
+on top of a single SQLite file, so full ticks can run and be benchmarked without Airtable.
+
+Each Airtable table becomes one SQLite table `(id, created_time, fields JSON)`. Formulas are
+translated to SQL by airtable_formula.SQLCompiler, and the fields the engine filters on most
+(Username, BuildingId, Asset, Type, Status, ...) get JSON expression indexes.
+
+Selecting the backend:
+    SERENISSIMA_STORAGE_BACKEND=sqlite            (default: airtable)
+    SERENISSIMA_SQLITE_PATH=data/serenissima.db   (optional)
+
+Seeding a local database from Airtable:
+    python backend/engine/utils/sqlite_storage.py --import-from-airtable
+"""
+
+import os
+import sys
+import json
+import string
+import random
+import logging
+import sqlite3
+import argparse
+import threading
+import datetime
+from typing import Dict, List, Optional, Any, Iterable
+
+import pytz
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from backend.engine.utils.airtable_formula import (
+    SQLCompiler,
+    parse_formula,
+    normalize_datetime,
+    datetime_diff,
+    date_add,
+    now_iso
+)
+
+log = logging.getLogger(__name__)
+
+STORAGE_BACKEND_ENV = "SERENISSIMA_STORAGE_BACKEND"
+SQLITE_PATH_ENV = "SERENISSIMA_SQLITE_PATH"
+DEFAULT_SQLITE_PATH = os.path.join(PROJECT_ROOT, 'data', 'serenissima.db')
+
+# Fields used as equality filters across the engine; each gets an expression index.
+INDEXED_FIELDS = [
+    'Username', 'CitizenId', 'BuildingId', 'Occupant', 'RunBy', 'Owner', 'Asset', 'AssetType',
+    'Type', 'Status', 'Citizen', 'ActivityId', 'ContractId', 'LandId', 'Category', 'SubCategory',
+    'Buyer', 'Seller', 'SellerBuilding', 'BuyerBuilding', 'ResourceType', 'Citizen1', 'Citizen2',
+]
+
+_RECORD_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+def is_local_storage_enabled() -> bool:
+    return os.getenv(STORAGE_BACKEND_ENV, 'airtable').strip().lower() == 'sqlite'
+
+
+def _new_record_id() -> str:
+    # Same shape as Airtable ids ('rec' + 14 chars); get_contract_record relies on it.
+    return 'rec' + ''.join(random.choices(_RECORD_ID_ALPHABET, k=14))
+
+
+def _arrayjoin(value: Any, separator: str = ', ') -> str:
+    if value is None:
+        return ''
+    try:
+        parsed = json.loads(value) if isinstance(value, str) and value.startswith('[') else value
+    except json.JSONDecodeError:
+        parsed = value
+    if isinstance(parsed, list):
+        return separator.join(str(v) for v in parsed)
+    return str(parsed)
+
+
+class SQLiteStorage:
+    """Owns the SQLite connection shared by all SQLiteTable instances of one database file."""
+
+    def __init__(self, db_path: str = DEFAULT_SQLITE_PATH):
+        self.db_path = db_path
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.create_function('at_datetime', 1, normalize_datetime, deterministic=True)
+        self.connection.create_function('at_datetime_diff', 3, datetime_diff, deterministic=True)
+        self.connection.create_function('at_dateadd', 3, date_add, deterministic=True)
+        self.connection.create_function('at_arrayjoin', 2, _arrayjoin, deterministic=True)
+        self.connection.create_function('at_now', 0, now_iso)
+        self.compiler = SQLCompiler()
+        self._tables: Dict[str, 'SQLiteTable'] = {}
+
+    def table(self, table_name: str) -> 'SQLiteTable':
+        with self.lock:
+            if table_name not in self._tables:
+                self._ensure_schema(table_name)
+                self._tables[table_name] = SQLiteTable(self, table_name)
+            return self._tables[table_name]
+
+    def _ensure_schema(self, table_name: str):
+        quoted = self.quote_identifier(table_name)
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {quoted} (id TEXT PRIMARY KEY, created_time TEXT NOT NULL, fields TEXT NOT NULL)"
+        )
+        for field_name in INDEXED_FIELDS:
+            index_name = self.quote_identifier(f"idx_{table_name}_{field_name}")
+            self.connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {index_name} ON {quoted} ({self.compiler.field_expression(field_name)})"
+            )
+
+    @staticmethod
+    def quote_identifier(name: str) -> str:
+        return '"' + name.replace('"', '""') + '"'
+
+
+class SQLiteTable:
+    """Drop-in replacement for pyairtable.Table backed by SQLiteStorage."""
+
+    def __init__(self, storage: SQLiteStorage, table_name: str):
+        self.storage = storage
+        self.name = table_name
+        self._quoted = storage.quote_identifier(table_name)
+
+    def __repr__(self):
+        return f"<SQLiteTable {self.name} ({self.storage.db_path})>"
+
+    @staticmethod
+    def _to_record(row, field_names: Optional[Iterable[str]] = None) -> Dict:
+        fields = json.loads(row[2])
+        if field_names is not None:
+            wanted = set(field_names)
+            fields = {k: v for k, v in fields.items() if k in wanted}
+        return {'id': row[0], 'createdTime': row[1], 'fields': fields}
+
+    # --- Reads ---
+
+    def all(self, formula: Optional[str] = None, max_records: Optional[int] = None,
+            fields: Optional[List[str]] = None, sort: Optional[List[str]] = None, **options) -> List[Dict]:
+        sql = f"SELECT id, created_time, fields FROM {self._quoted}"
+        params: List[Any] = []
+        if formula:
+            where_sql, params = self.storage.compiler.compile_where(parse_formula(formula))
+            sql += f" WHERE {where_sql}"
+        if sort:
+            order_terms = []
+            for sort_field in sort:
+                descending = sort_field.startswith('-')
+                field_name = sort_field[1:] if descending else sort_field
+                order_terms.append(f"{self.storage.compiler.field_expression(field_name)} {'DESC' if descending else 'ASC'}")
+            sql += " ORDER BY " + ", ".join(order_terms)
+        if max_records:
+            sql += f" LIMIT {int(max_records)}"
+        with self.storage.lock:
+            rows = self.storage.connection.execute(sql, params).fetchall()
+        return [self._to_record(row, fields) for row in rows]
+
+    def first(self, **options) -> Optional[Dict]:
+        options['max_records'] = 1
+        records = self.all(**options)
+        return records[0] if records else None
+
+    def get(self, record_id: str, **options) -> Dict:
+        with self.storage.lock:
+            row = self.storage.connection.execute(
+                f"SELECT id, created_time, fields FROM {self._quoted} WHERE id = ?", (record_id,)
+            ).fetchone()
+        if not row:
+            # pyairtable raises on unknown ids (HTTP 404); keep the same contract
+            raise KeyError(f"Record {record_id} not found in {self.name}")
+        return self._to_record(row)
+
+    # --- Writes ---
+
+    def create(self, fields: Dict[str, Any], typecast: bool = False) -> Dict:
+        return self.batch_create([fields], typecast=typecast)[0]
+
+    def batch_create(self, records: List[Dict[str, Any]], typecast: bool = False) -> List[Dict]:
+        created_time = datetime.datetime.now(pytz.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        created = [{'id': _new_record_id(), 'createdTime': created_time, 'fields': dict(fields)} for fields in records]
+        with self.storage.lock:
+            self.storage.connection.executemany(
+                f"INSERT INTO {self._quoted} (id, created_time, fields) VALUES (?, ?, ?)",
+                [(r['id'], r['createdTime'], json.dumps(r['fields'])) for r in created]
+            )
+        return created
+
+    def update(self, record_id: str, fields: Dict[str, Any], replace: bool = False, typecast: bool = False) -> Dict:
+        return self.batch_update([{'id': record_id, 'fields': fields}], replace=replace, typecast=typecast)[0]
+
+    def batch_update(self, records: List[Dict[str, Any]], replace: bool = False, typecast: bool = False) -> List[Dict]:
+        updated = []
+        with self.storage.lock:
+            self.storage.connection.execute("BEGIN")
+            try:
+                for record in records:
+                    current = self.get(record['id'])
+                    new_fields = dict(record['fields']) if replace else {**current['fields'], **record['fields']}
+                    # Airtable drops fields set to None/empty instead of storing them
+                    new_fields = {k: v for k, v in new_fields.items() if v is not None}
+                    self.storage.connection.execute(
+                        f"UPDATE {self._quoted} SET fields = ? WHERE id = ?", (json.dumps(new_fields), record['id'])
+                    )
+                    updated.append({'id': record['id'], 'createdTime': current['createdTime'], 'fields': new_fields})
+                self.storage.connection.execute("COMMIT")
+            except Exception:
+                self.storage.connection.execute("ROLLBACK")
+                raise
+        return updated
+
+    def delete(self, record_id: str) -> Dict:
+        return self.batch_delete([record_id])[0]
+
+    def batch_delete(self, record_ids: List[str]) -> List[Dict]:
+        with self.storage.lock:
+            self.storage.connection.executemany(
+                f"DELETE FROM {self._quoted} WHERE id = ?", [(record_id,) for record_id in record_ids]
+            )
+        return [{'id': record_id, 'deleted': True} for record_id in record_ids]
+
+    def import_records(self, records: List[Dict]):
+        """Inserts Airtable records keeping their ids (used to seed the local database)."""
+        with self.storage.lock:
+            self.storage.connection.executemany(
+                f"INSERT OR REPLACE INTO {self._quoted} (id, created_time, fields) VALUES (?, ?, ?)",
+                [(r['id'], r.get('createdTime', ''), json.dumps(r.get('fields', {}))) for r in records]
+            )
+
+
+_storage_instances: Dict[str, SQLiteStorage] = {}
+_storage_instances_lock = threading.Lock()
+
+
+def get_sqlite_storage(db_path: Optional[str] = None) -> SQLiteStorage:
+    """Returns the process-wide SQLiteStorage for a database file."""
+    db_path = db_path or os.getenv(SQLITE_PATH_ENV) or DEFAULT_SQLITE_PATH
+    with _storage_instances_lock:
+        if db_path not in _storage_instances:
+            _storage_instances[db_path] = SQLiteStorage(db_path)
+        return _storage_instances[db_path]
+
+
+def initialize_local_tables(table_names: Dict[str, str], db_path: Optional[str] = None) -> Dict[str, SQLiteTable]:
+    """Builds a `tables` dict (same keys as initialize_airtable) backed by the local SQLite database."""
+    storage = get_sqlite_storage(db_path)
+    log.info(f"Using local SQLite storage backend at {storage.db_path}")
+    return {table_key: storage.table(table_name) for table_key, table_name in table_names.items()}
+
+
+def import_from_airtable(table_names: Iterable[str], db_path: Optional[str] = None):
+    """Copies whole Airtable tables into the local SQLite database."""
+    from pyairtable import Api
+    from dotenv import load_dotenv
+
+    load_dotenv(os.path.join(PROJECT_ROOT, '.env'))
+    api_key = (os.getenv('AIRTABLE_API_KEY') or '').strip()
+    base_id = (os.getenv('AIRTABLE_BASE_ID') or '').strip()
+    if not api_key or not base_id:
+        log.error("Missing Airtable credentials. Set AIRTABLE_API_KEY and AIRTABLE_BASE_ID to import.")
+        return
+
+    api = Api(api_key)
+    storage = get_sqlite_storage(db_path)
+    for table_name in table_names:
+        records = api.table(base_id, table_name).all()
+        storage.table(table_name).import_records(records)
+        log.info(f"Imported {len(records)} records from {table_name} into {storage.db_path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Manage the local SQLite storage backend.")
+    parser.add_argument("--import-from-airtable", action="store_true", help="Copy Airtable tables into the local database.")
+    parser.add_argument("--db", type=str, help=f"Database path (default: ${SQLITE_PATH_ENV} or {DEFAULT_SQLITE_PATH}).")
+    parser.add_argument("--tables", type=str, default="CITIZENS,BUILDINGS,ACTIVITIES,CONTRACTS,RESOURCES,RELATIONSHIPS,STRATAGEMS,PROCESSES,TRANSACTIONS,PROBLEMS,LANDS,NOTIFICATIONS,MESSAGES",
+                        help="Comma-separated Airtable table names to import.")
+    args = parser.parse_args()
+
+    if args.import_from_airtable:
+        import_from_airtable([t.strip() for t in args.tables.split(',') if t.strip()], args.db)
+    else:
+        parser.print_help()
@@ -0,0 +1,217 @@
+"""
+Startup profiler for engine scripts (`--profile-startup`).
+
+Short scheduled scripts spend a large share of their wall-clock time before doing any work:
+importing processor modules, loading .env, initializing Airtable and testing the connection.
+This module measures that:
+
+- per-module import time (cumulative and self), recorded by a meta path finder that wraps
+  the loader of every module imported after `install()`;
+- named phases (`with startup_profiler.phase('connection_test'):`) and milestones
+  (`startup_profiler.mark('first_query')`), relative to the moment the profiler was installed.
+
+It costs nothing unless installed. Scripts install it at the very top, before their heavy
+imports, when `--profile-startup` is on the command line or PROFILE_STARTUP is set. This module
+only uses the standard library; scripts load it from its file path (see processActivities.py),
+because importing it through backend.engine.utils runs utils/__init__.py and its imports first:
+
+    startup_profiler = <this file, loaded with importlib.util.spec_from_file_location>
+    startup_profiler.install_if_requested(started_at=SCRIPT_STARTED_AT)
+    ... heavy imports ...
+    startup_profiler.mark('imports_done')
+    ...
+    startup_profiler.log_report()
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+from typing import Dict, Iterator, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+PROFILE_STARTUP_FLAG = "--profile-startup"
+REPORT_TOP_MODULES = int(os.getenv("PROFILE_STARTUP_TOP_MODULES", "25"))
+
+
+class _TimedLoader:
+    """Delegates to the real loader and times exec_module()."""
+
+    def __init__(self, loader, profiler: 'StartupProfiler'):
+        self._loader = loader
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._enter_import()
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._exit_import(module.__name__, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class _ImportTimingFinder(MetaPathFinder):
+    """Finds specs with the other finders and wraps their loaders in a _TimedLoader."""
+
+    def __init__(self, profiler: 'StartupProfiler'):
+        self._profiler = profiler
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self._profiler)
+                return spec
+        return None
+
+
+class StartupProfiler:
+    def __init__(self, started_at: Optional[float] = None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.imports: Dict[str, Tuple[float, float]] = {}  # module -> (cumulative, self) seconds
+        self.phases: List[Tuple[str, float, float]] = []   # (name, start offset, duration)
+        self.marks: List[Tuple[str, float]] = []            # (name, offset)
+        self._finder: Optional[_ImportTimingFinder] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # --- Imports ---
+
+    def _child_stack(self) -> List[float]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter_import(self):
+        self._child_stack().append(0.0)
+
+    def _exit_import(self, module_name: str, elapsed: float):
+        stack = self._child_stack()
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        with self._lock:
+            self.imports[module_name] = (elapsed, elapsed - children)
+
+    def start_import_timing(self):
+        if self._finder is None:
+            self._finder = _ImportTimingFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def stop_import_timing(self):
+        if self._finder is not None:
+            try:
+                sys.meta_path.remove(self._finder)
+            except ValueError:
+                pass
+            self._finder = None
+
+    # --- Phases ---
+
+    def _offset(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def mark(self, name: str):
+        with self._lock:
+            self.marks.append((name, self._offset()))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = self._offset()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, start, self._offset() - start))
+
+    # --- Report ---
+
+    def report_lines(self, top: int = REPORT_TOP_MODULES) -> List[str]:
+        lines = [f"Startup profile ({self._offset():.3f}s since profiler start):"]
+        if self.imports:
+            # Self times add up to the total without counting nested imports twice
+            total_self = sum(self_time for _, self_time in self.imports.values())
+            lines.append(f"  Imports: {len(self.imports)} modules, {total_self:.3f}s total.")
+            by_cumulative = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)
+            for module_name, (cumulative, self_time) in by_cumulative[:top]:
+                lines.append(f"    {cumulative * 1000:9.1f} ms cumulative {self_time * 1000:9.1f} ms self  {module_name}")
+        else:
+            lines.append("  Imports: not measured (modules were already imported when the profiler started).")
+        for name, start, duration in self.phases:
+            lines.append(f"  Phase {name}: {duration:.3f}s (started at +{start:.3f}s)")
+        for name, offset in self.marks:
+            lines.append(f"  Reached {name} at +{offset:.3f}s")
+        return lines
+
+
+_profiler: Optional[StartupProfiler] = None
+
+
+def is_requested(argv: Optional[List[str]] = None) -> bool:
+    argv = sys.argv[1:] if argv is None else argv
+    return PROFILE_STARTUP_FLAG in argv or os.getenv("PROFILE_STARTUP", "").lower() in ("1", "true", "yes")
+
+
+def install(time_imports: bool = True, started_at: Optional[float] = None) -> StartupProfiler:
+    """
+    Starts profiling (idempotent) and returns the active profiler. `started_at` (a
+    time.perf_counter() value) lets a script count what ran before this module was importable,
+    such as the backend.engine.utils package itself.
+    """
+    global _profiler
+    if _profiler is None:
+        _profiler = StartupProfiler(started_at)
+        _profiler.mark('profiler_installed')
+    if time_imports:
+        _profiler.start_import_timing()
+    return _profiler
+
+
+def install_if_requested(argv: Optional[List[str]] = None, started_at: Optional[float] = None) -> Optional[StartupProfiler]:
+    return install(started_at=started_at) if is_requested(argv) else None
+
+
+def get_profiler() -> Optional[StartupProfiler]:
+    return _profiler
+
+
+def mark(name: str):
+    """Records a milestone; a no-op unless the profiler is installed."""
+    if _profiler is not None:
+        _profiler.mark(name)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Times a block; a no-op unless the profiler is installed."""
+    if _profiler is None:
+        yield
+        return
+    with _profiler.phase(name):
+        yield
+
+
+def log_report(reset: bool = True):
+    """Logs the report and, by default, uninstalls the profiler so the next run starts clean."""
+    global _profiler
+    if _profiler is None:
+        return
+    _profiler.stop_import_timing()
+    for line in _profiler.report_lines():
+        log.info(line)
+    if reset:
+        _profiler = None
@@ -0,0 +1,236 @@
+"""
+Append-only columnar archive of the TRANSACTIONS table.
+
+Historical analytics (welfare monitoring, income and trust statistics, il-testimone, the
+synthesis) used to rescan TRANSACTIONS with formula queries, and the table kept growing because
+nothing could be deleted from it. cleanTables.py now archives the old transactions here before
+it deletes them from Airtable, so the history is kept and can be queried without Airtable.
+
+The archive is a directory of Parquet files partitioned by the UTC day the transaction was
+executed (ExecutedAt, CreatedAt if missing):
+
+    data/transaction_archive/day=2026-10-17/part-20261018T031500-3f9c2a1b.parquet
+
+Files are never rewritten; every archiving run adds one part per day. A transaction archived
+twice (e.g. the deletion failed after archiving) is dropped on read by its record id.
+
+    archive_transactions(old_records)                       # cleanTables.py
+    archive = TransactionArchive()
+    archive.per_citizen(start, end, types=['wage_payment'])  # income, expenses, net, count
+    archive.per_pair(start, end)                             # Seller -> Buyer totals
+    archive.per_type(start, end)
+    archive.frame(start, end, columns=['Seller', 'Price'])   # raw rows as a pandas DataFrame
+
+pyarrow and pandas are optional: without them archive_transactions() raises
+TransactionArchiveUnavailable and cleanTables keeps the transactions in Airtable.
+"""
+
+import os
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+log = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+TRANSACTION_ARCHIVE_DIR = os.getenv("TRANSACTION_ARCHIVE_DIR", os.path.join(PROJECT_ROOT, 'data', 'transaction_archive'))
+PARTITION_PREFIX = 'day='
+
+STRING_COLUMNS = ['id', 'Type', 'AssetType', 'Asset', 'Seller', 'Buyer', 'Notes']
+TIMESTAMP_COLUMNS = ['CreatedAt', 'ExecutedAt']
+
+
+class TransactionArchiveUnavailable(RuntimeError):
+    """Raised when pyarrow or pandas is not installed."""
+
+
+def archive_available() -> bool:
+    return pa is not None and pd is not None
+
+
+def _require_dependencies():
+    if not archive_available():
+        raise TransactionArchiveUnavailable("The transaction archive needs pyarrow and pandas (pip install pyarrow pandas)")
+
+
+def _schema():
+    return pa.schema([(name, pa.string()) for name in STRING_COLUMNS] +
+                     [('Price', pa.float64())] +
+                     [(name, pa.timestamp('us', tz='UTC')) for name in TIMESTAMP_COLUMNS])
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    """Airtable timestamp as an aware UTC datetime (naive ones are taken as UTC)."""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _parse_price(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None and value != '' else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _row(record: Dict) -> Dict[str, Any]:
+    fields = record.get('fields', {})
+    row = {name: (str(fields[name]) if fields.get(name) is not None else None) for name in STRING_COLUMNS if name != 'id'}
+    row['id'] = record['id']
+    row['Price'] = _parse_price(fields.get('Price'))
+    for name in TIMESTAMP_COLUMNS:
+        row[name] = _parse_timestamp(fields.get(name))
+    return row
+
+
+def _partition_day(row: Dict[str, Any]) -> str:
+    moment = row['ExecutedAt'] or row['CreatedAt']
+    return moment.strftime('%Y-%m-%d') if moment else 'unknown'
+
+
+def archive_transactions(records: Iterable[Dict], archive_dir: str = TRANSACTION_ARCHIVE_DIR) -> int:
+    """
+    Appends TRANSACTIONS records (as returned by pyairtable) to the archive and returns how many
+    were written. Raises TransactionArchiveUnavailable or OSError if they could not be archived.
+    """
+    _require_dependencies()
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        row = _row(record)
+        by_day.setdefault(_partition_day(row), []).append(row)
+    if not by_day:
+        return 0
+
+    schema = _schema()
+    run_stamp = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"  # Unique even for two runs in one second
+    written = 0
+    for day, rows in sorted(by_day.items()):
+        partition_dir = os.path.join(archive_dir, f"{PARTITION_PREFIX}{day}")
+        os.makedirs(partition_dir, exist_ok=True)
+        path = os.path.join(partition_dir, f"part-{run_stamp}.parquet")
+        tmp_path = f"{path}.tmp"
+        pq.write_table(pa.Table.from_pylist(rows, schema=schema), tmp_path)
+        os.replace(tmp_path, path)  # Readers never see a partial part
+        written += len(rows)
+    log.info(f"Archived {written} transactions into {len(by_day)} day partitions under {archive_dir}.")
+    return written
+
+
+def _day_bound(moment: Optional[datetime]) -> Optional[str]:
+    if moment is None:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%d')
+
+
+def _utc_timestamp(moment: datetime) -> 'pd.Timestamp':
+    timestamp = pd.Timestamp(moment)
+    return timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+
+
+class TransactionArchive:
+    """Read side of the archive: rows and aggregates over a time range, as pandas DataFrames."""
+
+    def __init__(self, archive_dir: str = TRANSACTION_ARCHIVE_DIR):
+        _require_dependencies()
+        self.archive_dir = archive_dir
+
+    def days(self) -> List[str]:
+        """Archived days ('YYYY-MM-DD'), oldest first."""
+        try:
+            names = os.listdir(self.archive_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(name[len(PARTITION_PREFIX):] for name in names if name.startswith(PARTITION_PREFIX))
+
+    def _part_files(self, start: Optional[datetime], end: Optional[datetime]) -> List[str]:
+        first_day, last_day = _day_bound(start), _day_bound(end)
+        paths = []
+        for day in self.days():
+            # Undated transactions ('unknown') are only part of unbounded queries
+            if (first_day or last_day) and day == 'unknown':
+                continue
+            if (first_day and day < first_day) or (last_day and day > last_day):
+                continue
+            partition_dir = os.path.join(self.archive_dir, f"{PARTITION_PREFIX}{day}")
+            paths.extend(os.path.join(partition_dir, name) for name in sorted(os.listdir(partition_dir))
+                         if name.endswith('.parquet'))
+        return paths
+
+    def frame(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              types: Optional[Iterable[str]] = None, columns: Optional[List[str]] = None) -> 'pd.DataFrame':
+        """
+        Archived transactions executed in [start, end) (either bound may be None), optionally only
+        of the given Types. Only the partitions of the range are read.
+        """
+        wanted = None
+        if columns is not None:
+            wanted = list(dict.fromkeys(['id', 'ExecutedAt', 'CreatedAt', 'Type'] + list(columns)))
+        paths = self._part_files(start, end)
+        if paths:
+            df = pq.ParquetDataset(paths, schema=_schema()).read(columns=wanted).to_pandas()
+            df = df.drop_duplicates(subset='id', keep='first')
+        else:
+            df = _schema().empty_table().to_pandas()
+
+        executed = df['ExecutedAt'].fillna(df['CreatedAt'])
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= executed >= _utc_timestamp(start)
+        if end is not None:
+            mask &= executed < _utc_timestamp(end)
+        if types is not None:
+            mask &= df['Type'].isin(list(types))
+        df = df[mask].reset_index(drop=True)
+        return df[columns] if columns is not None else df
+
+    def per_citizen(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    types: Optional[Iterable[str]] = None) -> 'pd.DataFrame':
+        """
+        Per citizen: income (Price of the transactions they are the Seller of), expenses (as
+        Buyer), net and transaction count. Indexed by the Seller/Buyer value (Username or Wallet).
+        """
+        df = self.frame(start, end, types, columns=['Seller', 'Buyer', 'Price'])
+        income = df.groupby('Seller')['Price'].agg(['sum', 'count'])
+        expenses = df.groupby('Buyer')['Price'].agg(['sum', 'count'])
+        result = pd.DataFrame({
+            'income': income['sum'],
+            'expenses': expenses['sum'],
+        }).fillna(0.0)
+        result['net'] = result['income'] - result['expenses']
+        result['count'] = income['count'].reindex(result.index, fill_value=0) + expenses['count'].reindex(result.index, fill_value=0)
+        result.index.name = 'citizen'
+        return result.sort_values('net', ascending=False)
+
+    def per_pair(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 types: Optional[Iterable[str]] = None) -> 'pd.DataFrame':
+        """Total and count of the money paid by each Buyer to each Seller."""
+        df = self.frame(start, end, types, columns=['Seller', 'Buyer', 'Price'])
+        result = df.groupby(['Buyer', 'Seller'])['Price'].agg(total='sum', count='count')
+        return result.sort_values('total', ascending=False)
+
+    def per_type(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> 'pd.DataFrame':
+        """Total, count and mean Price per transaction Type."""
+        df = self.frame(start, end, columns=['Type', 'Price'])
+        result = df.groupby('Type')['Price'].agg(total='sum', count='count', mean='mean')
+        return result.sort_values('total', ascending=False)
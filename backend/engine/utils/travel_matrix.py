@@ -0,0 +1,353 @@
+"""
+Precomputed building-to-building travel times and distances.
+
+Handlers keep asking how long it takes to get from one building to another (home to work,
+closest inn, closest shop), which used to cost a path request each time. The offline job
+backend/engine/buildTravelMatrix.py computes the fastest walk/gondola route between every pair
+of constructed buildings on the in-process navigation network (see pathfinding.py). The results
+are stored under data/.travel_matrix/:
+
+- index.json: building index (BuildingId -> slot, with the position used), matrix capacity and
+  the version of the navigation data the matrix was computed on;
+- times.f32 / distances.f32: capacity x capacity float32 matrices in row-major order
+  (seconds / meters, NaN when unknown or unreachable), memory-mapped on read.
+
+Lookups are O(1) (`get_travel_matrix().travel_time_seconds(from_id, to_id)`), so activity
+creators only fetch a full path once they commit to a trip.
+
+Updates are incremental: new buildings (and buildings whose position changed) get their row and
+column computed with one Dijkstra run each; removed buildings free their slot. The matrix is
+rebuilt from scratch when the navigation data changes. The network is undirected, so one run
+per building fills both its row and its column.
+
+NumPy is optional. Without it the same files are read and written through mmap and
+memoryview, which is slower for bulk writes but gives identical lookups.
+"""
+
+import os
+import json
+import mmap
+import math
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional: the mmap/memoryview fallback below reads the same files
+    np = None
+
+from backend.engine.utils.activity_helpers import LogColors, _get_building_position_coords
+from backend.engine.utils.pathfinding import DATA_DIR, get_navigation_network
+
+log = logging.getLogger(__name__)
+
+TRAVEL_MATRIX_DIR = os.getenv("TRAVEL_MATRIX_DIR", os.path.join(DATA_DIR, '.travel_matrix'))
+INDEX_FILE = 'index.json'
+TIMES_FILE = 'times.f32'
+DISTANCES_FILE = 'distances.f32'
+MATRIX_FORMAT_VERSION = 1
+FLOAT32_SIZE = 4
+CAPACITY_HEADROOM = 64  # free slots kept when the matrix grows, so a few new buildings don't force a resize
+
+
+class Float32Matrix:
+    """Square float32 matrix in a raw file, memory-mapped (numpy.memmap when NumPy is installed)."""
+
+    def __init__(self, path: str, capacity: int, writable: bool = False):
+        self.path = path
+        self.capacity = capacity
+        self.writable = writable
+        expected_size = capacity * capacity * FLOAT32_SIZE
+        if os.path.getsize(path) != expected_size:
+            raise ValueError(f"{path} has {os.path.getsize(path)} bytes, expected {expected_size} for capacity {capacity}")
+        self._file = None
+        self._mmap = None
+        if np is not None:
+            self._array = np.memmap(path, dtype=np.float32, mode='r+' if writable else 'r', shape=(capacity, capacity))
+        else:
+            self._file = open(path, 'r+b' if writable else 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+            self._array = memoryview(self._mmap).cast('f')
+
+    @classmethod
+    def create(cls, path: str, capacity: int, previous: Optional['Float32Matrix'] = None) -> 'Float32Matrix':
+        """New NaN-filled matrix file, with the top-left block copied from `previous` if given."""
+        nan_row = (b'\x00\x00\xc0\x7f') * capacity  # float32 NaN, little-endian
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            for i in range(capacity):
+                if previous is not None and i < previous.capacity:
+                    f.write(previous.row_bytes(i) + nan_row[previous.capacity * FLOAT32_SIZE:])
+                else:
+                    f.write(nan_row)
+        if previous is not None:
+            previous.close()
+        os.replace(tmp_path, path)
+        return cls(path, capacity, writable=True)
+
+    def row_bytes(self, i: int) -> bytes:
+        if np is not None:
+            return self._array[i].astype('<f4').tobytes()
+        return self._array[i * self.capacity:(i + 1) * self.capacity].tobytes()
+
+    def get(self, i: int, j: int) -> float:
+        if np is not None:
+            return float(self._array[i, j])
+        return self._array[i * self.capacity + j]
+
+    def set(self, i: int, j: int, value: float):
+        if np is not None:
+            self._array[i, j] = value
+        else:
+            self._array[i * self.capacity + j] = value
+
+    def clear(self, i: int):
+        """Sets row and column i to NaN."""
+        if np is not None:
+            self._array[i, :] = np.nan
+            self._array[:, i] = np.nan
+            return
+        for j in range(self.capacity):
+            self._array[i * self.capacity + j] = math.nan
+            self._array[j * self.capacity + i] = math.nan
+
+    def flush(self):
+        if np is not None:
+            self._array.flush()
+        elif self._mmap is not None and self.writable:
+            self._mmap.flush()
+
+    def close(self):
+        if np is not None:
+            if self.writable:
+                self._array.flush()
+            self._array = None
+            return
+        if self._array is not None:
+            self._array.release()
+            self._array = None
+        if self._mmap is not None:
+            if self.writable:
+                self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class TravelMatrix:
+    """Read access to a built matrix."""
+
+    def __init__(self, directory: str, index: Dict[str, Any], times: Float32Matrix, distances: Float32Matrix):
+        self.directory = directory
+        self.index = index
+        self.slots: Dict[str, int] = {
+            entry['id']: slot for slot, entry in enumerate(index['buildings']) if entry
+        }
+        self.times = times
+        self.distances = distances
+
+    @classmethod
+    def open(cls, directory: str = TRAVEL_MATRIX_DIR, writable: bool = False) -> Optional['TravelMatrix']:
+        index = read_index(directory)
+        if index is None:
+            return None
+        try:
+            times = Float32Matrix(os.path.join(directory, TIMES_FILE), index['capacity'], writable)
+            distances = Float32Matrix(os.path.join(directory, DISTANCES_FILE), index['capacity'], writable)
+        except (OSError, ValueError) as e:
+            log.warning(f"{LogColors.WARNING}Travel matrix in {directory} is unusable: {e}{LogColors.ENDC}")
+            return None
+        return cls(directory, index, times, distances)
+
+    def close(self):
+        self.times.close()
+        self.distances.close()
+
+    @property
+    def network_version(self) -> Optional[str]:
+        return self.index.get('networkVersion')
+
+    def has_building(self, building_id: str) -> bool:
+        return building_id in self.slots
+
+    def _lookup(self, matrix: Float32Matrix, from_building_id: str, to_building_id: str) -> Optional[float]:
+        i = self.slots.get(from_building_id)
+        j = self.slots.get(to_building_id)
+        if i is None or j is None:
+            return None
+        value = matrix.get(i, j)
+        return None if math.isnan(value) else value
+
+    def travel_time_seconds(self, from_building_id: str, to_building_id: str) -> Optional[float]:
+        """Fastest travel time, or None if either building is not in the matrix or no route exists."""
+        return self._lookup(self.times, from_building_id, to_building_id)
+
+    def travel_distance_meters(self, from_building_id: str, to_building_id: str) -> Optional[float]:
+        """Length of the fastest route (same None cases as travel_time_seconds)."""
+        return self._lookup(self.distances, from_building_id, to_building_id)
+
+    def nearest(self, from_building_id: str, candidate_ids: Iterable[str], limit: int = 1) -> List[Tuple[str, float]]:
+        """The `limit` candidates with the shortest travel time from `from_building_id`, as (id, seconds)."""
+        reachable = []
+        for candidate_id in candidate_ids:
+            seconds = self.travel_time_seconds(from_building_id, candidate_id)
+            if seconds is not None:
+                reachable.append((candidate_id, seconds))
+        reachable.sort(key=lambda item: item[1])
+        return reachable[:limit]
+
+
+def read_index(directory: str = TRAVEL_MATRIX_DIR) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, INDEX_FILE), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log.warning(f"{LogColors.WARNING}Could not read travel matrix index in {directory}: {e}{LogColors.ENDC}")
+        return None
+    if index.get('format') != MATRIX_FORMAT_VERSION:
+        return None
+    return index
+
+
+def _write_index(directory: str, index: Dict[str, Any]):
+    tmp_path = os.path.join(directory, f"{INDEX_FILE}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(directory, INDEX_FILE))
+
+
+_matrix: Optional[TravelMatrix] = None
+_matrix_index_mtime: Optional[float] = None
+_matrix_lock = threading.Lock()
+
+
+def get_travel_matrix() -> Optional[TravelMatrix]:
+    """The matrix on disk (reopened when the build job rewrites it), or None if it was never built."""
+    global _matrix, _matrix_index_mtime
+    try:
+        index_mtime = os.path.getmtime(os.path.join(TRAVEL_MATRIX_DIR, INDEX_FILE))
+    except OSError:
+        return None
+    if _matrix is not None and _matrix_index_mtime == index_mtime:
+        return _matrix
+    with _matrix_lock:
+        if _matrix is None or _matrix_index_mtime != index_mtime:
+            # The previous mapping is left for the garbage collector: other threads may still use it
+            _matrix = TravelMatrix.open(TRAVEL_MATRIX_DIR)
+            _matrix_index_mtime = index_mtime
+        return _matrix
+
+
+def get_travel_time_seconds(from_building_id: str, to_building_id: str) -> Optional[float]:
+    """O(1) travel time between two buildings, or None when the matrix cannot answer."""
+    matrix = get_travel_matrix()
+    return matrix.travel_time_seconds(from_building_id, to_building_id) if matrix else None
+
+
+def update_travel_matrix(buildings: List[Dict], full_rebuild: bool = False, directory: str = TRAVEL_MATRIX_DIR) -> Dict[str, int]:
+    """
+    Brings the matrix on disk in line with `buildings` (Airtable building records).
+    Returns counters: {'buildings', 'computed', 'removed', 'capacity'}.
+    """
+    network = get_navigation_network()
+    if network is None:
+        raise RuntimeError("Navigation data is not available; cannot build the travel matrix.")
+
+    positions: Dict[str, Dict[str, float]] = {}
+    for building in buildings:
+        building_id = building['fields'].get('BuildingId')
+        position = _get_building_position_coords(building)
+        if building_id and position:
+            positions[building_id] = {'lat': float(position['lat']), 'lng': float(position['lng'])}
+
+    os.makedirs(directory, exist_ok=True)
+    existing = None if full_rebuild else TravelMatrix.open(directory, writable=True)
+    if existing is not None and existing.network_version != network.version:
+        log.info(f"{LogColors.OKBLUE}Navigation data changed since the travel matrix was built; rebuilding it.{LogColors.ENDC}")
+        existing.close()
+        existing = None
+
+    slots: List[Optional[Dict[str, Any]]] = list(existing.index['buildings']) if existing else []
+    removed = 0
+    dirty: List[int] = []
+    for slot, entry in enumerate(slots):
+        if not entry:
+            continue
+        position = positions.get(entry['id'])
+        if position is None:
+            slots[slot] = None
+            removed += 1
+        elif (position['lat'], position['lng']) != (entry['lat'], entry['lng']):
+            slots[slot] = {'id': entry['id'], **position}
+            dirty.append(slot)
+
+    known_ids = {entry['id'] for entry in slots if entry}
+    free_slots = [slot for slot, entry in enumerate(slots) if entry is None]
+    for building_id, position in positions.items():
+        if building_id in known_ids:
+            continue
+        entry = {'id': building_id, **position}
+        if free_slots:
+            slot = free_slots.pop(0)
+            slots[slot] = entry
+        else:
+            slot = len(slots)
+            slots.append(entry)
+        dirty.append(slot)
+
+    capacity = existing.index['capacity'] if existing else 0
+    times_path = os.path.join(directory, TIMES_FILE)
+    distances_path = os.path.join(directory, DISTANCES_FILE)
+    if existing is None or len(slots) > capacity:
+        capacity = len(slots) + CAPACITY_HEADROOM
+        log.info(f"{LogColors.OKBLUE}Allocating travel matrix for {capacity} buildings.{LogColors.ENDC}")
+        times = Float32Matrix.create(times_path, capacity, existing.times if existing else None)
+        distances = Float32Matrix.create(distances_path, capacity, existing.distances if existing else None)
+    else:
+        times, distances = existing.times, existing.distances
+
+    # Slots freed or reassigned since the last run must not keep stale values
+    for slot, entry in enumerate(slots):
+        if entry is None or slot in dirty:
+            times.clear(slot)
+            distances.clear(slot)
+
+    live_slots = [slot for slot, entry in enumerate(slots) if entry]
+    attachments = {slot: network.attach(slots[slot]) for slot in live_slots}
+    start = time.time()
+    for done, source_slot in enumerate(dirty, 1):
+        origin = attachments[source_slot]
+        node_costs = network.costs_from(origin)
+        for target_slot in live_slots:
+            if target_slot == source_slot:
+                seconds, meters = 0.0, 0.0
+            else:
+                cost = network.cost_to(origin, node_costs, attachments[target_slot])
+                if cost is None:
+                    continue
+                seconds, meters = cost
+            times.set(source_slot, target_slot, seconds)
+            times.set(target_slot, source_slot, seconds)
+            distances.set(source_slot, target_slot, meters)
+            distances.set(target_slot, source_slot, meters)
+        if done % 100 == 0:
+            log.info(f"{LogColors.OKBLUE}Travel matrix: computed {done}/{len(dirty)} buildings ({time.time() - start:.1f}s).{LogColors.ENDC}")
+
+    times.flush()
+    distances.flush()
+    times.close()
+    distances.close()
+    _write_index(directory, {
+        'format': MATRIX_FORMAT_VERSION,
+        'networkVersion': network.version,
+        'capacity': capacity,
+        'builtAt': time.time(),
+        'buildings': slots,
+    })
+    return {'buildings': len(live_slots), 'computed': len(dirty), 'removed': removed, 'capacity': capacity}
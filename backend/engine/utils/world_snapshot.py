@@ -0,0 +1,426 @@
+"""
+Tick-scoped in-memory snapshot of the world for La Serenissima.
+
+Loads CITIZENS, BUILDINGS, RESOURCES, CONTRACTS and the non-terminal ACTIVITIES
+once with bulk `.all()` calls and indexes them, so the lookup helpers in
+activity_helpers can answer from memory instead of issuing one Airtable
+`formula=` query per call.
+
+Usage:
+    snapshot = WorldSnapshot.load(tables)
+    with snapshot.activate():
+        ...  # get_citizen_home(), get_building_record(), ... read from the snapshot
+
+Helpers also accept an explicit `snapshot=` argument. Lookups without a dedicated index can
+use `snapshot.query(table_key, formula)`, which evaluates the Airtable formula in-process.
+
+Citizens' Ducats, resource stock and contract amounts change during the tick. Writes made
+through `snapshot.track_writes(tables)` are applied to the snapshot's copy as well (fields are
+merged into the record, created records are added, deleted ones removed, and only the index
+entries of the written record are moved), so later lookups in the same tick see them:
+
+    tables = snapshot.track_writes(tables)
+"""
+
+import logging
+import threading
+import contextvars
+import time
+from contextlib import contextmanager
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Iterable, Iterator, Tuple
+
+from pyairtable import Table
+
+from backend.engine.utils.airtable_formula import compile_predicate, filter_records
+from backend.engine.utils.spatial_index import BuildingSpatialIndex
+
+log = logging.getLogger(__name__)
+
+# Tables loaded by default and the formula used to restrict each of them.
+DEFAULT_SNAPSHOT_TABLES = ('citizens', 'buildings', 'resources', 'contracts', 'activities')
+SNAPSHOT_TABLE_FORMULAS = {
+    'activities': "NOT(OR({Status} = 'processed', {Status} = 'failed'))",
+}
+# Fields the indexes are keyed on: writes changing them move the record between index buckets.
+INDEXED_FIELDS = {
+    'citizens': {'Username', 'CitizenId'},
+    'buildings': {'BuildingId', 'Occupant', 'RunBy', 'Type', 'Category'},
+    'resources': {'Asset', 'AssetType', 'Owner', 'Type'},
+    'contracts': {'ContractId'},
+    'activities': {'Citizen'},
+}
+
+_active_snapshot: contextvars.ContextVar[Optional['WorldSnapshot']] = contextvars.ContextVar(
+    'serenissima_active_world_snapshot', default=None
+)
+
+
+def get_active_snapshot() -> Optional['WorldSnapshot']:
+    """Returns the snapshot activated for the current context, if any."""
+    return _active_snapshot.get()
+
+
+class WorldSnapshot:
+    """
+    Read-only, indexed copy of the world state for one tick.
+    Records keep the Airtable shape ({'id': ..., 'fields': {...}}) so callers can use them unchanged.
+    """
+
+    def __init__(self, records_by_table: Dict[str, List[Dict]], loaded_at: Optional[float] = None):
+        self.records_by_table = records_by_table
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+        self._write_lock = threading.RLock()
+        self._records_by_id: Dict[str, Dict[str, Dict]] = {
+            table_key: {record['id']: record for record in records} for table_key, records in records_by_table.items()
+        }
+        self._build_indexes()
+        self._building_spatial_index: Optional[BuildingSpatialIndex] = None
+        self._spatial_index_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, tables: Dict[str, Table], include: Iterable[str] = DEFAULT_SNAPSHOT_TABLES) -> 'WorldSnapshot':
+        """Bulk-fetches the requested tables (one paginated `.all()` each) and indexes them."""
+        from backend.engine.utils.activity_helpers import LogColors
+
+        start = time.time()
+        records_by_table: Dict[str, List[Dict]] = {}
+        for table_key in include:
+            if table_key not in tables or tables[table_key] is None:
+                log.warning(f"{LogColors.WARNING}WorldSnapshot: table '{table_key}' not available, skipping.{LogColors.ENDC}")
+                continue
+            formula = SNAPSHOT_TABLE_FORMULAS.get(table_key)
+            records_by_table[table_key] = tables[table_key].all(formula=formula) if formula else tables[table_key].all()
+
+        snapshot = cls(records_by_table, loaded_at=start)
+        counts = ", ".join(f"{k}={len(v)}" for k, v in records_by_table.items())
+        log.info(f"{LogColors.OKGREEN}WorldSnapshot loaded in {time.time() - start:.2f}s ({counts}).{LogColors.ENDC}")
+        return snapshot
+
+    def has_table(self, table_key: str) -> bool:
+        return table_key in self.records_by_table
+
+    @contextmanager
+    def activate(self) -> Iterator['WorldSnapshot']:
+        """Makes this snapshot the default for activity_helpers lookups within the block."""
+        token = _active_snapshot.set(self)
+        try:
+            yield self
+        finally:
+            _active_snapshot.reset(token)
+
+    # --- Indexes ---
+
+    def _build_indexes(self, table_keys: Optional[Iterable[str]] = None):
+        for table_key in (table_keys if table_keys is not None else INDEXED_FIELDS):
+            getattr(self, f"_index_{table_key}")(self.records_by_table.get(table_key, []))
+        if table_keys is None or 'buildings' in table_keys:
+            self._building_spatial_index = None
+
+    def _index_citizens(self, records: List[Dict]):
+        by_username: Dict[str, Dict] = {}
+        by_username_lower: Dict[str, Dict] = {}
+        by_citizen_id: Dict[str, Dict] = {}
+        by_record_id: Dict[str, Dict] = {}
+        for record in records:
+            fields = record['fields']
+            by_record_id[record['id']] = record
+            username = fields.get('Username')
+            if username:
+                by_username[username] = record
+                by_username_lower.setdefault(username.lower(), record)
+            citizen_id = fields.get('CitizenId')
+            if citizen_id:
+                by_citizen_id[citizen_id] = record
+        # Assigned at the end so concurrent readers see either the old or the new indexes
+        self.citizens_by_username, self.citizens_by_username_lower = by_username, by_username_lower
+        self.citizens_by_citizen_id, self.citizens_by_record_id = by_citizen_id, by_record_id
+
+    def _index_buildings(self, records: List[Dict]):
+        by_id: Dict[str, Dict] = {}
+        by_occupant: Dict[str, List[Dict]] = defaultdict(list)
+        by_run_by: Dict[str, List[Dict]] = defaultdict(list)
+        by_type: Dict[str, List[Dict]] = defaultdict(list)
+        for record in records:
+            fields = record['fields']
+            if fields.get('BuildingId'):
+                by_id[fields['BuildingId']] = record
+            if fields.get('Occupant'):
+                by_occupant[fields['Occupant']].append(record)
+            if fields.get('RunBy'):
+                by_run_by[fields['RunBy']].append(record)
+            if fields.get('Type'):
+                by_type[fields['Type']].append(record)
+        self.buildings_by_id, self.buildings_by_occupant = by_id, by_occupant
+        self.buildings_by_run_by, self.buildings_by_type = by_run_by, by_type
+
+    def _index_resources(self, records: List[Dict]):
+        # Resources keyed by (Asset, AssetType) and by the full (Asset, AssetType, Owner, Type) key.
+        by_asset: Dict[Tuple[str, str], List[Dict]] = defaultdict(list)
+        by_key: Dict[Tuple[str, str, str, str], List[Dict]] = defaultdict(list)
+        for record in records:
+            fields = record['fields']
+            asset_key = (fields.get('Asset'), fields.get('AssetType'))
+            by_asset[asset_key].append(record)
+            by_key[asset_key + (fields.get('Owner'), fields.get('Type'))].append(record)
+        self.resources_by_asset, self.resources_by_key = by_asset, by_key
+
+    def _index_contracts(self, records: List[Dict]):
+        self.contracts_by_id = {record['fields']['ContractId']: record for record in records if record['fields'].get('ContractId')}
+
+    def _index_activities(self, records: List[Dict]):
+        by_citizen: Dict[str, List[Dict]] = defaultdict(list)
+        for record in records:
+            if record['fields'].get('Citizen'):
+                by_citizen[record['fields']['Citizen']].append(record)
+        self.activities_by_citizen = by_citizen
+
+    @staticmethod
+    def _index_entries(table_key: str, record_id: str, fields: Dict) -> List[Tuple[str, object, str]]:
+        """
+        (index attribute, key, kind) of every index entry of a record, mirroring the _index_* builders.
+        kind is 'list' for bucket indexes, 'last' or 'first' for unique ones (which duplicate wins).
+        """
+        entries: List[Tuple[str, object, str]] = []
+        if table_key == 'citizens':
+            entries.append(('citizens_by_record_id', record_id, 'last'))
+            if fields.get('Username'):
+                entries.append(('citizens_by_username', fields['Username'], 'last'))
+                entries.append(('citizens_by_username_lower', fields['Username'].lower(), 'first'))
+            if fields.get('CitizenId'):
+                entries.append(('citizens_by_citizen_id', fields['CitizenId'], 'last'))
+        elif table_key == 'buildings':
+            if fields.get('BuildingId'):
+                entries.append(('buildings_by_id', fields['BuildingId'], 'last'))
+            for attr, field_name in (('buildings_by_occupant', 'Occupant'), ('buildings_by_run_by', 'RunBy'), ('buildings_by_type', 'Type')):
+                if fields.get(field_name):
+                    entries.append((attr, fields[field_name], 'list'))
+        elif table_key == 'resources':
+            asset_key = (fields.get('Asset'), fields.get('AssetType'))
+            entries.append(('resources_by_asset', asset_key, 'list'))
+            entries.append(('resources_by_key', asset_key + (fields.get('Owner'), fields.get('Type')), 'list'))
+        elif table_key == 'contracts':
+            if fields.get('ContractId'):
+                entries.append(('contracts_by_id', fields['ContractId'], 'last'))
+        elif table_key == 'activities':
+            if fields.get('Citizen'):
+                entries.append(('activities_by_citizen', fields['Citizen'], 'list'))
+        return entries
+
+    def _add_index_entries(self, record: Dict, entries: Iterable[Tuple[str, object, str]]):
+        for attr, key, kind in entries:
+            index = getattr(self, attr)
+            if kind == 'list':
+                # A new bucket list, so readers iterating the old one are not affected
+                index[key] = index.get(key, []) + [record]
+            elif kind == 'first':
+                index.setdefault(key, record)
+            else:
+                index[key] = record
+
+    def _remove_index_entries(self, table_key: str, record: Dict, entries: Iterable[Tuple[str, object, str]]):
+        for attr, key, kind in entries:
+            index = getattr(self, attr)
+            if kind == 'list':
+                bucket = [r for r in index.get(key, []) if r is not record]
+                if bucket:
+                    index[key] = bucket
+                else:
+                    index.pop(key, None)
+            elif index.get(key) is record:
+                del index[key]
+                # Unique keys are unique in practice; if another record shares it, it takes over
+                candidates = [
+                    r for r in self.records_by_table.get(table_key, [])
+                    if r is not record and (attr, key, kind) in self._index_entries(table_key, r['id'], r['fields'])
+                ]
+                if candidates:
+                    index[key] = candidates[0] if kind == 'first' else candidates[-1]
+
+    # --- Writes made during the tick ---
+
+    def _belongs_in_snapshot(self, table_key: str, record: Dict) -> bool:
+        formula = SNAPSHOT_TABLE_FORMULAS.get(table_key)
+        return not formula or compile_predicate(formula)(record)
+
+    def apply_update(self, table_key: str, record_id: str, fields: Dict, replace: bool = False):
+        """Merges written fields into the snapshot's record (or replaces them with `replace`)."""
+        with self._write_lock:
+            record = self._records_by_id.get(table_key, {}).get(record_id)
+            if record is None:
+                return
+            old_fields = record['fields']
+            new_fields = dict(fields) if replace else {**old_fields, **fields}
+            record['fields'] = new_fields
+            if not self._belongs_in_snapshot(table_key, record):
+                self._remove(table_key, record_id, indexed_fields=old_fields)
+                return
+            indexed = INDEXED_FIELDS.get(table_key, set())
+            if any(old_fields.get(name) != new_fields.get(name) for name in indexed):
+                old_entries = self._index_entries(table_key, record_id, old_fields)
+                new_entries = self._index_entries(table_key, record_id, new_fields)
+                self._remove_index_entries(table_key, record, [e for e in old_entries if e not in new_entries])
+                self._add_index_entries(record, [e for e in new_entries if e not in old_entries])
+                if table_key == 'buildings':
+                    self._building_spatial_index = None
+
+    def apply_create(self, table_key: str, record: Optional[Dict]):
+        if not record or table_key not in self.records_by_table:
+            return
+        with self._write_lock:
+            if not self._belongs_in_snapshot(table_key, record):
+                return
+            record = {'id': record['id'], 'fields': dict(record.get('fields', {}))}
+            self.records_by_table[table_key].append(record)
+            self._records_by_id[table_key][record['id']] = record
+            self._add_index_entries(record, self._index_entries(table_key, record['id'], record['fields']))
+            if table_key == 'buildings':
+                self._building_spatial_index = None
+
+    def apply_delete(self, table_key: str, record_id: str):
+        with self._write_lock:
+            self._remove(table_key, record_id)
+
+    def _remove(self, table_key: str, record_id: str, indexed_fields: Optional[Dict] = None):
+        """Drops a record; `indexed_fields` are the fields it was indexed under, if they were just overwritten."""
+        record = self._records_by_id.get(table_key, {}).pop(record_id, None)
+        if record is None:
+            return
+        records = self.records_by_table[table_key]
+        position = next((i for i, r in enumerate(records) if r is record), None)
+        if position is not None:
+            # Sliced into a new list rather than deleted in place, so concurrent queries don't skip records
+            self.records_by_table[table_key] = records[:position] + records[position + 1:]
+        fields = indexed_fields if indexed_fields is not None else record['fields']
+        self._remove_index_entries(table_key, record, self._index_entries(table_key, record_id, fields))
+        if table_key == 'buildings':
+            self._building_spatial_index = None
+
+    def track_writes(self, tables: Dict[str, Table]) -> Dict[str, Table]:
+        """`tables` with the snapshot's tables wrapped so that their writes also patch the snapshot."""
+        return {
+            key: SnapshotTrackingTable(key, table, self) if key in self.records_by_table and table is not None else table
+            for key, table in tables.items()
+        }
+
+    # --- Lookups ---
+
+    def get_citizen(self, identifier: str) -> Optional[Dict]:
+        """Resolves a citizen by Username, then case-insensitive Username, then CitizenId."""
+        if not identifier:
+            return None
+        return (self.citizens_by_username.get(identifier)
+                or self.citizens_by_username_lower.get(identifier.lower())
+                or self.citizens_by_citizen_id.get(identifier))
+
+    def get_building(self, building_id: str) -> Optional[Dict]:
+        return self.buildings_by_id.get(building_id)
+
+    def get_contract(self, contract_id: str) -> Optional[Dict]:
+        return self.contracts_by_id.get(contract_id)
+
+    def get_buildings_occupied_by(self, username: str, category: Optional[str] = None) -> List[Dict]:
+        buildings = self.buildings_by_occupant.get(username, [])
+        if category is None:
+            return list(buildings)
+        return [b for b in buildings if b['fields'].get('Category') == category]
+
+    def get_buildings_run_by(self, username: str, category: Optional[str] = None) -> List[Dict]:
+        buildings = self.buildings_by_run_by.get(username, [])
+        if category is None:
+            return list(buildings)
+        return [b for b in buildings if b['fields'].get('Category') == category]
+
+    def get_buildings_of_type(self, building_type: str) -> List[Dict]:
+        return list(self.buildings_by_type.get(building_type, []))
+
+    def building_spatial_index(self, position_fn: Callable[[Dict], Optional[Dict[str, float]]],
+                               distance_fn: Optional[Callable[[float, float, float, float], float]] = None) -> BuildingSpatialIndex:
+        """Grid index over the snapshot's buildings (by Type and SubCategory), built on first use."""
+        if self._building_spatial_index is None:
+            with self._spatial_index_lock:
+                if self._building_spatial_index is None:
+                    self._building_spatial_index = BuildingSpatialIndex(
+                        self.records_by_table.get('buildings', []), position_fn, distance_fn
+                    )
+        return self._building_spatial_index
+
+    def get_resources(
+        self,
+        asset_id: str,
+        asset_type: str,
+        owner: Optional[str] = None,
+        resource_type: Optional[str] = None
+    ) -> List[Dict]:
+        """Returns resource records held by an asset, optionally filtered by Owner and Type."""
+        if owner is not None and resource_type is not None:
+            return list(self.resources_by_key.get((asset_id, asset_type, owner, resource_type), []))
+        records = self.resources_by_asset.get((asset_id, asset_type), [])
+        return [
+            r for r in records
+            if (owner is None or r['fields'].get('Owner') == owner)
+            and (resource_type is None or r['fields'].get('Type') == resource_type)
+        ]
+
+    def get_active_activities(self, citizen_username: str) -> List[Dict]:
+        """Activities for the citizen that were not in a terminal state when the snapshot was loaded."""
+        return list(self.activities_by_citizen.get(citizen_username, []))
+
+    def all_records(self, table_key: str) -> List[Dict]:
+        return list(self.records_by_table.get(table_key, []))
+
+    def query(self, table_key: str, formula: Optional[str] = None, max_records: Optional[int] = None) -> List[Dict]:
+        """
+        Evaluates an Airtable formula against the snapshot copy of a table, e.g.
+        snapshot.query('resources', "AND({Asset}='bld_1', {AssetType}='building', {Count}>0)").
+        Raises KeyError if the table was not loaded, so callers can fall back to the API.
+        """
+        if table_key not in self.records_by_table:
+            raise KeyError(f"Table '{table_key}' is not part of this snapshot")
+        return filter_records(self.records_by_table[table_key], formula, max_records=max_records)
+
+
+class SnapshotTrackingTable:
+    """Proxy for a pyairtable Table that applies its successful writes to a WorldSnapshot."""
+
+    def __init__(self, table_key: str, table: Table, snapshot: WorldSnapshot):
+        self.table_key = table_key
+        self.table = table
+        self._snapshot = snapshot
+
+    def __getattr__(self, name: str):
+        # Reads and anything not overridden here go to the real table
+        return getattr(self.table, name)
+
+    def create(self, fields: Dict, typecast: bool = False) -> Dict:
+        record = self.table.create(fields, typecast=typecast)
+        self._snapshot.apply_create(self.table_key, record)
+        return record
+
+    def batch_create(self, records: List[Dict], typecast: bool = False) -> List[Dict]:
+        created = self.table.batch_create(records, typecast=typecast)
+        for record in created:
+            self._snapshot.apply_create(self.table_key, record)
+        return created
+
+    def update(self, record_id: str, fields: Dict, replace: bool = False, typecast: bool = False) -> Dict:
+        record = self.table.update(record_id, fields, replace=replace, typecast=typecast)
+        self._snapshot.apply_update(self.table_key, record_id, fields, replace=replace)
+        return record
+
+    def batch_update(self, records: List[Dict], replace: bool = False, typecast: bool = False) -> List[Dict]:
+        updated = self.table.batch_update(records, replace=replace, typecast=typecast)
+        for record in records:
+            self._snapshot.apply_update(self.table_key, record['id'], record['fields'], replace=replace)
+        return updated
+
+    def delete(self, record_id: str) -> Dict:
+        result = self.table.delete(record_id)
+        self._snapshot.apply_delete(self.table_key, record_id)
+        return result
+
+    def batch_delete(self, record_ids: List[str]) -> List[Dict]:
+        results = self.table.batch_delete(record_ids)
+        for record_id in record_ids:
+            self._snapshot.apply_delete(self.table_key, record_id)
+        return results
@@ -0,0 +1,351 @@
+"""
+Write-behind mutation buffer for La Serenissima processors.
+
+Collects creates/updates/deletes per table instead of sending one Airtable request per call,
+merges repeated updates to the same record (e.g. several Count changes on one resource) and
+flushes everything through batch_create/batch_update/batch_delete in chunks of 10.
+
+Usage:
+    buffer = MutationBuffer(tables)
+    process(buffer.tables, ...)   # same Table API: all/first/get/create/update/delete/batch_*
+    buffer.flush()
+
+Reads through the buffered tables see the pending writes: pending updates are merged into the
+returned records and pending deletes are filtered out. Pending creates of a table are flushed
+before that table is read, so a record created by one activity is visible to the next one.
+The `formula` of a read is evaluated again on the overlaid records, so records a pending update
+moved out of the filter are dropped and records it moved into the filter are added.
+
+`flush()` sends the activities table last. If any other write fails, or would reference a
+record whose create failed, the activities writes are dropped and FlushError is raised, so
+the caller doesn't mark activities processed whose effects were not written.
+"""
+
+import logging
+import threading
+import uuid
+from typing import Dict, List, Optional, Any, Iterable
+
+from pyairtable import Table
+
+from backend.engine.utils.airtable_formula import FormulaError, compile_predicate
+
+log = logging.getLogger(__name__)
+
+AIRTABLE_BATCH_SIZE = 10
+PENDING_RECORD_ID_PREFIX = "pending-"
+
+# Citizens, resources and contracts are written through: Ducats, stock counts and contract
+# amounts are read-modify-written by many citizen threads at once, and delaying those writes
+# would let other threads read stale values and overwrite each other's changes.
+DEFAULT_BUFFERED_TABLES = ('transactions', 'activities', 'notifications', 'problems')
+# Flushed after every other table, and only if their writes succeeded
+FLUSH_LAST_TABLES = ('activities',)
+RECORD_IDS_PER_QUERY = 50
+
+
+class FlushError(Exception):
+    """Raised by MutationBuffer.flush() when some writes failed; `failures` describes them."""
+
+    def __init__(self, failures: List[str], dropped: int):
+        super().__init__(f"{len(failures)} buffered write failures ({dropped} dependent writes dropped): {'; '.join(failures[:5])}")
+        self.failures = failures
+        self.dropped = dropped
+
+
+def _chunks(items: List[Any], size: int = AIRTABLE_BATCH_SIZE) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class BufferedTable:
+    """Proxy for a pyairtable Table whose writes are queued in a MutationBuffer."""
+
+    def __init__(self, table_key: str, table: Table, buffer: 'MutationBuffer'):
+        self.table_key = table_key
+        self.table = table
+        self._buffer = buffer
+
+    def __getattr__(self, name: str) -> Any:
+        # Anything not overridden here (name, base_id, iterate, ...) goes to the real table
+        return getattr(self.table, name)
+
+    # --- Reads ---
+
+    def all(self, **options) -> List[Dict]:
+        self._buffer.flush_creates(self.table_key)
+        records = self._buffer.overlay(self.table_key, self.table.all(**options))
+        formula = options.get('formula')
+        if formula:
+            records = self._buffer.refilter(self.table_key, self.table, formula, records)
+        return records
+
+    def first(self, **options) -> Optional[Dict]:
+        options['max_records'] = 1
+        records = self.all(**options)
+        return records[0] if records else None
+
+    def get(self, record_id: str, **options) -> Optional[Dict]:
+        self._buffer.flush_creates(self.table_key)
+        record_id = self._buffer.resolve_id(record_id)
+        overlaid = self._buffer.overlay(self.table_key, [self.table.get(record_id, **options)])
+        return overlaid[0] if overlaid else None
+
+    # --- Writes ---
+
+    def create(self, fields: Dict[str, Any], typecast: bool = False) -> Dict:
+        return self._buffer.queue_create(self.table_key, fields)
+
+    def batch_create(self, records: List[Dict[str, Any]], typecast: bool = False) -> List[Dict]:
+        return [self._buffer.queue_create(self.table_key, fields) for fields in records]
+
+    def update(self, record_id: str, fields: Dict[str, Any], replace: bool = False, typecast: bool = False) -> Dict:
+        if replace:
+            # Replacing clears unspecified fields, which cannot be merged with other updates
+            self._buffer.flush_table(self.table_key)
+            return self.table.update(self._buffer.resolve_id(record_id), fields, replace=True, typecast=typecast)
+        return self._buffer.queue_update(self.table_key, record_id, fields)
+
+    def batch_update(self, records: List[Dict[str, Any]], replace: bool = False, typecast: bool = False) -> List[Dict]:
+        return [self.update(r['id'], r['fields'], replace=replace, typecast=typecast) for r in records]
+
+    def delete(self, record_id: str) -> Dict:
+        return self._buffer.queue_delete(self.table_key, record_id)
+
+    def batch_delete(self, record_ids: List[str]) -> List[Dict]:
+        return [self._buffer.queue_delete(self.table_key, record_id) for record_id in record_ids]
+
+
+class MutationBuffer:
+    """
+    Unit of work over the `tables` dict. Not shared between threads: each citizen batch owns one.
+    """
+
+    def __init__(self, tables: Dict[str, Table], buffered_table_keys: Iterable[str] = DEFAULT_BUFFERED_TABLES):
+        self._raw_tables = tables
+        self._lock = threading.RLock()
+        self._pending_creates: Dict[str, Dict[str, Dict[str, Any]]] = {}  # table -> placeholder id -> fields (insertion ordered)
+        self._pending_updates: Dict[str, Dict[str, Dict[str, Any]]] = {}  # table -> record id -> merged fields
+        self._pending_deletes: Dict[str, Dict[str, None]] = {}            # table -> record ids (ordered set)
+        self._resolved_ids: Dict[str, str] = {}                           # placeholder id -> real record id
+        self.failures: List[str] = []
+        self.api_calls_saved = 0
+
+        buffered_keys = set(buffered_table_keys)
+        self.tables: Dict[str, Any] = {
+            key: BufferedTable(key, table, self) if key in buffered_keys and table is not None else table
+            for key, table in tables.items()
+        }
+
+    # --- Queueing ---
+
+    def resolve_id(self, record_id: str) -> str:
+        return self._resolved_ids.get(record_id, record_id)
+
+    def queue_create(self, table_key: str, fields: Dict[str, Any]) -> Dict:
+        with self._lock:
+            placeholder_id = f"{PENDING_RECORD_ID_PREFIX}{uuid.uuid4().hex[:12]}"
+            self._pending_creates.setdefault(table_key, {})[placeholder_id] = dict(fields)
+            return {'id': placeholder_id, 'fields': dict(fields)}
+
+    def queue_update(self, table_key: str, record_id: str, fields: Dict[str, Any]) -> Dict:
+        with self._lock:
+            record_id = self.resolve_id(record_id)
+            pending_creates = self._pending_creates.get(table_key, {})
+            if record_id in pending_creates:
+                # Fold into the not-yet-sent create
+                pending_creates[record_id].update(fields)
+                self.api_calls_saved += 1
+                return {'id': record_id, 'fields': dict(pending_creates[record_id])}
+
+            table_updates = self._pending_updates.setdefault(table_key, {})
+            if record_id in table_updates:
+                self.api_calls_saved += 1
+            table_updates.setdefault(record_id, {}).update(fields)
+            return {'id': record_id, 'fields': dict(table_updates[record_id])}
+
+    def queue_delete(self, table_key: str, record_id: str) -> Dict:
+        with self._lock:
+            record_id = self.resolve_id(record_id)
+            pending_creates = self._pending_creates.get(table_key, {})
+            if record_id in pending_creates:
+                # Created and deleted within the same unit of work: neither call is needed
+                del pending_creates[record_id]
+                self.api_calls_saved += 2
+                return {'id': record_id, 'deleted': True}
+
+            if self._pending_updates.get(table_key, {}).pop(record_id, None) is not None:
+                self.api_calls_saved += 1
+            self._pending_deletes.setdefault(table_key, {})[record_id] = None
+            return {'id': record_id, 'deleted': True}
+
+    def overlay(self, table_key: str, records: List[Optional[Dict]]) -> List[Dict]:
+        """Applies pending updates and deletes to records read from Airtable."""
+        with self._lock:
+            table_updates = self._pending_updates.get(table_key, {})
+            table_deletes = self._pending_deletes.get(table_key, {})
+            if not table_updates and not table_deletes:
+                return [r for r in records if r]
+            overlaid = []
+            for record in records:
+                if not record or record['id'] in table_deletes:
+                    continue
+                if record['id'] in table_updates:
+                    record = {**record, 'fields': {**record.get('fields', {}), **table_updates[record['id']]}}
+                overlaid.append(record)
+            return overlaid
+
+    def refilter(self, table_key: str, table: Table, formula: str, records: List[Dict]) -> List[Dict]:
+        """
+        Airtable evaluated `formula` without the pending updates: evaluates it again on the overlaid
+        records, and fetches the pending-updated records it didn't return to check if they match now.
+        """
+        with self._lock:
+            updated_ids = [rid for rid in self._pending_updates.get(table_key, {})
+                           if not rid.startswith(PENDING_RECORD_ID_PREFIX)]
+        if not updated_ids:
+            return records
+        try:
+            predicate = compile_predicate(formula)
+        except FormulaError:
+            return records  # Not evaluable in-process: keep Airtable's answer
+        returned_ids = {record['id'] for record in records}
+        missing_ids = [rid for rid in updated_ids if rid not in returned_ids]
+        for chunk in _chunks(missing_ids, RECORD_IDS_PER_QUERY):
+            ids_formula = "OR(" + ", ".join(f"RECORD_ID()='{rid}'" for rid in chunk) + ")"
+            records = records + self.overlay(table_key, table.all(formula=ids_formula))
+        return [record for record in records if predicate(record)]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return (sum(len(v) for v in self._pending_creates.values())
+                    + sum(len(v) for v in self._pending_updates.values())
+                    + sum(len(v) for v in self._pending_deletes.values()))
+
+    # --- Flushing ---
+
+    def _resolve_value(self, value: Any) -> Any:
+        """Replaces placeholder ids in a field value (linked record fields) by the created records' ids."""
+        if isinstance(value, str) and value.startswith(PENDING_RECORD_ID_PREFIX):
+            return self._resolved_ids.get(value, value)
+        if isinstance(value, list):
+            return [self._resolve_value(v) for v in value]
+        return value
+
+    def _resolve_fields(self, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Fields with placeholder ids resolved; None if one of them refers to a record that was not created."""
+        resolved = {name: self._resolve_value(value) for name, value in fields.items()}
+        for value in resolved.values():
+            for item in (value if isinstance(value, list) else [value]):
+                if isinstance(item, str) and item.startswith(PENDING_RECORD_ID_PREFIX):
+                    return None
+        return resolved
+
+    def _fail(self, message: str):
+        self.failures.append(message)
+        log.error(message)
+
+    def flush_creates(self, table_key: str, only_resolvable: bool = False) -> int:
+        """
+        Sends the pending creates of a table. With `only_resolvable`, creates linking to a record
+        that is still pending are kept for a later call. Returns how many records were sent.
+        """
+        with self._lock:
+            pending = self._pending_creates.pop(table_key, {})
+            if not pending:
+                return 0
+            table = self._raw_tables[table_key]
+            to_create = []
+            for pid, fields in pending.items():
+                resolved = self._resolve_fields(fields)
+                if resolved is not None:
+                    to_create.append((pid, resolved))
+                elif only_resolvable:
+                    self._pending_creates.setdefault(table_key, {})[pid] = fields
+                else:
+                    self._fail(f"Not creating a record in '{table_key}': it links to a record whose create failed")
+            for chunk in _chunks(to_create):
+                try:
+                    created = table.batch_create([fields for _, fields in chunk])
+                    for (pid, _), record in zip(chunk, created):
+                        self._resolved_ids[pid] = record['id']
+                except Exception as e:
+                    self._fail(f"Error batch-creating {len(chunk)} records in '{table_key}': {e}")
+            return len(to_create)
+
+    def _flush_all_creates(self, table_keys: List[str]):
+        """Creates records across tables so that records linked to by others are created first."""
+        while any(self.flush_creates(table_key, only_resolvable=True) for table_key in table_keys):
+            pass
+
+    def _resolved_record_id(self, table_key: str, record_id: str, action: str) -> Optional[str]:
+        record_id = self.resolve_id(record_id)
+        if record_id.startswith(PENDING_RECORD_ID_PREFIX):
+            # Its create failed: never send the placeholder to Airtable
+            self._fail(f"Not {action} record {record_id} in '{table_key}': its create failed")
+            return None
+        return record_id
+
+    def flush_table(self, table_key: str):
+        """Sends every pending write for one table: creates, then updates, then deletes."""
+        with self._lock:
+            self.flush_creates(table_key)
+            table = self._raw_tables[table_key]
+
+            updates = self._pending_updates.pop(table_key, {})
+            update_records = []
+            for rid, fields in updates.items():
+                record_id = self._resolved_record_id(table_key, rid, 'updating')
+                resolved = self._resolve_fields(fields) if record_id else None
+                if record_id and resolved is None:
+                    self._fail(f"Not updating record {record_id} in '{table_key}': it links to a record whose create failed")
+                if record_id and resolved is not None:
+                    update_records.append({'id': record_id, 'fields': resolved})
+            for chunk in _chunks(update_records):
+                try:
+                    table.batch_update(chunk)
+                except Exception as e:
+                    self._fail(f"Error batch-updating {len(chunk)} records in '{table_key}': {e}")
+
+            deletes = self._pending_deletes.pop(table_key, {})
+            delete_ids = [rid for rid in (self._resolved_record_id(table_key, rid, 'deleting') for rid in deletes) if rid]
+            for chunk in _chunks(delete_ids):
+                try:
+                    table.batch_delete(chunk)
+                except Exception as e:
+                    self._fail(f"Error batch-deleting {len(chunk)} records in '{table_key}': {e}")
+
+    def discard_table(self, table_key: str) -> int:
+        """Drops the pending writes of a table without sending them. Returns how many were dropped."""
+        with self._lock:
+            dropped = (len(self._pending_creates.pop(table_key, {})) + len(self._pending_updates.pop(table_key, {}))
+                       + len(self._pending_deletes.pop(table_key, {})))
+            return dropped
+
+    def flush(self, last: Iterable[str] = FLUSH_LAST_TABLES) -> int:
+        """
+        Flushes all tables, the `last` ones after the others. Returns the number of mutations that
+        were pending. If a write failed, the `last` tables' writes are dropped and FlushError is raised.
+        """
+        with self._lock:
+            pending = self.pending_count()
+            if not pending:
+                return 0
+            last = list(last)
+            table_keys = set(self._pending_creates) | set(self._pending_updates) | set(self._pending_deletes)
+            first_keys = sorted(table_keys - set(last))
+            self._flush_all_creates(first_keys)
+            for table_key in first_keys:
+                self.flush_table(table_key)
+            if self.failures:
+                dropped = sum(self.discard_table(table_key) for table_key in last)
+                failures, self.failures = self.failures, []
+                raise FlushError(failures, dropped)
+            for table_key in last:
+                if table_key in table_keys:
+                    self.flush_table(table_key)
+            log.debug(f"MutationBuffer flushed {pending} mutations across {len(table_keys)} tables ({self.api_calls_saved} calls merged away).")
+            if self.failures:
+                failures, self.failures = self.failures, []
+                raise FlushError(failures, 0)
+            return pending
@@ -0,0 +1,177 @@
+// Codec for compact activity paths ("pc1:" strings), the same format as backend/engine/utils/path_codec.py.
+// Paths are written compact when PATH_ENCODING=compact. Server-side only (uses Node's Buffer and zlib).
+import { deflateSync, inflateSync } from 'zlib';
+
+export const COMPACT_PATH_PREFIX = 'pc1:';
+const FORMAT_VERSION = 1;
+const MICRODEGREES = 1_000_000;
+const HEADER_BYTES = 9; // uint8 version, uint32 point count, uint32 string table length
+const ABSENT = 0;
+const NULL_CODE = 1;
+const ENCODABLE_KEYS = new Set(['lat', 'lng', 'type', 'transportMode', 'nodeId', 'polygonId', 'isIntermediatePoint']);
+
+export interface PathPoint {
+  lat: number;
+  lng: number;
+  type?: string | null;
+  transportMode?: string | null;
+  nodeId?: string | null;
+  polygonId?: string | null;
+  isIntermediatePoint?: boolean;
+}
+
+export function isCompactPath(value: unknown): value is string {
+  return typeof value === 'string' && value.startsWith(COMPACT_PATH_PREFIX);
+}
+
+// Same layout as the Python encoder: string codes are 0 = absent, 1 = null, 2 + i = string i
+export function decodeCompactPath(value: string): PathPoint[] {
+  const data = inflateSync(Buffer.from(value.slice(COMPACT_PATH_PREFIX.length), 'base64'));
+  const version = data.readUInt8(0);
+  if (version !== FORMAT_VERSION) {
+    throw new Error(`Unsupported compact path version ${version}`);
+  }
+  const count = data.readUInt32LE(1);
+  const tableLength = data.readUInt32LE(5);
+  let offset = HEADER_BYTES;
+  const table: (string | null)[] = [null, null];
+  if (tableLength > 0) {
+    table.push(...data.toString('utf8', offset, offset + tableLength).split('\0'));
+  }
+  offset += tableLength;
+
+  const coordinatesOffset = offset;
+  const typesOffset = coordinatesOffset + 8 * count;
+  const modesOffset = typesOffset + count;
+  const nodeIdsOffset = modesOffset + count;
+  const polygonIdsOffset = nodeIdsOffset + 2 * count;
+  const flagsOffset = polygonIdsOffset + 2 * count;
+  if (flagsOffset + count !== data.length) {
+    throw new Error('Malformed compact path: unexpected length');
+  }
+
+  const points: PathPoint[] = [];
+  let lat = 0;
+  let lng = 0;
+  for (let i = 0; i < count; i++) {
+    lat += data.readInt32LE(coordinatesOffset + 8 * i);
+    lng += data.readInt32LE(coordinatesOffset + 8 * i + 4);
+    const point: PathPoint = { lat: lat / MICRODEGREES, lng: lng / MICRODEGREES };
+    const typeCode = data.readUInt8(typesOffset + i);
+    const modeCode = data.readUInt8(modesOffset + i);
+    const nodeCode = data.readUInt16LE(nodeIdsOffset + 2 * i);
+    const polygonCode = data.readUInt16LE(polygonIdsOffset + 2 * i);
+    const flag = data.readUInt8(flagsOffset + i);
+    if (typeCode) point.type = table[typeCode];
+    if (modeCode) point.transportMode = table[modeCode];
+    if (nodeCode) point.nodeId = table[nodeCode];
+    if (polygonCode) point.polygonId = table[polygonCode];
+    if (flag) point.isIntermediatePoint = flag === 2;
+    points.push(point);
+  }
+  return points;
+}
+
+// Compact form of a list of path points. Throws for points it can't represent (see path_codec.encode_path)
+export function encodeCompactPath(points: PathPoint[]): string {
+  const strings: string[] = [];
+  const stringCodes = new Map<string, number>();
+  const codeOf = (point: Record<string, unknown>, key: string): number => {
+    const value = point[key];
+    if (value === undefined) return ABSENT;
+    if (value === null) return NULL_CODE;
+    if (typeof value !== 'string') {
+      throw new Error(`Path point field ${key} is not a string: ${JSON.stringify(value)}`);
+    }
+    let code = stringCodes.get(value);
+    if (code === undefined) {
+      code = strings.length + 2;
+      stringCodes.set(value, code);
+      strings.push(value);
+    }
+    return code;
+  };
+
+  const coordinates: number[] = [];
+  const types: number[] = [];
+  const modes: number[] = [];
+  const nodeIds: number[] = [];
+  const polygonIds: number[] = [];
+  const flags: number[] = [];
+  let previousLat = 0;
+  let previousLng = 0;
+  for (const point of points) {
+    const fields = point as unknown as Record<string, unknown>;
+    if (typeof point !== 'object' || point === null || !Object.keys(point).every(key => ENCODABLE_KEYS.has(key))
+        || !Number.isFinite(point.lat) || !Number.isFinite(point.lng)) {
+      throw new Error(`Path point can't be encoded: ${JSON.stringify(point)}`);
+    }
+    const lat = Math.round(point.lat * MICRODEGREES);
+    const lng = Math.round(point.lng * MICRODEGREES);
+    coordinates.push(lat - previousLat, lng - previousLng);
+    previousLat = lat;
+    previousLng = lng;
+    types.push(codeOf(fields, 'type'));
+    modes.push(codeOf(fields, 'transportMode'));
+    nodeIds.push(codeOf(fields, 'nodeId'));
+    polygonIds.push(codeOf(fields, 'polygonId'));
+    if (point.isIntermediatePoint === undefined) {
+      flags.push(ABSENT);
+    } else if (typeof point.isIntermediatePoint === 'boolean') {
+      flags.push(point.isIntermediatePoint ? 2 : 1);
+    } else {
+      throw new Error(`Path point isIntermediatePoint is not a boolean: ${JSON.stringify(point.isIntermediatePoint)}`);
+    }
+  }
+  if (strings.length > 0xFFFF - 2 || types.some(code => code > 0xFF) || modes.some(code => code > 0xFF)) {
+    throw new Error('Path has too many distinct strings to encode');
+  }
+  if (coordinates.some(delta => delta < -0x80000000 || delta > 0x7FFFFFFF)) {
+    throw new Error('Path coordinates are out of range');
+  }
+  if (strings.some(value => value.includes('\0'))) {
+    throw new Error("Path strings can't contain NUL characters");
+  }
+
+  const table = Buffer.from(strings.join('\0'), 'utf8');
+  const header = Buffer.alloc(HEADER_BYTES);
+  header.writeUInt8(FORMAT_VERSION, 0);
+  header.writeUInt32LE(points.length, 1);
+  header.writeUInt32LE(table.length, 5);
+  const coordinateBytes = Buffer.alloc(4 * coordinates.length);
+  coordinates.forEach((delta, i) => coordinateBytes.writeInt32LE(delta, 4 * i));
+  const uint16Bytes = (codes: number[]) => {
+    const bytes = Buffer.alloc(2 * codes.length);
+    codes.forEach((code, i) => bytes.writeUInt16LE(code, 2 * i));
+    return bytes;
+  };
+  const data = Buffer.concat([header, table, coordinateBytes, Buffer.from(types), Buffer.from(modes),
+                              uint16Bytes(nodeIds), uint16Bytes(polygonIds), Buffer.from(flags)]);
+  return COMPACT_PATH_PREFIX + deflateSync(data).toString('base64');
+}
+
+// Path field value for a list of points, in the PATH_ENCODING form (JSON if it can't be encoded compactly)
+export function dumpPath(points: PathPoint[] | null | undefined): string {
+  const pathPoints = points || [];
+  if ((process.env.PATH_ENCODING || 'json').toLowerCase() === 'compact' && pathPoints.length > 0) {
+    try {
+      return encodeCompactPath(pathPoints);
+    } catch {
+      // Falls back to JSON like path_codec.dump_path
+    }
+  }
+  return JSON.stringify(pathPoints);
+}
+
+// Path field value as the JSON string the frontend expects, whichever form it was stored in
+export function toJsonPath(value: unknown): unknown {
+  if (!isCompactPath(value)) {
+    return value;
+  }
+  try {
+    return JSON.stringify(decodeCompactPath(value));
+  } catch (error) {
+    console.error('Failed to decode compact path:', error);
+    return '[]';
+  }
+}